@@ -275,3 +275,234 @@ class AdamW(Optimizer):
                 p.data.copy_(p_data_fp32)
 
         return loss
+
+
+def _get_foreach_state_lists(optimizer, group, state_dtype):
+    """Get lists of params, grads and moments (all float32) of params in a group with gradients,
+    bucketed by step, initializing state where needed.
+
+    Returns:
+        dict mapping step (before this update) to lists of
+            (params, params_fp32, grads, exp_avgs, exp_avg_sqs, exp_avgs_fp32, exp_avg_sqs_fp32)
+    """
+    buckets = {}
+    for p in group["params"]:
+        if p.grad is None:
+            continue
+        if p.grad.is_sparse:
+            raise RuntimeError("Foreach optimizers do not support sparse gradients")
+        state = optimizer.state[p]
+        if len(state) == 0:
+            state["step"] = 0
+            state["exp_avg"] = torch.zeros_like(p.data, dtype=state_dtype)
+            state["exp_avg_sq"] = torch.zeros_like(p.data, dtype=state_dtype)
+        bucket = buckets.setdefault(state["step"], tuple([] for _ in range(7)))
+        for ls, x in zip(
+            bucket,
+            (
+                p,
+                p.data.float(),
+                p.grad.data.float(),
+                state["exp_avg"],
+                state["exp_avg_sq"],
+                state["exp_avg"].float(),
+                state["exp_avg_sq"].float(),
+            ),
+        ):
+            ls.append(x)
+        state["step"] += 1
+    return buckets
+
+
+def _copy_back_foreach_state(tensors, tensors_fp32):
+    # .float() returns float32 tensors themselves, which have then been updated in-place
+    for tensor, tensor_fp32 in zip(tensors, tensors_fp32):
+        if tensor.dtype != tensor_fp32.dtype:
+            tensor.data.copy_(tensor_fp32)
+
+
+def _cast_foreach_state(optimizer):
+    # Optimizer.load_state_dict casts floating-point state to the dtype of its parameter
+    for state in optimizer.state.values():
+        for key in ("exp_avg", "exp_avg_sq"):
+            if key in state:
+                state[key] = state[key].to(optimizer.state_dtype)
+
+
+def _update_moments(grads, exp_avgs_fp32, exp_avg_sqs_fp32, beta1, beta2):
+    torch._foreach_mul_(exp_avg_sqs_fp32, beta2)
+    torch._foreach_addcmul_(exp_avg_sqs_fp32, grads, grads, value=1 - beta2)
+    torch._foreach_mul_(exp_avgs_fp32, beta1)
+    torch._foreach_add_(exp_avgs_fp32, grads, alpha=1 - beta1)
+
+
+class ForeachRAdam(Optimizer):
+    def __init__(
+        self,
+        params,
+        lr=1e-3,
+        betas=(0.9, 0.999),
+        eps=1e-8,
+        weight_decay=0,
+        degenerated_to_sgd=True,
+        state_dtype=torch.float32,
+    ):
+        """RAdam, updating all parameters of a group with multi-tensor (foreach) operations.
+
+        Gives the same updates as RAdam. Moments are kept in state_dtype (e.g. torch.bfloat16 to
+        halve optimizer state memory), and updates are computed in float32.
+        """
+        if not hasattr(torch, "_foreach_addcdiv_"):
+            raise RuntimeError("Foreach optimizers require torch>=1.7")
+        if not 0.0 <= lr:
+            raise ValueError("Invalid learning rate: {}".format(lr))
+        if not 0.0 <= eps:
+            raise ValueError("Invalid epsilon value: {}".format(eps))
+        if not 0.0 <= betas[0] < 1.0:
+            raise ValueError("Invalid beta parameter at index 0: {}".format(betas[0]))
+        if not 0.0 <= betas[1] < 1.0:
+            raise ValueError("Invalid beta parameter at index 1: {}".format(betas[1]))
+        self.degenerated_to_sgd = degenerated_to_sgd
+        self.state_dtype = state_dtype
+        defaults = dict(lr=lr, betas=betas, eps=eps, weight_decay=weight_decay)
+        super(ForeachRAdam, self).__init__(params, defaults)
+
+    def load_state_dict(self, state_dict):
+        super(ForeachRAdam, self).load_state_dict(state_dict)
+        _cast_foreach_state(self)
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            buckets = _get_foreach_state_lists(self, group, self.state_dtype)
+            for prev_step, lists in buckets.items():
+                (
+                    params,
+                    params_fp32,
+                    grads,
+                    exp_avgs,
+                    exp_avg_sqs,
+                    exp_avgs_fp32,
+                    exp_avg_sqs_fp32,
+                ) = lists
+                _update_moments(grads, exp_avgs_fp32, exp_avg_sqs_fp32, beta1, beta2)
+
+                step = prev_step + 1
+                beta2_t = beta2 ** step
+                N_sma_max = 2 / (1 - beta2) - 1
+                N_sma = N_sma_max - 2 * step * beta2_t / (1 - beta2_t)
+                if N_sma >= 5:
+                    step_size = math.sqrt(
+                        (1 - beta2_t)
+                        * (N_sma - 4)
+                        / (N_sma_max - 4)
+                        * (N_sma - 2)
+                        / N_sma
+                        * N_sma_max
+                        / (N_sma_max - 2)
+                    ) / (1 - beta1 ** step)
+                elif self.degenerated_to_sgd:
+                    step_size = 1.0 / (1 - beta1 ** step)
+                else:
+                    step_size = -1
+
+                if N_sma >= 5 or step_size > 0:
+                    if group["weight_decay"] != 0:
+                        torch._foreach_mul_(params_fp32, 1 - group["weight_decay"] * group["lr"])
+                    if N_sma >= 5:
+                        denom = torch._foreach_sqrt(exp_avg_sqs_fp32)
+                        torch._foreach_add_(denom, group["eps"])
+                        torch._foreach_addcdiv_(
+                            params_fp32, exp_avgs_fp32, denom, value=-step_size * group["lr"]
+                        )
+                    else:
+                        torch._foreach_add_(
+                            params_fp32, exp_avgs_fp32, alpha=-step_size * group["lr"]
+                        )
+                _copy_back_foreach_state(
+                    params + exp_avgs + exp_avg_sqs, params_fp32 + exp_avgs_fp32 + exp_avg_sqs_fp32,
+                )
+
+        return loss
+
+
+class ForeachAdamW(Optimizer):
+    def __init__(
+        self,
+        params,
+        lr=1e-3,
+        betas=(0.9, 0.999),
+        eps=1e-6,
+        weight_decay=0.0,
+        correct_bias=True,
+        state_dtype=torch.float32,
+    ):
+        """AdamW (as in transformers.AdamW), updating all parameters of a group with
+        multi-tensor (foreach) operations.
+
+        Moments are kept in state_dtype (e.g. torch.bfloat16 to halve optimizer state memory), and
+        updates are computed in float32.
+        """
+        if not hasattr(torch, "_foreach_addcdiv_"):
+            raise RuntimeError("Foreach optimizers require torch>=1.7")
+        if not 0.0 <= lr:
+            raise ValueError("Invalid learning rate: {}".format(lr))
+        if not 0.0 <= eps:
+            raise ValueError("Invalid epsilon value: {}".format(eps))
+        if not 0.0 <= betas[0] < 1.0:
+            raise ValueError("Invalid beta parameter at index 0: {}".format(betas[0]))
+        if not 0.0 <= betas[1] < 1.0:
+            raise ValueError("Invalid beta parameter at index 1: {}".format(betas[1]))
+        self.state_dtype = state_dtype
+        defaults = dict(
+            lr=lr, betas=betas, eps=eps, weight_decay=weight_decay, correct_bias=correct_bias
+        )
+        super(ForeachAdamW, self).__init__(params, defaults)
+
+    def load_state_dict(self, state_dict):
+        super(ForeachAdamW, self).load_state_dict(state_dict)
+        _cast_foreach_state(self)
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            buckets = _get_foreach_state_lists(self, group, self.state_dtype)
+            for prev_step, lists in buckets.items():
+                (
+                    params,
+                    params_fp32,
+                    grads,
+                    exp_avgs,
+                    exp_avg_sqs,
+                    exp_avgs_fp32,
+                    exp_avg_sqs_fp32,
+                ) = lists
+                _update_moments(grads, exp_avgs_fp32, exp_avg_sqs_fp32, beta1, beta2)
+
+                step = prev_step + 1
+                step_size = group["lr"]
+                if group["correct_bias"]:
+                    step_size = step_size * math.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                denom = torch._foreach_sqrt(exp_avg_sqs_fp32)
+                torch._foreach_add_(denom, group["eps"])
+                torch._foreach_addcdiv_(params_fp32, exp_avgs_fp32, denom, value=-step_size)
+                # Decoupled weight decay, applied after the Adam update (as in transformers.AdamW)
+                if group["weight_decay"] > 0.0:
+                    torch._foreach_mul_(params_fp32, 1 - group["lr"] * group["weight_decay"])
+                _copy_back_foreach_state(
+                    params + exp_avgs + exp_avg_sqs, params_fp32 + exp_avgs_fp32 + exp_avg_sqs_fp32,
+                )
+
+        return loss
@@ -169,6 +169,7 @@ def create_jiant_task_container(
     taskmodels_config: Dict,
     task_run_config: Dict,
     verbose: bool = True,
+    task_sampler_rng=None,
 ) -> JiantTaskContainer:
     """Read and interpret config files, initialize configuration objects, return JiantTaskContainer.
 
@@ -182,6 +183,8 @@ def create_jiant_task_container(
         taskmodels_config: maps mapping from tasks to models, and specifying task-model configs.
         task_run_config: config determining which tasks are used in which phase (e.g., train).
         verbose: True to print task info.
+        task_sampler_rng: seed or random state of the task sampler (e.g. the same seed on all
+            processes in distributed training, so they sample the same tasks).
 
     Returns:
         JiantTaskContainer carrying components configured and set up pre-runner.
@@ -206,6 +209,7 @@ def create_jiant_task_container(
             task_name: task_dict[task_name] for task_name in task_run_config.train_task_list
         },
         task_to_num_examples_dict=num_train_examples_dict,
+        rng=task_sampler_rng,
     )
     metric_aggregator = jiant_task_sampler.create_metric_aggregator(
         metric_aggregator_config=metric_aggregator_config,
@@ -223,7 +227,7 @@ def create_jiant_task_container(
 
 
 def create_jiant_task_container_from_dict(
-    jiant_task_container_config_dict: Dict, verbose: bool = True
+    jiant_task_container_config_dict: Dict, verbose: bool = True, task_sampler_rng=None
 ) -> JiantTaskContainer:
     return create_jiant_task_container(
         task_config_path_dict=jiant_task_container_config_dict["task_config_path_dict"],
@@ -235,13 +239,15 @@ def create_jiant_task_container_from_dict(
         task_run_config=jiant_task_container_config_dict["task_run_config"],
         metric_aggregator_config=jiant_task_container_config_dict["metric_aggregator_config"],
         verbose=verbose,
+        task_sampler_rng=task_sampler_rng,
     )
 
 
 def create_jiant_task_container_from_json(
-    jiant_task_container_config_path: str, verbose: bool = True
+    jiant_task_container_config_path: str, verbose: bool = True, task_sampler_rng=None
 ) -> JiantTaskContainer:
     return create_jiant_task_container_from_dict(
         jiant_task_container_config_dict=py_io.read_json(jiant_task_container_config_path),
         verbose=verbose,
+        task_sampler_rng=task_sampler_rng,
     )
@@ -0,0 +1,96 @@
+"""Embed a tokenized-and-cached corpus with an EmbeddingModel, into an EmbeddingStore on disk.
+
+The corpus is any embedding task (e.g. Tatoeba, BUCC2018) run through tokenize_and_cache.
+The saved embeddings (and guids etc., where the task provides them) can be loaded with
+jiant.shared.embedding_store.load_embedding_store.
+"""
+import torch
+
+import jiant.proj.main.components.container_setup as container_setup
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.shared.caching as caching
+import jiant.shared.embedding_store as embedding_store
+import jiant.shared.runner as jiant_runner
+import jiant.tasks as tasks
+import jiant.utils.zconf as zconf
+from jiant.proj.main.modeling.primary import wrap_jiant_forward
+from jiant.utils.display import maybe_tqdm
+
+# Batch fields saved alongside the embeddings, if present
+SIDE_DATA_FIELDS = ("guid", "is_english", "text_hash")
+
+
+@zconf.run_config
+class RunConfiguration(zconf.RunConfig):
+    # === Required parameters === #
+    task_config_path = zconf.attr(type=str, required=True)
+    task_cache_path = zconf.attr(type=str, required=True)
+    output_dir = zconf.attr(type=str, required=True)
+
+    # === Model parameters === #
+    model_type = zconf.attr(type=str, required=True)
+    model_path = zconf.attr(type=str, required=True)
+    model_config_path = zconf.attr(default=None, type=str)
+    model_tokenizer_path = zconf.attr(default=None, type=str)
+    model_load_mode = zconf.attr(default="from_transformers", type=str)
+
+    # === Embedding parameters === #
+    layer = zconf.attr(type=int, default=14)
+    pooler_type = zconf.attr(type=str, default="mean")
+    batch_size = zconf.attr(type=int, default=32)
+    dtype = zconf.attr(type=str, default="float32")
+    no_cuda = zconf.attr(action="store_true")
+
+
+def embed_corpus(args: RunConfiguration, verbose=True):
+    device = torch.device("cuda" if torch.cuda.is_available() and not args.no_cuda else "cpu")
+    task = tasks.create_task_from_config_path(config_path=args.task_config_path, verbose=verbose)
+    if task.TASK_TYPE != tasks.TaskTypes.EMBEDDING:
+        raise RuntimeError(f"Task {task.name} is not an embedding task")
+
+    jiant_model = jiant_model_setup.setup_jiant_model(
+        model_type=args.model_type,
+        model_config_path=args.model_config_path,
+        tokenizer_path=args.model_tokenizer_path,
+        task_dict={task.name: task},
+        taskmodels_config=container_setup.TaskmodelsConfig(
+            task_to_taskmodel_map={task.name: task.name},
+            taskmodel_config_map={
+                task.name: {"pooler_type": args.pooler_type, "layer": args.layer}
+            },
+        ),
+    )
+    jiant_model_setup.delegate_load_from_path(
+        jiant_model=jiant_model, weights_path=args.model_path, load_mode=args.model_load_mode
+    )
+    jiant_model.to(device)
+    jiant_model.eval()
+
+    dataloader = jiant_runner.get_eval_dataloader_from_cache(
+        eval_cache=caching.ChunkedFilesDataCache(args.task_cache_path),
+        task=task,
+        eval_batch_size=args.batch_size,
+    )
+    store = embedding_store.EmbeddingStore(output_dir=args.output_dir, dtype=args.dtype)
+    for batch, batch_metadata in maybe_tqdm(dataloader, desc="Embedding", verbose=verbose):
+        batch = batch.to(device)
+        with torch.no_grad():
+            model_output = wrap_jiant_forward(
+                jiant_model=jiant_model, batch=batch, task=task, compute_loss=False,
+            )
+        side_data = {}
+        for field in SIDE_DATA_FIELDS:
+            if hasattr(batch, field):
+                value = getattr(batch, field)
+                side_data[field] = value.cpu().numpy() if torch.is_tensor(value) else value
+        store.add(model_output.logits.detach().cpu().numpy(), **side_data)
+    store.get_data()
+    return store
+
+
+def main():
+    embed_corpus(RunConfiguration.default_run_cli())
+
+
+if __name__ == "__main__":
+    main()
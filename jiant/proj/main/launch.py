@@ -0,0 +1,90 @@
+"""Launch distributed (DistributedDataParallel) training, with one process per rank on this node.
+
+Arguments after "--" are passed to the Python interpreter of each process, e.g.:
+
+    python -m jiant.proj.main.launch --nproc_per_node 4 \
+        -- -m jiant.proj.main.runscript run --ZZsrc ${RUN_CONFIG} --no_cuda ...
+
+Each process gets MASTER_ADDR, MASTER_PORT, WORLD_SIZE, RANK and LOCAL_RANK in its environment,
+from which the runscript initializes the process group (see: initialization.quick_init). On CPU
+(or with --no_cuda), processes communicate with the gloo backend. For training across nodes, run
+the launcher on each node, with the same --nnodes, --master_addr and --master_port, and the
+node's --node_rank.
+
+Data caches should be created (tokenize_and_cache) before launching.
+"""
+import os
+import subprocess
+import sys
+import time
+from typing import List
+
+import jiant.utils.zconf as zconf
+
+
+@zconf.run_config
+class RunConfiguration(zconf.RunConfig):
+    nproc_per_node = zconf.attr(type=int, default=1)
+    nnodes = zconf.attr(type=int, default=1)
+    node_rank = zconf.attr(type=int, default=0)
+    master_addr = zconf.attr(type=str, default="127.0.0.1")
+    master_port = zconf.attr(type=int, default=29500)
+
+
+def get_process_env(args: RunConfiguration, local_rank: int) -> dict:
+    env = os.environ.copy()
+    env.update(
+        {
+            "MASTER_ADDR": args.master_addr,
+            "MASTER_PORT": str(args.master_port),
+            "WORLD_SIZE": str(args.nproc_per_node * args.nnodes),
+            "RANK": str(args.node_rank * args.nproc_per_node + local_rank),
+            "LOCAL_RANK": str(local_rank),
+        }
+    )
+    return env
+
+
+def launch(args: RunConfiguration, python_args: List[str], poll_interval: float = 1.0):
+    """Start one process per rank on this node, and wait for them to finish.
+
+    If any process fails, the remaining processes are terminated.
+
+    Raises:
+        subprocess.CalledProcessError if any process fails.
+
+    """
+    processes = [
+        subprocess.Popen(
+            [sys.executable] + list(python_args), env=get_process_env(args, local_rank=local_rank),
+        )
+        for local_rank in range(args.nproc_per_node)
+    ]
+    try:
+        while processes:
+            for process in list(processes):
+                return_code = process.poll()
+                if return_code is None:
+                    continue
+                processes.remove(process)
+                if return_code != 0:
+                    raise subprocess.CalledProcessError(returncode=return_code, cmd=process.args)
+            time.sleep(poll_interval)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+
+def main():
+    cl_args = sys.argv[1:]
+    if "--" not in cl_args:
+        raise RuntimeError("Pass the arguments of each process after '--'")
+    split_index = cl_args.index("--")
+    args = RunConfiguration.default_run_cli(cl_args=cl_args[:split_index])
+    launch(args=args, python_args=cl_args[split_index + 1 :])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
 from dataclasses import dataclass
 from typing import Dict
-import torch.nn as nn
 
 
 import jiant.proj.main.runner as jiant_runner
 import jiant.proj.main.components.task_sampler as jiant_task_sampler
+import jiant.shared.distributed as distributed
 from jiant.shared.runner import (
     save_model_with_metadata,
     compare_steps_max_steps,
 )
 from jiant.utils.python.datastructures import ExtendedDataClassMixin
 from jiant.utils.python.functional import always_false
-from jiant.utils.torch_utils import copy_state_dict, CPU_DEVICE, get_model_for_saving
+from jiant.utils.torch_utils import (
+    copy_state_dict,
+    CPU_DEVICE,
+    get_state_dict_for_saving,
+    load_state_dict_for_saving,
+)
 from jiant.utils.zlog import BaseZLogger, PRINT_LOGGER
 from jiant.shared.metarunner import AbstractMetarunner
 
@@ -110,7 +115,7 @@ class JiantMetarunner(AbstractMetarunner):
             yield
 
     def should_save_model(self) -> bool:
-        if self.save_every_steps == 0:
+        if self.save_every_steps == 0 or not distributed.is_main_process():
             return False
         return (self.train_state.global_steps + 1) % self.save_every_steps == 0
 
@@ -123,7 +128,7 @@ class JiantMetarunner(AbstractMetarunner):
         )
 
     def should_save_checkpoint(self) -> bool:
-        if self.save_checkpoint_every_steps == 0:
+        if self.save_checkpoint_every_steps == 0 or not distributed.is_main_process():
             return False
         return (self.train_state.global_steps + 1) % self.save_checkpoint_every_steps == 0
 
@@ -168,10 +173,10 @@ class JiantMetarunner(AbstractMetarunner):
                 target_device=None,  # Why was this required?
                 # target_device=self.device,
             )
-            if isinstance(self.model, nn.DataParallel):
-                self.model.module.load_state_dict(copied_state_dict)
-            else:
-                self.model.load_state_dict(copied_state_dict)
+            load_state_dict_for_saving(self.model, copied_state_dict)
+        if self.load_best_model:
+            # In distributed training, only the main process keeps the best model
+            distributed.broadcast_parameters(self.model)
 
     def returned_result(self):
         return {
@@ -202,6 +207,15 @@ class JiantMetarunner(AbstractMetarunner):
             task_name_list=self.runner.jiant_task_container.task_run_config.train_val_task_list,
             use_subset=True,
         )
+        # In distributed training, validation results are gathered to the main process, which
+        #   records them and decides early stopping
+        if distributed.is_main_process():
+            self._record_val_results(val_results_dict)
+        self.num_evals_since_improvement = distributed.broadcast_int(
+            self.num_evals_since_improvement
+        )
+
+    def _record_val_results(self, val_results_dict):
         aggregated_major = jiant_task_sampler.compute_aggregate_major_metrics_from_results_dict(
             metrics_aggregator=self.runner.jiant_task_container.metrics_aggregator,
             results_dict=val_results_dict,
@@ -230,7 +244,7 @@ class JiantMetarunner(AbstractMetarunner):
                 )
             del self.best_state_dict
             self.best_state_dict = copy_state_dict(
-                state_dict=get_model_for_saving(self.model).state_dict(), target_device=CPU_DEVICE,
+                state_dict=get_state_dict_for_saving(self.model), target_device=CPU_DEVICE,
             )
             self.num_evals_since_improvement = 0
         self.log_writer.write_entry(
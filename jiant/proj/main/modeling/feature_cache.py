@@ -0,0 +1,319 @@
+"""Cache of frozen-encoder features, for head-only training (e.g. probing).
+
+When the encoder is frozen, its outputs for a given example never change, so there is no need
+to run the encoder on every step of every epoch. Instead, the pooled and unpooled encoder outputs
+are computed the first time an example is seen, written to a memmapped store (one per task and
+phase, indexed by example_id), and read back on later visits.
+
+Each store records a fingerprint of the encoder weights and of the task data it was computed
+from, and is only reused by a run with the same fingerprint.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+import jiant.proj.main.modeling.taskmodels as taskmodels
+import jiant.utils.python.io as py_io
+import jiant.utils.torch_utils as torch_utils
+from jiant.proj.main.modeling.primary import JiantModel, wrap_jiant_forward
+
+METADATA_FILE_NAME = "metadata.json"
+
+
+def get_fingerprint(obj) -> str:
+    """Hash of a JSON-serializable object (e.g. data_args of a task data cache)"""
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def get_encoder_fingerprint(encoder: nn.Module) -> str:
+    """Hash of the config and weights of an encoder"""
+    hasher = hashlib.sha1()
+    config = getattr(encoder, "config", None)
+    if config is not None:
+        hasher.update(config.to_json_string().encode("utf-8"))
+    for name, tensor in encoder.state_dict().items():
+        tensor = tensor.detach().cpu()
+        hasher.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode("utf-8"))
+        # numpy does not support bfloat16
+        if tensor.dtype == torch.bfloat16:
+            tensor = tensor.float()
+        hasher.update(tensor.numpy().tobytes())
+    return hasher.hexdigest()
+
+
+class EncoderFeatureStore:
+    def __init__(
+        self,
+        path: str,
+        num_examples: int,
+        dtype="float32",
+        max_rows=None,
+        fingerprint: Optional[Dict[str, str]] = None,
+    ):
+        """Memmapped store of pooled and unpooled encoder outputs, indexed by example_id.
+
+        Arrays are allocated on the first write, once the sequence length and hidden size are
+        known. Only examples with example_id < max_rows are stored.
+
+        Args:
+            path: directory to store the features in
+            num_examples: number of examples in the task phase
+            dtype: storage dtype of the features (e.g. "float16" to halve the size)
+            max_rows: maximum number of examples to store (None for all)
+            fingerprint: hashes of what the features are computed from (e.g. encoder weights,
+                task data), which existing features in path must match
+
+        Raises:
+            RuntimeError if existing features in path do not match.
+        """
+        self.path = path
+        self.num_examples = num_examples
+        self.dtype = np.dtype(dtype)
+        self.max_rows = num_examples if max_rows is None else min(max_rows, num_examples)
+        self.fingerprint = fingerprint
+        self.pooled = None
+        self.unpooled = None
+        self.is_computed = None
+        if os.path.exists(os.path.join(path, METADATA_FILE_NAME)):
+            self._load()
+
+    @classmethod
+    def get_bytes_per_example(cls, seq_len, hidden_size, dtype):
+        return (seq_len + 1) * hidden_size * np.dtype(dtype).itemsize + 1
+
+    def lookup(self, example_ids: np.ndarray) -> Optional[taskmodels.EncoderOutput]:
+        """Get the stored encoder output for a batch, or None if any example is not stored"""
+        if self.is_computed is None:
+            return None
+        if (example_ids >= self.max_rows).any() or not self.is_computed[example_ids].all():
+            return None
+        return taskmodels.EncoderOutput(
+            pooled=torch.from_numpy(self.pooled[example_ids].astype(np.float32)),
+            unpooled=torch.from_numpy(self.unpooled[example_ids].astype(np.float32)),
+            other=(),
+        )
+
+    def write(self, example_ids: np.ndarray, pooled: np.ndarray, unpooled: np.ndarray):
+        if self.max_rows == 0:
+            return
+        if self.is_computed is None:
+            self._allocate(seq_len=unpooled.shape[1], hidden_size=unpooled.shape[2])
+        assert unpooled.shape[1:] == self.unpooled.shape[1:]
+        selector = example_ids < self.max_rows
+        if not selector.any():
+            return
+        selected_ids = example_ids[selector]
+        self.pooled[selected_ids] = pooled[selector]
+        self.unpooled[selected_ids] = unpooled[selector]
+        self.is_computed[selected_ids] = True
+
+    def flush(self):
+        if self.is_computed is not None:
+            self.pooled.flush()
+            self.unpooled.flush()
+            self.is_computed.flush()
+
+    def _allocate(self, seq_len, hidden_size):
+        os.makedirs(self.path, exist_ok=True)
+        py_io.write_json(
+            {
+                "num_examples": self.num_examples,
+                "max_rows": self.max_rows,
+                "seq_len": seq_len,
+                "hidden_size": hidden_size,
+                "dtype": self.dtype.name,
+                "fingerprint": self.fingerprint,
+            },
+            os.path.join(self.path, METADATA_FILE_NAME),
+        )
+        self._open_memmaps(seq_len=seq_len, hidden_size=hidden_size, mode="w+")
+
+    def _load(self):
+        metadata = py_io.read_json(os.path.join(self.path, METADATA_FILE_NAME))
+        if metadata["num_examples"] != self.num_examples or metadata["dtype"] != self.dtype.name:
+            raise RuntimeError(f"Existing encoder features in {self.path} do not match")
+        existing_fingerprint = metadata.get("fingerprint") or {}
+        fingerprint = self.fingerprint or {}
+        mismatched = sorted(
+            key
+            for key in set(existing_fingerprint) | set(fingerprint)
+            if existing_fingerprint.get(key) != fingerprint.get(key)
+        )
+        if mismatched:
+            raise RuntimeError(
+                f"Existing encoder features in {self.path} were computed from a different"
+                f" {', '.join(mismatched)}. Delete them, or use another cache directory"
+            )
+        self.max_rows = metadata["max_rows"]
+        self._open_memmaps(
+            seq_len=metadata["seq_len"], hidden_size=metadata["hidden_size"], mode="r+"
+        )
+
+    def _open_memmaps(self, seq_len, hidden_size, mode):
+        self.pooled = np.memmap(
+            os.path.join(self.path, "pooled.bin"),
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.max_rows, hidden_size),
+        )
+        self.unpooled = np.memmap(
+            os.path.join(self.path, "unpooled.bin"),
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self.max_rows, seq_len, hidden_size),
+        )
+        self.is_computed = np.memmap(
+            os.path.join(self.path, "is_computed.bin"),
+            dtype=np.bool_,
+            mode=mode,
+            shape=(self.max_rows,),
+        )
+
+
+class EncoderFeatureCache:
+    def __init__(
+        self,
+        jiant_model: JiantModel,
+        cache_dir: str,
+        num_examples_dict: Dict[str, Dict[str, int]],
+        dtype="float32",
+        max_bytes: Optional[int] = None,
+        data_fingerprint_dict: Optional[Dict[str, Dict[str, str]]] = None,
+    ):
+        """Frozen-encoder feature cache across tasks and phases.
+
+        The storage budget (max_bytes) is allotted to stores in the order in which they are
+        first written to. Examples that do not fit within the budget are encoded on every visit.
+
+        Features persisted in cache_dir (e.g. by a previous run) are reused only if they were
+        computed by an encoder with the same config and weights, and from task data with the
+        same fingerprint.
+
+        Args:
+            jiant_model: JiantModel, whose encoder must be frozen
+            cache_dir: directory to store features in (one subdirectory per task and phase)
+            num_examples_dict: task_name -> phase -> number of examples
+            dtype: storage dtype of the features
+            max_bytes: storage budget across all tasks and phases (None for no limit)
+            data_fingerprint_dict: task_name -> phase -> fingerprint of the task data (e.g. from
+                get_fingerprint of its cache path and data_args)
+        """
+        self.jiant_model = jiant_model
+        self.cache_dir = cache_dir
+        self.num_examples_dict = num_examples_dict
+        self.dtype = dtype
+        self.max_bytes = max_bytes
+        self.data_fingerprint_dict = data_fingerprint_dict if data_fingerprint_dict else {}
+        self.used_bytes = 0
+        self.stores = {}
+        if any(p.requires_grad for p in self.encoder.parameters()):
+            raise RuntimeError("Encoder feature caching requires a frozen encoder")
+        self.encoder_fingerprint = get_encoder_fingerprint(self.encoder)
+
+    @property
+    def encoder(self):
+        return torch_utils.get_model_for_saving(self.jiant_model).encoder
+
+    def is_cacheable(self, task_name):
+        jiant_model = torch_utils.get_model_for_saving(self.jiant_model)
+        taskmodel = jiant_model.taskmodels_dict[jiant_model.task_to_taskmodel_map[task_name]]
+        return isinstance(taskmodel, taskmodels.PRECOMPUTABLE_TASKMODEL_TYPES)
+
+    def get_encoder_output(self, batch, example_ids, task_name, phase):
+        """Get encoder output for a batch, from the cache if available, computing and caching
+        it otherwise.
+        """
+        example_ids = np.array(example_ids)
+        key = (task_name, phase)
+        if key in self.stores:
+            encoder_output = self.stores[key].lookup(example_ids)
+            if encoder_output is not None:
+                return taskmodels.EncoderOutput(
+                    pooled=encoder_output.pooled.to(batch.input_ids.device),
+                    unpooled=encoder_output.unpooled.to(batch.input_ids.device),
+                    other=(),
+                )
+
+        # Features are computed without dropout, so that they are identical across visits
+        was_training = self.encoder.training
+        self.encoder.eval()
+        with torch.no_grad():
+            encoder_output = taskmodels.get_output_from_encoder_and_batch(
+                encoder=self.encoder, batch=batch
+            )
+        self.encoder.train(was_training)
+        pooled = encoder_output.pooled.cpu().numpy().astype(self.dtype)
+        unpooled = encoder_output.unpooled.cpu().numpy().astype(self.dtype)
+        if key not in self.stores:
+            self.stores[key] = self._create_store(
+                task_name=task_name,
+                phase=phase,
+                seq_len=unpooled.shape[1],
+                hidden_size=unpooled.shape[2],
+            )
+        self.stores[key].write(example_ids=example_ids, pooled=pooled, unpooled=unpooled)
+        # Round-trip through the storage dtype, so that cached and fresh features match
+        return taskmodels.EncoderOutput(
+            pooled=torch.from_numpy(pooled.astype(np.float32)).to(batch.input_ids.device),
+            unpooled=torch.from_numpy(unpooled.astype(np.float32)).to(batch.input_ids.device),
+            other=(),
+        )
+
+    def _create_store(self, task_name, phase, seq_len, hidden_size):
+        max_rows = None
+        if self.max_bytes is not None:
+            bytes_per_example = EncoderFeatureStore.get_bytes_per_example(
+                seq_len=seq_len, hidden_size=hidden_size, dtype=self.dtype
+            )
+            max_rows = max(self.max_bytes - self.used_bytes, 0) // bytes_per_example
+        store = EncoderFeatureStore(
+            path=os.path.join(self.cache_dir, task_name, phase),
+            num_examples=self.num_examples_dict[task_name][phase],
+            dtype=self.dtype,
+            max_rows=max_rows,
+            fingerprint={
+                "encoder": self.encoder_fingerprint,
+                "data": self.data_fingerprint_dict.get(task_name, {}).get(phase),
+            },
+        )
+        if self.max_bytes is not None:
+            self.used_bytes += store.max_rows * bytes_per_example
+        return store
+
+    def flush(self):
+        for store in self.stores.values():
+            store.flush()
+
+
+def wrap_jiant_forward_with_feature_cache(
+    jiant_model,
+    batch,
+    batch_metadata,
+    task,
+    phase,
+    compute_loss: bool = False,
+    encoder_feature_cache: Optional[EncoderFeatureCache] = None,
+):
+    """wrap_jiant_forward, reading encoder outputs from the encoder_feature_cache where possible.
+
+    Falls back to wrap_jiant_forward if there is no cache, or if the task's taskmodel is not
+    cacheable.
+    """
+    if encoder_feature_cache is None or not encoder_feature_cache.is_cacheable(task.name):
+        return wrap_jiant_forward(
+            jiant_model=jiant_model, batch=batch, task=task, compute_loss=compute_loss
+        )
+    encoder_output = encoder_feature_cache.get_encoder_output(
+        batch=batch, example_ids=batch_metadata["example_id"], task_name=task.name, phase=phase,
+    )
+    with taskmodels.precomputed_encoder_output_context(
+        encoder=encoder_feature_cache.encoder, encoder_output=encoder_output
+    ):
+        return wrap_jiant_forward(
+            jiant_model=jiant_model, batch=batch, task=task, compute_loss=compute_loss
+        )
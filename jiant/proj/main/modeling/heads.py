@@ -63,11 +63,23 @@ class SpanComparisonHead(BaseHead):
         self.classifier = nn.Linear(hidden_size * self.num_spans, self.num_labels)
 
     def forward(self, unpooled, spans):
-        span_embeddings = self.span_attention_extractor(unpooled, spans)
+        """Classify spans (or grouped span queries) from the same unpooled encoder output
+
+        Args:
+            unpooled: (batch_size, seq_len, hidden_size)
+            spans: (batch_size, num_spans, 2), or (batch_size, num_queries, num_spans, 2) for
+                grouped span queries
+
+        Returns:
+            logits: (batch_size, num_labels), or (batch_size, num_queries, num_labels)
+        """
+        span_embeddings = self.span_attention_extractor(
+            unpooled, spans.view(unpooled.shape[0], -1, 2)
+        )
         span_embeddings = span_embeddings.view(-1, self.num_spans * self.hidden_size)
         span_embeddings = self.dropout(span_embeddings)
         logits = self.classifier(span_embeddings)
-        return logits
+        return logits.view(*spans.shape[:-2], self.num_labels)
 
 
 class TokenClassificationHead(BaseHead):
@@ -11,6 +11,7 @@ import jiant.proj.main.modeling.primary as primary
 import jiant.proj.main.modeling.taskmodels as taskmodels
 import jiant.proj.main.modeling.heads as heads
 import jiant.shared.model_setup as model_setup
+import jiant.utils.torch_utils as torch_utils
 import jiant.utils.python.strings as strings
 from jiant.shared.model_setup import ModelArchitectures
 from jiant.tasks import Task, TaskTypes
@@ -414,6 +415,151 @@ def get_encoder(model_arch, ancestor_model):
         raise KeyError(model_arch)
 
 
+# Names of the lists of layers in transformers encoders (BERT-style, BART/mBART, ALBERT)
+ENCODER_LAYER_LIST_NAMES = {"layer", "layers", "albert_layer_groups"}
+
+
+def enable_gradient_checkpointing(encoder: nn.Module) -> int:
+    """Enable layer-wise activation (gradient) checkpointing in an encoder, in-place.
+
+    Activations within each layer are recomputed in the backward pass instead of being stored,
+    reducing peak memory in training at the cost of an extra forward pass per layer.
+
+    Each layer is wrapped by torch_utils.checkpoint_module, which leaves parameter names
+    unchanged. The Hugging Face implementation (config.gradient_checkpointing) is not used: it
+    is reentrant, and so computes no gradients for a layer whose input does not require them
+    (e.g. with frozen embeddings, or with only adapter/LoRA parameters trainable).
+
+    Args:
+        encoder: encoder (e.g. from get_encoder).
+
+    Raises:
+        RuntimeError if no layers are found to checkpoint.
+
+    Returns:
+        number of checkpointed layers.
+
+    """
+    layer_lists = [
+        module
+        for name, module in encoder.named_modules()
+        if isinstance(module, nn.ModuleList) and name.split(".")[-1] in ENCODER_LAYER_LIST_NAMES
+    ]
+    if not layer_lists:
+        raise RuntimeError(f"Gradient checkpointing not supported for {type(encoder).__name__}")
+    num_layers = 0
+    for layer_list in layer_lists:
+        for layer in layer_list:
+            torch_utils.checkpoint_module(layer)
+            num_layers += 1
+    return num_layers
+
+
+def has_reentrant_gradient_checkpointing(encoder: nn.Module) -> bool:
+    """Whether the Hugging Face (reentrant) gradient checkpointing is enabled in an encoder.
+
+    e.g. from "gradient_checkpointing" in the model config. Reentrant checkpointing computes no
+    gradients for a layer whose input does not require them, so it cannot be combined with
+    frozen embeddings or adapter/LoRA-only training (see: enable_gradient_checkpointing).
+    """
+    config = getattr(encoder, "config", None)
+    return bool(
+        getattr(config, "gradient_checkpointing", False)
+        or getattr(encoder, "is_gradient_checkpointing", False)
+    )
+
+
+def parse_layer_indices(layers_str: str) -> List[int]:
+    """Parse layer indices from a string of comma-separated indices and (inclusive) ranges.
+
+    e.g. "0-3,6" -> [0, 1, 2, 3, 6]
+    """
+    layer_indices = set()
+    for part in layers_str.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            layer_indices.update(range(int(start), int(end) + 1))
+        else:
+            layer_indices.add(int(part))
+    return sorted(layer_indices)
+
+
+def freeze_encoder_parameters(
+    encoder: nn.Module, freeze_embeddings: bool = False, freeze_layers: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """Freeze the embeddings and/or some layers of an encoder (in-place).
+
+    Frozen parameters are left out of the optimizer (see: create_optimizer), and have no gradients
+    or optimizer state. Autograd does not backpropagate into modules whose parameters and inputs
+    do not require gradients, so if the embeddings and the bottom layers are frozen, the backward
+    pass stops at the lowest trainable layer, and activations below it are not stored. This also
+    holds with gradient checkpointing (see: enable_gradient_checkpointing), which is
+    non-reentrant.
+
+    Args:
+        encoder: encoder (e.g. from get_encoder).
+        freeze_embeddings: freeze the embedding layer.
+        freeze_layers: indices of layers to freeze.
+
+    Raises:
+        RuntimeError if the embeddings or layers are not found.
+
+    Returns:
+        Dict summarizing frozen parameters, including the estimated memory saved (gradients and
+        AdamW state), and whether backward stops early: lowest_trainable_layer is None if the
+        embeddings are trainable, or if all layers are frozen.
+
+    """
+    frozen_modules = []
+    if freeze_embeddings:
+        if not hasattr(encoder, "embeddings"):
+            raise RuntimeError(f"Embeddings not found in {type(encoder).__name__}")
+        frozen_modules.append(encoder.embeddings)
+    num_layers = None
+    if freeze_layers:
+        layer_lists = [
+            module
+            for name, module in encoder.named_modules()
+            if isinstance(module, nn.ModuleList) and name.split(".")[-1] in ENCODER_LAYER_LIST_NAMES
+        ]
+        if len(layer_lists) != 1:
+            raise RuntimeError(f"Layers not found in {type(encoder).__name__}")
+        layers = layer_lists[0]
+        num_layers = len(layers)
+        for i in freeze_layers:
+            if not 0 <= i < num_layers:
+                raise RuntimeError(f"Layer {i} not in encoder with {num_layers} layers")
+            frozen_modules.append(layers[i])
+
+    frozen_parameters = {}
+    for module in frozen_modules:
+        for param in module.parameters():
+            if param.requires_grad:
+                frozen_parameters[id(param)] = param
+                torch_utils.set_requires_grad_single(param, requires_grad=False)
+    # Backward stops early only if everything below the lowest trainable layer is frozen
+    lowest_trainable_layer = None
+    all_layers_frozen = num_layers is not None and len(set(freeze_layers)) == num_layers
+    if freeze_embeddings and not all_layers_frozen:
+        lowest_trainable_layer = 0
+        while lowest_trainable_layer in (freeze_layers or []):
+            lowest_trainable_layer += 1
+    return {
+        "num_frozen_params": sum(param.numel() for param in frozen_parameters.values()),
+        "num_frozen_layers": len(freeze_layers or []),
+        "num_layers": num_layers,
+        "lowest_trainable_layer": lowest_trainable_layer,
+        "all_layers_frozen": all_layers_frozen,
+        # Gradients + AdamW first and second moments
+        "estimated_memory_saved_mb": 3
+        * sum(param.numel() * param.element_size() for param in frozen_parameters.values())
+        / 2 ** 20,
+    }
+
+
 @dataclass
 class TransformersClassSpec:
     config_class: Any
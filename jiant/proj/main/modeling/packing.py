@@ -0,0 +1,103 @@
+"""Packed multi-task forward passes: batches of several tasks through one shared encoder pass.
+
+The inputs of the batches are padded to a common sequence length and concatenated, the encoder is
+run once, and its (pooled and unpooled) outputs are split back per batch and fed to each task's
+taskmodel (see: taskmodels.precomputed_encoder_output_context). Padding is masked out in
+attention, so each batch's outputs match those of a separate encoder pass.
+
+Only taskmodels that use encoder outputs through get_output_from_encoder_and_batch can be
+packed (see: taskmodels.PRECOMPUTABLE_TASKMODEL_TYPES). Batches of other tasks (e.g. multiple
+choice, MLM) are run separately.
+"""
+from typing import List, Tuple
+
+import torch
+import torch.nn.functional as F  # noqa PyPep8Naming
+
+import jiant.proj.main.modeling.peft as peft
+import jiant.proj.main.modeling.taskmodels as taskmodels
+from jiant.proj.main.modeling.primary import JiantModel, wrap_jiant_forward
+
+
+def is_packable(jiant_model: JiantModel, task_name: str) -> bool:
+    taskmodel = jiant_model.taskmodels_dict[jiant_model.task_to_taskmodel_map[task_name]]
+    return isinstance(taskmodel, taskmodels.PRECOMPUTABLE_TASKMODEL_TYPES)
+
+
+def pad_and_concat_inputs(batch_list: list, pad_token_id: int):
+    """Pad encoder inputs of batches to a common sequence length, and concatenate them.
+
+    Returns:
+        input_ids, segment_ids, input_mask, and the (start, end) rows of each batch
+    """
+    max_seq_length = max(batch.input_ids.shape[1] for batch in batch_list)
+    input_ids_ls, segment_ids_ls, input_mask_ls, row_slices = [], [], [], []
+    start = 0
+    for batch in batch_list:
+        padding = (0, max_seq_length - batch.input_ids.shape[1])
+        input_ids_ls.append(F.pad(batch.input_ids, padding, value=pad_token_id))
+        segment_ids_ls.append(F.pad(batch.segment_ids, padding, value=0))
+        input_mask_ls.append(F.pad(batch.input_mask, padding, value=0))
+        row_slices.append((start, start + len(batch.input_ids)))
+        start += len(batch.input_ids)
+    return (
+        torch.cat(input_ids_ls),
+        torch.cat(segment_ids_ls),
+        torch.cat(input_mask_ls),
+        row_slices,
+    )
+
+
+def packed_forward(jiant_model: JiantModel, task_batch_list: List[Tuple], compute_loss=False):
+    """Forward pass for batches of several tasks, sharing one encoder pass where possible.
+
+    Args:
+        jiant_model: JiantModel (not wrapped in DataParallel).
+        task_batch_list: list of (task, batch) pairs.
+        compute_loss: whether to compute losses.
+
+    Returns:
+        list of model outputs (as from wrap_jiant_forward), for each (task, batch) pair.
+
+    """
+    if not isinstance(jiant_model, JiantModel):
+        raise RuntimeError("Packed forward passes are only supported for a single device")
+    encoder = jiant_model.encoder
+    packed_indices = [
+        i for i, (task, _) in enumerate(task_batch_list) if is_packable(jiant_model, task.name)
+    ]
+    if getattr(encoder, "peft_per_taskmodel", False) and (
+        len({jiant_model.task_to_taskmodel_map[task_batch_list[i][0].name] for i in packed_indices})
+        > 1
+    ):
+        raise RuntimeError("Packed forward passes need the same encoder for all taskmodels")
+
+    model_outputs = [None] * len(task_batch_list)
+    if packed_indices:
+        input_ids, segment_ids, input_mask, row_slices = pad_and_concat_inputs(
+            batch_list=[task_batch_list[i][1] for i in packed_indices],
+            pad_token_id=jiant_model.tokenizer.pad_token_id,
+        )
+        packed_task_name = task_batch_list[packed_indices[0]][0].name
+        peft.set_active_taskmodel(encoder, jiant_model.task_to_taskmodel_map[packed_task_name])
+        encoder_output = taskmodels.get_output_from_encoder(
+            encoder=encoder, input_ids=input_ids, segment_ids=segment_ids, input_mask=input_mask,
+        )
+        for i, (start, end) in zip(packed_indices, row_slices):
+            task, batch = task_batch_list[i]
+            batch_encoder_output = taskmodels.EncoderOutput(
+                pooled=encoder_output.pooled[start:end],
+                unpooled=encoder_output.unpooled[start:end, : batch.input_ids.shape[1]],
+            )
+            with taskmodels.precomputed_encoder_output_context(
+                encoder=encoder, encoder_output=batch_encoder_output
+            ):
+                model_outputs[i] = wrap_jiant_forward(
+                    jiant_model=jiant_model, batch=batch, task=task, compute_loss=compute_loss
+                )
+    for i, (task, batch) in enumerate(task_batch_list):
+        if model_outputs[i] is None:
+            model_outputs[i] = wrap_jiant_forward(
+                jiant_model=jiant_model, batch=batch, task=task, compute_loss=compute_loss
+            )
+    return model_outputs
@@ -0,0 +1,184 @@
+"""Parameter-efficient fine-tuning (PEFT): adapters and LoRA in a frozen encoder.
+
+Adapters (bottleneck MLPs added to the output of the attention and feed-forward output
+projections) and/or LoRA (low-rank updates to the attention query and value projections) are
+injected into the encoder, and the encoder's own weights are frozen. Only the injected modules
+(and the task heads) are trained, so the optimizer holds state only for those parameters, and
+saved models and checkpoints only hold the trainable parameters (see:
+torch_utils.get_state_dict_for_saving).
+
+Injected modules are attached to the existing nn.Linear modules of the encoder with forward hooks,
+so the names of the pretrained weights are unchanged, and the encoder can be loaded from (full)
+pretrained weights before or after injection.
+
+With per_taskmodel, each taskmodel gets its own adapters/LoRA, over a shared frozen encoder.
+"""
+import math
+from dataclasses import dataclass
+from typing import Dict, List
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F  # noqa PyPep8Naming
+
+import jiant.utils.torch_utils as torch_utils
+from jiant.utils.python.datastructures import ExtendedDataClassMixin
+
+SHARED_KEY = "shared"
+
+# Suffixes of the names of nn.Linear modules that adapters/LoRA are added to, for
+# BERT-style (BERT, RoBERTa, XLM-R, ELECTRA), ALBERT and BART/mBART encoders
+ADAPTER_TARGET_MODULES = (
+    "output.dense",
+    "attention.dense",
+    "ffn_output",
+    "self_attn.out_proj",
+    "fc2",
+)
+LORA_TARGET_MODULES = ("query", "value", "q_proj", "v_proj")
+
+
+@dataclass
+class PeftConfig(ExtendedDataClassMixin):
+    adapter_size: int = 0
+    lora_rank: int = 0
+    lora_alpha: float = 16.0
+    lora_dropout: float = 0.0
+    per_taskmodel: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.adapter_size > 0 or self.lora_rank > 0
+
+
+class Adapter(nn.Module):
+    def __init__(self, hidden_size: int, adapter_size: int):
+        """Bottleneck adapter (Houlsby et al., 2019), initialized to the identity function"""
+        super().__init__()
+        self.down_project = nn.Linear(hidden_size, adapter_size)
+        self.up_project = nn.Linear(adapter_size, hidden_size)
+        nn.init.zeros_(self.up_project.weight)
+        nn.init.zeros_(self.up_project.bias)
+
+    def forward(self, hidden_states):
+        return hidden_states + self.up_project(F.gelu(self.down_project(hidden_states)))
+
+
+class LoRA(nn.Module):
+    def __init__(
+        self, in_features: int, out_features: int, rank: int, alpha: float, dropout: float
+    ):
+        """Low-rank update (Hu et al., 2021) to a linear layer, initialized to zero"""
+        super().__init__()
+        self.lora_a = nn.Parameter(torch.empty(rank, in_features))
+        self.lora_b = nn.Parameter(torch.zeros(out_features, rank))
+        nn.init.kaiming_uniform_(self.lora_a, a=math.sqrt(5))
+        self.scaling = alpha / rank
+        self.dropout = nn.Dropout(dropout)
+
+    def forward(self, x):
+        return F.linear(F.linear(self.dropout(x), self.lora_a), self.lora_b) * self.scaling
+
+
+class PeftLayer(nn.Module):
+    def __init__(
+        self, linear: nn.Linear, peft_config: PeftConfig, add_adapter: bool, add_lora: bool
+    ):
+        super().__init__()
+        self.adapter = (
+            Adapter(hidden_size=linear.out_features, adapter_size=peft_config.adapter_size)
+            if add_adapter
+            else None
+        )
+        self.lora = (
+            LoRA(
+                in_features=linear.in_features,
+                out_features=linear.out_features,
+                rank=peft_config.lora_rank,
+                alpha=peft_config.lora_alpha,
+                dropout=peft_config.lora_dropout,
+            )
+            if add_lora
+            else None
+        )
+
+    def forward(self, linear_input, linear_output):
+        if self.lora is not None:
+            linear_output = linear_output + self.lora(linear_input)
+        if self.adapter is not None:
+            linear_output = self.adapter(linear_output)
+        return linear_output
+
+
+def _peft_forward_hook(module, inputs, output):
+    return module.peft[module.active_peft_key](inputs[0], output)
+
+
+def _matches(module_name: str, target_modules) -> bool:
+    return any(module_name == t or module_name.endswith("." + t) for t in target_modules)
+
+
+def inject_peft(jiant_model: nn.Module, peft_config: PeftConfig) -> Dict[str, int]:
+    """Freeze the encoder of a JiantModel, and add trainable adapters and/or LoRA to it (in-place).
+
+    Args:
+        jiant_model: JiantModel.
+        peft_config: PeftConfig.
+
+    Raises:
+        RuntimeError if no modules are found to add adapters/LoRA to.
+
+    Returns:
+        Dict with the numbers of trainable and total parameters.
+
+    """
+    assert peft_config.enabled
+    encoder = jiant_model.encoder
+    if peft_config.per_taskmodel:
+        peft_keys = sorted(set(jiant_model.task_to_taskmodel_map.values()))
+    else:
+        peft_keys = [SHARED_KEY]
+    torch_utils.set_requires_grad(encoder.named_parameters(), requires_grad=False)
+
+    target_modules = []
+    for name, module in encoder.named_modules():
+        add_adapter = peft_config.adapter_size > 0 and _matches(name, ADAPTER_TARGET_MODULES)
+        add_lora = peft_config.lora_rank > 0 and _matches(name, LORA_TARGET_MODULES)
+        if (add_adapter or add_lora) and isinstance(module, nn.Linear):
+            target_modules.append((module, add_adapter, add_lora))
+    if not target_modules:
+        raise RuntimeError(f"No modules found for adapters/LoRA in {type(encoder).__name__}")
+    for module, add_adapter, add_lora in target_modules:
+        module.peft = nn.ModuleDict(
+            {
+                key: PeftLayer(
+                    linear=module,
+                    peft_config=peft_config,
+                    add_adapter=add_adapter,
+                    add_lora=add_lora,
+                ).to(module.weight.device)
+                for key in peft_keys
+            }
+        )
+        module.active_peft_key = peft_keys[0]
+        module.register_forward_hook(_peft_forward_hook)
+    encoder.peft_per_taskmodel = peft_config.per_taskmodel
+    jiant_model.save_trainable_only = True
+
+    parameters = list(jiant_model.parameters())
+    return {
+        "trainable": sum(p.numel() for p in parameters if p.requires_grad),
+        "total": sum(p.numel() for p in parameters),
+    }
+
+
+def set_active_taskmodel(encoder: nn.Module, taskmodel_name: str):
+    """Use the adapters/LoRA of a taskmodel (only needed for per_taskmodel PEFT)"""
+    if not getattr(encoder, "peft_per_taskmodel", False):
+        return
+    for module in get_peft_modules(encoder):
+        module.active_peft_key = taskmodel_name
+
+
+def get_peft_modules(encoder: nn.Module) -> List[nn.Module]:
+    return [module for module in encoder.modules() if hasattr(module, "active_peft_key")]
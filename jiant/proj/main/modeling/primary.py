@@ -2,6 +2,7 @@ from typing import Dict, Union
 
 import torch.nn as nn
 
+import jiant.proj.main.modeling.peft as peft
 import jiant.proj.main.modeling.taskmodels as taskmodels
 import jiant.tasks as tasks
 from jiant.proj.main.components.outputs import construct_output_from_dict
@@ -48,6 +49,7 @@ class JiantModel(nn.Module):
             task = task
         taskmodel_key = self.task_to_taskmodel_map[task_name]
         taskmodel = self.taskmodels_dict[taskmodel_key]
+        peft.set_active_taskmodel(self.encoder, taskmodel_key)
         return taskmodel(
             batch=batch, task=task, tokenizer=self.tokenizer, compute_loss=compute_loss,
         ).to_dict()
@@ -75,7 +77,9 @@ def wrap_jiant_forward(
         Union[LogitsOutput, LogitsAndLossOutput, EmbeddingOutput]: model output dataclass.
 
     """
-    assert isinstance(jiant_model, (JiantModel, nn.DataParallel))
+    assert isinstance(
+        jiant_model, (JiantModel, nn.DataParallel, nn.parallel.DistributedDataParallel)
+    )
     is_multi_gpu = isinstance(jiant_model, nn.DataParallel)
     model_output = construct_output_from_dict(
         jiant_model(
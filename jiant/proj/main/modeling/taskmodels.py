@@ -1,6 +1,7 @@
 import abc
+import contextlib
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Dict, List, Optional
 
 import torch
 import torch.nn as nn
@@ -156,9 +157,14 @@ class MultiLabelSpanComparisonModel(Taskmodel):
         logits = self.span_comparison_head(unpooled=encoder_output.unpooled, spans=batch.spans)
         if compute_loss:
             loss_fct = nn.BCEWithLogitsLoss()
-            loss = loss_fct(
-                logits.view(-1, self.span_comparison_head.num_labels), batch.label_ids.float(),
-            )
+            if hasattr(batch, "span_mask"):
+                # Grouped span queries: padding queries are excluded from the loss
+                query_mask = batch.span_mask.bool()
+                loss = loss_fct(logits[query_mask], batch.label_ids[query_mask].float())
+            else:
+                loss = loss_fct(
+                    logits.view(-1, self.span_comparison_head.num_labels), batch.label_ids.float(),
+                )
             return LogitsAndLossOutput(logits=logits, loss=loss, other=encoder_output.other)
         else:
             return LogitsOutput(logits=logits, other=encoder_output.other)
@@ -234,11 +240,11 @@ class EmbeddingModel(Taskmodel):
         self.layer = layer
 
     def forward(self, batch, task, tokenizer, compute_loss: bool = False):
-        with transformer_utils.output_hidden_states_context(self.encoder):
-            encoder_output = get_output_from_encoder_and_batch(encoder=self.encoder, batch=batch)
-        # A tuple of layers of hidden states
-        hidden_states = take_one(encoder_output.other)
-        layer_hidden_states = hidden_states[self.layer]
+        # Only the hidden states of self.layer are used, so the layers above it are not run, and
+        # the hidden states of other layers are not returned.
+        layer_hidden_states = get_layer_output_from_encoder_and_batch(
+            encoder=self.encoder, batch=batch, layer=self.layer
+        )
 
         if isinstance(self.pooler_head, heads.MeanPoolerHead):
             logits = self.pooler_head(unpooled=layer_hidden_states, input_mask=batch.input_mask)
@@ -251,12 +257,23 @@ class EmbeddingModel(Taskmodel):
         if compute_loss:
             # TODO: make this optional?   (issue #1187)
             return LogitsAndLossOutput(
-                logits=logits,
-                loss=torch.tensor([0.0]),  # This is a horrible hack
-                other=encoder_output.other,
+                logits=logits, loss=torch.tensor([0.0]),  # This is a horrible hack
             )
         else:
-            return LogitsOutput(logits=logits, other=encoder_output.other)
+            return LogitsOutput(logits=logits)
+
+
+# Taskmodels that only use the encoder via get_output_from_encoder_and_batch, and so can be fed
+# precomputed encoder outputs (see: precomputed_encoder_output_context)
+PRECOMPUTABLE_TASKMODEL_TYPES = (
+    ClassificationModel,
+    RegressionModel,
+    SpanComparisonModel,
+    SpanPredictionModel,
+    MultiLabelSpanComparisonModel,
+    TokenClassificationModel,
+    QAModel,
+)
 
 
 @dataclass
@@ -267,6 +284,25 @@ class EncoderOutput:
     # Extend later with attention, hidden_acts, etc
 
 
+PRECOMPUTED_OUTPUT_ATTR = "_jiant_precomputed_output"
+
+
+@contextlib.contextmanager
+def precomputed_encoder_output_context(encoder, encoder_output: EncoderOutput):
+    """Within the context, get_output_from_encoder_and_batch returns encoder_output for the
+    given encoder, instead of running the encoder.
+
+    Used to feed previously computed features (e.g. of a frozen encoder) to taskmodels.
+    Taskmodels that call the encoder in other ways (e.g. MultipleChoiceModel, MLMModel) are
+    not affected.
+    """
+    setattr(encoder, PRECOMPUTED_OUTPUT_ATTR, encoder_output)
+    try:
+        yield
+    finally:
+        delattr(encoder, PRECOMPUTED_OUTPUT_ATTR)
+
+
 def get_output_from_encoder_and_batch(encoder, batch) -> EncoderOutput:
     """Pass batch to encoder, return encoder model output.
 
@@ -278,6 +314,11 @@ def get_output_from_encoder_and_batch(encoder, batch) -> EncoderOutput:
         EncoderOutput containing pooled and unpooled model outputs as well as any other outputs.
 
     """
+    precomputed_output = getattr(encoder, PRECOMPUTED_OUTPUT_ATTR, None)
+    if precomputed_output is not None:
+        # See: precomputed_encoder_output_context
+        assert precomputed_output.unpooled.shape[:2] == batch.input_ids.shape
+        return precomputed_output
     return get_output_from_encoder(
         encoder=encoder,
         input_ids=batch.input_ids,
@@ -286,6 +327,107 @@ def get_output_from_encoder_and_batch(encoder, batch) -> EncoderOutput:
     )
 
 
+def get_layer_output_from_encoder_and_batch(encoder, batch, layer: int) -> torch.Tensor:
+    """Pass batch to encoder, return the hidden states of one layer.
+
+    Where the architecture supports it, the encoder is only run up to the requested layer
+    (see transformer_utils.truncated_layers_context). Otherwise, the full encoder is run with
+    output_hidden_states, and the requested layer is selected.
+
+    Args:
+        encoder: bare model outputting raw hidden-states without any specific head.
+        batch: Batch object (containing token indices, token type ids, and attention mask).
+        layer: index into the hidden states (0 for the embeddings, -1 for the last layer).
+            For BART/mBART, the encoder hidden states are followed by the decoder hidden states.
+
+    Returns:
+        hidden states of the requested layer (batch_size, seq_len, hidden_size)
+
+    """
+    num_hidden_states = transformer_utils.get_num_hidden_states(encoder)
+    if not -num_hidden_states <= layer < num_hidden_states:
+        raise IndexError(f"Layer {layer} out of range for {num_hidden_states} hidden states")
+    num_layers = layer % num_hidden_states
+    if transformer_utils.supports_truncated_layers(encoder, num_layers):
+        model_arch = ModelArchitectures.from_encoder(encoder)
+        with transformer_utils.truncated_layers_context(encoder, num_layers):
+            if model_arch in [ModelArchitectures.BART, ModelArchitectures.MBART]:
+                # Encoder layers only, the decoder does not need to be run
+                bart_encoder_output = encoder.encoder(
+                    input_ids=batch.input_ids, attention_mask=batch.input_mask
+                )
+                return bart_encoder_output[0]
+            return get_output_from_encoder_and_batch(encoder=encoder, batch=batch).unpooled
+    with transformer_utils.output_hidden_states_context(encoder):
+        encoder_output = get_output_from_encoder_and_batch(encoder=encoder, batch=batch)
+    # A tuple of layers of hidden states
+    return take_one(encoder_output.other)[layer]
+
+
+def get_layer_outputs_from_encoder_and_batch(
+    encoder, batch, layers: List[Optional[int]]
+) -> Dict[Optional[int], EncoderOutput]:
+    """Pass batch to encoder once, return encoder outputs for several layers.
+
+    For each integer layer, the unpooled output is the hidden states of that layer (indexed as in
+    get_layer_output_from_encoder_and_batch), and the pooled output is the representation of the
+    first token. A layer of None stands for the regular encoder output.
+    The encoder is only run up to the highest requested layer, where possible.
+
+    Args:
+        encoder: bare model outputting raw hidden-states without any specific head.
+        batch: Batch object (containing token indices, token type ids, and attention mask).
+        layers: list of layers
+
+    Returns:
+        Dict mapping each layer to an EncoderOutput
+
+    """
+    num_hidden_states = transformer_utils.get_num_hidden_states(encoder)
+    layer_indices = [layer for layer in layers if layer is not None]
+    for layer in layer_indices:
+        if not -num_hidden_states <= layer < num_hidden_states:
+            raise IndexError(f"Layer {layer} out of range for {num_hidden_states} hidden states")
+    max_num_layers = max([layer % num_hidden_states for layer in layer_indices], default=0)
+
+    encoder_output = None
+    if None not in layers and transformer_utils.supports_truncated_layers(encoder, max_num_layers):
+        model_arch = ModelArchitectures.from_encoder(encoder)
+        with transformer_utils.truncated_layers_context(encoder, max_num_layers):
+            if model_arch in [ModelArchitectures.BART, ModelArchitectures.MBART]:
+                # Encoder layers only, the decoder does not need to be run
+                _, hidden_states, _ = encoder.encoder(
+                    input_ids=batch.input_ids,
+                    attention_mask=batch.input_mask,
+                    output_hidden_states=True,
+                )
+            else:
+                with transformer_utils.output_hidden_states_context(encoder):
+                    hidden_states = take_one(
+                        get_output_from_encoder_and_batch(encoder=encoder, batch=batch).other
+                    )
+        # Truncated hidden states only go up to max_num_layers, so index them from the start
+        layer_indices_map = {layer: layer % num_hidden_states for layer in layer_indices}
+    elif layer_indices:
+        with transformer_utils.output_hidden_states_context(encoder):
+            encoder_output = get_output_from_encoder_and_batch(encoder=encoder, batch=batch)
+        hidden_states = take_one(encoder_output.other)
+        layer_indices_map = {layer: layer for layer in layer_indices}
+    else:
+        encoder_output = get_output_from_encoder_and_batch(encoder=encoder, batch=batch)
+
+    layer_outputs = {}
+    for layer in layers:
+        if layer is None:
+            layer_outputs[layer] = EncoderOutput(
+                pooled=encoder_output.pooled, unpooled=encoder_output.unpooled, other=(),
+            )
+        else:
+            unpooled = hidden_states[layer_indices_map[layer]]
+            layer_outputs[layer] = EncoderOutput(pooled=unpooled[:, 0], unpooled=unpooled, other=())
+    return layer_outputs
+
+
 def get_output_from_encoder(encoder, input_ids, segment_ids, input_mask) -> EncoderOutput:
     """Pass inputs to encoder, return encoder output.
 
@@ -346,13 +488,19 @@ def get_output_from_bart_models(encoder, input_ids, input_mask):
     # the decode input is 1-shifted sequence, and the resulting
     # sentence representation is the final decoder state.
     # That's what we use for `unpooled` here.
-    dec_last, dec_all, enc_last, enc_all = encoder(
-        input_ids=input_ids, attention_mask=input_mask, output_hidden_states=True,
-    )
+    # Hidden states are only returned if requested (see output_hidden_states_context)
+    if encoder.config.output_hidden_states:
+        dec_last, dec_all, enc_last, enc_all = encoder(
+            input_ids=input_ids, attention_mask=input_mask, output_hidden_states=True,
+        )
+        other = (enc_all + dec_all,)
+    else:
+        dec_last, enc_last = encoder(
+            input_ids=input_ids, attention_mask=input_mask, output_hidden_states=False,
+        )
+        other = ()
     unpooled = dec_last
 
-    other = (enc_all + dec_all,)
-
     bsize, slen = input_ids.shape
     batch_idx = torch.arange(bsize).to(input_ids.device)
     # Get last non-pad index
@@ -364,7 +512,8 @@ def get_output_from_electra(encoder, input_ids, segment_ids, input_mask):
     output = encoder(input_ids=input_ids, token_type_ids=segment_ids, attention_mask=input_mask)
     unpooled = output[0]
     pooled = unpooled[:, 0, :]
-    return pooled, unpooled, output
+    other = output[1:]
+    return pooled, unpooled, other
 
 
 def compute_mlm_loss(logits, masked_lm_labels):
@@ -0,0 +1,385 @@
+"""Train many independent heads (e.g. probing classifiers) over one shared, frozen encoder.
+
+Each head has its own task, layer selection, seed, optimizer state, loss and metrics, as if it
+were trained in a separate run. For each batch, the encoder is run once (up to the highest layer
+needed), and every head on the batch's task is trained on that output.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn as nn
+
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.proj.main.modeling.taskmodels as taskmodels
+import jiant.shared.model_setup as model_setup
+import jiant.tasks.evaluate as evaluate
+from jiant.proj.main.components.container_setup import JiantTaskContainer
+from jiant.proj.main.runner import TrainState
+from jiant.shared.constants import PHASE
+from jiant.shared.runner import (
+    complex_backpropagate,
+    get_train_dataloader_from_cache,
+    get_eval_dataloader_from_cache,
+)
+from jiant.utils.display import maybe_tqdm
+from jiant.utils.python.datastructures import InfiniteYield, ExtendedDataClassMixin
+from jiant.utils.torch_utils import copy_state_dict, CPU_DEVICE
+
+
+@dataclass
+class HeadConfig(ExtendedDataClassMixin):
+    name: str
+    task_name: str
+    # Index into the encoder hidden states, or None for the regular encoder output
+    layer: Optional[int] = None
+    # Seed for initializing the head
+    seed: int = 0
+    learning_rate: Optional[float] = None
+
+
+@dataclass
+class HeadState:
+    config: HeadConfig
+    taskmodel: taskmodels.Taskmodel
+    optimizer_scheduler: model_setup.OptimizerScheduler
+    train_state: TrainState
+    best_val_score: Optional[float] = None
+    best_state_dict: Optional[dict] = None
+
+    def get_head_state_dict(self):
+        """State dict of the head, without the (shared, frozen) encoder"""
+        return {
+            k: v for k, v in self.taskmodel.state_dict().items() if not k.startswith("encoder.")
+        }
+
+    def load_head_state_dict(self, state_dict):
+        missing_keys, unexpected_keys = self.taskmodel.load_state_dict(state_dict, strict=False)
+        assert not unexpected_keys
+        assert all(k.startswith("encoder.") for k in missing_keys)
+
+
+def create_head_states(
+    head_config_list: List[HeadConfig],
+    jiant_task_container: JiantTaskContainer,
+    encoder: nn.Module,
+    model_arch,
+    learning_rate: float,
+    adam_epsilon: float,
+    optimizer_type: str,
+    device,
+    verbose: bool = True,
+) -> Dict[str, HeadState]:
+    """Create a taskmodel and optimizer for each head, sharing the given encoder.
+
+    Args:
+        head_config_list: list of head configs (head names must be unique)
+        jiant_task_container: task and sampler configs
+        encoder: shared encoder, which is frozen
+        model_arch: ModelArchitectures of the encoder
+        learning_rate: learning rate, unless overridden in the head config
+        adam_epsilon: optimizer epsilon
+        optimizer_type: optimizer type, see model_setup.create_optimizer
+        device: device to place the heads on
+        verbose: whether to print optimizer info
+
+    Returns:
+        Dict mapping head names to HeadStates
+
+    """
+    assert len({head_config.name for head_config in head_config_list}) == len(head_config_list)
+    for p in encoder.parameters():
+        p.requires_grad = False
+    head_states = {}
+    for head_config in head_config_list:
+        task = jiant_task_container.task_dict[head_config.task_name]
+        torch.manual_seed(head_config.seed)
+        taskmodel = jiant_model_setup.create_taskmodel(
+            task=task,
+            model_arch=model_arch,
+            encoder=encoder,
+            taskmodel_kwargs=jiant_task_container.taskmodels_config.get_taskmodel_kwargs(
+                jiant_task_container.taskmodels_config.task_to_taskmodel_map[task.name]
+            ),
+        )
+        if not isinstance(taskmodel, taskmodels.PRECOMPUTABLE_TASKMODEL_TYPES):
+            raise TypeError(f"Taskmodel {type(taskmodel)} does not support shared encoder output")
+        taskmodel.to(device)
+        optimizer_scheduler = model_setup.create_optimizer(
+            model=taskmodel,
+            learning_rate=(
+                head_config.learning_rate
+                if head_config.learning_rate is not None
+                else learning_rate
+            ),
+            t_total=jiant_task_container.global_train_config.max_steps,
+            warmup_steps=jiant_task_container.global_train_config.warmup_steps,
+            warmup_proportion=None,
+            optimizer_type=optimizer_type,
+            optimizer_epsilon=adam_epsilon,
+            verbose=verbose,
+        )
+        head_states[head_config.name] = HeadState(
+            config=head_config,
+            taskmodel=taskmodel,
+            optimizer_scheduler=optimizer_scheduler,
+            train_state=TrainState.from_task_name_list([task.name]),
+        )
+    return head_states
+
+
+class MultiHeadRunner:
+    def __init__(
+        self,
+        jiant_task_container: JiantTaskContainer,
+        encoder: nn.Module,
+        tokenizer,
+        head_states: Dict[str, HeadState],
+        device,
+        max_grad_norm: float,
+        log_writer,
+    ):
+        self.jiant_task_container = jiant_task_container
+        self.encoder = encoder
+        self.tokenizer = tokenizer
+        self.head_states = head_states
+        self.device = device
+        self.max_grad_norm = max_grad_norm
+        self.log_writer = log_writer
+
+    def get_head_names_for_task(self, task_name):
+        return [
+            head_name
+            for head_name, head_state in self.head_states.items()
+            if head_state.config.task_name == task_name
+        ]
+
+    def get_layer_outputs(self, batch, head_name_list):
+        """Run the (frozen) encoder once, for the layers needed by the given heads"""
+        self.encoder.eval()
+        with torch.no_grad():
+            return taskmodels.get_layer_outputs_from_encoder_and_batch(
+                encoder=self.encoder,
+                batch=batch,
+                layers=list(
+                    {self.head_states[head_name].config.layer for head_name in head_name_list}
+                ),
+            )
+
+    def head_forward(self, head_name, batch, layer_outputs, compute_loss: bool = False):
+        head_state = self.head_states[head_name]
+        task = self.jiant_task_container.task_dict[head_state.config.task_name]
+        with taskmodels.precomputed_encoder_output_context(
+            encoder=self.encoder, encoder_output=layer_outputs[head_state.config.layer]
+        ):
+            return head_state.taskmodel(
+                batch=batch, task=task, tokenizer=self.tokenizer, compute_loss=compute_loss
+            )
+
+    def run_train_context(self, verbose=True):
+        train_dataloader_dict = self.get_train_dataloader_dict()
+        for global_step in maybe_tqdm(
+            range(self.jiant_task_container.global_train_config.max_steps),
+            desc="Training",
+            verbose=verbose,
+        ):
+            self.run_train_step(train_dataloader_dict=train_dataloader_dict)
+            yield global_step
+
+    def run_train_step(self, train_dataloader_dict: dict):
+        task_name, task = self.jiant_task_container.task_sampler.pop()
+        task_specific_config = self.jiant_task_container.task_specific_configs[task_name]
+        head_name_list = self.get_head_names_for_task(task_name)
+        for head_name in head_name_list:
+            self.head_states[head_name].taskmodel.train()
+
+        loss_val_dict = {head_name: 0 for head_name in head_name_list}
+        for i in range(task_specific_config.gradient_accumulation_steps):
+            batch, batch_metadata = train_dataloader_dict[task_name].pop()
+            batch = batch.to(self.device)
+            layer_outputs = self.get_layer_outputs(batch=batch, head_name_list=head_name_list)
+            for head_name in head_name_list:
+                model_output = self.head_forward(
+                    head_name=head_name,
+                    batch=batch,
+                    layer_outputs=layer_outputs,
+                    compute_loss=True,
+                )
+                loss = complex_backpropagate(
+                    loss=model_output.loss,
+                    optimizer=self.head_states[head_name].optimizer_scheduler.optimizer,
+                    model=self.head_states[head_name].taskmodel,
+                    fp16=False,
+                    n_gpu=1,
+                    gradient_accumulation_steps=task_specific_config.gradient_accumulation_steps,
+                    max_grad_norm=self.max_grad_norm,
+                )
+                loss_val_dict[head_name] += loss.item()
+
+        for head_name in head_name_list:
+            head_state = self.head_states[head_name]
+            head_state.optimizer_scheduler.step()
+            head_state.optimizer_scheduler.optimizer.zero_grad()
+            head_state.train_state.step(task_name=task_name)
+            self.log_writer.write_entry(
+                "loss_train",
+                {
+                    "head": head_name,
+                    "task": task_name,
+                    "task_step": head_state.train_state.task_steps[task_name],
+                    "global_step": head_state.train_state.global_steps,
+                    "loss_val": (
+                        loss_val_dict[head_name] / task_specific_config.gradient_accumulation_steps
+                    ),
+                },
+            )
+
+    def run_val(self, task_name_list, use_subset=None, return_preds=False, verbose=True):
+        """Evaluate all heads on their tasks.
+
+        Returns:
+            Dict mapping head names to results dicts (task_name -> results), in the format
+            returned by JiantRunner.run_val
+        """
+        evaluate_dict = {}
+        for task_name in task_name_list:
+            head_name_list = self.get_head_names_for_task(task_name)
+            if not head_name_list:
+                continue
+            task = self.jiant_task_container.task_dict[task_name]
+            task_specific_config = self.jiant_task_container.task_specific_configs[task_name]
+            val_dataloader = get_eval_dataloader_from_cache(
+                eval_cache=self.jiant_task_container.task_cache_dict[task_name][PHASE.VAL],
+                task=task,
+                eval_batch_size=task_specific_config.eval_batch_size,
+                subset_num=task_specific_config.eval_subset_num if use_subset else None,
+            )
+            val_labels = self.jiant_task_container.task_cache_dict[task_name][
+                "val_labels"
+            ].get_all()
+            evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task=task)
+            if use_subset:
+                val_labels = evaluation_scheme.get_labels_subset(
+                    labels=val_labels,
+                    cache=self.jiant_task_container.task_cache_dict[task_name][PHASE.VAL],
+                    subset_num=task_specific_config.eval_subset_num,
+                )
+            for head_name, results in self._run_eval(
+                dataloader=val_dataloader,
+                task=task,
+                head_name_list=head_name_list,
+                compute_loss=True,
+                desc=f"Eval ({task.name}, Val)",
+                verbose=verbose,
+            ).items():
+                results["metrics"] = evaluation_scheme.compute_metrics_from_accumulator(
+                    task=task,
+                    accumulator=results["accumulator"],
+                    labels=val_labels,
+                    tokenizer=self.tokenizer,
+                )
+                if return_preds:
+                    results["preds"] = evaluation_scheme.get_preds_from_accumulator(
+                        task=task, accumulator=results["accumulator"],
+                    )
+                evaluate_dict.setdefault(head_name, {})[task_name] = results
+        return evaluate_dict
+
+    def run_test(self, task_name_list, verbose=True):
+        evaluate_dict = {}
+        for task_name in task_name_list:
+            head_name_list = self.get_head_names_for_task(task_name)
+            if not head_name_list:
+                continue
+            task = self.jiant_task_container.task_dict[task_name]
+            test_dataloader = get_eval_dataloader_from_cache(
+                eval_cache=self.jiant_task_container.task_cache_dict[task_name][PHASE.TEST],
+                task=task,
+                eval_batch_size=self.jiant_task_container.task_specific_configs[
+                    task_name
+                ].eval_batch_size,
+            )
+            for head_name, results in self._run_eval(
+                dataloader=test_dataloader,
+                task=task,
+                head_name_list=head_name_list,
+                compute_loss=False,
+                desc=f"Eval ({task.name}, Test)",
+                verbose=verbose,
+            ).items():
+                results["preds"] = evaluate.get_evaluation_scheme_for_task(
+                    task=task
+                ).get_preds_from_accumulator(task=task, accumulator=results["accumulator"])
+                evaluate_dict.setdefault(head_name, {})[task_name] = results
+        return evaluate_dict
+
+    def _run_eval(self, dataloader, task, head_name_list, compute_loss, desc, verbose=True):
+        accumulator_dict = {}
+        total_eval_loss_dict = {}
+        for head_name in head_name_list:
+            self.head_states[head_name].taskmodel.eval()
+            accumulator_dict[head_name] = evaluate.get_evaluation_scheme_for_task(
+                task=task
+            ).get_accumulator()
+            total_eval_loss_dict[head_name] = 0
+        nb_eval_steps = 0
+        for batch, batch_metadata in maybe_tqdm(dataloader, desc=desc, verbose=verbose):
+            batch = batch.to(self.device)
+            layer_outputs = self.get_layer_outputs(batch=batch, head_name_list=head_name_list)
+            for head_name in head_name_list:
+                with torch.no_grad():
+                    model_output = self.head_forward(
+                        head_name=head_name,
+                        batch=batch,
+                        layer_outputs=layer_outputs,
+                        compute_loss=compute_loss,
+                    )
+                batch_loss = model_output.loss.mean().item() if compute_loss else 0
+                total_eval_loss_dict[head_name] += batch_loss
+                accumulator_dict[head_name].update(
+                    batch_logits=model_output.logits.detach().cpu().numpy(),
+                    batch_loss=batch_loss,
+                    batch=batch,
+                    batch_metadata=batch_metadata,
+                )
+            nb_eval_steps += 1
+        results_dict = {}
+        for head_name in head_name_list:
+            results_dict[head_name] = {"accumulator": accumulator_dict[head_name]}
+            if compute_loss:
+                results_dict[head_name]["loss"] = total_eval_loss_dict[head_name] / nb_eval_steps
+        return results_dict
+
+    def update_best_heads(self, val_results_dict):
+        """Keep the best state of each head, by the major metric of its task"""
+        best_head_name_list = []
+        for head_name, head_results_dict in val_results_dict.items():
+            head_state = self.head_states[head_name]
+            score = head_results_dict[head_state.config.task_name]["metrics"].major
+            if head_state.best_val_score is None or score > head_state.best_val_score:
+                head_state.best_val_score = score
+                head_state.best_state_dict = copy_state_dict(
+                    state_dict=head_state.get_head_state_dict(), target_device=CPU_DEVICE,
+                )
+                best_head_name_list.append(head_name)
+        return best_head_name_list
+
+    def load_best_heads(self):
+        for head_state in self.head_states.values():
+            if head_state.best_state_dict is not None:
+                head_state.load_head_state_dict(head_state.best_state_dict)
+
+    def get_train_dataloader_dict(self):
+        train_dataloader_dict = {}
+        for task_name in self.jiant_task_container.task_run_config.train_task_list:
+            task = self.jiant_task_container.task_dict[task_name]
+            train_dataloader_dict[task_name] = InfiniteYield(
+                get_train_dataloader_from_cache(
+                    train_cache=self.jiant_task_container.task_cache_dict[task_name]["train"],
+                    task=task,
+                    train_batch_size=self.jiant_task_container.task_specific_configs[
+                        task_name
+                    ].train_batch_size,
+                )
+            )
+        return train_dataloader_dict
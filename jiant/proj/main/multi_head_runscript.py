@@ -0,0 +1,221 @@
+"""Train many heads over one shared, frozen encoder (see: multi_head_runner).
+
+Heads are specified in a JSON file containing a list of HeadConfigs, e.g.:
+    [
+        {"name": "pos_layer6_seed0", "task_name": "pos", "layer": 6, "seed": 0},
+        {"name": "pos_layer12_seed0", "task_name": "pos", "layer": 12, "seed": 0}
+    ]
+Results for each head are written to output_dir/<head name>/, in the same format as
+a separate run of runscript.
+"""
+import os
+
+import torch
+
+import jiant.proj.main.components.container_setup as container_setup
+import jiant.proj.main.components.evaluate as jiant_evaluate
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.proj.main.multi_head_runner as multi_head_runner
+import jiant.shared.initialization as initialization
+import jiant.utils.python.io as py_io
+import jiant.utils.zconf as zconf
+
+
+@zconf.run_config
+class RunConfiguration(zconf.RunConfig):
+    # === Required parameters === #
+    jiant_task_container_config_path = zconf.attr(type=str, required=True)
+    head_configs_path = zconf.attr(type=str, required=True)
+    output_dir = zconf.attr(type=str, required=True)
+
+    # === Model parameters === #
+    model_type = zconf.attr(type=str, required=True)
+    model_path = zconf.attr(type=str, required=True)
+    model_config_path = zconf.attr(default=None, type=str)
+    model_tokenizer_path = zconf.attr(default=None, type=str)
+    model_load_mode = zconf.attr(default="from_transformers", type=str)
+
+    # === Running Setup === #
+    do_train = zconf.attr(action="store_true")
+    do_val = zconf.attr(action="store_true")
+    do_save = zconf.attr(action="store_true")
+    write_val_preds = zconf.attr(action="store_true")
+    write_test_preds = zconf.attr(action="store_true")
+    eval_every_steps = zconf.attr(type=int, default=0)
+    force_overwrite = zconf.attr(action="store_true")
+    seed = zconf.attr(type=int, default=-1)
+
+    # === Training Learning Parameters === #
+    learning_rate = zconf.attr(default=1e-5, type=float)
+    adam_epsilon = zconf.attr(default=1e-8, type=float)
+    max_grad_norm = zconf.attr(default=1.0, type=float)
+    optimizer_type = zconf.attr(default="adam", type=str)
+
+    # Specialized config
+    no_cuda = zconf.attr(action="store_true")
+    fp16 = zconf.attr(action="store_true")
+    local_rank = zconf.attr(default=-1, type=int)
+    server_ip = zconf.attr(default="", type=str)
+    server_port = zconf.attr(default="", type=str)
+
+    def _post_init(self):
+        assert not self.fp16, "fp16 is not supported for multi-head training"
+        assert self.local_rank == -1, "Distributed multi-head training is not supported"
+
+
+def setup_runner(
+    args: RunConfiguration,
+    jiant_task_container: container_setup.JiantTaskContainer,
+    quick_init_out,
+    verbose: bool = True,
+) -> multi_head_runner.MultiHeadRunner:
+    """Setup encoder, heads and optimizers, and return multi-head runner.
+
+    Args:
+        args (RunConfiguration): configuration carrying command line args specifying run params.
+        jiant_task_container (container_setup.JiantTaskContainer): task and sampler configs.
+        quick_init_out (QuickInitContainer): device (GPU/CPU) and logging configuration.
+        verbose: If True, enables printing configuration info (to standard out).
+
+    Returns:
+        multi_head_runner.MultiHeadRunner
+
+    """
+    jiant_model = jiant_model_setup.setup_jiant_model(
+        model_type=args.model_type,
+        model_config_path=args.model_config_path,
+        tokenizer_path=args.model_tokenizer_path,
+        task_dict=jiant_task_container.task_dict,
+        taskmodels_config=jiant_task_container.taskmodels_config,
+    )
+    jiant_model_setup.delegate_load_from_path(
+        jiant_model=jiant_model, weights_path=args.model_path, load_mode=args.model_load_mode
+    )
+    jiant_model.to(quick_init_out.device)
+    head_states = multi_head_runner.create_head_states(
+        head_config_list=[
+            multi_head_runner.HeadConfig.from_dict(head_config)
+            for head_config in py_io.read_json(args.head_configs_path)
+        ],
+        jiant_task_container=jiant_task_container,
+        encoder=jiant_model.encoder,
+        model_arch=jiant_model_setup.get_model_arch_from_jiant_model(jiant_model),
+        learning_rate=args.learning_rate,
+        adam_epsilon=args.adam_epsilon,
+        optimizer_type=args.optimizer_type,
+        device=quick_init_out.device,
+        verbose=verbose,
+    )
+    return multi_head_runner.MultiHeadRunner(
+        jiant_task_container=jiant_task_container,
+        encoder=jiant_model.encoder,
+        tokenizer=jiant_model.tokenizer,
+        head_states=head_states,
+        device=quick_init_out.device,
+        max_grad_norm=args.max_grad_norm,
+        log_writer=quick_init_out.log_writer,
+    )
+
+
+def run_loop(args: RunConfiguration):
+    quick_init_out = initialization.quick_init(args=args, verbose=True)
+    with quick_init_out.log_writer.log_context():
+        jiant_task_container = container_setup.create_jiant_task_container_from_json(
+            jiant_task_container_config_path=args.jiant_task_container_config_path, verbose=True,
+        )
+        runner = setup_runner(
+            args=args,
+            jiant_task_container=jiant_task_container,
+            quick_init_out=quick_init_out,
+            verbose=True,
+        )
+        head_output_dir_dict = {}
+        for head_name in runner.head_states:
+            head_output_dir_dict[head_name] = os.path.join(args.output_dir, head_name)
+            os.makedirs(head_output_dir_dict[head_name], exist_ok=True)
+
+        if args.do_train:
+            for global_step in runner.run_train_context(verbose=True):
+                if args.eval_every_steps and (global_step + 1) % args.eval_every_steps == 0:
+                    update_best_heads(runner=runner)
+            if args.eval_every_steps:
+                update_best_heads(runner=runner)
+                runner.load_best_heads()
+
+        if args.do_save:
+            for head_name, head_state in runner.head_states.items():
+                torch.save(
+                    head_state.get_head_state_dict(),
+                    os.path.join(head_output_dir_dict[head_name], "head.p"),
+                )
+
+        if args.do_val:
+            val_results_dict = runner.run_val(
+                task_name_list=runner.jiant_task_container.task_run_config.val_task_list,
+                return_preds=args.write_val_preds,
+            )
+            for head_name, head_val_results_dict in val_results_dict.items():
+                jiant_evaluate.write_val_results(
+                    val_results_dict=head_val_results_dict,
+                    metrics_aggregator=runner.jiant_task_container.metrics_aggregator,
+                    output_dir=head_output_dir_dict[head_name],
+                    verbose=True,
+                )
+                if args.write_val_preds:
+                    jiant_evaluate.write_preds(
+                        eval_results_dict=head_val_results_dict,
+                        path=os.path.join(head_output_dir_dict[head_name], "val_preds.p"),
+                    )
+        else:
+            assert not args.write_val_preds
+
+        if args.write_test_preds:
+            test_results_dict = runner.run_test(
+                task_name_list=runner.jiant_task_container.task_run_config.test_task_list,
+            )
+            for head_name, head_test_results_dict in test_results_dict.items():
+                jiant_evaluate.write_preds(
+                    eval_results_dict=head_test_results_dict,
+                    path=os.path.join(head_output_dir_dict[head_name], "test_preds.p"),
+                )
+
+    for head_output_dir in head_output_dir_dict.values():
+        py_io.write_file("DONE", os.path.join(head_output_dir, "done_file"))
+    py_io.write_file("DONE", os.path.join(args.output_dir, "done_file"))
+
+
+def update_best_heads(runner: multi_head_runner.MultiHeadRunner):
+    val_results_dict = runner.run_val(
+        task_name_list=runner.jiant_task_container.task_run_config.train_val_task_list,
+        use_subset=True,
+    )
+    for head_name, head_val_results_dict in val_results_dict.items():
+        runner.log_writer.write_entry(
+            "train_val",
+            {
+                "head": head_name,
+                "metrics": {
+                    task_name: task_results["metrics"].to_dict()
+                    for task_name, task_results in head_val_results_dict.items()
+                },
+                "train_state": runner.head_states[head_name].train_state.to_dict(),
+            },
+        )
+    for head_name in runner.update_best_heads(val_results_dict):
+        runner.log_writer.write_entry(
+            "train_val_best",
+            {
+                "head": head_name,
+                "score": float(runner.head_states[head_name].best_val_score),
+                "train_state": runner.head_states[head_name].train_state.to_dict(),
+            },
+        )
+    runner.log_writer.flush()
+
+
+def main():
+    run_loop(RunConfiguration.default_run_cli())
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,51 @@ class MaxValidLengthRecorder:
         self.max_valid_length = max(self.max_valid_length, valid_length)
 
 
+class StreamingLabelsRecorder:
+    def __init__(self, task, evaluation_scheme, write_fn, group_size: int):
+        """Extract evaluation labels while examples are being converted and cached.
+
+        Examples and their data are collected in groups of group_size examples, and labels are
+        extracted from each group with evaluation_scheme.get_labels_from_cache_and_examples,
+        so that neither the examples nor the cache need to be read again afterwards.
+        Requires evaluation_scheme.SUPPORTS_STREAMING_LABELS.
+
+        Args:
+            task (Task): Task object
+            evaluation_scheme (BaseEvaluationScheme): evaluation scheme for the task.
+            write_fn: function called on each label, in order.
+            group_size (int): number of examples per group.
+
+        """
+        assert evaluation_scheme.SUPPORTS_STREAMING_LABELS
+        self.task = task
+        self.evaluation_scheme = evaluation_scheme
+        self.write_fn = write_fn
+        self.group_size = group_size
+        self.examples = []
+        self.data = []
+
+    def add(self, example, data: list):
+        """Add an example, and the data (DataRows and metadata) created from it"""
+        self.examples.append(example)
+        self.data += data
+        if len(self.examples) >= self.group_size:
+            self.flush()
+
+    def flush(self):
+        if not self.examples:
+            return
+        labels = self.evaluation_scheme.get_labels_from_cache_and_examples(
+            task=self.task,
+            cache=shared_caching.InMemoryDataCache(self.data),
+            examples=self.examples,
+        )
+        for label in labels:
+            self.write_fn(label)
+        self.examples = []
+        self.data = []
+
+
 def smart_truncate(dataset: torch_utils.ListDataset, max_seq_length: int, verbose: bool = False):
     """Truncate data to the length of the longest example in the dataset.
 
@@ -133,20 +178,42 @@ def convert_examples_to_dataset(
 
 
 def iter_chunk_convert_examples_to_dataset(
-    task, examples: list, tokenizer, feat_spec: FeaturizationSpec, phase: str, verbose=False
+    task,
+    examples: list,
+    tokenizer,
+    feat_spec: FeaturizationSpec,
+    phase: str,
+    verbose=False,
+    labels_recorder: StreamingLabelsRecorder = None,
 ):
-    for i, data_row in enumerate(
-        iter_chunk_tokenize_and_featurize(
-            task=task,
-            examples=examples,
-            tokenizer=tokenizer,
-            feat_spec=feat_spec,
-            phase=phase,
-            verbose=verbose,
-        )
-    ):
-        metadata = {"example_id": i}
-        yield {"data_row": data_row, "metadata": metadata}
+    """Generator of DataRows and metadata, consuming examples lazily.
+
+    Args:
+        task (Task): Task object
+        examples (Iterable[Example]): iterable of task Examples.
+        tokenizer: TODO  (issue #1188)
+        feat_spec (FeaturizationSpec): Tokenization-related metadata.
+        phase (str): string identifying the data subset (e.g., train, val or test).
+        verbose: If True, display progress bar.
+        labels_recorder: If provided, labels are extracted in the same pass.
+
+    Yields:
+        dict containing a DataRow and metadata.
+
+    """
+    i = 0
+    for example in maybe_tqdm(examples, desc="Tokenizing", verbose=verbose):
+        data = []
+        for data_row in tokenize_and_featurize_example(
+            task=task, example=example, tokenizer=tokenizer, feat_spec=feat_spec, phase=phase,
+        ):
+            data.append({"data_row": data_row, "metadata": {"example_id": i}})
+            i += 1
+        if labels_recorder is not None:
+            labels_recorder.add(example=example, data=data)
+        yield from data
+    if labels_recorder is not None:
+        labels_recorder.flush()
 
 
 def tokenize_and_featurize(
@@ -166,22 +233,11 @@ def tokenize_and_featurize(
         List DataRows containing tokenized and featurized examples.
 
     """
-    # TODO: Better solution  (issue #1184)
-    if task.TASK_TYPE == TaskTypes.SQUAD_STYLE_QA:
-        data_rows = []
-        for example in maybe_tqdm(examples, desc="Tokenizing", verbose=verbose):
-            data_rows += example.to_feature_list(
-                tokenizer=tokenizer,
-                max_seq_length=feat_spec.max_seq_length,
-                doc_stride=task.doc_stride,
-                max_query_length=task.max_query_length,
-                set_type=phase,
-            )
-    else:
-        data_rows = [
-            example.tokenize(tokenizer).featurize(tokenizer, feat_spec)
-            for example in maybe_tqdm(examples, desc="Tokenizing", verbose=verbose)
-        ]
+    data_rows = []
+    for example in maybe_tqdm(examples, desc="Tokenizing", verbose=verbose):
+        data_rows += tokenize_and_featurize_example(
+            task=task, example=example, tokenizer=tokenizer, feat_spec=feat_spec, phase=phase,
+        )
     return data_rows
 
 
@@ -203,14 +259,27 @@ def iter_chunk_tokenize_and_featurize(
 
     """
     for example in maybe_tqdm(examples, desc="Tokenizing", verbose=verbose):
-        # TODO: Better solution  (issue #1184)
-        if task.TASK_TYPE == TaskTypes.SQUAD_STYLE_QA:
-            yield from example.to_feature_list(
-                tokenizer=tokenizer,
-                max_seq_length=feat_spec.max_seq_length,
-                doc_stride=task.doc_stride,
-                max_query_length=task.max_query_length,
-                set_type=phase,
-            )
-        else:
-            yield example.tokenize(tokenizer).featurize(tokenizer, feat_spec)
+        yield from tokenize_and_featurize_example(
+            task=task, example=example, tokenizer=tokenizer, feat_spec=feat_spec, phase=phase,
+        )
+
+
+def tokenize_and_featurize_example(task, example, tokenizer, feat_spec: FeaturizationSpec, phase):
+    """Tokenize and featurize a single example.
+
+    Returns:
+        List of DataRows (one per example, except for SQuAD-style tasks, which can produce
+        several DataRows from an example).
+
+    """
+    # TODO: Better solution  (issue #1184)
+    if task.TASK_TYPE == TaskTypes.SQUAD_STYLE_QA:
+        return example.to_feature_list(
+            tokenizer=tokenizer,
+            max_seq_length=feat_spec.max_seq_length,
+            doc_stride=task.doc_stride,
+            max_query_length=task.max_query_length,
+            set_type=phase,
+        )
+    else:
+        return [example.tokenize(tokenizer).featurize(tokenizer, feat_spec)]
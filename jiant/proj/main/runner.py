@@ -1,13 +1,23 @@
-from typing import Dict
+import collections
+import time
+from typing import Dict, Optional
 from dataclasses import dataclass
 
 import torch
 
+import jiant.shared.distributed as distributed
+import jiant.shared.model_setup as model_setup
 import jiant.tasks.evaluate as evaluate
 import jiant.utils.torch_utils as torch_utils
 from jiant.proj.main.components.container_setup import JiantTaskContainer
-from jiant.proj.main.modeling.primary import JiantModel, wrap_jiant_forward
+from jiant.proj.main.modeling.feature_cache import (
+    EncoderFeatureCache,
+    wrap_jiant_forward_with_feature_cache,
+)
+from jiant.proj.main.modeling.packing import packed_forward
+from jiant.proj.main.modeling.primary import JiantModel
 from jiant.shared.constants import PHASE
+from jiant.shared.mixed_precision import MixedPrecision, logits_to_numpy
 from jiant.shared.runner import (
     complex_backpropagate,
     get_train_dataloader_from_cache,
@@ -23,6 +33,11 @@ class RunnerParameters(ExtendedDataClassMixin):
     n_gpu: int
     fp16: bool
     max_grad_norm: float
+    # Native mixed precision (see: jiant.shared.mixed_precision), separate from apex fp16
+    precision: str = "fp32"
+    # Above 1, batches of several sampled tasks are packed into each training step, sharing one
+    # encoder pass (see: jiant.proj.main.modeling.packing)
+    num_tasks_per_step: int = 1
 
 
 @dataclass
@@ -38,6 +53,11 @@ class TrainState(ExtendedDataClassMixin):
         self.task_steps[task_name] += 1
         self.global_steps += 1
 
+    def packed_step(self, task_name_list):
+        for task_name in task_name_list:
+            self.task_steps[task_name] += 1
+        self.global_steps += 1
+
 
 class JiantRunner:
     def __init__(
@@ -48,6 +68,7 @@ class JiantRunner:
         device,
         rparams: RunnerParameters,
         log_writer,
+        encoder_feature_cache: Optional[EncoderFeatureCache] = None,
     ):
         self.jiant_task_container = jiant_task_container
         self.jiant_model = jiant_model
@@ -55,6 +76,19 @@ class JiantRunner:
         self.device = device
         self.rparams = rparams
         self.log_writer = log_writer
+        self.encoder_feature_cache = encoder_feature_cache
+        self.mixed_precision = MixedPrecision(
+            precision=rparams.precision, device_type=torch.device(device).type
+        )
+        if rparams.num_tasks_per_step > 1:
+            if encoder_feature_cache is not None:
+                raise RuntimeError("Packed training steps do not support encoder feature caching")
+            if any(
+                config.gradient_accumulation_steps != 1
+                for config in jiant_task_container.task_specific_configs.values()
+            ):
+                raise RuntimeError("Packed training steps do not support gradient accumulation")
+        self.num_params_with_optimizer_state = 0
 
         self.model = self.jiant_model
 
@@ -93,24 +127,41 @@ class JiantRunner:
             yield train_state
 
     def run_train_step(self, train_dataloader_dict: dict, train_state: TrainState):
+        if self.rparams.num_tasks_per_step > 1:
+            return self.run_packed_train_step(
+                train_dataloader_dict=train_dataloader_dict, train_state=train_state
+            )
         self.jiant_model.train()
         task_name, task = self.jiant_task_container.task_sampler.pop()
         task_specific_config = self.jiant_task_container.task_specific_configs[task_name]
 
+        torch_utils.reset_peak_memory(self.device)
+        start_time = time.perf_counter()
         loss_val = 0
         for i in range(task_specific_config.gradient_accumulation_steps):
             batch, batch_metadata = train_dataloader_dict[task_name].pop()
             batch = batch.to(self.device)
-            model_output = wrap_jiant_forward(
-                jiant_model=self.jiant_model, batch=batch, task=task, compute_loss=True,
-            )
+            with self.mixed_precision.autocast():
+                model_output = wrap_jiant_forward_with_feature_cache(
+                    jiant_model=self.jiant_model,
+                    batch=batch,
+                    batch_metadata=batch_metadata,
+                    task=task,
+                    phase=PHASE.TRAIN,
+                    compute_loss=True,
+                    encoder_feature_cache=self.encoder_feature_cache,
+                )
             loss = self.complex_backpropagate(
                 loss=model_output.loss,
                 gradient_accumulation_steps=task_specific_config.gradient_accumulation_steps,
             )
             loss_val += loss.item()
 
-        self.optimizer_scheduler.step()
+        self.mixed_precision.step(
+            optimizer_scheduler=self.optimizer_scheduler,
+            parameters=self.jiant_model.parameters(),
+            max_grad_norm=self.rparams.max_grad_norm,
+        )
         self.optimizer_scheduler.optimizer.zero_grad()
 
         train_state.step(task_name=task_name)
@@ -121,6 +172,76 @@ class JiantRunner:
                 "task_step": train_state.task_steps[task_name],
                 "global_step": train_state.global_steps,
                 "loss_val": loss_val / task_specific_config.gradient_accumulation_steps,
+                "step_time": time.perf_counter() - start_time,
+                "peak_memory_mb": torch_utils.get_peak_memory_mb(self.device),
+            },
+        )
+        self.maybe_log_optimizer_state_memory(train_state)
+
+    def run_packed_train_step(self, train_dataloader_dict: dict, train_state: TrainState):
+        """Training step over batches of num_tasks_per_step sampled tasks, in one encoder pass.
+
+        Task losses are averaged, so each task is weighted by how often it was sampled, as over
+        num_tasks_per_step separate (accumulated) steps.
+        """
+        self.jiant_model.train()
+        torch_utils.reset_peak_memory(self.device)
+        start_time = time.perf_counter()
+        task_batch_list = []
+        for _ in range(self.rparams.num_tasks_per_step):
+            _, task = self.jiant_task_container.task_sampler.pop()
+            batch, _ = train_dataloader_dict[task.name].pop()
+            task_batch_list.append((task, batch.to(self.device)))
+        with self.mixed_precision.autocast():
+            model_output_list = packed_forward(
+                jiant_model=self.jiant_model, task_batch_list=task_batch_list, compute_loss=True,
+            )
+        loss = sum(model_output.loss for model_output in model_output_list) / len(model_output_list)
+        self.complex_backpropagate(loss=loss, gradient_accumulation_steps=1)
+        self.mixed_precision.step(
+            optimizer_scheduler=self.optimizer_scheduler,
+            parameters=self.jiant_model.parameters(),
+            max_grad_norm=self.rparams.max_grad_norm,
+        )
+        self.optimizer_scheduler.optimizer.zero_grad()
+
+        task_name_list = [task.name for task, _ in task_batch_list]
+        train_state.packed_step(task_name_list=task_name_list)
+        step_time = time.perf_counter() - start_time
+        peak_memory_mb = torch_utils.get_peak_memory_mb(self.device)
+        # Tasks sampled more than once in the step are logged with consecutive task steps
+        remaining_counts = collections.Counter(task_name_list)
+        for task_name, model_output in zip(task_name_list, model_output_list):
+            remaining_counts[task_name] -= 1
+            self.log_writer.write_entry(
+                "loss_train",
+                {
+                    "task": task_name,
+                    "task_step": train_state.task_steps[task_name] - remaining_counts[task_name],
+                    "global_step": train_state.global_steps,
+                    "loss_val": model_output.loss.item(),
+                    "step_time": step_time,
+                    "peak_memory_mb": peak_memory_mb,
+                },
+            )
+        self.maybe_log_optimizer_state_memory(train_state)
+
+    def maybe_log_optimizer_state_memory(self, train_state: TrainState):
+        """Log optimizer state memory per parameter group, whenever new state has been created.
+
+        Optimizer state is created lazily, as parameters first get gradients (e.g. task heads
+        when their task is first sampled), so this is logged after the first step, and again
+        when state grows.
+        """
+        optimizer = self.optimizer_scheduler.optimizer
+        if len(optimizer.state) == self.num_params_with_optimizer_state:
+            return
+        self.num_params_with_optimizer_state = len(optimizer.state)
+        self.log_writer.write_entry(
+            "optimizer_state_memory",
+            {
+                "global_step": train_state.global_steps,
+                "groups": model_setup.get_optimizer_state_memory(optimizer),
             },
         )
 
@@ -143,6 +264,8 @@ class JiantRunner:
                 local_rank=self.rparams.local_rank,
                 return_preds=return_preds,
                 verbose=verbose,
+                encoder_feature_cache=self.encoder_feature_cache,
+                mixed_precision=self.mixed_precision,
             )
         return evaluate_dict
 
@@ -158,11 +281,13 @@ class JiantRunner:
                 device=self.device,
                 local_rank=self.rparams.local_rank,
                 verbose=verbose,
+                encoder_feature_cache=self.encoder_feature_cache,
+                mixed_precision=self.mixed_precision,
             )
         return evaluate_dict
 
     def get_train_dataloader_dict(self):
-        # Not currently supported distributed parallel
+        # In distributed training, each process iterates over its own shard of the training data
         train_dataloader_dict = {}
         for task_name in self.jiant_task_container.task_run_config.train_task_list:
             task = self.jiant_task_container.task_dict[task_name]
@@ -172,7 +297,11 @@ class JiantRunner:
             ].train_batch_size
             train_dataloader_dict[task_name] = InfiniteYield(
                 get_train_dataloader_from_cache(
-                    train_cache=train_cache, task=task, train_batch_size=train_batch_size,
+                    train_cache=train_cache,
+                    task=task,
+                    train_batch_size=train_batch_size,
+                    num_shards=distributed.get_world_size(),
+                    shard_index=distributed.get_rank(),
                 )
             )
         return train_dataloader_dict
@@ -188,6 +317,9 @@ class JiantRunner:
                 task=task,
                 eval_batch_size=task_specific_config.eval_batch_size,
                 subset_num=task_specific_config.eval_subset_num if use_subset else None,
+                # In distributed evaluation, each process evaluates a contiguous shard of the data
+                num_shards=distributed.get_world_size(),
+                shard_index=distributed.get_rank(),
             )
         return val_dataloader_dict
 
@@ -199,11 +331,16 @@ class JiantRunner:
     def get_val_labels_dict(self, task_name_list, use_subset=False):
         val_labels_dict = {}
         for task_name in task_name_list:
+            task = self.jiant_task_container.task_dict[task_name]
             task_specific_config = self.jiant_task_container.task_specific_configs[task_name]
-            val_labels_cache = self.jiant_task_container.task_cache_dict[task_name]["val_labels"]
-            val_labels = val_labels_cache.get_all()
+            task_cache_dict = self.jiant_task_container.task_cache_dict[task_name]
+            val_labels = task_cache_dict["val_labels"].get_all()
             if use_subset:
-                val_labels = val_labels[: task_specific_config.eval_subset_num]
+                val_labels = evaluate.get_evaluation_scheme_for_task(task=task).get_labels_subset(
+                    labels=val_labels,
+                    cache=task_cache_dict[PHASE.VAL],
+                    subset_num=task_specific_config.eval_subset_num,
+                )
             val_labels_dict[task_name] = val_labels
         return val_labels_dict
 
@@ -222,19 +359,24 @@ class JiantRunner:
             n_gpu=self.rparams.n_gpu,
             gradient_accumulation_steps=gradient_accumulation_steps,
             max_grad_norm=self.rparams.max_grad_norm,
+            mixed_precision=self.mixed_precision,
         )
 
     def get_runner_state(self):
-        # TODO: Add fp16  (issue #1186)
+        # TODO: Add apex fp16  (issue #1186)
         state = {
-            "model": torch_utils.get_model_for_saving(self.jiant_model).state_dict(),
+            "model": torch_utils.get_state_dict_for_saving(self.jiant_model),
             "optimizer": self.optimizer_scheduler.optimizer.state_dict(),
+            "mixed_precision": self.mixed_precision.state_dict(),
         }
         return state
 
     def load_state(self, runner_state):
-        torch_utils.get_model_for_saving(self.jiant_model).load_state_dict(runner_state["model"])
+        torch_utils.load_state_dict_for_saving(self.jiant_model, runner_state["model"])
         self.optimizer_scheduler.optimizer.load_state_dict(runner_state["optimizer"])
+        # Checkpoints from before native mixed precision have no mixed_precision state
+        if "mixed_precision" in runner_state:
+            self.mixed_precision.load_state_dict(runner_state["mixed_precision"])
 
 
 class CheckpointSaver:
@@ -260,12 +402,17 @@ def run_val(
     local_rank,
     return_preds=False,
     verbose=True,
+    encoder_feature_cache: Optional[EncoderFeatureCache] = None,
+    mixed_precision: Optional[MixedPrecision] = None,
 ):
     # Reminder:
     #   val_dataloader contains mostly PyTorch-relevant info
     #   val_labels might contain more details information needed for full evaluation
-    if not local_rank == -1:
-        return
+    # In distributed evaluation, each process evaluates its shard of val_dataloader, and results
+    #   are gathered to the main process. Other processes return None.
+    jiant_model = _get_eval_model(jiant_model)
+    if mixed_precision is None:
+        mixed_precision = MixedPrecision()
     jiant_model.eval()
     total_eval_loss = 0
     nb_eval_steps, nb_eval_examples = 0, 0
@@ -277,11 +424,17 @@ def run_val(
     ):
         batch = batch.to(device)
 
-        with torch.no_grad():
-            model_output = wrap_jiant_forward(
-                jiant_model=jiant_model, batch=batch, task=task, compute_loss=True,
+        with torch.no_grad(), mixed_precision.autocast():
+            model_output = wrap_jiant_forward_with_feature_cache(
+                jiant_model=jiant_model,
+                batch=batch,
+                batch_metadata=batch_metadata,
+                task=task,
+                phase=PHASE.VAL,
+                compute_loss=True,
+                encoder_feature_cache=encoder_feature_cache,
             )
-        batch_logits = model_output.logits.detach().cpu().numpy()
+        batch_logits = logits_to_numpy(model_output.logits)
         batch_loss = model_output.loss.mean().item()
         total_eval_loss += batch_loss
         eval_accumulator.update(
@@ -293,7 +446,18 @@ def run_val(
 
         nb_eval_examples += len(batch)
         nb_eval_steps += 1
+    if distributed.is_distributed():
+        gathered = gather_eval_results(
+            eval_accumulator=eval_accumulator,
+            total_eval_loss=total_eval_loss,
+            nb_eval_steps=nb_eval_steps,
+        )
+        if gathered is None:
+            return
+        eval_accumulator, total_eval_loss, nb_eval_steps = gathered
     eval_loss = total_eval_loss / nb_eval_steps
+    if encoder_feature_cache is not None:
+        encoder_feature_cache.flush()
     tokenizer = (
         jiant_model.tokenizer
         if not torch_utils.is_data_parallel(jiant_model)
@@ -321,9 +485,13 @@ def run_test(
     local_rank,
     verbose=True,
     return_preds=True,
+    encoder_feature_cache: Optional[EncoderFeatureCache] = None,
+    mixed_precision: Optional[MixedPrecision] = None,
 ):
-    if not local_rank == -1:
-        return
+    # As in run_val, results of distributed evaluation are gathered to the main process
+    jiant_model = _get_eval_model(jiant_model)
+    if mixed_precision is None:
+        mixed_precision = MixedPrecision()
     jiant_model.eval()
     evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task=task)
     eval_accumulator = evaluation_scheme.get_accumulator()
@@ -333,14 +501,25 @@ def run_test(
     ):
         batch = batch.to(device)
 
-        with torch.no_grad():
-            model_output = wrap_jiant_forward(
-                jiant_model=jiant_model, batch=batch, task=task, compute_loss=False,
+        with torch.no_grad(), mixed_precision.autocast():
+            model_output = wrap_jiant_forward_with_feature_cache(
+                jiant_model=jiant_model,
+                batch=batch,
+                batch_metadata=batch_metadata,
+                task=task,
+                phase=PHASE.TEST,
+                compute_loss=False,
+                encoder_feature_cache=encoder_feature_cache,
             )
-        batch_logits = model_output.logits.detach().cpu().numpy()
+        batch_logits = logits_to_numpy(model_output.logits)
         eval_accumulator.update(
             batch_logits=batch_logits, batch_loss=0, batch=batch, batch_metadata=batch_metadata,
         )
+    if distributed.is_distributed():
+        gathered = gather_eval_results(eval_accumulator=eval_accumulator)
+        if gathered is None:
+            return
+        eval_accumulator, _, _ = gathered
     output = {
         "accumulator": eval_accumulator,
     }
@@ -349,3 +528,31 @@ def run_test(
             task=task, accumulator=eval_accumulator,
         )
     return output
+
+
+def gather_eval_results(eval_accumulator, total_eval_loss=0.0, nb_eval_steps=0):
+    """Gather the evaluation results of all processes (over contiguous shards of the data) to the
+    main process, merging accumulators in order.
+
+    Returns:
+        (eval_accumulator, total_eval_loss, nb_eval_steps) over all processes on the main
+        process, None on other processes
+    """
+    gathered = distributed.gather_objects(
+        (eval_accumulator.get_gather_state(), total_eval_loss, nb_eval_steps)
+    )
+    if not distributed.is_main_process():
+        return None
+    for state, process_eval_loss, process_eval_steps in gathered[1:]:
+        eval_accumulator.extend_from_gather_state(state)
+        total_eval_loss += process_eval_loss
+        nb_eval_steps += process_eval_steps
+    return eval_accumulator, total_eval_loss, nb_eval_steps
+
+
+def _get_eval_model(jiant_model):
+    # Processes evaluate separately, so must not go through DistributedDataParallel, which syncs
+    # across processes
+    if isinstance(jiant_model, torch.nn.parallel.DistributedDataParallel):
+        return jiant_model.module
+    return jiant_model
@@ -2,7 +2,9 @@ import os
 import torch
 
 
+import jiant.proj.main.modeling.feature_cache as feature_cache
 import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.proj.main.modeling.peft as jiant_peft
 import jiant.proj.main.runner as jiant_runner
 import jiant.proj.main.components.container_setup as container_setup
 import jiant.proj.main.metarunner as jiant_metarunner
@@ -13,6 +15,7 @@ import jiant.shared.model_setup as model_setup
 import jiant.utils.torch_utils as torch_utils
 import jiant.utils.python.io as py_io
 import jiant.utils.zconf as zconf
+from jiant.shared.constants import PHASE
 
 
 @zconf.run_config
@@ -46,12 +49,42 @@ class RunConfiguration(zconf.RunConfig):
     learning_rate = zconf.attr(default=1e-5, type=float)
     adam_epsilon = zconf.attr(default=1e-8, type=float)
     max_grad_norm = zconf.attr(default=1.0, type=float)
+    # adam, radam, adam_foreach, radam_foreach, adam_fused (see: model_setup.create_optimizer)
     optimizer_type = zconf.attr(default="adam", type=str)
+    # Dtype of optimizer moments (e.g. bfloat16), for foreach optimizer types
+    optimizer_state_dtype = zconf.attr(default="float32", type=str)
+    # Pack batches of several sampled tasks into each step, sharing one encoder pass
+    num_tasks_per_step = zconf.attr(default=1, type=int)
+
+    # === Frozen Encoder === #
+    freeze_encoder = zconf.attr(action="store_true")
+    # Freeze parts of the encoder, e.g. --freeze_embeddings --freeze_layers 0-5
+    freeze_embeddings = zconf.attr(action="store_true")
+    freeze_layers = zconf.attr(default=None, type=str)
+    cache_encoder_features = zconf.attr(action="store_true")
+    encoder_feature_cache_dir = zconf.attr(default=None, type=str)
+    encoder_feature_cache_dtype = zconf.attr(default="float32", type=str)
+    encoder_feature_cache_max_gb = zconf.attr(default=None, type=float)
+
+    # === Memory === #
+    # Recompute encoder activations in the backward pass, trading step time for memory
+    gradient_checkpointing = zconf.attr(action="store_true")
+
+    # === Parameter-efficient fine-tuning (frozen encoder, with adapters and/or LoRA) === #
+    adapter_size = zconf.attr(default=0, type=int)
+    lora_rank = zconf.attr(default=0, type=int)
+    lora_alpha = zconf.attr(default=16.0, type=float)
+    lora_dropout = zconf.attr(default=0.0, type=float)
+    peft_per_taskmodel = zconf.attr(action="store_true")
+    # Trained adapters/LoRA and heads, loaded after model_path
+    peft_model_path = zconf.attr(default=None, type=str)
 
     # Specialized config
     no_cuda = zconf.attr(action="store_true")
     fp16 = zconf.attr(action="store_true")
     fp16_opt_level = zconf.attr(default="O1", type=str)
+    # Native mixed precision (fp32, bf16 or fp16), an alternative to apex --fp16
+    precision = zconf.attr(default="fp32", type=str)
     local_rank = zconf.attr(default=-1, type=int)
     server_ip = zconf.attr(default="", type=str)
     server_port = zconf.attr(default="", type=str)
@@ -80,6 +113,8 @@ def setup_runner(
         jiant_runner.JiantRunner
 
     """
+    if args.fp16 and args.precision != "fp32":
+        raise RuntimeError("Use either apex (--fp16) or native mixed precision (--precision)")
     # TODO document why the distributed.only_first_process() context manager is being used here.
     with distributed.only_first_process(local_rank=args.local_rank):
         # load the model
@@ -93,7 +128,68 @@ def setup_runner(
         jiant_model_setup.delegate_load_from_path(
             jiant_model=jiant_model, weights_path=args.model_path, load_mode=args.model_load_mode
         )
+        peft_config = jiant_peft.PeftConfig(
+            adapter_size=args.adapter_size,
+            lora_rank=args.lora_rank,
+            lora_alpha=args.lora_alpha,
+            lora_dropout=args.lora_dropout,
+            per_taskmodel=args.peft_per_taskmodel,
+        )
+        if peft_config.enabled:
+            if jiant_model_setup.has_reentrant_gradient_checkpointing(jiant_model.encoder):
+                raise RuntimeError(
+                    "PEFT cannot be combined with gradient_checkpointing in the model config."
+                    " Use the gradient_checkpointing runscript argument instead"
+                )
+            num_params = jiant_peft.inject_peft(jiant_model=jiant_model, peft_config=peft_config)
+            quick_init_out.log_writer.write_entry(
+                "peft", {"peft_config": peft_config.to_dict(), "num_params": num_params}
+            )
+            if verbose:
+                print(f"PEFT: training {num_params['trainable']}/{num_params['total']} parameters")
+            if args.peft_model_path:
+                torch_utils.load_state_dict_for_saving(
+                    jiant_model, torch.load(args.peft_model_path)
+                )
+        elif args.peft_model_path:
+            raise RuntimeError("peft_model_path requires adapter_size or lora_rank")
         jiant_model.to(quick_init_out.device)
+    if args.freeze_encoder:
+        torch_utils.set_requires_grad(jiant_model.encoder.named_parameters(), requires_grad=False)
+    if args.freeze_embeddings or args.freeze_layers:
+        if args.freeze_embeddings and jiant_model_setup.has_reentrant_gradient_checkpointing(
+            jiant_model.encoder
+        ):
+            raise RuntimeError(
+                "freeze_embeddings cannot be combined with gradient_checkpointing in the model"
+                " config. Use the gradient_checkpointing runscript argument instead"
+            )
+        freeze_summary = jiant_model_setup.freeze_encoder_parameters(
+            encoder=jiant_model.encoder,
+            freeze_embeddings=args.freeze_embeddings,
+            freeze_layers=jiant_model_setup.parse_layer_indices(args.freeze_layers or ""),
+        )
+        quick_init_out.log_writer.write_entry("freeze", freeze_summary)
+        if verbose:
+            print(
+                f"Froze {freeze_summary['num_frozen_params']} parameters"
+                f" ({freeze_summary['num_frozen_layers']} layers), saving"
+                f" ~{freeze_summary['estimated_memory_saved_mb']:.0f}MB of gradients and"
+                " optimizer state"
+            )
+            if freeze_summary["all_layers_frozen"]:
+                print("All encoder layers are frozen")
+            elif freeze_summary["lowest_trainable_layer"] is not None:
+                print(f"Backward stops at layer {freeze_summary['lowest_trainable_layer']}")
+    if args.gradient_checkpointing:
+        num_checkpointed_layers = jiant_model_setup.enable_gradient_checkpointing(
+            jiant_model.encoder
+        )
+        quick_init_out.log_writer.write_entry(
+            "gradient_checkpointing", {"num_layers": num_checkpointed_layers}
+        )
+        if verbose:
+            print(f"Gradient checkpointing enabled ({num_checkpointed_layers} layers)")
 
     optimizer_scheduler = model_setup.create_optimizer(
         model=jiant_model,
@@ -102,6 +198,7 @@ def setup_runner(
         warmup_steps=jiant_task_container.global_train_config.warmup_steps,
         warmup_proportion=None,
         optimizer_type=args.optimizer_type,
+        optimizer_state_dtype=args.optimizer_state_dtype,
         verbose=verbose,
     )
     jiant_model, optimizer = model_setup.raw_special_model_setup(
@@ -118,7 +215,18 @@ def setup_runner(
         n_gpu=quick_init_out.n_gpu,
         fp16=args.fp16,
         max_grad_norm=args.max_grad_norm,
+        precision=args.precision,
+        num_tasks_per_step=args.num_tasks_per_step,
     )
+    if args.cache_encoder_features:
+        encoder_feature_cache = setup_encoder_feature_cache(
+            args=args,
+            jiant_task_container=jiant_task_container,
+            jiant_model=jiant_model,
+            n_gpu=quick_init_out.n_gpu,
+        )
+    else:
+        encoder_feature_cache = None
     runner = jiant_runner.JiantRunner(
         jiant_task_container=jiant_task_container,
         jiant_model=jiant_model,
@@ -126,17 +234,83 @@ def setup_runner(
         device=quick_init_out.device,
         rparams=rparams,
         log_writer=quick_init_out.log_writer,
+        encoder_feature_cache=encoder_feature_cache,
     )
     return runner
 
 
+def setup_encoder_feature_cache(
+    args: RunConfiguration,
+    jiant_task_container: container_setup.JiantTaskContainer,
+    jiant_model,
+    n_gpu,
+) -> feature_cache.EncoderFeatureCache:
+    """Setup cache of frozen-encoder features, so the encoder is run once per example.
+
+    Args:
+        args (RunConfiguration): configuration carrying command line args specifying run params.
+        jiant_task_container (container_setup.JiantTaskContainer): task and sampler configs.
+        jiant_model: JiantModel (possibly wrapped), with a frozen encoder.
+        n_gpu: number of GPUs.
+
+    Returns:
+        feature_cache.EncoderFeatureCache
+
+    """
+    if not args.freeze_encoder:
+        raise RuntimeError("cache_encoder_features requires freeze_encoder")
+    if n_gpu > 1 or args.local_rank != -1:
+        raise RuntimeError("cache_encoder_features is not supported with multiple GPUs")
+    num_examples_dict = {
+        task_name: {
+            phase: len(task_cache)
+            for phase, task_cache in single_task_cache_dict.items()
+            if phase in (PHASE.TRAIN, PHASE.VAL, PHASE.TEST)
+        }
+        for task_name, single_task_cache_dict in jiant_task_container.task_cache_dict.items()
+    }
+    # Features are only reused for the same task data (and tokenization, max_seq_length, ...)
+    data_fingerprint_dict = {
+        task_name: {
+            phase: feature_cache.get_fingerprint(
+                {
+                    "cache_path": os.path.abspath(task_cache.cache_fol_path),
+                    "data_args": task_cache.data_args,
+                }
+            )
+            for phase, task_cache in single_task_cache_dict.items()
+            if phase in (PHASE.TRAIN, PHASE.VAL, PHASE.TEST)
+        }
+        for task_name, single_task_cache_dict in jiant_task_container.task_cache_dict.items()
+    }
+    if args.encoder_feature_cache_max_gb is None:
+        max_bytes = None
+    else:
+        max_bytes = int(args.encoder_feature_cache_max_gb * 2 ** 30)
+    return feature_cache.EncoderFeatureCache(
+        jiant_model=jiant_model,
+        cache_dir=(
+            args.encoder_feature_cache_dir
+            if args.encoder_feature_cache_dir is not None
+            else os.path.join(args.output_dir, "encoder_features")
+        ),
+        num_examples_dict=num_examples_dict,
+        dtype=args.encoder_feature_cache_dtype,
+        max_bytes=max_bytes,
+        data_fingerprint_dict=data_fingerprint_dict,
+    )
+
+
 def run_loop(args: RunConfiguration, checkpoint=None):
     is_resumed = checkpoint is not None
     quick_init_out = initialization.quick_init(args=args, verbose=True)
     print(quick_init_out.n_gpu)
     with quick_init_out.log_writer.log_context():
         jiant_task_container = container_setup.create_jiant_task_container_from_json(
-            jiant_task_container_config_path=args.jiant_task_container_config_path, verbose=True,
+            jiant_task_container_config_path=args.jiant_task_container_config_path,
+            verbose=True,
+            # Processes in distributed training must sample the same task at each step
+            task_sampler_rng=args.seed if distributed.is_distributed() else None,
         )
         runner = setup_runner(
             args=args,
@@ -170,9 +344,11 @@ def run_loop(args: RunConfiguration, checkpoint=None):
                 del checkpoint["metarunner_state"]
             metarunner.run_train_loop()
 
-        if args.do_save:
+        # In distributed runs, the main process saves the model and results, and all processes
+        #   evaluate (see: jiant_runner.run_val)
+        if args.do_save and distributed.is_main_process():
             torch.save(
-                torch_utils.get_model_for_saving(runner.jiant_model).state_dict(),
+                torch_utils.get_state_dict_for_saving(runner.jiant_model),
                 os.path.join(args.output_dir, "model.p"),
             )
 
@@ -181,6 +357,16 @@ def run_loop(args: RunConfiguration, checkpoint=None):
                 task_name_list=runner.jiant_task_container.task_run_config.val_task_list,
                 return_preds=args.write_val_preds,
             )
+        else:
+            assert not args.write_val_preds
+        if args.write_test_preds:
+            test_results_dict = runner.run_test(
+                task_name_list=runner.jiant_task_container.task_run_config.test_task_list,
+            )
+        if not distributed.is_main_process():
+            return
+
+        if args.do_val:
             jiant_evaluate.write_val_results(
                 val_results_dict=val_results_dict,
                 metrics_aggregator=runner.jiant_task_container.metrics_aggregator,
@@ -192,13 +378,8 @@ def run_loop(args: RunConfiguration, checkpoint=None):
                     eval_results_dict=val_results_dict,
                     path=os.path.join(args.output_dir, "val_preds.p"),
                 )
-        else:
-            assert not args.write_val_preds
 
         if args.write_test_preds:
-            test_results_dict = runner.run_test(
-                task_name_list=runner.jiant_task_container.task_run_config.test_task_list,
-            )
             jiant_evaluate.write_preds(
                 eval_results_dict=test_results_dict,
                 path=os.path.join(args.output_dir, "test_preds.p"),
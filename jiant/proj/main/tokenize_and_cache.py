@@ -9,6 +9,7 @@ import jiant.tasks.evaluate as evaluate
 import jiant.utils.zconf as zconf
 import jiant.utils.python.io as py_io
 from jiant.shared.constants import PHASE
+from jiant.utils.tokenization_memo import get_tokenization_memo
 
 
 @zconf.run_config
@@ -26,9 +27,13 @@ class RunConfiguration(zconf.RunConfig):
     smart_truncate = zconf.attr(action="store_true")
     do_iter = zconf.attr(action="store_true")
     skip_write_output_paths = zconf.attr(action="store_true")
+    # Fast (Rust-backed) tokenizers enable offset-mapping-based SQuAD-style featurization
+    use_fast_tokenizer = zconf.attr(action="store_true")
 
 
-def chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfiguration):
+def chunk_and_save(
+    task, phase, examples, feat_spec, tokenizer, args: RunConfiguration, labels_recorder=None
+):
     """Convert Examples to DataRows, optionally truncate sequences if possible, and save to disk.
 
     Note:
@@ -37,12 +42,16 @@ def chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfigu
     Args:
         task: Task object
         phase (str): string identifying the data subset (e.g., train, val or test).
-        examples (list[Example]): list of task Examples.
+        examples (list[Example]): list (or, with args.do_iter, iterable) of task Examples.
         feat_spec: (FeaturizationSpec): Tokenization-related metadata.
         tokenizer: TODO  (issue #1188)
         args (RunConfiguration): run configuration object.
+        labels_recorder (StreamingLabelsRecorder): extracts labels in the same pass (requires
+            args.do_iter).
 
     """
+    tokenization_memo = get_tokenization_memo()
+    tokenization_memo.reset_stats()
     if args.do_iter:
         iter_chunk_and_save(
             task=task,
@@ -51,8 +60,10 @@ def chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfigu
             feat_spec=feat_spec,
             tokenizer=tokenizer,
             args=args,
+            labels_recorder=labels_recorder,
         )
     else:
+        assert labels_recorder is None
         full_chunk_and_save(
             task=task,
             phase=phase,
@@ -61,6 +72,11 @@ def chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfigu
             tokenizer=tokenizer,
             args=args,
         )
+    if tokenization_memo.hits + tokenization_memo.misses:
+        print(
+            f"Tokenization memo ({phase}): {tokenization_memo.hits} hits, "
+            f"{tokenization_memo.misses} misses, hit rate {tokenization_memo.hit_rate:.1%}"
+        )
 
 
 def full_chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfiguration):
@@ -100,16 +116,19 @@ def full_chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunCo
     )
 
 
-def iter_chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunConfiguration):
+def iter_chunk_and_save(
+    task, phase, examples, feat_spec, tokenizer, args: RunConfiguration, labels_recorder=None
+):
     """Convert Examples to DataRows, optionally truncate sequences if possible, stream to disk.
 
     Args:
         task: Task object
         phase (str): string identifying the data subset (e.g., train, val or test).
-        examples (list[Example]): list of task Examples.
+        examples (Iterable[Example]): iterable of task Examples, consumed lazily.
         feat_spec: (FeaturizationSpec): Tokenization-related metadata.
         tokenizer: TODO  (issue #1188)
         args (RunConfiguration): run configuration object.
+        labels_recorder (StreamingLabelsRecorder): extracts labels in the same pass.
 
     """
     dataset_generator = preprocessing.iter_chunk_convert_examples_to_dataset(
@@ -119,6 +138,7 @@ def iter_chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunCo
         tokenizer=tokenizer,
         phase=phase,
         verbose=True,
+        labels_recorder=labels_recorder,
     )
     max_valid_length_recorder = preprocessing.MaxValidLengthRecorder(args.max_seq_length)
     shared_caching.iter_chunk_and_save(
@@ -141,13 +161,23 @@ def iter_chunk_and_save(task, phase, examples, feat_spec, tokenizer, args: RunCo
         )
 
 
+def get_examples(task, phase, args: RunConfiguration):
+    """Get examples for a phase: lazily if args.do_iter (examples are streamed to disk)"""
+    if args.do_iter:
+        return task.iter_examples(phase)
+    else:
+        return task.get_examples(phase)
+
+
 def main(args: RunConfiguration):
     task = tasks.create_task_from_config_path(config_path=args.task_config_path, verbose=True)
     feat_spec = model_resolution.build_featurization_spec(
         model_type=args.model_type, max_seq_length=args.max_seq_length,
     )
     tokenizer = model_setup.get_tokenizer(
-        model_type=args.model_type, tokenizer_path=args.model_tokenizer_path,
+        model_type=args.model_type,
+        tokenizer_path=args.model_tokenizer_path,
+        use_fast=args.use_fast_tokenizer,
     )
     if isinstance(args.phases, str):
         phases = args.phases.split(",")
@@ -162,7 +192,7 @@ def main(args: RunConfiguration):
         chunk_and_save(
             task=task,
             phase=PHASE.TRAIN,
-            examples=task.get_train_examples(),
+            examples=get_examples(task=task, phase=PHASE.TRAIN, args=args),
             feat_spec=feat_spec,
             tokenizer=tokenizer,
             args=args,
@@ -170,36 +200,61 @@ def main(args: RunConfiguration):
         paths_dict["train"] = os.path.join(args.output_dir, PHASE.TRAIN)
 
     if PHASE.VAL in phases:
-        val_examples = task.get_val_examples()
-        chunk_and_save(
-            task=task,
-            phase=PHASE.VAL,
-            examples=val_examples,
-            feat_spec=feat_spec,
-            tokenizer=tokenizer,
-            args=args,
-        )
         evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task)
-        shared_caching.chunk_and_save(
-            data=evaluation_scheme.get_labels_from_cache_and_examples(
+        val_labels_output_dir = os.path.join(args.output_dir, "val_labels")
+        # Smart truncation modifies the cached data after it has been written, so labels are then
+        #   extracted from the truncated cache afterwards
+        if args.do_iter and not args.smart_truncate and evaluation_scheme.SUPPORTS_STREAMING_LABELS:
+            val_labels_writer = shared_caching.ChunkedFilesWriter(
+                chunk_size=args.chunk_size,
+                data_args=args.to_dict(),
+                output_dir=val_labels_output_dir,
+            )
+            chunk_and_save(
                 task=task,
-                cache=shared_caching.ChunkedFilesDataCache(
-                    os.path.join(args.output_dir, PHASE.VAL)
+                phase=PHASE.VAL,
+                examples=task.iter_examples(PHASE.VAL),
+                feat_spec=feat_spec,
+                tokenizer=tokenizer,
+                args=args,
+                labels_recorder=preprocessing.StreamingLabelsRecorder(
+                    task=task,
+                    evaluation_scheme=evaluation_scheme,
+                    write_fn=val_labels_writer.write,
+                    group_size=args.chunk_size,
                 ),
+            )
+            val_labels_writer.close()
+        else:
+            val_examples = task.get_examples(PHASE.VAL)
+            chunk_and_save(
+                task=task,
+                phase=PHASE.VAL,
                 examples=val_examples,
-            ),
-            chunk_size=args.chunk_size,
-            data_args=args.to_dict(),
-            output_dir=os.path.join(args.output_dir, "val_labels"),
-        )
+                feat_spec=feat_spec,
+                tokenizer=tokenizer,
+                args=args,
+            )
+            shared_caching.chunk_and_save(
+                data=evaluation_scheme.get_labels_from_cache_and_examples(
+                    task=task,
+                    cache=shared_caching.ChunkedFilesDataCache(
+                        os.path.join(args.output_dir, PHASE.VAL)
+                    ),
+                    examples=val_examples,
+                ),
+                chunk_size=args.chunk_size,
+                data_args=args.to_dict(),
+                output_dir=val_labels_output_dir,
+            )
         paths_dict[PHASE.VAL] = os.path.join(args.output_dir, PHASE.VAL)
-        paths_dict["val_labels"] = os.path.join(args.output_dir, "val_labels")
+        paths_dict["val_labels"] = val_labels_output_dir
 
     if PHASE.TEST in phases:
         chunk_and_save(
             task=task,
             phase=PHASE.TEST,
-            examples=task.get_test_examples(),
+            examples=get_examples(task=task, phase=PHASE.TEST, args=args),
             feat_spec=feat_spec,
             tokenizer=tokenizer,
             args=args,
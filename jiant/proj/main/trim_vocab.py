@@ -0,0 +1,238 @@
+"""Trim the vocabulary of a model to the tokens used in a set of task caches.
+
+Fine-tuning a multilingual encoder (e.g. XLM-R, mBERT) on data in one language only ever indexes a
+small fraction of its embedding rows. This tool scans task caches (all phases) for used token
+ids, and writes:
+    - model weights, with the embeddings and MLM head (decoder weights and biases) restricted to
+      the used token ids, in the format of the input weights (Transformers or jiant weights), to be
+      loaded with delegate_load_from_path with the same load_mode as the input weights
+    - the model config, with the trimmed vocab_size
+    - the tokenizer, with the trimmed vocabulary (see: jiant.shared.trimmed_vocab)
+    - the task caches, with token ids remapped to the trimmed vocabulary
+    - config.json, pointing to the above (as in export_model)
+
+Special tokens (and the unknown token) are always kept.
+"""
+import os
+import shutil
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import torch
+
+import jiant.shared.caching as caching
+import jiant.shared.model_setup as model_setup
+import jiant.shared.trimmed_vocab as trimmed_vocab
+import jiant.utils.python.io as py_io
+import jiant.utils.zconf as zconf
+from jiant.utils.display import maybe_tqdm
+
+# DataRow fields (besides those ending with "input_ids") holding token ids
+TOKEN_ID_FIELDS = ("masked_lm_labels",)
+DATA_PHASES = ("train", "val", "test")
+
+
+@zconf.run_config
+class RunConfiguration(zconf.RunConfig):
+    model_type = zconf.attr(type=str, required=True)
+    model_path = zconf.attr(type=str, required=True)
+    model_config_path = zconf.attr(type=str, required=True)
+    model_tokenizer_path = zconf.attr(type=str, required=True)
+    # Folder of task caches (task_cache_base_path/{task_name}/{phase}), from tokenize_and_cache
+    task_cache_base_path = zconf.attr(type=str, required=True)
+    output_base_path = zconf.attr(type=str, required=True)
+    verbose = zconf.attr(action="store_true")
+
+
+def is_token_id_field(field_name: str) -> bool:
+    return field_name.endswith("input_ids") or field_name in TOKEN_ID_FIELDS
+
+
+def iter_task_cache_paths(task_cache_base_path: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (task_name, phase, cache_path) for each data cache (train/val/test) of each task"""
+    for task_name in sorted(os.listdir(task_cache_base_path)):
+        for phase in DATA_PHASES:
+            cache_path = os.path.join(task_cache_base_path, task_name, phase)
+            if os.path.exists(os.path.join(cache_path, "data_args.p")):
+                yield task_name, phase, cache_path
+
+
+def iter_cache_chunks(cache: caching.ChunkedFilesDataCache) -> Iterator[list]:
+    for i in range(cache.num_chunks):
+        yield cache.load_chunk(i)
+
+
+def get_used_token_ids(cache_paths: List[str], verbose: bool = False) -> np.ndarray:
+    """Get the sorted, unique token ids used in the DataRows of a set of caches"""
+    used_token_ids = set()
+    for cache_path in cache_paths:
+        cache = caching.ChunkedFilesDataCache(cache_path)
+        for chunk in maybe_tqdm(iter_cache_chunks(cache), total=cache.num_chunks, verbose=verbose):
+            for datum in chunk:
+                data_row = datum["data_row"]
+                for field_name in data_row.get_field_names():
+                    if is_token_id_field(field_name):
+                        used_token_ids.update(np.unique(getattr(data_row, field_name)).tolist())
+    # Ignored positions in MLM labels
+    return np.array(sorted(token_id for token_id in used_token_ids if token_id >= 0))
+
+
+def trim_weights_dict(weights_dict: dict, vocab_size: int, kept_token_ids: np.ndarray) -> dict:
+    """Restrict vocabulary-indexed weights to the kept token ids.
+
+    Weights indexed by token id are found by shape: tensors with a first dimension of vocab_size
+    (embeddings, MLM decoder weights and biases), and (1, vocab_size) biases (e.g. BART's
+    final_logits_bias).
+    """
+    index = torch.tensor(kept_token_ids, dtype=torch.long)
+    trimmed_weights_dict = {}
+    for k, v in weights_dict.items():
+        if v.dim() >= 1 and v.shape[0] == vocab_size:
+            v = v.index_select(0, index.to(v.device)).clone()
+        elif v.dim() == 2 and v.shape == (1, vocab_size):
+            v = v.index_select(1, index.to(v.device)).clone()
+        trimmed_weights_dict[k] = v
+    return trimmed_weights_dict
+
+
+def remap_cache(
+    cache_path: str, output_path: str, token_id_map: np.ndarray, remap_labels: bool = False
+):
+    """Copy a cache, remapping token ids to a trimmed vocabulary (chunk by chunk).
+
+    Args:
+        cache_path: path to ChunkedFilesDataCache.
+        output_path: path to write remapped cache to.
+        token_id_map: array mapping original token ids to new token ids.
+        remap_labels: remap (non-negative) entries of label arrays (for caches of val labels of
+            MLM tasks, where labels are token ids), instead of DataRows.
+
+    """
+    cache = caching.ChunkedFilesDataCache(cache_path)
+    os.makedirs(output_path, exist_ok=True)
+    for file_name in os.listdir(cache_path):
+        if not file_name.endswith(".chunk"):
+            shutil.copy(os.path.join(cache_path, file_name), os.path.join(output_path, file_name))
+    for i, chunk in enumerate(iter_cache_chunks(cache)):
+        if remap_labels:
+            chunk = [_remap_token_ids(labels, token_id_map) for labels in chunk]
+        else:
+            for datum in chunk:
+                data_row = datum["data_row"]
+                for field_name in data_row.get_field_names():
+                    if is_token_id_field(field_name):
+                        setattr(
+                            data_row,
+                            field_name,
+                            _remap_token_ids(getattr(data_row, field_name), token_id_map),
+                        )
+        torch.save(chunk, os.path.join(output_path, os.path.basename(cache.get_chunk_path(i))))
+
+
+def _remap_token_ids(token_ids, token_id_map: np.ndarray):
+    token_ids = np.asarray(token_ids)
+    # Negative ids (ignored MLM labels) are kept as-is
+    return np.where(token_ids >= 0, token_id_map[np.maximum(token_ids, 0)], token_ids)
+
+
+def trim_vocab(args: RunConfiguration) -> Dict[str, int]:
+    tokenizer = model_setup.get_tokenizer(
+        model_type=args.model_type, tokenizer_path=args.model_tokenizer_path
+    )
+    model_config = py_io.read_json(args.model_config_path)
+    vocab_size = model_config["vocab_size"]
+
+    task_cache_paths = list(iter_task_cache_paths(args.task_cache_base_path))
+    if not task_cache_paths:
+        raise RuntimeError(f"No task caches found in {args.task_cache_base_path}")
+    used_token_ids = get_used_token_ids(
+        [cache_path for _, _, cache_path in task_cache_paths], verbose=args.verbose
+    )
+    special_token_ids = tokenizer.convert_tokens_to_ids(
+        tokenizer.all_special_tokens + [tokenizer.unk_token]
+    )
+    kept_token_ids = np.union1d(used_token_ids, special_token_ids).astype(int)
+    if kept_token_ids[-1] >= vocab_size:
+        raise RuntimeError(f"Token id {kept_token_ids[-1]} >= vocab_size {vocab_size}")
+    token_id_map = np.full(vocab_size, -1, dtype=int)
+    token_id_map[kept_token_ids] = np.arange(len(kept_token_ids))
+
+    # Model weights and config
+    model_fol_path = os.path.join(args.output_base_path, "model")
+    os.makedirs(model_fol_path, exist_ok=True)
+    model_path = os.path.join(model_fol_path, f"{args.model_type}.p")
+    model_config_path = os.path.join(model_fol_path, f"{args.model_type}.json")
+    weights_dict = torch.load(args.model_path, map_location="cpu")
+    torch.save(
+        trim_weights_dict(
+            weights_dict=weights_dict, vocab_size=vocab_size, kept_token_ids=kept_token_ids
+        ),
+        model_path,
+    )
+    del weights_dict
+    model_config["vocab_size"] = len(kept_token_ids)
+    py_io.write_json(model_config, model_config_path)
+
+    # Tokenizer: original files, and kept token ids in the original vocabulary
+    tokenizer_fol_path = os.path.join(args.output_base_path, "tokenizer")
+    shutil.copytree(args.model_tokenizer_path, tokenizer_fol_path)
+    trimmed_vocab.write_kept_token_ids(
+        trimmed_vocab.get_original_token_ids(tokenizer, kept_token_ids.tolist()),
+        tokenizer_fol_path,
+    )
+
+    # Task caches
+    task_cache_base_path = os.path.join(args.output_base_path, "cache")
+    for task_name, phase, cache_path in task_cache_paths:
+        remap_cache(
+            cache_path=cache_path,
+            output_path=os.path.join(task_cache_base_path, task_name, phase),
+            token_id_map=token_id_map,
+        )
+    for task_name in sorted({task_name for task_name, _, _ in task_cache_paths}):
+        val_labels_path = os.path.join(args.task_cache_base_path, task_name, "val_labels")
+        output_val_labels_path = os.path.join(task_cache_base_path, task_name, "val_labels")
+        if not os.path.isdir(val_labels_path):
+            continue
+        elif _has_token_id_labels(os.path.join(args.task_cache_base_path, task_name)):
+            remap_cache(
+                cache_path=val_labels_path,
+                output_path=output_val_labels_path,
+                token_id_map=token_id_map,
+                remap_labels=True,
+            )
+        else:
+            shutil.copytree(val_labels_path, output_val_labels_path)
+
+    py_io.write_json(
+        {
+            "model_type": args.model_type,
+            "model_path": model_path,
+            "model_config_path": model_config_path,
+            "model_tokenizer_path": tokenizer_fol_path,
+            "task_cache_base_path": task_cache_base_path,
+        },
+        os.path.join(args.output_base_path, "config.json"),
+    )
+    return {"vocab_size": vocab_size, "trimmed_vocab_size": len(kept_token_ids)}
+
+
+def _has_token_id_labels(task_cache_path: str) -> bool:
+    # Only MLM tasks have token ids as labels
+    val_cache_path = os.path.join(task_cache_path, "val")
+    if not os.path.exists(os.path.join(val_cache_path, "data_args.p")):
+        return False
+    val_cache = caching.ChunkedFilesDataCache(val_cache_path)
+    if not val_cache.num_chunks:
+        return False
+    return "masked_lm_labels" in val_cache.load_chunk(0)[0]["data_row"].get_field_names()
+
+
+def main():
+    args = RunConfiguration.default_run_cli()
+    result = trim_vocab(args)
+    print(f"Trimmed vocabulary from {result['vocab_size']} to {result['trimmed_vocab_size']}")
+
+
+if __name__ == "__main__":
+    main()
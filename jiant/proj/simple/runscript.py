@@ -55,11 +55,21 @@ class RunConfiguration(zconf.RunConfig):
     adam_epsilon = zconf.attr(default=1e-8, type=float)
     max_grad_norm = zconf.attr(default=1.0, type=float)
     optimizer_type = zconf.attr(default="adam", type=str)
+    optimizer_state_dtype = zconf.attr(default="float32", type=str)
+    gradient_checkpointing = zconf.attr(action="store_true")
+    num_tasks_per_step = zconf.attr(default=1, type=int)
+    freeze_embeddings = zconf.attr(action="store_true")
+    freeze_layers = zconf.attr(default=None, type=str)
+    adapter_size = zconf.attr(default=0, type=int)
+    lora_rank = zconf.attr(default=0, type=int)
+    peft_per_taskmodel = zconf.attr(action="store_true")
 
     # === Specialized config === #
     no_cuda = zconf.attr(action="store_true")
     fp16 = zconf.attr(action="store_true")
     fp16_opt_level = zconf.attr(default="O1", type=str)
+    # Native mixed precision (fp32, bf16 or fp16), an alternative to apex --fp16
+    precision = zconf.attr(default="fp32", type=str)
     local_rank = zconf.attr(default=-1, type=int)
     server_ip = zconf.attr(default="", type=str)
     server_port = zconf.attr(default="", type=str)
@@ -235,10 +245,19 @@ def run_simple(args: RunConfiguration, with_continue: bool = False):
             adam_epsilon=args.adam_epsilon,
             max_grad_norm=args.max_grad_norm,
             optimizer_type=args.optimizer_type,
+            optimizer_state_dtype=args.optimizer_state_dtype,
+            gradient_checkpointing=args.gradient_checkpointing,
+            num_tasks_per_step=args.num_tasks_per_step,
+            freeze_embeddings=args.freeze_embeddings,
+            freeze_layers=args.freeze_layers,
+            adapter_size=args.adapter_size,
+            lora_rank=args.lora_rank,
+            peft_per_taskmodel=args.peft_per_taskmodel,
             # === Specialized config === #
             no_cuda=args.no_cuda,
             fp16=args.fp16,
             fp16_opt_level=args.fp16_opt_level,
+            precision=args.precision,
             local_rank=args.local_rank,
             server_ip=args.server_ip,
             server_port=args.server_port,
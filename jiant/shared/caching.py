@@ -84,26 +84,67 @@ def chunk_and_save(data: list, chunk_size: int, data_args: dict, output_dir: str
 def iter_chunk_and_save(
     data: Generator, chunk_size: int, data_args: dict, output_dir: str, recorder_callback=None
 ):
-    os.makedirs(output_dir, exist_ok=True)
-    chunk_i = 0
-    length = 0
-    current_chunk = []
+    writer = ChunkedFilesWriter(
+        chunk_size=chunk_size,
+        data_args=data_args,
+        output_dir=output_dir,
+        recorder_callback=recorder_callback,
+    )
     for datum in data:
-        if recorder_callback is not None:
-            recorder_callback(datum)
-        length += 1
-        current_chunk.append(datum)
-        if len(current_chunk) == chunk_size:
-            torch.save(current_chunk, os.path.join(output_dir, f"data_{chunk_i:05d}.chunk"))
-            chunk_i += 1
-            current_chunk = []
-    if current_chunk:
-        torch.save(current_chunk, os.path.join(output_dir, f"data_{chunk_i:05d}.chunk"))
-        chunk_i += 1
-    data_args = data_args.copy()
-    data_args["num_chunks"] = chunk_i
-    data_args["length"] = length
-    torch.save(data_args, os.path.join(output_dir, "data_args.p"))
+        writer.write(datum)
+    writer.close()
+
+
+class ChunkedFilesWriter:
+    def __init__(self, chunk_size: int, data_args: dict, output_dir: str, recorder_callback=None):
+        """Write data to disk in chunks, one datum at a time (in the format of chunk_and_save).
+
+        Args:
+            chunk_size (int): number of data elements to store per chunk.
+            data_args (Dict): RunConfiguration represented as a dictionary.
+            output_dir: phase-specific dir in the output dir specified in the RunConfiguration.
+            recorder_callback: optional function called on each datum as it is written.
+
+        """
+        self.chunk_size = chunk_size
+        self.data_args = data_args
+        self.output_dir = output_dir
+        self.recorder_callback = recorder_callback
+        self.chunk_i = 0
+        self.length = 0
+        self.current_chunk = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, datum):
+        if self.recorder_callback is not None:
+            self.recorder_callback(datum)
+        self.length += 1
+        self.current_chunk.append(datum)
+        if len(self.current_chunk) == self.chunk_size:
+            self._save_current_chunk()
+
+    def close(self):
+        """Save the last (partial) chunk, and the metadata describing the chunking"""
+        if self.current_chunk:
+            self._save_current_chunk()
+        data_args = self.data_args.copy()
+        data_args["num_chunks"] = self.chunk_i
+        data_args["length"] = self.length
+        torch.save(data_args, os.path.join(self.output_dir, "data_args.p"))
+
+    def _save_current_chunk(self):
+        torch.save(
+            self.current_chunk, os.path.join(self.output_dir, f"data_{self.chunk_i:05d}.chunk")
+        )
+        self.chunk_i += 1
+        self.current_chunk = []
+
+
+def get_shard_slice(length: int, num_shards: int, shard_index: int) -> slice:
+    """Get the shard_index-th of num_shards contiguous, near-equal blocks of range(length)"""
+    base_size, num_larger = divmod(length, num_shards)
+    start = shard_index * base_size + min(shard_index, num_larger)
+    return slice(start, start + base_size + (1 if shard_index < num_larger else 0))
 
 
 def compare_tensor_tuples(tup1, tup2):
@@ -168,6 +209,8 @@ class ChunkedFilesDataCache(DataCache):
         shuffle=False,
         subset_num: Union[None, int] = None,
         explicit_subset: Union[None, Sequence] = None,
+        num_shards: int = 1,
+        shard_index: int = 0,
         verbose=False,
     ):
         return ChunkedFilesIterableDataset(
@@ -176,6 +219,8 @@ class ChunkedFilesDataCache(DataCache):
             subset_num=subset_num,
             explicit_subset=explicit_subset,
             chunked_file_data_cache=self,
+            num_shards=num_shards,
+            shard_index=shard_index,
             verbose=verbose,
         )
 
@@ -225,13 +270,25 @@ class ChunkedFilesIterableDataset(torch.utils.data.dataset.IterableDataset):
         chunked_file_data_cache: ChunkedFilesDataCache,
         subset_num: Union[int, None] = None,
         explicit_subset: Union[Sequence, None] = None,
+        num_shards: int = 1,
+        shard_index: int = 0,
         verbose=False,
     ):
+        """Iterable dataset over a ChunkedFilesDataCache, loading buffer_size examples at a time.
+
+        With num_shards > 1 (e.g. one shard per process in distributed training), only the
+        shard_index-th of num_shards contiguous blocks of examples is used, so that outputs over
+        the shards concatenate in order. Shards are fixed, and shuffled separately, so processes
+        need not share random state.
+        """
+        assert 0 <= shard_index < num_shards
         self.buffer_size = buffer_size
         self.shuffle = shuffle
         self.subset_num = subset_num
         self.chunked_file_data_cache = chunked_file_data_cache
         self.explicit_subset = explicit_subset
+        self.num_shards = num_shards
+        self.shard_index = shard_index
         self.verbose = verbose
 
         if self.explicit_subset is not None:
@@ -241,6 +298,9 @@ class ChunkedFilesIterableDataset(torch.utils.data.dataset.IterableDataset):
             self.length = self.chunked_file_data_cache.length
             if self.subset_num:
                 self.length = min(self.subset_num, self.length)
+        self.unsharded_length = self.length
+        shard_slice = get_shard_slice(self.unsharded_length, self.num_shards, self.shard_index)
+        self.length = shard_slice.stop - shard_slice.start
 
         if self.buffer_size is None:
             self.buffer_size = self.length
@@ -265,7 +325,8 @@ class ChunkedFilesIterableDataset(torch.utils.data.dataset.IterableDataset):
         if self.explicit_subset is not None:
             indices = np.array(self.explicit_subset).astype(int)
         else:
-            indices = np.arange(self.length).astype(int)
+            indices = np.arange(self.unsharded_length).astype(int)
+        indices = indices[get_shard_slice(len(indices), self.num_shards, self.shard_index)]
         if self.shuffle:
             np.random.shuffle(indices)
         if self.subset_num:
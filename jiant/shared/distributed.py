@@ -14,3 +14,57 @@ def only_first_process(local_rank):
         if local_rank == 0:
             # noinspection PyUnresolvedReferences
             torch.distributed.barrier()
+
+
+def is_distributed():
+    return torch.distributed.is_available() and torch.distributed.is_initialized()
+
+
+def get_rank():
+    """Global rank of the process (0 if not distributed)"""
+    return torch.distributed.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    """Number of processes (1 if not distributed)"""
+    return torch.distributed.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    """Whether the process is the one that logs, saves and evaluates (global rank 0)"""
+    return get_rank() == 0
+
+
+def broadcast_int(value: int, src=0) -> int:
+    """Broadcast an integer from process src to all processes (no-op if not distributed)"""
+    if not is_distributed():
+        return value
+    tensor = torch.tensor([value], dtype=torch.long)
+    if torch.distributed.get_backend() == "nccl":
+        tensor = tensor.cuda()
+    torch.distributed.broadcast(tensor, src=src)
+    return int(tensor.item())
+
+
+def gather_objects(obj, dst=0):
+    """Gather a picklable object from all processes to process dst.
+
+    Returns:
+        list of the objects of all processes (in rank order) on process dst, None on others
+        ([obj] if not distributed)
+    """
+    if not is_distributed():
+        return [obj]
+    if not hasattr(torch.distributed, "gather_object"):
+        raise RuntimeError("Gathering objects across processes requires torch>=1.8")
+    object_list = [None] * get_world_size() if get_rank() == dst else None
+    torch.distributed.gather_object(obj, object_list, dst=dst)
+    return object_list
+
+
+def broadcast_parameters(model: torch.nn.Module, src=0):
+    """Copy the parameters and buffers of model from process src to all processes (in-place)"""
+    if not is_distributed():
+        return
+    for tensor in model.state_dict().values():
+        torch.distributed.broadcast(tensor, src=src)
@@ -0,0 +1,147 @@
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+import jiant.utils.python.io as py_io
+
+EMBEDDINGS_FILE_NAME = "embeddings.bin"
+METADATA_FILE_NAME = "metadata.json"
+
+
+class EmbeddingStore:
+    def __init__(
+        self,
+        output_dir: Optional[str] = None,
+        dtype="float32",
+        initial_capacity: int = 4096,
+        temp_dir: Optional[str] = None,
+    ):
+        """Disk-backed store for embeddings, streamed in one batch at a time.
+
+        Embeddings are written into a preallocated memmap, which grows (by resizing the file)
+        when full, so that the full set of embeddings never needs to be held in memory.
+        Per-row side data (e.g. guids) is kept alongside, and saved as .npy files.
+
+        Args:
+            output_dir: directory to write the store to. If None, a temporary directory is used,
+                and deleted when the store is garbage-collected.
+            dtype: storage dtype of the embeddings (e.g. "float16" to halve the size)
+            initial_capacity: number of rows to preallocate
+            temp_dir: directory under which to create the temporary directory, if output_dir is
+                None (default: the system temp dir, which may be in memory on some systems)
+        """
+        if output_dir is None:
+            if temp_dir is not None:
+                os.makedirs(temp_dir, exist_ok=True)
+            output_dir = tempfile.mkdtemp(prefix="jiant_embeddings_", dir=temp_dir)
+            weakref.finalize(self, shutil.rmtree, output_dir, ignore_errors=True)
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = initial_capacity
+        self.num_rows = 0
+        self.dim = None
+        self.side_data = {}
+        self._memmap = None
+
+    @property
+    def embeddings_path(self):
+        return os.path.join(self.output_dir, EMBEDDINGS_FILE_NAME)
+
+    def __len__(self):
+        return self.num_rows
+
+    def add(self, embeddings: np.ndarray, **side_data):
+        """Append a batch of embeddings, and side data with one entry per embedding
+
+        Args:
+            embeddings: (batch_size, dim) array
+            **side_data: side data name -> sequence of length batch_size
+        """
+        batch_size = embeddings.shape[0]
+        if self._memmap is None:
+            self.dim = embeddings.shape[1]
+            self._resize(max(self.initial_capacity, batch_size))
+            self.side_data = {k: [] for k in side_data}
+        assert embeddings.shape[1] == self.dim
+        assert set(side_data) == set(self.side_data)
+        if self.num_rows + batch_size > self._memmap.shape[0]:
+            self._resize(max(2 * self._memmap.shape[0], self.num_rows + batch_size))
+        self._memmap[self.num_rows : self.num_rows + batch_size] = embeddings
+        self.num_rows += batch_size
+        for k, v in side_data.items():
+            assert len(v) == batch_size
+            self.side_data[k].extend(v)
+
+    def _resize(self, capacity):
+        if self._memmap is not None:
+            self._memmap.flush()
+            del self._memmap
+        with open(self.embeddings_path, "ab") as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        self._memmap = np.memmap(
+            self.embeddings_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim)
+        )
+
+    def get_data(self) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Flush the store to disk, and return its contents.
+
+        Returns:
+            (read-only (num_rows, dim) memmap of embeddings, dict of side data arrays)
+        """
+        side_arrays = {k: np.array(v) for k, v in self.side_data.items()}
+        if self._memmap is None:
+            return np.zeros((0, 0), dtype=self.dtype), side_arrays
+        self._memmap.flush()
+        for k, v in side_arrays.items():
+            np.save(os.path.join(self.output_dir, f"{k}.npy"), v)
+        py_io.write_json(
+            {
+                "num_rows": self.num_rows,
+                "dim": self.dim,
+                "dtype": self.dtype.name,
+                "side_data": sorted(side_arrays),
+            },
+            os.path.join(self.output_dir, METADATA_FILE_NAME),
+        )
+        embeddings = np.memmap(
+            self.embeddings_path, dtype=self.dtype, mode="r", shape=(self.num_rows, self.dim)
+        )
+        return embeddings, side_arrays
+
+
+def load_embedding_store(path) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Load the contents of an EmbeddingStore saved to disk
+
+    Args:
+        path: output_dir of the EmbeddingStore
+
+    Returns:
+        (read-only (num_rows, dim) memmap of embeddings, dict of side data arrays)
+    """
+    metadata = py_io.read_json(os.path.join(path, METADATA_FILE_NAME))
+    embeddings = np.memmap(
+        os.path.join(path, EMBEDDINGS_FILE_NAME),
+        dtype=metadata["dtype"],
+        mode="r",
+        shape=(metadata["num_rows"], metadata["dim"]),
+    )
+    side_arrays = {k: np.load(os.path.join(path, f"{k}.npy")) for k in metadata["side_data"]}
+    return embeddings, side_arrays
+
+
+def select_rows(x: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Select rows of x with a boolean mask, returning a view (not a copy) if they are contiguous
+
+    This avoids loading a whole memmap into memory when e.g. selecting the rows of one language,
+    which are typically stored contiguously.
+    """
+    (inds,) = np.nonzero(mask)
+    if len(inds) and inds[-1] - inds[0] + 1 == len(inds):
+        return x[inds[0] : inds[-1] + 1]
+    return x[inds]
@@ -7,6 +7,7 @@ import torch
 from dataclasses import dataclass
 from typing import Any
 
+import jiant.shared.distributed as distributed
 import jiant.utils.python.io as py_io
 import jiant.utils.zlog as zlog
 
@@ -21,6 +22,10 @@ class QuickInitContainer:
 def quick_init(args, verbose=True) -> QuickInitContainer:
     """Sets up logging, initializes device(s) and random seed, prepares output dir, and saves args."
 
+    In distributed runs (started with a launcher which sets LOCAL_RANK, e.g.
+    jiant.proj.main.launch), args.local_rank is set from the environment, all processes use the
+    seed of the first process, and only the first process writes logs and args.
+
     Args:
         args (RunConfiguration): configuration carrying command line args specifying run params.
         verbose (bool): whether to print the input run config and the run config as saved.
@@ -29,16 +34,23 @@ def quick_init(args, verbose=True) -> QuickInitContainer:
         QuickInitContainer specifying the run's device, GPU count, and logging configuration.
 
     """
+    if "LOCAL_RANK" in os.environ:
+        args.local_rank = int(os.environ["LOCAL_RANK"])
     if verbose:
         print_args(args)
     init_server_logging(server_ip=args.server_ip, server_port=args.server_port, verbose=verbose)
     device, n_gpu = init_cuda_from_args(
         no_cuda=args.no_cuda, local_rank=args.local_rank, fp16=args.fp16, verbose=verbose,
     )
-    args.seed = init_seed(given_seed=args.seed, n_gpu=n_gpu, verbose=verbose)
+    args.seed = init_seed(
+        given_seed=distributed.broadcast_int(get_seed(args.seed)), n_gpu=n_gpu, verbose=verbose
+    )
     init_output_dir(output_dir=args.output_dir, force_overwrite=args.force_overwrite)
-    log_writer = init_log_writer(output_dir=args.output_dir)
-    save_args(args=args, verbose=verbose)
+    if distributed.is_main_process():
+        log_writer = init_log_writer(output_dir=args.output_dir)
+        save_args(args=args, verbose=verbose)
+    else:
+        log_writer = zlog.VOID_LOGGER
     return QuickInitContainer(device=device, n_gpu=n_gpu, log_writer=log_writer)
 
 
@@ -75,6 +87,9 @@ def init_cuda_from_args(no_cuda, local_rank, fp16, verbose=True):
 
     Notes:
         local_rank == -1 is used to indicate that DistributedDataParallel should be disabled.
+        With local_rank != -1 and no_cuda (or no CUDA devices), DistributedDataParallel runs on
+        CPU, with the gloo backend (n_gpu = 0). The process group is initialized from the
+        environment (MASTER_ADDR, MASTER_PORT, RANK, WORLD_SIZE), as set by the launcher.
         n_gpu > 1 is used to indicate that DataParallel should be used. Currently, local_rank == -1
         sets n_gpu = 1 even if torch.cuda.device_count() would show more than one GPU is available.
 
@@ -85,7 +100,12 @@ def init_cuda_from_args(no_cuda, local_rank, fp16, verbose=True):
 
     """
     # TODO break local_rank == -1 and no_cuda into separate cases to make the logic easier to read.
-    if local_rank == -1 or no_cuda:
+    if local_rank != -1 and (no_cuda or not torch.cuda.is_available()):
+        device = torch.device("cpu")
+        n_gpu = 0
+        # noinspection PyUnresolvedReferences
+        torch.distributed.init_process_group(backend="gloo")
+    elif local_rank == -1 or no_cuda:
         device = torch.device("cuda" if torch.cuda.is_available() and not no_cuda else "cpu")
         n_gpu = torch.cuda.device_count()
     else:
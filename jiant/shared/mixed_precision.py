@@ -0,0 +1,104 @@
+"""Native mixed precision, with torch autocast (and loss scaling for fp16).
+
+Precision modes:
+    fp32: no mixed precision (default).
+    bf16: autocast to bfloat16, on CPU or on GPUs that support it. No loss scaling is needed.
+    fp16: autocast to float16 on GPU, with dynamic loss scaling (GradScaler).
+
+Unlike the apex-based --fp16 path (see: model_setup.fp16ize), this needs no extra dependencies,
+works on CPU (bf16), and its state (the loss scale) is saved in checkpoints.
+"""
+import contextlib
+
+import torch
+
+PRECISIONS = ("fp32", "bf16", "fp16")
+
+
+class MixedPrecision:
+    def __init__(self, precision: str = "fp32", device_type: str = "cpu"):
+        """
+        Args:
+            precision: one of PRECISIONS.
+            device_type: type of the device that the model runs on ("cpu" or "cuda").
+        """
+        if precision not in PRECISIONS:
+            raise KeyError(precision)
+        self.precision = precision
+        self.device_type = device_type
+        if precision == "fp32":
+            self.dtype = None
+        elif not hasattr(torch, "autocast"):
+            raise RuntimeError("Native mixed precision requires torch.autocast (torch>=1.10)")
+        elif precision == "bf16":
+            if device_type == "cuda" and not torch.cuda.is_bf16_supported():
+                raise RuntimeError("bf16 is not supported on this GPU, use fp16")
+            self.dtype = torch.bfloat16
+        elif precision == "fp16":
+            if device_type != "cuda":
+                raise RuntimeError("fp16 mixed precision requires a GPU, use bf16 on CPU")
+            self.dtype = torch.float16
+        # float16 gradients can underflow, so losses are scaled. bfloat16 has the range of float32.
+        self.grad_scaler = _create_grad_scaler() if precision == "fp16" else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.dtype is not None
+
+    def autocast(self):
+        """Context manager running the forward pass in mixed precision (if enabled)"""
+        if not self.enabled:
+            return _no_autocast()
+        return torch.autocast(device_type=self.device_type, dtype=self.dtype)
+
+    def backward(self, loss):
+        if self.grad_scaler is not None:
+            self.grad_scaler.scale(loss).backward()
+        else:
+            loss.backward()
+
+    def step(self, optimizer_scheduler, parameters, max_grad_norm):
+        """Step the optimizer and scheduler. With loss scaling, gradients are unscaled and clipped
+        here (once, over the accumulated gradients), and steps with inf/NaN gradients are skipped.
+        """
+        if self.grad_scaler is None:
+            optimizer_scheduler.step()
+            return
+        self.grad_scaler.unscale_(optimizer_scheduler.optimizer)
+        torch.nn.utils.clip_grad_norm_(parameters, max_grad_norm)
+        self.grad_scaler.step(optimizer_scheduler.optimizer)
+        self.grad_scaler.update()
+        optimizer_scheduler.scheduler.step()
+
+    def state_dict(self) -> dict:
+        return {
+            "precision": self.precision,
+            "grad_scaler": self.grad_scaler.state_dict() if self.grad_scaler is not None else None,
+        }
+
+    def load_state_dict(self, state_dict: dict):
+        if state_dict["precision"] != self.precision:
+            raise RuntimeError(
+                f"Checkpoint precision {state_dict['precision']} != precision {self.precision}"
+            )
+        if self.grad_scaler is not None:
+            self.grad_scaler.load_state_dict(state_dict["grad_scaler"])
+
+
+def logits_to_numpy(logits: torch.Tensor):
+    # numpy has no bfloat16 (and float16 logits are upcast for accumulation)
+    logits = logits.detach()
+    if logits.dtype in (torch.bfloat16, torch.float16):
+        logits = logits.float()
+    return logits.cpu().numpy()
+
+
+def _create_grad_scaler():
+    if hasattr(torch.amp, "GradScaler"):
+        return torch.amp.GradScaler("cuda")
+    return torch.cuda.amp.GradScaler()
+
+
+@contextlib.contextmanager
+def _no_autocast():
+    yield
@@ -1,16 +1,21 @@
 import transformers
 import torch
 
-from jiant.ext.radam import RAdam
+import jiant.shared.trimmed_vocab as trimmed_vocab
+from jiant.ext.radam import ForeachAdamW, ForeachRAdam, RAdam
 from jiant.shared.model_resolution import ModelArchitectures, resolve_tokenizer_class
 
 
-def get_tokenizer(model_type, tokenizer_path):
+def get_tokenizer(model_type, tokenizer_path, use_fast=False):
     """Instantiate a tokenizer for a given model type.
 
+    If the tokenizer directory holds a trimmed vocabulary (see: trimmed_vocab), the tokenizer is
+    restricted to it.
+
     Args:
         model_type (str): model shortcut name.
         tokenizer_path (str): path to tokenizer directory.
+        use_fast (bool): whether to use the fast (Rust-backed) version of the tokenizer.
 
     Returns:
         Tokenizer for the given model type.
@@ -38,7 +43,15 @@ def get_tokenizer(model_type, tokenizer_path):
         do_lower_case = True
     else:
         raise RuntimeError(str(tokenizer_class))
+    if use_fast:
+        fast_tokenizer_class = getattr(transformers, tokenizer_class.__name__ + "Fast", None)
+        if fast_tokenizer_class is None:
+            raise RuntimeError(f"No fast tokenizer for {tokenizer_class.__name__}")
+        tokenizer_class = fast_tokenizer_class
     tokenizer = tokenizer_class.from_pretrained(tokenizer_path, do_lower_case=do_lower_case)
+    kept_token_ids = trimmed_vocab.read_kept_token_ids(tokenizer_path)
+    if kept_token_ids is not None:
+        tokenizer = trimmed_vocab.trim_tokenizer_vocab(tokenizer, kept_token_ids)
     return tokenizer
 
 
@@ -71,6 +84,7 @@ def create_optimizer(
     warmup_proportion,
     optimizer_epsilon=1e-8,
     optimizer_type="adam",
+    optimizer_state_dtype="float32",
     verbose=False,
 ):
     return create_optimizer_from_params(
@@ -81,6 +95,7 @@ def create_optimizer(
         warmup_proportion=warmup_proportion,
         optimizer_epsilon=optimizer_epsilon,
         optimizer_type=optimizer_type,
+        optimizer_state_dtype=optimizer_state_dtype,
         verbose=verbose,
     )
 
@@ -93,8 +108,29 @@ def create_optimizer_from_params(
     warmup_proportion,
     optimizer_epsilon=1e-8,
     optimizer_type="adam",
+    optimizer_state_dtype="float32",
     verbose=False,
 ):
+    """Create optimizer and linear warmup schedule.
+
+    Optimizer types:
+        adam: transformers.AdamW
+        radam: RAdam
+        adam_foreach: AdamW (as transformers.AdamW) with multi-tensor (foreach) updates
+        radam_foreach: RAdam with multi-tensor (foreach) updates
+        adam_fused: torch.optim.AdamW with fused updates (requires a recent version of PyTorch;
+            weight decay is applied before rather than after the update, and eps is added to the
+            bias-corrected second moment)
+
+    optimizer_state_dtype (e.g. "bfloat16") sets the dtype of optimizer moments, for the foreach
+    optimizer types only. Updates are still computed in float32.
+    """
+    state_dtype = getattr(torch, optimizer_state_dtype)
+    if state_dtype != torch.float32 and optimizer_type not in ("adam_foreach", "radam_foreach"):
+        raise RuntimeError(
+            f"optimizer_state_dtype={optimizer_state_dtype} requires a foreach optimizer_type"
+        )
+
     # Prepare optimizer
     no_decay = [
         "bias",
@@ -139,6 +175,30 @@ def create_optimizer_from_params(
         if verbose:
             print("Using RAdam")
         optimizer = RAdam(optimizer_grouped_parameters, lr=learning_rate, eps=optimizer_epsilon)
+    elif optimizer_type == "adam_foreach":
+        if verbose:
+            print("Using AdamW (foreach)")
+        optimizer = ForeachAdamW(
+            optimizer_grouped_parameters,
+            lr=learning_rate,
+            eps=optimizer_epsilon,
+            state_dtype=state_dtype,
+        )
+    elif optimizer_type == "radam_foreach":
+        if verbose:
+            print("Using RAdam (foreach)")
+        optimizer = ForeachRAdam(
+            optimizer_grouped_parameters,
+            lr=learning_rate,
+            eps=optimizer_epsilon,
+            state_dtype=state_dtype,
+        )
+    elif optimizer_type == "adam_fused":
+        if verbose:
+            print("Using AdamW (fused)")
+        optimizer = torch.optim.AdamW(
+            optimizer_grouped_parameters, lr=learning_rate, eps=optimizer_epsilon, fused=True
+        )
     else:
         raise KeyError(optimizer_type)
 
@@ -152,6 +212,33 @@ def create_optimizer_from_params(
     return optimizer_scheduler
 
 
+def get_optimizer_state_memory(optimizer) -> list:
+    """Get the memory used by optimizer state, for each parameter group.
+
+    State is created lazily by most optimizers, so this is best called after the first step.
+
+    Returns:
+        list of dicts (one per parameter group) with the number of parameters, the number of
+            state tensors, and the memory used by state tensors (MB)
+    """
+    group_memory_list = []
+    for group in optimizer.param_groups:
+        num_state_tensors, state_bytes = 0, 0
+        for p in group["params"]:
+            for v in optimizer.state.get(p, {}).values():
+                if torch.is_tensor(v) and v.dim() > 0:
+                    num_state_tensors += 1
+                    state_bytes += v.numel() * v.element_size()
+        group_memory_list.append(
+            {
+                "num_params": sum(p.numel() for p in group["params"]),
+                "num_state_tensors": num_state_tensors,
+                "state_memory_mb": state_bytes / 1024 ** 2,
+            }
+        )
+    return group_memory_list
+
+
 def resolve_warmup_steps(t_total, warmup_steps, warmup_proportion):
     if warmup_steps is None and warmup_proportion is None:
         raise RuntimeError()
@@ -182,8 +269,14 @@ def parallelize_gpu(model):
 
 
 def parallelize_dist(model, local_rank):
+    """Wrap model in DistributedDataParallel, on GPU local_rank, or on CPU for CPU models.
+
+    Each step only uses the taskmodel of the sampled task, so unused parameters are allowed.
+    """
+    if next(model.parameters()).device.type == "cpu":
+        return torch.nn.parallel.DistributedDataParallel(model, find_unused_parameters=True)
     return torch.nn.parallel.DistributedDataParallel(
-        model, device_ids=[local_rank], output_device=local_rank,
+        model, device_ids=[local_rank], output_device=local_rank, find_unused_parameters=True,
     )
 
 
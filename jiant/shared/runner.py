@@ -1,21 +1,33 @@
 import os
+from typing import Optional
 
 import torch
 import torch.nn as nn
 
 import jiant.shared.caching as caching
+from jiant.shared.mixed_precision import MixedPrecision
 import jiant.utils.python.io as py_io
 import jiant.utils.torch_utils as torch_utils
 
 
 def complex_backpropagate(
-    loss, optimizer, model, fp16, n_gpu, gradient_accumulation_steps, max_grad_norm
+    loss,
+    optimizer,
+    model,
+    fp16,
+    n_gpu,
+    gradient_accumulation_steps,
+    max_grad_norm,
+    mixed_precision: Optional[MixedPrecision] = None,
 ):
     if n_gpu > 1:
         loss = loss.mean()  # mean() to average on multi-gpu.
     if gradient_accumulation_steps > 1:
         loss = loss / gradient_accumulation_steps
-    if fp16:
+    if mixed_precision is not None and mixed_precision.grad_scaler is not None:
+        # Gradients are unscaled and clipped in mixed_precision.step()
+        mixed_precision.backward(loss)
+    elif fp16:
         # noinspection PyUnresolvedReferences,PyPackageRequirements
         from apex import amp
 
@@ -29,10 +41,16 @@ def complex_backpropagate(
 
 
 def get_train_dataloader_from_cache(
-    train_cache: caching.ChunkedFilesDataCache, task, train_batch_size: int
+    train_cache: caching.ChunkedFilesDataCache,
+    task,
+    train_batch_size: int,
+    num_shards: int = 1,
+    shard_index: int = 0,
 ):
     # TODO: Expose buffer_size parameter  (issue #1183)
-    dataset = train_cache.get_iterable_dataset(buffer_size=10000, shuffle=True)
+    dataset = train_cache.get_iterable_dataset(
+        buffer_size=10000, shuffle=True, num_shards=num_shards, shard_index=shard_index,
+    )
     train_dataloader = torch_utils.DataLoaderWithLength(
         dataset=dataset, batch_size=train_batch_size, collate_fn=task.collate_fn,
     )
@@ -45,9 +63,16 @@ def get_eval_dataloader_from_cache(
     eval_batch_size: int,
     subset_num=None,
     explicit_subset=None,
+    num_shards: int = 1,
+    shard_index: int = 0,
 ):
     dataset = eval_cache.get_iterable_dataset(
-        buffer_size=10000, shuffle=False, subset_num=subset_num, explicit_subset=explicit_subset,
+        buffer_size=10000,
+        shuffle=False,
+        subset_num=subset_num,
+        explicit_subset=explicit_subset,
+        num_shards=num_shards,
+        shard_index=shard_index,
     )
     eval_dataloader = torch_utils.DataLoaderWithLength(
         dataset=dataset, batch_size=eval_batch_size, collate_fn=task.collate_fn,
@@ -57,8 +82,7 @@ def get_eval_dataloader_from_cache(
 
 def save_model_with_metadata(model: nn.Module, metadata: dict, output_dir: str, file_name="model"):
     torch.save(
-        torch_utils.get_model_for_saving(model).state_dict(),
-        os.path.join(output_dir, f"{file_name}.p"),
+        torch_utils.get_state_dict_for_saving(model), os.path.join(output_dir, f"{file_name}.p"),
     )
     py_io.write_json(metadata, os.path.join(output_dir, f"{file_name}.metadata.json"))
 
@@ -0,0 +1,92 @@
+"""Tokenizers with trimmed vocabularies (see: jiant.proj.main.trim_vocab).
+
+A trimmed vocabulary keeps a subset of the token ids of a tokenizer (kept_token_ids), renumbered
+in order. Rather than rewriting the tokenizer's own vocabulary files (which is not possible in
+general, e.g. for sentencepiece models), the kept token ids are stored alongside the tokenizer
+files, and token ids are remapped when the tokenizer is loaded (see: model_setup.get_tokenizer).
+Tokens outside the trimmed vocabulary are mapped to the unknown token.
+"""
+import os
+from typing import List
+
+import jiant.utils.python.io as py_io
+
+TRIMMED_VOCAB_FILE_NAME = "trimmed_vocab.json"
+
+
+class TrimmedVocabTokenizerMixin:
+    kept_token_ids: List[int]
+
+    @property
+    def vocab_size(self):
+        return len(self.kept_token_ids)
+
+    def _convert_token_to_id(self, token):
+        token_id = super()._convert_token_to_id(token)
+        if token_id not in self.new_token_ids:
+            token_id = super()._convert_token_to_id(self.unk_token)
+        return self.new_token_ids[token_id]
+
+    def _convert_id_to_token(self, index):
+        return super()._convert_id_to_token(self.kept_token_ids[index])
+
+    def get_vocab(self):
+        return {self._convert_id_to_token(i): i for i in range(self.vocab_size)}
+
+    def save_pretrained(self, save_directory):
+        saved_files = super().save_pretrained(save_directory)
+        write_kept_token_ids(self.kept_token_ids, save_directory)
+        return saved_files
+
+
+_trimmed_vocab_classes = {}
+
+
+def trim_tokenizer_vocab(tokenizer, kept_token_ids: List[int]):
+    """Restrict a (slow) tokenizer to a trimmed vocabulary (in-place).
+
+    Args:
+        tokenizer: tokenizer with its original vocabulary.
+        kept_token_ids: original token ids to keep, in the order of the new token ids.
+
+    Returns:
+        tokenizer
+
+    """
+    if getattr(tokenizer, "is_fast", False):
+        raise RuntimeError("Trimmed vocabularies are not supported for fast tokenizers")
+    if tokenizer.added_tokens_encoder:
+        raise RuntimeError("Trimmed vocabularies are not supported with added tokens")
+    cls = type(tokenizer)
+    if cls not in _trimmed_vocab_classes:
+        _trimmed_vocab_classes[cls] = type(
+            f"TrimmedVocab{cls.__name__}", (TrimmedVocabTokenizerMixin, cls), {}
+        )
+    tokenizer.__class__ = _trimmed_vocab_classes[cls]
+    tokenizer.kept_token_ids = list(kept_token_ids)
+    tokenizer.new_token_ids = {
+        token_id: new_token_id for new_token_id, token_id in enumerate(kept_token_ids)
+    }
+    return tokenizer
+
+
+def get_original_token_ids(tokenizer, token_ids: List[int]) -> List[int]:
+    """Map token ids of a tokenizer to ids in its original vocabulary (if trimmed)"""
+    if isinstance(tokenizer, TrimmedVocabTokenizerMixin):
+        return [tokenizer.kept_token_ids[i] for i in token_ids]
+    return list(token_ids)
+
+
+def write_kept_token_ids(kept_token_ids: List[int], tokenizer_path: str):
+    py_io.write_json(
+        {"kept_token_ids": list(kept_token_ids)},
+        os.path.join(tokenizer_path, TRIMMED_VOCAB_FILE_NAME),
+    )
+
+
+def read_kept_token_ids(tokenizer_path: str):
+    """Read the kept token ids of a trimmed vocabulary, or None if the vocabulary is not trimmed"""
+    path = os.path.join(tokenizer_path, TRIMMED_VOCAB_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    return py_io.read_json(path)["kept_token_ids"]
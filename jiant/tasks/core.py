@@ -1,11 +1,12 @@
 import numpy as np
-from typing import NamedTuple, Mapping, Dict
+from typing import NamedTuple, Mapping, Dict, Iterator
 from enum import Enum
 from dataclasses import dataclass
 
 import torch
 import torch.utils.data.dataloader as dataloader
 
+from jiant.shared.constants import PHASE
 from jiant.utils.python.datastructures import ExtendedDataClassMixin, combine_dicts
 
 
@@ -60,18 +61,24 @@ class BatchMixin(ExtendedDataClassMixin):
         return len(getattr(self, self.get_fields()[0]))
 
 
+# Examples, TokenizedExamples and DataRows are created in large numbers, and are slotted (see:
+#   add_slots), so their base classes define empty __slots__
 class BaseExample(ExtendedDataClassMixin):
+    __slots__ = ()
+
     def tokenize(self, tokenizer):
         raise NotImplementedError
 
 
 class BaseTokenizedExample(ExtendedDataClassMixin):
+    __slots__ = ()
+
     def featurize(self, tokenizer, feat_spec: FeaturizationSpec):
         raise NotImplementedError
 
 
 class BaseDataRow(ExtendedDataClassMixin):
-    pass
+    __slots__ = ()
 
 
 class BaseBatch(BatchMixin, ExtendedDataClassMixin):
@@ -149,6 +156,26 @@ class Task:
     def test_path(self):
         return self.path_dict["test"]
 
+    def get_examples(self, phase: str):
+        """Get the examples for a phase, as a list or a re-iterable generator of Examples"""
+        if phase == PHASE.TRAIN:
+            return self.get_train_examples()
+        elif phase == PHASE.VAL:
+            return self.get_val_examples()
+        elif phase == PHASE.TEST:
+            return self.get_test_examples()
+        else:
+            raise KeyError(phase)
+
+    def iter_examples(self, phase: str) -> Iterator:
+        """Lazily iterate over the examples for a phase, in order.
+
+        Tasks whose get_*_examples return generators (e.g. through read_examples_lazily) are
+        streamed without materializing their examples. Otherwise, falls back to iterating over
+        the list of examples.
+        """
+        yield from self.get_examples(phase)
+
     @classmethod
     def collate_fn(cls, batch):
         # cls.collate_fn
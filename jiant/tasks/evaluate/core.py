@@ -8,8 +8,9 @@ import seqeval.metrics as seqeval_metrics
 import torch
 from sklearn.metrics import f1_score, matthews_corrcoef
 from scipy.stats import pearsonr, spearmanr
-from typing import Dict, List
+from typing import Dict, List, Optional
 
+import jiant.shared.embedding_store as embedding_store
 import jiant.shared.model_resolution as model_resolution
 import jiant.tasks as tasks
 import jiant.tasks.lib.templates.squad_style.core as squad_style
@@ -18,9 +19,10 @@ import jiant.tasks.lib.mlqa as mlqa_lib
 import jiant.tasks.lib.bucc2018 as bucc2018_lib
 import jiant.tasks.lib.tatoeba as tatoeba_lib
 from jiant.tasks.lib.templates import mlm as mlm_template
+from jiant.utils.knn import KNNConfig
 from jiant.utils.python.datastructures import ExtendedDataClassMixin
 from jiant.utils.python.io import read_json
-from jiant.utils.string_comparing import string_f1_score, exact_match_score
+from jiant.utils.string_comparing import compute_em_and_f1
 
 
 @dataclass
@@ -43,8 +45,27 @@ class BaseAccumulator:
     def get_accumulated(self):
         raise NotImplementedError()
 
+    def get_gather_state(self):
+        """Get the (picklable) state of the accumulator, to be gathered to another process.
+
+        In distributed evaluation, each process accumulates a contiguous shard of the data, and
+        the states of all processes are merged, in order, into that of the main process (see:
+        extend_from_gather_state).
+        """
+        return vars(self)
+
+    def extend_from_gather_state(self, state):
+        """Append the accumulated data of another accumulator, from its get_gather_state()"""
+        for k, v in state.items():
+            getattr(self, k).extend(v)
+
 
 class BaseEvaluationScheme:
+    # Whether get_labels_from_cache_and_examples can be applied to consecutive chunks of the
+    #   data (and their examples), with the labels concatenated, so that labels can be extracted
+    #   while the data is being cached (see: preprocessing.StreamingLabelsRecorder)
+    SUPPORTS_STREAMING_LABELS = True
+
     def get_accumulator(self) -> BaseAccumulator:
         raise NotImplementedError()
 
@@ -63,6 +84,19 @@ class BaseEvaluationScheme:
     ) -> Metrics:
         raise NotImplementedError()
 
+    def get_labels_subset(self, labels, cache, subset_num: int):
+        """Get the labels of the first subset_num rows of a cache (e.g. for subset validation).
+
+        Args:
+            labels: labels of all rows, from get_labels_from_cache_and_examples
+            cache: cache of DataRows the labels were extracted from
+            subset_num: number of rows
+
+        Returns:
+            labels of the first subset_num rows
+        """
+        return labels[:subset_num]
+
 
 class ConcatenateLogitsAccumulator(BaseAccumulator):
     def __init__(self):
@@ -86,6 +120,30 @@ class ConcatenateLogitsAccumulator(BaseAccumulator):
         return all_logits
 
 
+class ConcatenateSpanLogitsAccumulator(ConcatenateLogitsAccumulator):
+    """ConcatenateLogitsAccumulator, which also handles grouped span queries.
+
+    Batches of grouped span queries have logits of shape (batch_size, num_queries, num_labels),
+    padded along num_queries. These are flattened back to one row of logits (and one guid)
+    per span query, in the same layout as ungrouped span queries.
+    """
+
+    def update(self, batch_logits, batch_loss, batch, batch_metadata):
+        if not hasattr(batch, "span_mask"):
+            super().update(
+                batch_logits=batch_logits,
+                batch_loss=batch_loss,
+                batch=batch,
+                batch_metadata=batch_metadata,
+            )
+            return
+        query_mask = batch.span_mask.cpu().numpy().astype(bool)
+        self.logits_list.append(batch_logits[query_mask])
+        self.guid_list.append(
+            np.array([guid for span_guids in batch_metadata["span_guids"] for guid in span_guids])
+        )
+
+
 class ConcatenateLossAccumulator(BaseAccumulator):
     def __init__(self):
         self.loss_list = []
@@ -133,8 +191,11 @@ class SpanPredictionF1andEMScheme(BaseEvaluationScheme):
 
     @classmethod
     def compute_metrics_from_preds_and_labels(cls, preds, labels):
-        em = sum([exact_match_score(s1, s2) for s1, s2 in zip(preds, labels)]) / len(labels)
-        f1 = sum([string_f1_score(s1, s2) for s1, s2 in zip(preds, labels)]) / len(labels)
+        em_ls, f1_ls = compute_em_and_f1(
+            predictions=preds, ground_truths_list=[[label] for label in labels]
+        )
+        em = sum(em_ls) / len(labels)
+        f1 = sum(f1_ls) / len(labels)
         scores = {"f1": f1, "em": em, "avg": (f1 + em) / 2}
         return Metrics(major=scores["avg"], minor=scores)
 
@@ -184,49 +245,76 @@ class MLMPremaskedAccumulator(BaseAccumulator):
 
 
 class TatoebaAccumulator(BaseAccumulator):
-    def __init__(self):
-        self.embeddings_list = []
-        self.is_english_list = []
+    def __init__(self, embedding_store_dir=None, dtype="float32"):
+        # Embeddings are streamed to a disk-backed store rather than kept in memory
+        self.embedding_store = embedding_store.EmbeddingStore(
+            dtype=dtype, temp_dir=embedding_store_dir
+        )
 
     def update(self, batch_logits, batch_loss, batch, batch_metadata):
-        self.embeddings_list.append(batch_logits)
-        self.is_english_list.append(batch.is_english.cpu().numpy())
+        self.embedding_store.add(batch_logits, is_english=batch.is_english.cpu().numpy())
 
     @classmethod
     def get_guids(cls):
         return None
 
     def get_accumulated(self):
-        all_embeddings = np.concatenate(self.embeddings_list)
-        is_english_arr = np.concatenate(self.is_english_list).astype(bool)
+        all_embeddings, side_data = self.embedding_store.get_data()
+        is_english_arr = side_data["is_english"].astype(bool)
         return all_embeddings, is_english_arr
 
+    def get_gather_state(self):
+        return get_embedding_store_gather_state(self.embedding_store)
+
+    def extend_from_gather_state(self, state):
+        extend_embedding_store_from_gather_state(self.embedding_store, state)
+
 
 class Bucc2018Accumulator(BaseAccumulator):
-    def __init__(self):
-        self.embeddings_list = []
-        self.is_english_list = []
-        self.text_hash_list = []
-        self.guid_list = []
+    def __init__(self, embedding_store_dir=None, dtype="float32"):
+        # Embeddings are streamed to a disk-backed store rather than kept in memory
+        self.embedding_store = embedding_store.EmbeddingStore(
+            dtype=dtype, temp_dir=embedding_store_dir
+        )
 
     def update(self, batch_logits, batch_loss, batch, batch_metadata):
-        self.embeddings_list.append(batch_logits)
-        self.is_english_list.append(batch.is_english.cpu().numpy())
-        self.text_hash_list += batch.text_hash
-        self.guid_list += batch.guid
+        self.embedding_store.add(
+            batch_logits,
+            is_english=batch.is_english.cpu().numpy(),
+            text_hash=batch.text_hash,
+            guid=batch.guid,
+        )
 
     @classmethod
     def get_guids(cls):
         return None
 
     def get_accumulated(self):
+        all_embeddings, side_data = self.embedding_store.get_data()
         return {
-            "all_embeddings": np.concatenate(self.embeddings_list),
-            "is_english_arr": np.concatenate(self.is_english_list).astype(bool),
-            "text_hash_list": self.text_hash_list,
-            "guid_list": self.guid_list,
+            "all_embeddings": all_embeddings,
+            "is_english_arr": side_data["is_english"].astype(bool),
+            "text_hash_list": list(side_data["text_hash"]),
+            "guid_list": list(side_data["guid"]),
         }
 
+    def get_gather_state(self):
+        return get_embedding_store_gather_state(self.embedding_store)
+
+    def extend_from_gather_state(self, state):
+        extend_embedding_store_from_gather_state(self.embedding_store, state)
+
+
+def get_embedding_store_gather_state(store: embedding_store.EmbeddingStore):
+    # Embeddings are read into memory, to be sent to the main process
+    all_embeddings, side_data = store.get_data()
+    return {"embeddings": np.asarray(all_embeddings), "side_data": side_data}
+
+
+def extend_embedding_store_from_gather_state(store: embedding_store.EmbeddingStore, state):
+    if len(state["embeddings"]):
+        store.add(state["embeddings"], **state["side_data"])
+
 
 class BaseLogitsEvaluationScheme(BaseEvaluationScheme):
     def get_accumulator(self):
@@ -262,6 +350,9 @@ class SimpleAccuracyEvaluationScheme(BaseLogitsEvaluationScheme):
 
 
 class MultiLabelAccAndF1EvaluationScheme(BaseLogitsEvaluationScheme):
+    def get_accumulator(self):
+        return ConcatenateSpanLogitsAccumulator()
+
     def get_labels_from_cache_and_examples(self, task, cache, examples):
         return get_multi_label_ids_from_cache(cache=cache)
 
@@ -269,6 +360,17 @@ class MultiLabelAccAndF1EvaluationScheme(BaseLogitsEvaluationScheme):
         logits = accumulator.get_accumulated()
         return (logits > 0.5).astype(int)
 
+    def get_labels_subset(self, labels, cache, subset_num: int):
+        # Labels of grouped span queries are flattened (see: get_multi_label_ids_from_cache), so
+        #   the first subset_num rows have as many labels as span queries
+        if subset_num is None:
+            return labels
+        num_labels = 0
+        for datum, _ in zip(cache.iter_all(), range(subset_num)):
+            label_ids = get_label_ids_from_data_row(data_row=datum["data_row"])
+            num_labels += len(label_ids) if label_ids.ndim == 2 else 1
+        return labels[:num_labels]
+
     @classmethod
     def compute_metrics_from_preds_and_labels(cls, preds, labels):
         # noinspection PyUnresolvedReferences
@@ -423,11 +525,7 @@ class MultiRCEvaluationScheme(BaseEvaluationScheme):
         assert "question_ids" in df.columns
         df["preds"] = preds
         # noinspection PyUnresolvedReferences
-        exact_match = (
-            df.groupby("question_ids")
-            .apply(lambda _: (_["preds"] == _["label_values"]).all())
-            .mean()
-        )
+        exact_match = (df["preds"] == df["label_values"]).groupby(df["question_ids"]).all().mean()
         exact_match = float(exact_match)
         f1 = f1_score(y_true=df["label_values"], y_pred=df["preds"])
         return Metrics(major=mean(exact_match, f1), minor={"em": exact_match, "f1": f1},)
@@ -493,8 +591,6 @@ class ReCordEvaluationScheme(BaseEvaluationScheme):
 
     @classmethod
     def compute_preds_and_metrics(cls, task, accumulator):
-        f1_ls = []
-        em_ls = []
         predictions_dict = {}
 
         preds = cls.get_preds_from_accumulator(task, accumulator)
@@ -513,16 +609,10 @@ class ReCordEvaluationScheme(BaseEvaluationScheme):
             else:
                 gold_labels[question_id] = gold_label_set
 
-        for pred, gold_label_set in zip(preds, gold_labels.values()):
-            pred_ans = pred["label"]
-
-            # F1
-            f1 = cls.metric_max_over_ground_truths(string_f1_score, pred_ans, gold_label_set)
-            f1_ls.append(f1)
-
-            # EM
-            em = cls.metric_max_over_ground_truths(exact_match_score, pred_ans, gold_label_set)
-            em_ls.append(em)
+        em_ls, f1_ls = compute_em_and_f1(
+            predictions=[pred["label"] for pred in preds],
+            ground_truths_list=list(gold_labels.values()),
+        )
 
         em = sum(em_ls) / len(em_ls)
         f1 = sum(f1_ls) / len(f1_ls)
@@ -763,6 +853,8 @@ class MLQAEvaluationScheme(SQuADEvaluationScheme):
 
 
 class MLMEvaluationScheme(BaseEvaluationScheme):
+    SUPPORTS_STREAMING_LABELS = False
+
     @classmethod
     def get_accumulator(cls) -> BaseAccumulator:
         return ConcatenateLossAccumulator()
@@ -788,6 +880,8 @@ class MLMEvaluationScheme(BaseEvaluationScheme):
 
 
 class MLMPremaskedEvaluationScheme(MLMEvaluationScheme):
+    SUPPORTS_STREAMING_LABELS = True
+
     @classmethod
     def get_accumulator(cls) -> BaseAccumulator:
         return MLMPremaskedAccumulator()
@@ -820,21 +914,37 @@ class MLMPremaskedEvaluationScheme(MLMEvaluationScheme):
 
 
 class TatoebaEvaluationScheme(BaseEvaluationScheme):
+    SUPPORTS_STREAMING_LABELS = False
+
+    def __init__(self, knn_config: Optional[KNNConfig] = None, embedding_store_dir=None):
+        """
+        Args:
+            knn_config: configures the nearest-neighbour search backend and its memory budget.
+                Embeddings are stored with dtype knn_config.storage_dtype, if set.
+            embedding_store_dir: directory under which to store embeddings (default: temp dir)
+        """
+        self.knn_config = knn_config
+        self.embedding_store_dir = embedding_store_dir
+
     def get_accumulator(self):
-        return TatoebaAccumulator()
+        return TatoebaAccumulator(
+            embedding_store_dir=self.embedding_store_dir,
+            dtype=get_embedding_storage_dtype(self.knn_config),
+        )
 
     def get_labels_from_cache_and_examples(self, task, cache, examples):
         return task.get_val_labels()
 
     def get_preds_from_accumulator(self, task, accumulator):
         all_embeddings, is_english_arr = accumulator.get_accumulated()
-        other_lang_embeddings = all_embeddings[~is_english_arr]
-        eng_embeddings = all_embeddings[is_english_arr]
+        other_lang_embeddings = embedding_store.select_rows(all_embeddings, ~is_english_arr)
+        eng_embeddings = embedding_store.select_rows(all_embeddings, is_english_arr)
         predictions = tatoeba_lib.similarity_search(
             x=other_lang_embeddings,
             y=eng_embeddings,
             dim=other_lang_embeddings.shape[-1],
             normalize=True,
+            knn_config=self.knn_config,
         ).flatten()
         return predictions
 
@@ -852,20 +962,37 @@ class TatoebaEvaluationScheme(BaseEvaluationScheme):
 
 
 class Bucc2018EvaluationScheme(BaseEvaluationScheme):
+    SUPPORTS_STREAMING_LABELS = False
+
+    def __init__(self, knn_config: Optional[KNNConfig] = None, embedding_store_dir=None):
+        """
+        Args:
+            knn_config: configures the nearest-neighbour search backend and its memory budget.
+                Set knn_config.ann_type to mine with approximate nearest-neighbour search, in
+                which case the recall of the approximate search is added to the metrics.
+                Embeddings are stored with dtype knn_config.storage_dtype, if set.
+            embedding_store_dir: directory under which to store embeddings (default: temp dir)
+        """
+        self.knn_config = knn_config
+        self.embedding_store_dir = embedding_store_dir
+
     def get_accumulator(self):
-        return Bucc2018Accumulator()
+        return Bucc2018Accumulator(
+            embedding_store_dir=self.embedding_store_dir,
+            dtype=get_embedding_storage_dtype(self.knn_config),
+        )
 
     def get_labels_from_cache_and_examples(self, task, cache, examples):
         return task.get_val_labels()
 
-    def get_preds_from_accumulator(self, task, accumulator, threshold=0):
+    def get_preds_from_accumulator(self, task, accumulator, threshold=0, ann_recall_reports=None):
         accumulated = accumulator.get_accumulated()
         is_english_arr = accumulated["is_english_arr"]
         all_embeddings = accumulated["all_embeddings"]
         guids = accumulated["guid_list"]
         text_hash_list = accumulated["text_hash_list"]
-        other_lang_embeddings = all_embeddings[~is_english_arr]
-        eng_embeddings = all_embeddings[is_english_arr]
+        other_lang_embeddings = embedding_store.select_rows(all_embeddings, ~is_english_arr)
+        eng_embeddings = embedding_store.select_rows(all_embeddings, is_english_arr)
         english_guids = [x.split("-", 1)[1] for x in np.array(guids)[is_english_arr]]
         other_guids = [x.split("-", 1)[1] for x in np.array(guids)[~is_english_arr]]
 
@@ -886,6 +1013,8 @@ class Bucc2018EvaluationScheme(BaseEvaluationScheme):
             trg_inds=trg_inds,
             threshold=threshold,
             use_gpu=torch.cuda.is_available(),
+            knn_config=self.knn_config,
+            ann_recall_reports=ann_recall_reports,
         )
         # Note: Setting thresholds only available in test script
         candidates2score = {}
@@ -897,8 +1026,14 @@ class Bucc2018EvaluationScheme(BaseEvaluationScheme):
     def compute_metrics_from_accumulator(
         self, task, accumulator: ConcatenateLogitsAccumulator, tokenizer, labels: list
     ) -> Metrics:
-        preds = self.get_preds_from_accumulator(task=task, accumulator=accumulator)
-        return self.compute_metrics_from_preds_and_labels(preds=preds, labels=labels,)
+        ann_recall_reports = []
+        preds = self.get_preds_from_accumulator(
+            task=task, accumulator=accumulator, ann_recall_reports=ann_recall_reports
+        )
+        metrics = self.compute_metrics_from_preds_and_labels(preds=preds, labels=labels,)
+        for direction, report in zip(["fwd", "bwd"], ann_recall_reports):
+            metrics.minor["ann_recall_" + direction] = report["recall"]
+        return metrics
 
     @classmethod
     def compute_metrics_from_preds_and_labels(cls, preds, labels):
@@ -907,6 +1042,12 @@ class Bucc2018EvaluationScheme(BaseEvaluationScheme):
         return Metrics(major=result["F1"], minor=result,)
 
 
+def get_embedding_storage_dtype(knn_config: Optional[KNNConfig] = None):
+    if knn_config is None or knn_config.storage_dtype is None:
+        return "float32"
+    return knn_config.storage_dtype
+
+
 def get_evaluation_scheme_for_task(task) -> BaseEvaluationScheme:
     # TODO: move logic to task?  (issue #1182)
     if isinstance(
@@ -993,9 +1134,13 @@ def get_evaluation_scheme_for_task(task) -> BaseEvaluationScheme:
     elif isinstance(task, (tasks.UdposTask, tasks.PanxTask)):
         return F1TaggingEvaluationScheme()
     elif isinstance(task, tasks.Bucc2018Task):
-        return Bucc2018EvaluationScheme()
+        return Bucc2018EvaluationScheme(
+            knn_config=task.knn_config, embedding_store_dir=task.embedding_store_dir
+        )
     elif isinstance(task, tasks.TatoebaTask):
-        return TatoebaEvaluationScheme()
+        return TatoebaEvaluationScheme(
+            knn_config=task.knn_config, embedding_store_dir=task.embedding_store_dir
+        )
     else:
         raise KeyError(task)
 
@@ -1009,9 +1154,13 @@ def get_label_ids_from_data_row(data_row):
 
 
 def get_multi_label_ids_from_cache(cache):
-    return np.array(
-        [get_label_ids_from_data_row(data_row=datum["data_row"]) for datum in cache.iter_all()]
-    )
+    label_ids_list = [
+        get_label_ids_from_data_row(data_row=datum["data_row"]) for datum in cache.iter_all()
+    ]
+    if label_ids_list and label_ids_list[0].ndim == 2:
+        # Grouped span queries: flatten to one row of label_ids per span query
+        return np.concatenate(label_ids_list)
+    return np.array(label_ids_list)
 
 
 def get_label_id_from_data_row(data_row):
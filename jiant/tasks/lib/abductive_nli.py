@@ -18,8 +18,10 @@ from jiant.tasks.lib.templates.shared import (
 )
 from jiant.tasks.utils import truncate_sequences
 from jiant.utils.python.io import read_json_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -40,6 +42,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -143,6 +146,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -13,8 +13,10 @@ from jiant.tasks.core import (
     TaskTypes,
 )
 from jiant.tasks.lib.templates.shared import single_sentence_featurize, labels_to_bimap
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -29,6 +31,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -46,6 +49,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -13,8 +13,10 @@ from jiant.tasks.core import (
 )
 from jiant.tasks.lib.templates.shared import double_sentence_featurize, labels_to_bimap
 from jiant.utils.python.io import read_json_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -31,6 +33,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -50,6 +53,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -3,8 +3,10 @@ from dataclasses import dataclass
 from jiant.tasks.lib.templates.shared import labels_to_bimap
 from jiant.tasks.lib.templates import multiple_choice as mc_template
 from jiant.utils.python.io import read_json_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(mc_template.Example):
     @property
@@ -12,11 +14,13 @@ class Example(mc_template.Example):
         return ArcEasyTask
 
 
+@add_slots
 @dataclass
 class TokenizedExample(mc_template.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(mc_template.DataRow):
     pass
@@ -4,8 +4,10 @@ import pandas as pd
 
 from jiant.tasks.lib.templates.shared import labels_to_bimap
 from jiant.tasks.lib.templates import multiple_choice as mc_template
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(mc_template.Example):
     @property
@@ -13,11 +15,13 @@ class Example(mc_template.Example):
         return ArctTask
 
 
+@add_slots
 @dataclass
 class TokenizedExample(mc_template.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(mc_template.DataRow):
     pass
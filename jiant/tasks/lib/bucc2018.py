@@ -2,7 +2,7 @@ import hashlib
 import numpy as np
 import torch
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 from jiant.tasks.core import (
     BaseExample,
@@ -16,9 +16,13 @@ from jiant.tasks.lib.templates.shared import (
     construct_single_input_tokens_and_segment_ids,
     create_input_set_from_tokens_and_segments,
 )
+import jiant.utils.knn as knn_lib
+from jiant.utils.knn import KNNConfig
 from jiant.utils.python.io import read_file, read_file_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -35,6 +39,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -63,6 +68,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -93,9 +99,30 @@ class Bucc2018Task(Task):
 
     TASK_TYPE = TaskTypes.EMBEDDING
 
-    def __init__(self, name, path_dict, language):
+    def __init__(
+        self,
+        name,
+        path_dict,
+        language,
+        knn_config: Optional[dict] = None,
+        embedding_store_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            name: task name
+            path_dict: paths to task data
+            language: language paired with English
+            knn_config: KNNConfig fields (e.g. from the "kwargs" of the task config), configuring
+                the nearest-neighbour search used in evaluation (see: jiant.utils.knn). Set
+                ann_type ("ivf" or "hnsw") and its ivf_*/hnsw_* fields to mine bitext with
+                approximate search.
+            embedding_store_dir: directory under which embeddings are stored in evaluation
+                (default: a temp dir, which may be in memory on some systems)
+        """
         super().__init__(name=name, path_dict=path_dict)
         self.language = language
+        self.knn_config = KNNConfig(**knn_config) if knn_config is not None else None
+        self.embedding_store_dir = embedding_store_dir
 
     def get_train_examples(self):
         raise RuntimeError("This task does not support train examples")
@@ -148,11 +175,17 @@ def mine_bitext(
     use_gpu=False,
     dist="cosine",
     use_shift_embeds=False,
+    knn_config: Optional[KNNConfig] = None,
+    ann_recall_reports: Optional[list] = None,
 ):
+    """Mine bitext pairs from source/target embeddings, with margin-based scoring.
+
+    Nearest neighbours are searched exactly, or approximately if knn_config.ann_type is set.
+    In the latter case, if ann_recall_reports is a list, a recall-vs-exact report (see
+    jiant.utils.knn.ANNIndex.recall_report) is appended to it for each search direction.
+    """
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    import faiss
-
     src_orig_inds = np.arange(len(x))
     trg_orig_inds = np.arange(len(y))
     out_ls = []
@@ -160,8 +193,8 @@ def mine_bitext(
     x = unique_embeddings(x, src_inds)
     y = unique_embeddings(y, trg_inds)
     if dist == "cosine":
-        faiss.normalize_L2(x)
-        faiss.normalize_L2(y)
+        knn_lib.l2_normalize_(x)
+        knn_lib.l2_normalize_(y)
 
     if use_shift_embeds:
         x2y, y2x = shift_embeddings(x, y)
@@ -170,18 +203,26 @@ def mine_bitext(
     if retrieval != "bwd":
         if use_shift_embeds:
             # project x to y space, and search k-nn ys for each x
-            x2y_sim, x2y_ind = knn(x2y, y, min(y.shape[0], neighborhood), use_gpu, dist)
+            x2y_sim, x2y_ind = knn(
+                x2y, y, min(y.shape[0], neighborhood), use_gpu, dist, knn_config, ann_recall_reports
+            )
             x2y_mean = x2y_sim.mean(axis=1)
         else:
-            x2y_sim, x2y_ind = knn(x, y, min(y.shape[0], neighborhood), use_gpu, dist)
+            x2y_sim, x2y_ind = knn(
+                x, y, min(y.shape[0], neighborhood), use_gpu, dist, knn_config, ann_recall_reports
+            )
             x2y_mean = x2y_sim.mean(axis=1)
 
     if retrieval != "fwd":
         if use_shift_embeds:
-            y2x_sim, y2x_ind = knn(y2x, x, min(x.shape[0], neighborhood), use_gpu, dist)
+            y2x_sim, y2x_ind = knn(
+                y2x, x, min(x.shape[0], neighborhood), use_gpu, dist, knn_config, ann_recall_reports
+            )
             y2x_mean = y2x_sim.mean(axis=1)
         else:
-            y2x_sim, y2x_ind = knn(y, x, min(x.shape[0], neighborhood), use_gpu, dist)
+            y2x_sim, y2x_ind = knn(
+                y, x, min(x.shape[0], neighborhood), use_gpu, dist, knn_config, ann_recall_reports
+            )
             y2x_mean = y2x_sim.mean(axis=1)
 
     # margin function
@@ -203,14 +244,14 @@ def mine_bitext(
     if mode == "search":
         scores = score_candidates(x, y, x2y_ind, x2y_mean, y2x_mean, margin)
         best = x2y_ind[np.arange(x.shape[0]), scores.argmax(axis=1)]
-
-        for i in src_inds:
-            out_ls.append(trg_orig_inds[best[i]])
+        out_ls = list(trg_orig_inds[best[src_inds]])
 
     elif mode == "score":
-        for i, j in zip(src_inds, trg_inds):
-            s = score(x[i], y[j], x2y_mean[i], y2x_mean[j], margin)
-            out_ls.append((s, src_orig_inds[i], trg_orig_inds[j]))
+        src_inds, trg_inds = np.asarray(src_inds), np.asarray(trg_inds)
+        scores = score_pairs(
+            x[src_inds], y[trg_inds], x2y_mean[src_inds], y2x_mean[trg_inds], margin
+        )
+        out_ls = list(zip(scores, src_orig_inds[src_inds], trg_orig_inds[trg_inds]))
 
     elif mode == "mine":
         if use_shift_embeds:
@@ -222,15 +263,18 @@ def mine_bitext(
         fwd_best = x2y_ind[np.arange(x.shape[0]), fwd_scores.argmax(axis=1)]
         bwd_best = y2x_ind[np.arange(y.shape[0]), bwd_scores.argmax(axis=1)]
         if retrieval == "fwd":
-            for i, j in enumerate(fwd_best):
-                out_ls.append((fwd_scores[i].max(), src_orig_inds[i], trg_orig_inds[j]))
+            out_ls = list(zip(fwd_scores.max(axis=1), src_orig_inds, trg_orig_inds[fwd_best]))
         if retrieval == "bwd":
-            for j, i in enumerate(bwd_best):
-                out_ls.append((bwd_scores[j].max(), src_orig_inds[i], trg_orig_inds[j]))
+            out_ls = list(zip(bwd_scores.max(axis=1), src_orig_inds[bwd_best], trg_orig_inds))
         if retrieval == "intersect":
-            for i, j in enumerate(fwd_best):
-                if bwd_best[j] == i:
-                    out_ls.append((fwd_scores[i].max(), src_orig_inds[i], trg_orig_inds[j]))
+            (mutual,) = np.nonzero(bwd_best[fwd_best] == np.arange(x.shape[0]))
+            out_ls = list(
+                zip(
+                    fwd_scores[mutual].max(axis=1),
+                    src_orig_inds[mutual],
+                    trg_orig_inds[fwd_best[mutual]],
+                )
+            )
         if retrieval == "max":
             indices = np.stack(
                 (
@@ -241,14 +285,23 @@ def mine_bitext(
             )
             # noinspection PyArgumentList
             scores = np.concatenate((fwd_scores.max(axis=1), bwd_scores.max(axis=1)))
-            seen_src, seen_trg = set(), set()
-            for i in np.argsort(-scores):
-                src_ind, trg_ind = indices[i]
-                if src_ind not in seen_src and trg_ind not in seen_trg:
-                    seen_src.add(src_ind)
-                    seen_trg.add(trg_ind)
-                    if scores[i] > threshold:
-                        out_ls.append((scores[i], src_orig_inds[src_ind], trg_orig_inds[trg_ind]))
+            order = np.argsort(-scores)
+            accepted = order[
+                greedy_unique_pairs(
+                    src=indices[order, 0],
+                    trg=indices[order, 1],
+                    num_src=x.shape[0],
+                    num_trg=y.shape[0],
+                )
+            ]
+            accepted = accepted[scores[accepted] > threshold]
+            out_ls = list(
+                zip(
+                    scores[accepted],
+                    src_orig_inds[indices[accepted, 0]],
+                    trg_orig_inds[indices[accepted, 1]],
+                )
+            )
     return out_ls
 
 
@@ -280,40 +333,45 @@ def bucc_eval(candidates2score, gold, threshold=None):
 def bucc_optimize(candidate2score, gold):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    items = sorted(candidate2score.items(), key=lambda x: -x[1])
+    # Vectorized: precision/recall for every cut-off of the sorted candidates via cumulative sums
+    gold = set(gold)
     ngold = len(gold)
-    nextract = ncorrect = 0
-    threshold = 0
-    best_f1 = 0
-    for i in range(len(items)):
-        nextract += 1
-        if items[i][0] in gold:
-            ncorrect += 1
-        if ncorrect > 0:
-            precision = ncorrect / nextract
-            recall = ncorrect / ngold
-            f1 = 2 * precision * recall / (precision + recall)
-            if f1 > best_f1:
-                best_f1 = f1
-                threshold = (items[i][1] + items[i + 1][1]) / 2
-    return threshold
+    scores = np.fromiter(candidate2score.values(), dtype=np.float64, count=len(candidate2score))
+    is_gold = np.fromiter(
+        (candidate in gold for candidate in candidate2score),
+        dtype=bool,
+        count=len(candidate2score),
+    )
+    order = np.argsort(-scores, kind="stable")
+    scores = scores[order]
+    ncorrect = np.cumsum(is_gold[order])
+    nextract = np.arange(1, len(scores) + 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = ncorrect / nextract
+        recall = ncorrect / ngold
+        f1 = np.where(ncorrect > 0, 2 * precision * recall / (precision + recall), 0)
+    if len(f1) == 0 or f1.max() <= 0:
+        return 0
+    # First index reaching the best F1, as in the sequential scan
+    best_i = int(np.argmax(f1))
+    return (scores[best_i] + scores[best_i + 1]) / 2
 
 
 def bucc_extract(cand2score, th):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    bitexts = []
-    for (src, trg), score_ in cand2score.items():
-        if score_ >= th:
-            bitexts.append((src, trg))
-    return bitexts
+    candidates = list(cand2score)
+    scores = np.fromiter(cand2score.values(), dtype=np.float64, count=len(cand2score))
+    return [candidates[i] for i in np.nonzero(scores >= th)[0]]
 
 
 def unique_embeddings(emb, ind):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    aux = {j: i for i, j in enumerate(ind)}
-    return emb[[aux[i] for i in range(len(aux))]]
+    # For each unique index, take the embedding at its last occurrence
+    ind = np.asarray(ind)
+    _, last_from_end = np.unique(ind[::-1], return_index=True)
+    return emb[len(ind) - 1 - last_from_end]
 
 
 def shift_embeddings(x, y):
@@ -325,14 +383,24 @@ def shift_embeddings(x, y):
     return x2y, y2x
 
 
-def score_candidates(x, y, candidate_inds, fwd_mean, bwd_mean, margin, dist="cosine"):
+def score_candidates(
+    x, y, candidate_inds, fwd_mean, bwd_mean, margin, dist="cosine", batch_size=4096
+):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
+    # Vectorized: candidates are gathered and scored a batch of rows at a time
     scores = np.zeros(candidate_inds.shape)
-    for i in range(scores.shape[0]):
-        for j in range(scores.shape[1]):
-            k = candidate_inds[i, j]
-            scores[i, j] = score(x[i], y[k], fwd_mean[i], bwd_mean[k], margin, dist)
+    for start in range(0, scores.shape[0], batch_size):
+        end = min(start + batch_size, scores.shape[0])
+        batch_candidate_inds = candidate_inds[start:end]
+        scores[start:end] = score_pairs(
+            x=x[start:end, None, :],
+            y=y[batch_candidate_inds],
+            fwd_mean=fwd_mean[start:end, None],
+            bwd_mean=bwd_mean[batch_candidate_inds],
+            margin=margin,
+            dist=dist,
+        )
     return scores
 
 
@@ -347,10 +415,56 @@ def score(x, y, fwd_mean, bwd_mean, margin, dist="cosine"):
         return margin(sim, (fwd_mean + bwd_mean) / 2)
 
 
-def knn(x, y, k, use_gpu, dist="cosine"):
+def score_pairs(x, y, fwd_mean, bwd_mean, margin, dist="cosine"):
+    """Vectorized score(): scores broadcastable arrays of embeddings along the last axis"""
+    if dist == "cosine":
+        sim = (x * y).sum(axis=-1)
+    else:
+        l2 = ((x - y) ** 2).sum(axis=-1)
+        sim = 1 / (1 + l2)
+    return margin(sim, (fwd_mean + bwd_mean) / 2)
+
+
+def greedy_unique_pairs(src, trg, num_src, num_trg):
+    """Greedily select pairs in priority order, skipping pairs whose src or trg is already taken.
+
+    A single pass over the pairs, with boolean arrays of taken src/trg indices (instead of the
+    sets of seen sentences in the original implementation).
+
+    Args:
+        src: array of src indices, in priority order
+        trg: array of trg indices, in priority order
+        num_src: number of possible src indices
+        num_trg: number of possible trg indices
+
+    Returns:
+        sorted array of positions (into src/trg) of the selected pairs
+    """
+    src_taken = np.zeros(num_src, dtype=bool)
+    trg_taken = np.zeros(num_trg, dtype=bool)
+    selected = []
+    for i, (src_ind, trg_ind) in enumerate(zip(np.asarray(src).tolist(), np.asarray(trg).tolist())):
+        if not src_taken[src_ind] and not trg_taken[trg_ind]:
+            src_taken[src_ind] = True
+            trg_taken[trg_ind] = True
+            selected.append(i)
+    return np.array(selected, dtype=np.int64)
+
+
+def knn(
+    x,
+    y,
+    k,
+    use_gpu,
+    dist="cosine",
+    knn_config: Optional[KNNConfig] = None,
+    ann_recall_reports: Optional[list] = None,
+):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    return knn_gpu(x, y, k) if use_gpu else knn_cpu(x, y, k, dist)
+    if knn_config is not None and knn_config.ann_type is not None:
+        return knn_ann(x, y, k, dist, knn_config, ann_recall_reports)
+    return knn_gpu(x, y, k) if use_gpu else knn_cpu(x, y, k, dist, knn_config)
 
 
 def knn_gpu(x, y, k, mem=5 * 1024 * 1024 * 1024):
@@ -376,27 +490,38 @@ def knn_gpu(x, y, k, mem=5 * 1024 * 1024 * 1024):
             del idx
         bsims = np.concatenate(bsims, axis=1)
         binds = np.concatenate(binds, axis=1)
-        aux = np.argsort(-bsims, axis=1)
-        for i in range(xfrom, xto):
-            for j in range(k):
-                sim[i, j] = bsims[i - xfrom, aux[i - xfrom, j]]
-                ind[i, j] = binds[i - xfrom, aux[i - xfrom, j]]
+        aux = np.argsort(-bsims, axis=1)[:, :k]
+        sim[xfrom:xto] = np.take_along_axis(bsims, aux, axis=1)
+        ind[xfrom:xto] = np.take_along_axis(binds, aux, axis=1)
     return sim, ind
 
 
-def knn_cpu(x, y, k, dist="cosine"):
+def knn_cpu(x, y, k, dist="cosine", knn_config: Optional[KNNConfig] = None):
     # Adapted From: https://github.com/google-research/xtreme/blob/
     #               522434d1aece34131d997a97ce7e9242a51a688a/third_party/utils_retrieve.py
-    import faiss
+    # x: query, y: database
+    sim, ind = knn_lib.exact_knn(
+        queries=x,
+        database=y,
+        k=k,
+        metric="ip" if dist == "cosine" else "l2",
+        knn_config=knn_config,
+    )
+
+    if dist != "cosine":
+        sim = 1 / (1 + sim)
+    return sim, ind
+
 
+def knn_ann(x, y, k, dist, knn_config: KNNConfig, ann_recall_reports: Optional[list] = None):
     # x: query, y: database
-    dim = x.shape[1]
-    if dist == "cosine":
-        idx = faiss.IndexFlatIP(dim)
-    else:
-        idx = faiss.IndexFlatL2(dim)
-    idx.add(y)
-    sim, ind = idx.search(x, k)
+    # The index over y is built once, and used for both the search and the recall report
+    index = knn_lib.ANNIndex(
+        database=y, metric="ip" if dist == "cosine" else "l2", knn_config=knn_config
+    )
+    sim, ind = index.search(queries=x, k=k)
+    if ann_recall_reports is not None and knn_config.ann_recall_sample_size > 0:
+        ann_recall_reports.append(index.recall_report(queries=x, k=k))
 
     if dist != "cosine":
         sim = 1 / (1 + sim)
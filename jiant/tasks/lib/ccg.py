@@ -19,8 +19,10 @@ from jiant.tasks.lib.templates.shared import (
 )
 from jiant.tasks.lib.templates import hacky_tokenization_matching as tokenization_utils
 from jiant.utils.python.io import read_json
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -50,6 +52,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -103,6 +106,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -8,9 +8,10 @@ from dataclasses import dataclass
 
 from jiant.tasks.lib.templates.shared import labels_to_bimap
 from jiant.tasks.lib.templates import edge_probing_single_span
-from jiant.utils.python.io import read_json_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(edge_probing_single_span.Example):
     @property
@@ -18,11 +19,13 @@ class Example(edge_probing_single_span.Example):
         return NonterminalTask
 
 
+@add_slots
 @dataclass
 class TokenizedExample(edge_probing_single_span.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(edge_probing_single_span.DataRow):
     pass
@@ -77,15 +80,6 @@ class NonterminalTask(edge_probing_single_span.AbstractProbingTask):
     def num_spans(self):
         return 1
 
-    def get_train_examples(self):
-        return self._create_examples(lines=read_json_lines(self.train_path), set_type="train")
-
-    def get_val_examples(self):
-        return self._create_examples(lines=read_json_lines(self.val_path), set_type="val")
-
-    def get_test_examples(self):
-        return self._create_examples(lines=read_json_lines(self.test_path), set_type="test")
-
     @classmethod
     def _create_examples(cls, lines, set_type):
         examples = []
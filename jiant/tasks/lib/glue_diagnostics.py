@@ -1,18 +1,23 @@
 from dataclasses import dataclass
 
+from jiant.utils.python.datastructures import add_slots
+
 from . import mnli
 
 
+@add_slots
 @dataclass
 class Example(mnli.Example):
     pass
 
 
+@add_slots
 @dataclass
 class TokenizedExample(mnli.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(mnli.DataRow):
     pass
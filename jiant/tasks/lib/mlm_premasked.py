@@ -8,9 +8,11 @@ from jiant.tasks.core import (
     BaseExample,
 )
 from jiant.tasks.utils import ExclusiveSpan
+from jiant.utils.python.datastructures import add_slots
 from .templates import mlm_premasked as mlm_premasked_template
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -45,11 +47,13 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(mlm_premasked_template.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(mlm_premasked_template.BaseDataRow):
     pass
@@ -1,19 +1,23 @@
 from dataclasses import dataclass
 
-from jiant.utils.python.datastructures import ReusableGenerator
+import jiant.utils.python.parallel_io as parallel_io
+from jiant.utils.python.datastructures import ReusableGenerator, add_slots
 from jiant.tasks.lib.templates import mlm as mlm_template
 
 
+@add_slots
 @dataclass
 class Example(mlm_template.Example):
     pass
 
 
+@add_slots
 @dataclass
 class TokenizedExample(mlm_template.TokenizedExample):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(mlm_template.DataRow):
     pass
@@ -57,14 +61,13 @@ class MLMSimpleTask(mlm_template.MLMTask):
 
     @classmethod
     def _get_examples_generator(cls, path, set_type):
-        with open(path, "r") as f:
-            for (i, line) in enumerate(f):
-                line = line.strip()
-                if not line:
-                    continue
-                yield Example(
-                    guid="%s-%s" % (set_type, i), text=line,
-                )
+        for (i, line) in enumerate(parallel_io.iter_parsed_lines(path, file_format="text")):
+            line = line.strip()
+            if not line:
+                continue
+            yield Example(
+                guid="%s-%s" % (set_type, i), text=line,
+            )
 
     @classmethod
     def _create_examples(cls, path, set_type, return_generator):
@@ -7,14 +7,17 @@ from collections import Counter
 from dataclasses import dataclass
 
 from jiant.tasks.lib.templates.squad_style import core as squad_style_template
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(squad_style_template.Example):
     def tokenize(self, tokenizer):
         raise NotImplementedError("SQuaD is weird")
 
 
+@add_slots
 @dataclass
 class DataRow(squad_style_template.DataRow):
     pass
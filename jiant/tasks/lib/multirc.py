@@ -21,8 +21,11 @@ from jiant.tasks.lib.templates.shared import (
 )
 from jiant.tasks.utils import truncate_sequences
 from jiant.utils.python.io import read_json_lines
+from jiant.utils.tokenization_memo import memoized_tokenize
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -35,7 +38,7 @@ class Example(BaseExample):
     def tokenize(self, tokenizer):
         return TokenizedExample(
             guid=self.guid,
-            paragraph=tokenizer.tokenize(self.paragraph),
+            paragraph=memoized_tokenize(tokenizer, self.paragraph),
             question=tokenizer.tokenize(self.question),
             answer=tokenizer.tokenize(self.answer),
             label_id=MultiRCTask.LABEL_TO_ID[self.label],
@@ -43,6 +46,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -107,6 +111,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -12,9 +12,11 @@ from jiant.tasks.core import (
     TaskTypes,
 )
 from jiant.tasks.lib.templates.shared import double_sentence_featurize, labels_to_bimap
-from jiant.utils.python.io import read_file_lines
+from jiant.tasks.utils import read_examples_lazily
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -31,6 +33,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -50,6 +53,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -84,24 +88,26 @@ class PawsXTask(Task):
         self.language = language
 
     def get_train_examples(self):
-        return self._create_examples(lines=read_file_lines(self.train_path), set_type="train")
+        return read_examples_lazily(
+            self._create_examples, path=self.train_path, set_type="train", file_format="text"
+        )
 
     def get_val_examples(self):
-        return self._create_examples(lines=read_file_lines(self.val_path), set_type="val")
+        return read_examples_lazily(
+            self._create_examples, path=self.val_path, set_type="val", file_format="text"
+        )
 
     def get_test_examples(self):
-        return self._create_examples(lines=read_file_lines(self.test_path), set_type="test")
+        return read_examples_lazily(
+            self._create_examples, path=self.test_path, set_type="test", file_format="text"
+        )
 
     @classmethod
     def _create_examples(cls, lines, set_type):
-        examples = []
         for (i, line) in enumerate(lines):
             # Skip the header (first line)
             if i == 0:
                 continue
             segments = line.strip().split("\t")
             idx, text_a, text_b, label = segments
-            examples.append(
-                Example(guid="%s-%s" % (set_type, idx), text_a=text_a, text_b=text_b, label=label)
-            )
-        return examples
+            yield Example(guid="%s-%s" % (set_type, idx), text_a=text_a, text_b=text_b, label=label)
@@ -2,7 +2,7 @@ import pandas as pd
 import nltk
 
 from jiant.tasks.lib.templates import span_prediction as span_pred_template
-from jiant.utils.retokenize import TokenAligner
+from jiant.utils.retokenize import get_token_aligner
 
 
 class QAMRTask(span_pred_template.AbstractSpanPredictionTask):
@@ -50,7 +50,9 @@ class QAMRTask(span_pred_template.AbstractSpanPredictionTask):
             ).split()
             passage_space_str = " ".join(passage_space_tokens)
 
-            token_aligner = TokenAligner(source=passage_ptb_tokens, target=passage_space_tokens)
+            token_aligner = get_token_aligner(
+                source=passage_ptb_tokens, target=passage_space_tokens
+            )
             answer_char_span = token_aligner.project_token_to_char_span(
                 answer_token_start, answer_token_end, inclusive=True
             )
@@ -3,7 +3,7 @@ import nltk
 import json
 
 from jiant.tasks.lib.templates import span_prediction as span_pred_template
-from jiant.utils.retokenize import TokenAligner
+from jiant.utils.retokenize import get_token_aligner
 
 
 class QASRLTask(span_pred_template.AbstractSpanPredictionTask):
@@ -57,7 +57,9 @@ class QASRLTask(span_pred_template.AbstractSpanPredictionTask):
             ).split()
             passage_space_str = " ".join(passage_space_tokens)
 
-            token_aligner = TokenAligner(source=passage_ptb_tokens, target=passage_space_tokens)
+            token_aligner = get_token_aligner(
+                source=passage_ptb_tokens, target=passage_space_tokens
+            )
 
             for entry in datum["entries"]:
                 for question, answer_list in entry["questions"].items():
@@ -13,9 +13,11 @@ from jiant.tasks.core import (
     TaskTypes,
 )
 from jiant.tasks.lib.templates.shared import double_sentence_featurize, labels_to_bimap
-from jiant.utils.python.io import read_jsonl
+from jiant.tasks.utils import read_examples_lazily
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -32,6 +34,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -51,6 +54,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -81,24 +85,20 @@ class QqpTask(GlueMixin, Task):
     LABEL_TO_ID, ID_TO_LABEL = labels_to_bimap(LABELS)
 
     def get_train_examples(self):
-        return self._create_examples(lines=read_jsonl(self.train_path), set_type="train")
+        return read_examples_lazily(self._create_examples, path=self.train_path, set_type="train")
 
     def get_val_examples(self):
-        return self._create_examples(lines=read_jsonl(self.val_path), set_type="val")
+        return read_examples_lazily(self._create_examples, path=self.val_path, set_type="val")
 
     def get_test_examples(self):
-        return self._create_examples(lines=read_jsonl(self.test_path), set_type="test")
+        return read_examples_lazily(self._create_examples, path=self.test_path, set_type="test")
 
     @classmethod
     def _create_examples(cls, lines, set_type):
-        examples = []
         for (i, line) in enumerate(lines):
-            examples.append(
-                Example(
-                    guid="%s-%s" % (set_type, i),
-                    text_a=line["text_a"],
-                    text_b=line["text_b"],
-                    label=line["label"] if set_type != "test" else cls.LABELS[-1],
-                )
+            yield Example(
+                guid="%s-%s" % (set_type, i),
+                text_a=line["text_a"],
+                text_b=line["text_b"],
+                label=line["label"] if set_type != "test" else cls.LABELS[-1],
             )
-        return examples
@@ -14,8 +14,11 @@ from jiant.tasks.core import (
 )
 from jiant.tasks.lib.templates.shared import labels_to_bimap, double_sentence_featurize
 from jiant.utils.python.io import read_json_lines
+from jiant.utils.tokenization_memo import memoized_tokenize
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -33,7 +36,7 @@ class Example(BaseExample):
         filled_query_text = self.query_text.replace("@placeholder", self.entity_str)
         return TokenizedExample(
             guid=self.guid,
-            passage_tokens=tokenizer.tokenize(self.passage_text),
+            passage_tokens=memoized_tokenize(tokenizer, self.passage_text),
             query_tokens=tokenizer.tokenize(filled_query_text),
             label_id=ReCoRDTask.LABEL_TO_ID[self.label],
             entity_str=self.entity_str,
@@ -41,6 +44,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -65,6 +69,7 @@ class TokenizedExample(BaseTokenizedExample):
         return data_row
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -14,8 +14,10 @@ from jiant.tasks.core import (
 )
 from jiant.tasks.lib.templates.shared import single_sentence_featurize, labels_to_bimap
 from jiant.utils.python.io import read_jsonl
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -30,6 +32,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -47,6 +50,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
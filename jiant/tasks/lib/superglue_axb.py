@@ -1,18 +1,23 @@
 from dataclasses import dataclass
 
+from jiant.utils.python.datastructures import add_slots
+
 from . import rte
 
 
+@add_slots
 @dataclass
 class Example(rte.Example):
     pass
 
 
+@add_slots
 @dataclass
 class TokenizedExample(rte.Example):
     pass
 
 
+@add_slots
 @dataclass
 class DataRow(rte.DataRow):
     pass
@@ -1,7 +1,7 @@
 import numpy as np
 import torch
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 
 from jiant.tasks.core import (
@@ -17,9 +17,13 @@ from jiant.tasks.lib.templates.shared import (
     create_input_set_from_tokens_and_segments,
     labels_to_bimap,
 )
+import jiant.utils.knn as knn
+from jiant.utils.knn import KNNConfig
 from jiant.utils.python.io import read_file, read_file_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -32,6 +36,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -58,6 +63,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -85,10 +91,29 @@ class TatoebaTask(Task):
 
     TASK_TYPE = TaskTypes.EMBEDDING
 
-    def __init__(self, name, path_dict, language):
+    def __init__(
+        self,
+        name,
+        path_dict,
+        language,
+        knn_config: Optional[dict] = None,
+        embedding_store_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            name: task name
+            path_dict: paths to task data
+            language: language paired with English
+            knn_config: KNNConfig fields (e.g. from the "kwargs" of the task config), configuring
+                the nearest-neighbour search used in evaluation (see: jiant.utils.knn)
+            embedding_store_dir: directory under which embeddings are stored in evaluation
+                (default: a temp dir, which may be in memory on some systems)
+        """
         super().__init__(name=name, path_dict=path_dict)
         self.language = language
         self.lang_bimap = labels_to_bimap(["en", language])
+        self.knn_config = KNNConfig(**knn_config) if knn_config is not None else None
+        self.embedding_store_dir = embedding_store_dir
 
     def get_train_examples(self):
         raise RuntimeError("This task does not support train examples")
@@ -120,15 +145,21 @@ class TatoebaTask(Task):
         return examples
 
 
-def similarity_search(x, y, dim, normalize=False):
-    import faiss
+def similarity_search(x, y, dim, normalize=False, knn_config: Optional[KNNConfig] = None):
+    """For each row of y, find the index of the nearest row of x.
 
-    x = x.copy()
-    y = y.copy()
-    idx = faiss.IndexFlatL2(dim)
-    if normalize:
-        faiss.normalize_L2(x)
-        faiss.normalize_L2(y)
-    idx.add(x)
-    scores, prediction = idx.search(y, 1)
+    Args:
+        x: (n, dim) embeddings to search over
+        y: (m, dim) query embeddings
+        dim: embedding dimension
+        normalize: if True, compare L2-normalized embeddings (cosine similarity)
+        knn_config: KNNConfig, configures the search backend and its memory use
+
+    Returns:
+        (m, 1) array of indices into x
+    """
+    assert x.shape[1] == y.shape[1] == dim
+    _, prediction = knn.exact_knn(
+        queries=y, database=x, k=1, metric="cosine" if normalize else "l2", knn_config=knn_config,
+    )
     return prediction
@@ -0,0 +1,142 @@
+"""Logic shared between the single-span and two-span edge-probing templates.
+
+Edge-probing data typically has many span queries (targets) per sentence. By default, each query
+is a separate Example, and the sentence is encoded once per query. With grouped span queries
+(group_spans=True), all queries over the same text are kept in a single GroupedExample/DataRow,
+so that the sentence is encoded once, and all of its spans are classified from the same encoder
+output. Batches of grouped DataRows are padded along the query dimension, with a span_mask.
+"""
+from typing import List
+
+import numpy as np
+import torch
+
+from jiant.tasks.core import flat_collate_fn, metadata_collate_fn
+from jiant.tasks.lib.templates.shared import (
+    create_input_set_from_tokens_and_segments,
+    add_cls_token,
+)
+from jiant.tasks.utils import ExclusiveSpan, truncate_sequences
+from jiant.utils.python.datastructures import combine_dicts
+from jiant.utils.tokenization_normalization import get_normalized_token_aligner
+
+# DataRow fields with one entry per span query, padded along the query dimension when batching
+GROUPED_QUERY_FIELDS = ("spans", "label_ids")
+
+
+def tokenize_and_align(text, tokenizer):
+    """Tokenize space-tokenized text, and align the space tokens to the target tokens.
+
+    Returns:
+        (target tokenization, TokenAligner from space tokens to target tokens)
+    """
+    space_tokenization = text.split()
+    target_tokenization = tokenizer.tokenize(text)
+    aligner = get_normalized_token_aligner(space_tokenization, target_tokenization, tokenizer)
+    return target_tokenization, aligner
+
+
+def featurize_tokens(tokens, tokenizer, feat_spec):
+    """Truncate and add special tokens to tokens.
+
+    Returns:
+        (InputSet, UnpaddedInputs)
+    """
+    special_tokens_count = 2  # CLS, SEP
+
+    (tokens,) = truncate_sequences(
+        tokens_ls=[tokens], max_length=feat_spec.max_seq_length - special_tokens_count,
+    )
+
+    unpadded_tokens = tokens + [tokenizer.sep_token]
+    unpadded_segment_ids = [feat_spec.sequence_a_segment_id] * (len(tokens) + 1)
+
+    unpadded_inputs = add_cls_token(
+        unpadded_tokens=unpadded_tokens,
+        unpadded_segment_ids=unpadded_segment_ids,
+        tokenizer=tokenizer,
+        feat_spec=feat_spec,
+    )
+
+    input_set = create_input_set_from_tokens_and_segments(
+        unpadded_tokens=unpadded_inputs.unpadded_tokens,
+        unpadded_segment_ids=unpadded_inputs.unpadded_segment_ids,
+        tokenizer=tokenizer,
+        feat_spec=feat_spec,
+    )
+    return input_set, unpadded_inputs
+
+
+def to_inclusive_input_span(span, cls_offset):
+    # exclusive spans are converted to inclusive spans for use with SelfAttentiveSpanExtractor
+    return ExclusiveSpan(start=span[0] + cls_offset, end=span[1] + cls_offset).to_inclusive()
+
+
+def to_binary_label_ids(label_ids, label_num):
+    binary_label_ids = np.zeros((label_num,), dtype=int)
+    for label_id in label_ids:
+        binary_label_ids[label_id] = 1
+    return binary_label_ids
+
+
+def group_examples_by_text(examples: List, grouped_example_cls, set_type: str) -> List:
+    """Group consecutive examples over the same text into grouped examples
+
+    Args:
+        examples: list of Examples, with the span queries for a given text being consecutive
+        grouped_example_cls: GroupedExample class, taking (guid, text, examples)
+        set_type: phase, used in guids of grouped examples
+
+    Returns:
+        list of grouped examples
+    """
+    grouped_examples = []
+    group = []
+    for example in examples:
+        if group and example.text != group[0].text:
+            grouped_examples.append(group)
+            group = []
+        group.append(example)
+    if group:
+        grouped_examples.append(group)
+    return [
+        grouped_example_cls(
+            guid="%s-%s" % (set_type, group_num), text=group[0].text, examples=group,
+        )
+        for group_num, group in enumerate(grouped_examples)
+    ]
+
+
+def collate_grouped_data_rows(batch, batch_cls):
+    """Collate grouped DataRows, padding span queries to the maximum number in the batch.
+
+    Adds a span_mask of shape (batch_size, max_num_queries) to the batch, indicating which
+    span queries are real (1) or padding (0).
+
+    Returns:
+        (batch, remainder)
+    """
+    data_rows = [x["data_row"] for x in batch]
+    num_queries_list = [len(data_row.spans) for data_row in data_rows]
+    max_num_queries = max(num_queries_list)
+    collated_data_rows = {}
+    for key in data_rows[0].to_dict():
+        values = [getattr(data_row, key) for data_row in data_rows]
+        if key in GROUPED_QUERY_FIELDS:
+            values = [
+                np.pad(value, [(0, max_num_queries - len(value))] + [(0, 0)] * (value.ndim - 1))
+                for value in values
+            ]
+        collated_data_rows[key] = flat_collate_fn(values)
+    collated_data_rows["span_mask"] = torch.tensor(
+        [
+            [1] * num_queries + [0] * (max_num_queries - num_queries)
+            for num_queries in num_queries_list
+        ]
+    )
+    collated_metadata = metadata_collate_fn([x["metadata"] for x in batch])
+    combined = combine_dicts([collated_data_rows, collated_metadata])
+    batch_dict = {}
+    for field in batch_cls.get_annotations():
+        batch_dict[field] = combined.pop(field)
+    return batch_cls(**batch_dict), combined
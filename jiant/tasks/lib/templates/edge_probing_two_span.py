@@ -20,15 +20,12 @@ from jiant.tasks.core import (
     Task,
     TaskTypes,
 )
-from jiant.tasks.lib.templates.shared import (
-    create_input_set_from_tokens_and_segments,
-    add_cls_token,
-)
-from jiant.tasks.utils import ExclusiveSpan, truncate_sequences
-from jiant.utils import retokenize
-from jiant.utils.tokenization_normalization import normalize_tokenizations
+from jiant.tasks.lib.templates import edge_probing_shared
+from jiant.utils.python.io import read_json_lines
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -42,12 +39,9 @@ class Example(BaseExample):
         raise NotImplementedError()
 
     def tokenize(self, tokenizer):
-        space_tokenization = self.text.split()
-        target_tokenization = tokenizer.tokenize(self.text)
-        normed_space_tokenization, normed_target_tokenization = normalize_tokenizations(
-            space_tokenization, target_tokenization, tokenizer
+        target_tokenization, aligner = edge_probing_shared.tokenize_and_align(
+            text=self.text, tokenizer=tokenizer
         )
-        aligner = retokenize.TokenAligner(normed_space_tokenization, normed_target_tokenization)
         target_span1 = aligner.project_token_span(self.span1[0], self.span1[1])
         target_span2 = aligner.project_token_span(self.span2[0], self.span2[1])
         return TokenizedExample(
@@ -62,6 +56,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -74,57 +69,31 @@ class TokenizedExample(BaseTokenizedExample):
     label_num: int
 
     def featurize(self, tokenizer, feat_spec):
-        special_tokens_count = 2  # CLS, SEP
-
-        (tokens,) = truncate_sequences(
-            tokens_ls=[self.tokens], max_length=feat_spec.max_seq_length - special_tokens_count,
+        input_set, unpadded_inputs = edge_probing_shared.featurize_tokens(
+            tokens=self.tokens, tokenizer=tokenizer, feat_spec=feat_spec
         )
-
-        unpadded_tokens = tokens + [tokenizer.sep_token]
-        unpadded_segment_ids = [feat_spec.sequence_a_segment_id] * (len(tokens) + 1)
-
-        unpadded_inputs = add_cls_token(
-            unpadded_tokens=unpadded_tokens,
-            unpadded_segment_ids=unpadded_segment_ids,
-            tokenizer=tokenizer,
-            feat_spec=feat_spec,
+        span1_span = edge_probing_shared.to_inclusive_input_span(
+            span=self.span1_span, cls_offset=unpadded_inputs.cls_offset
         )
-
-        input_set = create_input_set_from_tokens_and_segments(
-            unpadded_tokens=unpadded_inputs.unpadded_tokens,
-            unpadded_segment_ids=unpadded_inputs.unpadded_segment_ids,
-            tokenizer=tokenizer,
-            feat_spec=feat_spec,
+        span2_span = edge_probing_shared.to_inclusive_input_span(
+            span=self.span2_span, cls_offset=unpadded_inputs.cls_offset
         )
-
-        # exclusive spans are converted to inclusive spans for use with SelfAttentiveSpanExtractor
-        span1_span = ExclusiveSpan(
-            start=self.span1_span[0] + unpadded_inputs.cls_offset,
-            end=self.span1_span[1] + unpadded_inputs.cls_offset,
-        ).to_inclusive()
-
-        span2_span = ExclusiveSpan(
-            start=self.span2_span[0] + unpadded_inputs.cls_offset,
-            end=self.span2_span[1] + unpadded_inputs.cls_offset,
-        ).to_inclusive()
-
-        binary_label_ids = np.zeros((self.label_num,), dtype=int)
-        for label_id in self.label_ids:
-            binary_label_ids[label_id] = 1
-
         return DataRow(
             guid=self.guid,
             input_ids=np.array(input_set.input_ids),
             input_mask=np.array(input_set.input_mask),
             segment_ids=np.array(input_set.segment_ids),
             spans=np.array([span1_span, span2_span]),
-            label_ids=binary_label_ids,
+            label_ids=edge_probing_shared.to_binary_label_ids(
+                label_ids=self.label_ids, label_num=self.label_num
+            ),
             tokens=unpadded_inputs.unpadded_tokens,
             span1_text=self.span1_text,
             span2_text=self.span2_text,
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -150,9 +119,157 @@ class Batch(BatchMixin):
     span2_text: List
 
 
+@add_slots
+@dataclass
+class GroupedExample(BaseExample):
+    """Span queries (Examples) over the same text, which are encoded together"""
+
+    guid: str
+    text: str
+    examples: List[Example]
+
+    def tokenize(self, tokenizer):
+        task = self.examples[0].task
+        target_tokenization, aligner = edge_probing_shared.tokenize_and_align(
+            text=self.text, tokenizer=tokenizer
+        )
+        span1_spans = aligner.project_token_spans([example.span1 for example in self.examples])
+        span2_spans = aligner.project_token_spans([example.span2 for example in self.examples])
+        return GroupedTokenizedExample(
+            guid=self.guid,
+            tokens=target_tokenization,
+            span_guids=[example.guid for example in self.examples],
+            span1_spans=span1_spans,
+            span2_spans=span2_spans,
+            span1_texts=[" ".join(target_tokenization[span[0] : span[1]]) for span in span1_spans],
+            span2_texts=[" ".join(target_tokenization[span[0] : span[1]]) for span in span2_spans],
+            label_ids_list=[
+                [task.LABEL_TO_ID[label] for label in example.labels] for example in self.examples
+            ],
+            label_num=len(task.LABELS),
+        )
+
+
+@add_slots
+@dataclass
+class GroupedTokenizedExample(BaseTokenizedExample):
+    guid: str
+    tokens: List[str]
+    span_guids: List[str]
+    span1_spans: List[Tuple[int, int]]
+    span2_spans: List[Tuple[int, int]]
+    span1_texts: List[str]
+    span2_texts: List[str]
+    label_ids_list: List[List[int]]
+    label_num: int
+
+    def featurize(self, tokenizer, feat_spec):
+        input_set, unpadded_inputs = edge_probing_shared.featurize_tokens(
+            tokens=self.tokens, tokenizer=tokenizer, feat_spec=feat_spec
+        )
+        spans = [
+            [
+                edge_probing_shared.to_inclusive_input_span(
+                    span=span1_span, cls_offset=unpadded_inputs.cls_offset
+                ),
+                edge_probing_shared.to_inclusive_input_span(
+                    span=span2_span, cls_offset=unpadded_inputs.cls_offset
+                ),
+            ]
+            for span1_span, span2_span in zip(self.span1_spans, self.span2_spans)
+        ]
+        return GroupedDataRow(
+            guid=self.guid,
+            input_ids=np.array(input_set.input_ids),
+            input_mask=np.array(input_set.input_mask),
+            segment_ids=np.array(input_set.segment_ids),
+            spans=np.array(spans),
+            label_ids=np.array(
+                [
+                    edge_probing_shared.to_binary_label_ids(
+                        label_ids=label_ids, label_num=self.label_num
+                    )
+                    for label_ids in self.label_ids_list
+                ]
+            ),
+            tokens=unpadded_inputs.unpadded_tokens,
+            span_guids=self.span_guids,
+            span1_texts=self.span1_texts,
+            span2_texts=self.span2_texts,
+        )
+
+
+@add_slots
+@dataclass
+class GroupedDataRow(BaseDataRow):
+    guid: str
+    input_ids: np.ndarray
+    input_mask: np.ndarray
+    segment_ids: np.ndarray
+    spans: np.ndarray  # (num_queries, 2, 2)
+    label_ids: np.ndarray  # (num_queries, num_labels)
+    tokens: List
+    span_guids: List[str]
+    span1_texts: List[str]
+    span2_texts: List[str]
+
+
+@dataclass
+class GroupedBatch(BatchMixin):
+    input_ids: torch.LongTensor
+    input_mask: torch.LongTensor
+    segment_ids: torch.LongTensor
+    spans: torch.LongTensor
+    span_mask: torch.LongTensor
+    label_ids: torch.LongTensor
+    tokens: List
+    span1_texts: List
+    span2_texts: List
+
+
 class AbstractProbingTask(Task, ABC):
     TASK_TYPE = TaskTypes.MULTI_LABEL_SPAN_CLASSIFICATION
 
     LABELS = NotImplemented
     LABEL_TO_ID = NotImplemented
     ID_TO_LABEL = NotImplemented
+
+    def __init__(self, name: str, path_dict: dict, group_spans: bool = False):
+        """
+        Args:
+            name: task name
+            path_dict: paths to task data
+            group_spans: if True, group all span queries over the same text into a single
+                example, which is encoded once (see: edge_probing_shared)
+        """
+        super().__init__(name=name, path_dict=path_dict)
+        self.group_spans = group_spans
+
+    def get_train_examples(self):
+        return self._get_examples(path=self.train_path, set_type="train")
+
+    def get_val_examples(self):
+        return self._get_examples(path=self.val_path, set_type="val")
+
+    def get_test_examples(self):
+        return self._get_examples(path=self.test_path, set_type="test")
+
+    def _get_examples(self, path, set_type):
+        examples = self._create_examples(lines=read_json_lines(path), set_type=set_type)
+        if self.group_spans:
+            examples = edge_probing_shared.group_examples_by_text(
+                examples=examples, grouped_example_cls=GroupedExample, set_type=set_type
+            )
+        return examples
+
+    @classmethod
+    def _create_examples(cls, lines, set_type):
+        raise NotImplementedError()
+
+    @classmethod
+    def collate_fn(cls, batch):
+        if isinstance(batch[0]["data_row"], GroupedDataRow):
+            return edge_probing_shared.collate_grouped_data_rows(
+                batch=batch, batch_cls=GroupedBatch
+            )
+        return super().collate_fn(batch)
@@ -3,7 +3,7 @@ import torch
 from dataclasses import dataclass
 from typing import List, Tuple
 
-from jiant.utils.python.datastructures import ReusableGenerator
+from jiant.utils.python.datastructures import ReusableGenerator, add_slots
 
 from jiant.tasks.core import (
     Task,
@@ -21,6 +21,7 @@ from jiant.tasks.lib.templates.shared import (
 NON_MASKED_TOKEN_LABEL_ID = -100
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -30,6 +31,7 @@ class Example(BaseExample):
         return TokenizedExample(guid=self.guid, input_tokens=tokenizer.tokenize(self.text),)
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -55,6 +57,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
@@ -18,8 +18,11 @@ from jiant.tasks.lib.templates.shared import (
     add_cls_token,
 )
 from jiant.tasks.utils import truncate_sequences
+from jiant.utils.tokenization_memo import memoized_tokenize
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
 
@@ -35,12 +38,13 @@ class Example(BaseExample):
     def tokenize(self, tokenizer):
         return TokenizedExample(
             guid=self.guid,
-            prompt=tokenizer.tokenize(self.prompt),
+            prompt=memoized_tokenize(tokenizer, self.prompt),
             choice_list=[tokenizer.tokenize(choice) for choice in self.choice_list],
             label_id=self.task.CHOICE_TO_ID[self.label],
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -105,6 +109,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
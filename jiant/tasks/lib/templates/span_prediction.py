@@ -19,9 +19,11 @@ from jiant.tasks.lib.templates.shared import (
     add_cls_token,
 )
 from jiant.tasks.utils import truncate_sequences, pad_to_max_seq_length
-from jiant.utils.retokenize import TokenAligner
+from jiant.utils.retokenize import get_token_aligner
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
 
@@ -38,7 +40,7 @@ class Example(BaseExample):
             else self.passage
         )
         passage_tokens = tokenizer.tokenize(passage)
-        token_aligner = TokenAligner(source=passage, target=passage_tokens)
+        token_aligner = get_token_aligner(source=passage, target=passage_tokens)
         answer_token_span = token_aligner.project_char_to_token_span(
             self.answer_char_span[0], self.answer_char_span[1], inclusive=True
         )
@@ -50,10 +52,11 @@ class Example(BaseExample):
             answer_str=self.answer,
             passage_str=passage,
             answer_token_span=answer_token_span,
-            token_idx_to_char_idx_map=token_aligner.source_char_idx_to_target_token_idx.T,
+            token_idx_to_char_idx_map=token_aligner.source_char_idx_to_target_token_idx.T.toarray(),
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -144,6 +147,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
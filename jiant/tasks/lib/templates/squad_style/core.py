@@ -1,7 +1,10 @@
 import json
+import re
+
 import numpy as np
 
 import torch
+import transformers
 from dataclasses import dataclass
 from typing import Union, List, Dict
 
@@ -16,14 +19,32 @@ from jiant.tasks.core import (
     Task,
     TaskTypes,
 )
-from jiant.utils.python.datastructures import ExtendedDataClassMixin
+from jiant.utils.python.datastructures import ExtendedDataClassMixin, add_slots
 from jiant.utils.display import maybe_tqdm
+from jiant.utils.tokenization_memo import get_tokenization_memo
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Whitespace-separated words (see: is_whitespace)
+WORD_PATTERN = re.compile("[^ \t\r\n\u202f]+")
+
+
+def supports_fast_featurization(tokenizer) -> bool:
+    """Whether Example.to_feature_list_fast matches Example.to_feature_list for a tokenizer.
+
+    Only fast WordPiece tokenizers (BERT, and derived e.g. ELECTRA) are supported. Other fast
+    tokenizers (e.g. byte-level BPE for RoBERTa, SentencePiece for XLM-R/ALBERT) may tokenize
+    contexts differently, and are not supported by the regular path either, which passes
+    pre-tokenized inputs to encode_plus.
+    """
+    return getattr(tokenizer, "is_fast", False) and isinstance(
+        tokenizer, transformers.BertTokenizerFast
+    )
+
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     qas_id: str
@@ -42,21 +63,18 @@ class Example(BaseExample):
     end_position: int = 0
 
     def __post_init__(self):
-        doc_tokens = []
-        char_to_word_offset = []
-        prev_is_whitespace = True
-
         # Split on whitespace so that different tokens may be attributed to their original position.
-        for c in self.context_text:
-            if is_whitespace(c):
-                prev_is_whitespace = True
-            else:
-                if prev_is_whitespace:
-                    doc_tokens.append(c)
-                else:
-                    doc_tokens[-1] += c
-                prev_is_whitespace = False
-            char_to_word_offset.append(len(doc_tokens) - 1)
+        word_matches = list(WORD_PATTERN.finditer(self.context_text))
+        doc_tokens = [match.group() for match in word_matches]
+        # Each char is attributed to the last word starting at or before it (-1 if none)
+        char_to_word_offset = (
+            np.searchsorted(
+                [match.start() for match in word_matches],
+                np.arange(len(self.context_text)),
+                side="right",
+            )
+            - 1
+        ).tolist()
 
         self.doc_tokens = doc_tokens
         self.char_to_word_offset = char_to_word_offset
@@ -77,31 +95,38 @@ class Example(BaseExample):
     def to_feature_list(
         self, tokenizer, max_seq_length, doc_stride, max_query_length, set_type,
     ):
+        if getattr(tokenizer, "is_fast", False):
+            if not supports_fast_featurization(tokenizer):
+                raise RuntimeError(
+                    "SQuAD-style featurization with fast tokenizers is only supported for"
+                    f" WordPiece tokenizers, not {type(tokenizer).__name__}. Use the regular"
+                    " tokenizer (without use_fast_tokenizer)"
+                )
+            return self.to_feature_list_fast(
+                tokenizer=tokenizer,
+                max_seq_length=max_seq_length,
+                doc_stride=doc_stride,
+                max_query_length=max_query_length,
+                set_type=set_type,
+            )
         is_training = set_type == PHASE.TRAIN
         features = []
-        if is_training and not self.is_impossible:
-            # Get start and end position
-            start_position = self.start_position
-            end_position = self.end_position
-
+        if is_training and not self.is_impossible and not self._answer_is_found():
             # If the answer cannot be found in the text, then skip this example.
-            actual_text = " ".join(self.doc_tokens[start_position : (end_position + 1)])
-            cleaned_answer_text = " ".join(whitespace_tokenize(self.answer_text))
-            if actual_text.find(cleaned_answer_text) == -1:
-                logger.warning(
-                    "Could not find answer: '%s' vs. '%s'", actual_text, cleaned_answer_text
-                )
-                return []
-
-        tok_to_orig_index = []
-        orig_to_tok_index = []
-        all_doc_tokens = []
-        for (i, token) in enumerate(self.doc_tokens):
-            orig_to_tok_index.append(len(all_doc_tokens))
-            sub_tokens = tokenizer.tokenize(token)
-            for sub_token in sub_tokens:
-                tok_to_orig_index.append(i)
-                all_doc_tokens.append(sub_token)
+            return []
+
+        # The same context is typically shared by many questions, so its tokenization is memoized
+        (
+            tok_to_orig_index,
+            orig_to_tok_index,
+            all_doc_tokens,
+        ) = get_tokenization_memo().get_or_compute(
+            key=("squad_doc_tokens", tokenizer, tuple(self.doc_tokens)),
+            compute_fn=lambda: _tokenize_doc_tokens(
+                doc_tokens=self.doc_tokens, tokenizer=tokenizer
+            ),
+        )
+        all_doc_tokens = list(all_doc_tokens)
 
         if is_training and not self.is_impossible:
             tok_start_position = orig_to_tok_index[self.start_position]
@@ -122,12 +147,7 @@ class Example(BaseExample):
             truncation=True,
             max_length=max_query_length,
         )
-        sequence_added_tokens = (
-            tokenizer.max_len - tokenizer.max_len_single_sentence + 1
-            if "roberta" in str(type(tokenizer)) or "camembert" in str(type(tokenizer))
-            else tokenizer.max_len - tokenizer.max_len_single_sentence
-        )
-        sequence_pair_added_tokens = tokenizer.max_len - tokenizer.max_len_sentences_pair
+        sequence_added_tokens, sequence_pair_added_tokens = _get_num_added_tokens(tokenizer)
 
         span_doc_tokens = all_doc_tokens
         while len(spans) * doc_stride < len(all_doc_tokens):
@@ -222,7 +242,7 @@ class Example(BaseExample):
             else:
                 p_mask[-len(span["tokens"]) : -(len(truncated_query) + sequence_added_tokens)] = 0
 
-            pad_token_indices = np.where(span["input_ids"] == tokenizer.pad_token_id)
+            pad_token_indices = np.where(np.asarray(span["input_ids"]) == tokenizer.pad_token_id)
             special_token_indices = np.asarray(
                 tokenizer.get_special_tokens_mask(
                     span["input_ids"], already_has_special_tokens=True
@@ -286,7 +306,156 @@ class Example(BaseExample):
             )
         return features
 
+    def to_feature_list_fast(
+        self, tokenizer, max_seq_length, doc_stride, max_query_length, set_type,
+    ):
+        """Featurize with a fast (Rust-backed) tokenizer, producing the same DataRows as
+        to_feature_list.
+
+        Rather than tokenizing each whitespace token and calling encode_plus once per doc-stride
+        window, the context is tokenized once as a whole (and memoized across the questions that
+        share it), and mapped back to whitespace tokens with the offset mapping. The doc-stride
+        windows, token_to_orig_map and token_is_max_context are then derived with numpy.
+
+        With WordPiece tokenizers, this matches to_feature_list exactly. Tokenizers whose output
+        depends on the surrounding text (e.g. byte-level BPE, which marks preceding spaces) may
+        tokenize the context slightly differently, since it is no longer tokenized word by word,
+        so only fast WordPiece tokenizers are supported (see: supports_fast_featurization).
+        """
+        assert tokenizer.padding_side == "right", "Only right-padding tokenizers are supported"
+        is_training = set_type == PHASE.TRAIN
+        if is_training and not self.is_impossible and not self._answer_is_found():
+            return []
+
+        (
+            doc_ids,
+            all_doc_tokens,
+            tok_to_orig_index,
+            orig_to_tok_index,
+        ) = get_tokenization_memo().get_or_compute(
+            key=("squad_context_fast", tokenizer, self.context_text),
+            compute_fn=lambda: _tokenize_context_fast(
+                context_text=self.context_text,
+                char_to_word_offset=self.char_to_word_offset,
+                num_words=len(self.doc_tokens),
+                tokenizer=tokenizer,
+            ),
+        )
+        num_doc_tokens = len(doc_ids)
+        if num_doc_tokens == 0:
+            return []
+
+        if is_training and not self.is_impossible:
+            tok_start_position = orig_to_tok_index[self.start_position]
+            if self.end_position < len(self.doc_tokens) - 1:
+                tok_end_position = orig_to_tok_index[self.end_position + 1] - 1
+            else:
+                tok_end_position = num_doc_tokens - 1
+
+            (tok_start_position, tok_end_position) = _improve_answer_span(
+                all_doc_tokens, tok_start_position, tok_end_position, tokenizer, self.answer_text
+            )
+
+        truncated_query = tokenizer.encode(
+            self.question_text,
+            add_special_tokens=False,
+            truncation=True,
+            max_length=max_query_length,
+        )
+        sequence_added_tokens, sequence_pair_added_tokens = _get_num_added_tokens(tokenizer)
+        max_tokens_for_doc = max_seq_length - len(truncated_query) - sequence_pair_added_tokens
+        doc_offset = len(truncated_query) + sequence_added_tokens
+
+        # Doc-stride windows over the context tokens
+        window_starts = []
+        window_start = 0
+        while window_start < num_doc_tokens:
+            window_starts.append(window_start)
+            if num_doc_tokens - window_start <= max_tokens_for_doc:
+                break
+            window_start += doc_stride
+        window_starts = np.array(window_starts, dtype=int)
+        window_lengths = np.minimum(num_doc_tokens - window_starts, max_tokens_for_doc)
+        best_window_indices = _get_max_context_window_indices(
+            window_starts=window_starts, window_lengths=window_lengths, num_tokens=num_doc_tokens,
+        )
+
+        features = []
+        for window_index, (window_start, window_length) in enumerate(
+            zip(window_starts.tolist(), window_lengths.tolist())
+        ):
+            window_end = window_start + window_length
+            window_doc_ids = list(doc_ids[window_start:window_end])
+            input_ids = tokenizer.build_inputs_with_special_tokens(truncated_query, window_doc_ids)
+            segment_ids = tokenizer.create_token_type_ids_from_sequences(
+                truncated_query, window_doc_ids
+            )
+            tokens = tokenizer.convert_ids_to_tokens(input_ids)
+            num_padding = max_seq_length - len(input_ids)
+            input_mask = [1] * len(input_ids) + [0] * num_padding
+            input_ids = input_ids + [tokenizer.pad_token_id] * num_padding
+            segment_ids = segment_ids + [tokenizer.pad_token_type_id] * num_padding
+
+            doc_positions = range(doc_offset, doc_offset + window_length)
+            token_to_orig_map = dict(
+                zip(doc_positions, tok_to_orig_index[window_start:window_end].tolist())
+            )
+            token_is_max_context = dict(
+                zip(
+                    doc_positions,
+                    (best_window_indices[window_start:window_end] == window_index).tolist(),
+                )
+            )
+
+            cls_index = input_ids.index(tokenizer.cls_token_id)
+            # p_mask: mask with 1 for token than cannot be in the answer
+            #         (0 for token which can be in an answer, and the CLS token)
+            p_mask = np.ones(len(input_ids), dtype=int)
+            p_mask[doc_offset : doc_offset + window_length] = 0
+            p_mask[cls_index] = 0
+
+            start_position = 0
+            end_position = 0
+            if is_training and not self.is_impossible:
+                # noinspection PyUnboundLocalVariable
+                if tok_start_position >= window_start and tok_end_position < window_end:
+                    start_position = tok_start_position - window_start + doc_offset
+                    end_position = tok_end_position - window_start + doc_offset
+                else:
+                    start_position = cls_index
+                    end_position = cls_index
+
+            features.append(
+                DataRow(
+                    unique_id="",
+                    qas_id=self.qas_id,
+                    tokens=tokens,
+                    token_to_orig_map=token_to_orig_map,
+                    token_is_max_context=token_is_max_context,
+                    input_ids=np.array(input_ids),
+                    input_mask=np.array(input_mask),
+                    segment_ids=np.array(segment_ids),
+                    cls_index=np.array(cls_index),
+                    p_mask=p_mask,
+                    paragraph_len=window_length,
+                    start_position=start_position,
+                    end_position=end_position,
+                    answers=self.answers,
+                    doc_tokens=self.doc_tokens,
+                )
+            )
+        return features
+
+    def _answer_is_found(self):
+        actual_text = " ".join(self.doc_tokens[self.start_position : (self.end_position + 1)])
+        cleaned_answer_text = " ".join(whitespace_tokenize(self.answer_text))
+        if actual_text.find(cleaned_answer_text) == -1:
+            logger.warning("Could not find answer: '%s' vs. '%s'", actual_text, cleaned_answer_text)
+            return False
+        return True
+
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     unique_id: str
@@ -505,6 +674,71 @@ def _new_check_is_max_context(doc_spans, cur_span_index, position):
     return cur_span_index == best_span_index
 
 
+def _get_max_context_window_indices(window_starts, window_lengths, num_tokens):
+    """Vectorized _new_check_is_max_context: for each token, get the index of the window in
+    which it has the most context (the first such window, in case of ties).
+    """
+    positions = np.arange(num_tokens)
+    window_starts = window_starts[:, None]
+    window_ends = window_starts + window_lengths[:, None] - 1
+    scores = np.minimum(positions - window_starts, window_ends - positions) + 0.01 * (
+        window_lengths[:, None]
+    )
+    in_window = (positions >= window_starts) & (positions <= window_ends)
+    return np.where(in_window, scores, -np.inf).argmax(axis=0)
+
+
+def _get_num_added_tokens(tokenizer):
+    """Number of special tokens added to a single sequence, and to a pair of sequences"""
+    sequence_added_tokens = (
+        tokenizer.max_len - tokenizer.max_len_single_sentence + 1
+        if "roberta" in str(type(tokenizer)) or "camembert" in str(type(tokenizer))
+        else tokenizer.max_len - tokenizer.max_len_single_sentence
+    )
+    sequence_pair_added_tokens = tokenizer.max_len - tokenizer.max_len_sentences_pair
+    return sequence_added_tokens, sequence_pair_added_tokens
+
+
+def _tokenize_context_fast(context_text, char_to_word_offset, num_words, tokenizer):
+    """Tokenize a whole context with a fast tokenizer, mapping tokens back to whitespace tokens.
+
+    Returns:
+        (doc_ids, all_doc_tokens, tok_to_orig_index, orig_to_tok_index)
+    """
+    encoding = tokenizer(context_text, add_special_tokens=False, return_offsets_mapping=True)
+    offsets = np.array(encoding["offset_mapping"], dtype=int).reshape(-1, 2)
+    # Tokens are attributed to the word of their last char, since some tokenizers include a
+    # preceding space in the token's offsets. Empty tokens are attributed to the following word.
+    char_idxs = np.minimum(np.maximum(offsets[:, 1] - 1, offsets[:, 0]), len(context_text) - 1)
+    tok_to_orig_index = np.array(char_to_word_offset, dtype=int)[char_idxs]
+    orig_to_tok_index = np.searchsorted(tok_to_orig_index, np.arange(num_words), side="left")
+    return (
+        tuple(encoding["input_ids"]),
+        tuple(tokenizer.convert_ids_to_tokens(encoding["input_ids"])),
+        tok_to_orig_index,
+        orig_to_tok_index.tolist(),
+    )
+
+
+def _tokenize_doc_tokens(doc_tokens, tokenizer):
+    """Tokenize each whitespace token in a context.
+
+    Returns:
+        (tok_to_orig_index, orig_to_tok_index, all_doc_tokens), as tuples (so that they can be
+        shared between examples with the same context)
+    """
+    tok_to_orig_index = []
+    orig_to_tok_index = []
+    all_doc_tokens = []
+    for (i, token) in enumerate(doc_tokens):
+        orig_to_tok_index.append(len(all_doc_tokens))
+        sub_tokens = tokenizer.tokenize(token)
+        for sub_token in sub_tokens:
+            tok_to_orig_index.append(i)
+            all_doc_tokens.append(sub_token)
+    return tuple(tok_to_orig_index), tuple(orig_to_tok_index), tuple(all_doc_tokens)
+
+
 def _improve_answer_span(doc_tokens, input_start, input_end, tokenizer, orig_answer_text):
     """Returns tokenized answer spans that better match the annotated answer."""
     tok_answer_text = " ".join(tokenizer.tokenize(orig_answer_text))
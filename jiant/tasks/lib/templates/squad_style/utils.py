@@ -1,12 +1,12 @@
 import collections
 import math
-import re
-import string
 
+import numpy as np
 from dataclasses import dataclass
 from typing import List, Dict
 
 from transformers.tokenization_bert import BasicTokenizer
+import jiant.utils.string_comparing as string_comparing
 from jiant.utils.display import maybe_tqdm
 
 
@@ -33,6 +33,14 @@ class SquadResult:
     end_logits: List[float]
 
 
+_PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
+    "PrelimPrediction", ["feature_index", "start_index", "end_index", "start_logit", "end_logit"],
+)
+_NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
+    "NbestPrediction", ["text", "start_logit", "end_logit"]
+)
+
+
 def get_partial_examples(examples, features):
     example_index_to_features = collections.defaultdict(list)
     for feature in features:
@@ -67,11 +75,6 @@ def compute_predictions_logits_v2(
     for result in all_results:
         unique_id_to_result[result.unique_id] = result
 
-    _PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-        "PrelimPrediction",
-        ["feature_index", "start_index", "end_index", "start_logit", "end_logit"],
-    )
-
     all_predictions = collections.OrderedDict()
     all_nbest_json = collections.OrderedDict()
     scores_diff_json = collections.OrderedDict()
@@ -79,69 +82,17 @@ def compute_predictions_logits_v2(
     for example in maybe_tqdm(partial_examples, verbose=verbose):
         features = example.partial_features
 
-        prelim_predictions = []
-        # keep track of the minimum score of null start+end of position 0
-        score_null = 1000000  # large and positive
-        min_null_feature_index = 0  # the paragraph slice with min null score
-        null_start_logit = 0  # the start logit at the slice with min null score
-        null_end_logit = 0  # the end logit at the slice with min null score
-        for (feature_index, feature) in enumerate(features):
-            result = unique_id_to_result[feature.unique_id]
-            start_indexes = _get_best_indexes(result.start_logits, n_best_size)
-            end_indexes = _get_best_indexes(result.end_logits, n_best_size)
-            # if we could have irrelevant answers, get the min score of irrelevant
-            if version_2_with_negative:
-                feature_null_score = result.start_logits[0] + result.end_logits[0]
-                if feature_null_score < score_null:
-                    score_null = feature_null_score
-                    min_null_feature_index = feature_index
-                    null_start_logit = result.start_logits[0]
-                    null_end_logit = result.end_logits[0]
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= len(feature.tokens):
-                        continue
-                    if end_index >= len(feature.tokens):
-                        continue
-                    if start_index not in feature.token_to_orig_map:
-                        continue
-                    if end_index not in feature.token_to_orig_map:
-                        continue
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_logit=result.start_logits[start_index],
-                            end_logit=result.end_logits[end_index],
-                        )
-                    )
-        if version_2_with_negative:
-            prelim_predictions.append(
-                _PrelimPrediction(
-                    feature_index=min_null_feature_index,
-                    start_index=0,
-                    end_index=0,
-                    start_logit=null_start_logit,
-                    end_logit=null_end_logit,
-                )
-            )
-        prelim_predictions = sorted(
-            prelim_predictions, key=lambda x: (x.start_logit + x.end_logit), reverse=True
-        )
-
-        _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-            "NbestPrediction", ["text", "start_logit", "end_logit"]
+        (
+            prelim_predictions,
+            score_null,
+            null_start_logit,
+            null_end_logit,
+        ) = get_sorted_prelim_predictions(
+            features=features,
+            unique_id_to_result=unique_id_to_result,
+            n_best_size=n_best_size,
+            max_answer_length=max_answer_length,
+            version_2_with_negative=version_2_with_negative,
         )
 
         seen_predictions = {}
@@ -266,80 +217,23 @@ def compute_predictions_logits(
     for result in all_results:
         unique_id_to_result[result.unique_id] = result
 
-    _PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-        "PrelimPrediction",
-        ["feature_index", "start_index", "end_index", "start_logit", "end_logit"],
-    )
-
     all_predictions = collections.OrderedDict()
     scores_diff_json = collections.OrderedDict()
 
     for (example_index, example) in enumerate(all_examples):
         features = example_index_to_features[example_index]
 
-        prelim_predictions = []
-        # keep track of the minimum score of null start+end of position 0
-        score_null = 1000000  # large and positive
-        min_null_feature_index = 0  # the paragraph slice with min null score
-        null_start_logit = 0  # the start logit at the slice with min null score
-        null_end_logit = 0  # the end logit at the slice with min null score
-        for (feature_index, feature) in enumerate(features):
-            result = unique_id_to_result[feature.unique_id]
-            start_indexes = _get_best_indexes(result.start_logits, n_best_size)
-            end_indexes = _get_best_indexes(result.end_logits, n_best_size)
-            # if we could have irrelevant answers, get the min score of irrelevant
-            if version_2_with_negative:
-                feature_null_score = result.start_logits[0] + result.end_logits[0]
-                if feature_null_score < score_null:
-                    score_null = feature_null_score
-                    min_null_feature_index = feature_index
-                    null_start_logit = result.start_logits[0]
-                    null_end_logit = result.end_logits[0]
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= len(feature.tokens):
-                        continue
-                    if end_index >= len(feature.tokens):
-                        continue
-                    if start_index not in feature.token_to_orig_map:
-                        continue
-                    if end_index not in feature.token_to_orig_map:
-                        continue
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_logit=result.start_logits[start_index],
-                            end_logit=result.end_logits[end_index],
-                        )
-                    )
-        if version_2_with_negative:
-            prelim_predictions.append(
-                _PrelimPrediction(
-                    feature_index=min_null_feature_index,
-                    start_index=0,
-                    end_index=0,
-                    start_logit=null_start_logit,
-                    end_logit=null_end_logit,
-                )
-            )
-        prelim_predictions = sorted(
-            prelim_predictions, key=lambda x: (x.start_logit + x.end_logit), reverse=True
-        )
-
-        _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
-            "NbestPrediction", ["text", "start_logit", "end_logit"]
+        (
+            prelim_predictions,
+            score_null,
+            null_start_logit,
+            null_end_logit,
+        ) = get_sorted_prelim_predictions(
+            features=features,
+            unique_id_to_result=unique_id_to_result,
+            n_best_size=n_best_size,
+            max_answer_length=max_answer_length,
+            version_2_with_negative=version_2_with_negative,
         )
 
         seen_predictions = {}
@@ -527,16 +421,145 @@ def get_final_text(pred_text, orig_text, do_lower_case):
     return output_text
 
 
-def _get_best_indexes(logits, n_best_size):
-    """Get the n-best logits from a list."""
-    index_and_score = sorted(enumerate(logits), key=lambda x: x[1], reverse=True)
+def get_sorted_prelim_predictions(
+    features, unique_id_to_result, n_best_size, max_answer_length, version_2_with_negative,
+):
+    """Score the valid n-best spans of all features of an example, and sort them best-first.
+
+    Span validity and scores are computed with array operations per feature. The returned
+    predictions are built lazily, since callers usually only consume the first few.
+
+    Args:
+        features (List[PartialFeatures]): features (doc-stride windows) of a single example.
+        unique_id_to_result (Dict[int, SquadResult]): map from feature unique_id to logits.
+        n_best_size (int): number of top start and end logits considered per feature.
+        max_answer_length (int): maximum length of a predicted answer span.
+        version_2_with_negative (bool): whether to add the null (no-answer) prediction.
+
+    Returns:
+        (tuple): tuple containing:
+            prelim_predictions (Iterator[_PrelimPrediction]): predictions, best first.
+            score_null (float): minimum null score across features.
+            null_start_logit (float): start logit of the feature with the minimum null score.
+            null_end_logit (float): end logit of the feature with the minimum null score.
+
+    """
+    feature_index_ls, start_index_ls, end_index_ls = [], [], []
+    start_logit_ls, end_logit_ls = [], []
+    # keep track of the minimum score of null start+end of position 0
+    score_null = 1000000  # large and positive
+    min_null_feature_index = 0  # the paragraph slice with min null score
+    null_start_logit = 0  # the start logit at the slice with min null score
+    null_end_logit = 0  # the end logit at the slice with min null score
+    for (feature_index, feature) in enumerate(features):
+        result = unique_id_to_result[feature.unique_id]
+        start_logits = np.asarray(result.start_logits)
+        end_logits = np.asarray(result.end_logits)
+        # if we could have irrelevant answers, get the min score of irrelevant
+        if version_2_with_negative:
+            feature_null_score = start_logits[0] + end_logits[0]
+            if feature_null_score < score_null:
+                score_null = feature_null_score
+                min_null_feature_index = feature_index
+                null_start_logit = start_logits[0]
+                null_end_logit = end_logits[0]
+        start_indexes, end_indexes = get_valid_span_indexes(
+            feature=feature,
+            start_logits=start_logits,
+            end_logits=end_logits,
+            n_best_size=n_best_size,
+            max_answer_length=max_answer_length,
+        )
+        feature_index_ls.append(np.full(len(start_indexes), feature_index))
+        start_index_ls.append(start_indexes)
+        end_index_ls.append(end_indexes)
+        start_logit_ls.append(start_logits[start_indexes])
+        end_logit_ls.append(end_logits[end_indexes])
+    if version_2_with_negative:
+        feature_index_ls.append(np.array([min_null_feature_index]))
+        start_index_ls.append(np.array([0]))
+        end_index_ls.append(np.array([0]))
+        start_logit_ls.append(np.array([null_start_logit]))
+        end_logit_ls.append(np.array([null_end_logit]))
+    if not feature_index_ls:
+        return iter([]), score_null, null_start_logit, null_end_logit
+
+    feature_index_arr = np.concatenate(feature_index_ls)
+    start_index_arr = np.concatenate(start_index_ls)
+    end_index_arr = np.concatenate(end_index_ls)
+    start_logit_arr = np.concatenate(start_logit_ls)
+    end_logit_arr = np.concatenate(end_logit_ls)
+    # Stable sort, so that ties are resolved in (feature, start, end) visiting order
+    order = np.argsort(-(start_logit_arr + end_logit_arr), kind="stable")
+    prelim_predictions = (
+        _PrelimPrediction(
+            feature_index=int(feature_index_arr[i]),
+            start_index=int(start_index_arr[i]),
+            end_index=int(end_index_arr[i]),
+            start_logit=start_logit_arr[i],
+            end_logit=end_logit_arr[i],
+        )
+        for i in order
+    )
+    return prelim_predictions, score_null, null_start_logit, null_end_logit
+
+
+def get_valid_span_indexes(feature, start_logits, end_logits, n_best_size, max_answer_length):
+    """Get the (start, end) pairs among the n-best start/end logits that are valid answer spans.
+
+    We could hypothetically create invalid predictions, e.g., predict that the start of the span
+    is in the question. We throw out all invalid predictions. The pairs are returned in the
+    order of a nested loop over the n-best start indexes, then the n-best end indexes.
+
+    Args:
+        feature (PartialFeatures): a single doc-stride window.
+        start_logits (np.ndarray): start logits for the feature.
+        end_logits (np.ndarray): end logits for the feature.
+        n_best_size (int): number of top start and end logits to consider.
+        max_answer_length (int): maximum length of a predicted answer span.
+
+    Returns:
+        (tuple): tuple containing:
+            start_indexes (np.ndarray): start token index of each valid span.
+            end_indexes (np.ndarray): end token index of each valid span.
+
+    """
+    seq_length = len(start_logits)
+    in_document = np.arange(seq_length) < len(feature.tokens)
+    in_document &= _get_key_mask(feature.token_to_orig_map, seq_length)
+    is_max_context = _get_key_mask(feature.token_is_max_context, seq_length, true_only=True)
+
+    start_indexes = _get_best_indexes(start_logits, n_best_size)
+    end_indexes = _get_best_indexes(end_logits, n_best_size)
+    start_indexes = start_indexes[(in_document & is_max_context)[start_indexes]]
+    end_indexes = end_indexes[in_document[end_indexes]]
+
+    length = end_indexes[None, :] - start_indexes[:, None] + 1
+    start_pos, end_pos = np.nonzero((length >= 1) & (length <= max_answer_length))
+    return start_indexes[start_pos], end_indexes[end_pos]
+
+
+def _get_key_mask(d, length, true_only=False):
+    """Boolean mask over [0, length) of the integer keys in d (optionally only truthy values)."""
+    keys = np.fromiter(d.keys(), dtype=np.int64, count=len(d))
+    if true_only:
+        keys = keys[np.fromiter(d.values(), dtype=bool, count=len(d))]
+    mask = np.zeros(length, dtype=bool)
+    mask[keys[keys < length]] = True
+    return mask
 
-    best_indexes = []
-    for i in range(len(index_and_score)):
-        if i >= n_best_size:
-            break
-        best_indexes.append(index_and_score[i][0])
-    return best_indexes
+
+def _get_best_indexes(logits, n_best_size):
+    """Get the indexes of the n-best logits, best first (ties broken by lower index)."""
+    logits = np.asarray(logits)
+    if n_best_size >= len(logits):
+        return np.argsort(-logits, kind="stable")
+    kth = len(logits) - n_best_size
+    threshold = logits[np.argpartition(logits, kth)[kth]]
+    above = np.flatnonzero(logits > threshold)
+    tied = np.flatnonzero(logits == threshold)[: n_best_size - len(above)]
+    best_indexes = np.concatenate([above, tied])
+    return best_indexes[np.argsort(-logits[best_indexes], kind="stable")]
 
 
 def _compute_softmax(scores):
@@ -565,7 +588,9 @@ def _compute_softmax(scores):
 # === #
 
 
-def squad_evaluate(examples, preds, no_answer_probs=None, no_answer_probability_threshold=1.0):
+def squad_evaluate(
+    examples, preds, no_answer_probs=None, no_answer_probability_threshold=1.0, num_workers=0
+):
     qas_id_to_has_answer = {example.qas_id: bool(example.answers) for example in examples}
     has_answer_qids = [qas_id for qas_id, has_answer in qas_id_to_has_answer.items() if has_answer]
     no_answer_qids = [
@@ -575,7 +600,7 @@ def squad_evaluate(examples, preds, no_answer_probs=None, no_answer_probability_
     if no_answer_probs is None:
         no_answer_probs = {k: 0.0 for k in preds}
 
-    exact, f1 = get_raw_scores(examples, preds)
+    exact, f1 = get_raw_scores(examples, preds, num_workers=num_workers)
 
     exact_threshold = apply_no_ans_threshold(
         exact, no_answer_probs, qas_id_to_has_answer, no_answer_probability_threshold
@@ -670,11 +695,11 @@ def find_best_thresh(preds, scores, na_probs, qid_to_has_ans):
     return 100.0 * best_score / len(scores), best_thresh
 
 
-def get_raw_scores(examples, preds):
+def get_raw_scores(examples, preds, num_workers=0):
     """Computes the exact and f1 scores from the examples and the model predictions"""
-    exact_scores = {}
-    f1_scores = {}
-
+    qas_ids = []
+    predictions = []
+    gold_answers_list = []
     for example in examples:
         qas_id = example.qas_id
         gold_answers = [
@@ -689,31 +714,24 @@ def get_raw_scores(examples, preds):
             print("Missing prediction for %s" % qas_id)
             continue
 
-        prediction = preds[qas_id]
-        exact_scores[qas_id] = max(compute_exact(a, prediction) for a in gold_answers)
-        f1_scores[qas_id] = max(compute_f1(a, prediction) for a in gold_answers)
+        qas_ids.append(qas_id)
+        predictions.append(preds[qas_id])
+        gold_answers_list.append(gold_answers)
 
+    exact_list, f1_list = string_comparing.compute_em_and_f1(
+        predictions=predictions,
+        ground_truths_list=gold_answers_list,
+        empty_match=True,
+        num_workers=num_workers,
+    )
+    exact_scores = dict(zip(qas_ids, exact_list))
+    f1_scores = dict(zip(qas_ids, f1_list))
     return exact_scores, f1_scores
 
 
 def normalize_answer(s):
     """Lower text and remove punctuation, articles and extra whitespace."""
-
-    def remove_articles(text):
-        regex = re.compile(r"\b(a|an|the)\b", re.UNICODE)
-        return re.sub(regex, " ", text)
-
-    def white_space_fix(text):
-        return " ".join(text.split())
-
-    def remove_punc(text):
-        exclude = set(string.punctuation)
-        return "".join(ch for ch in text if ch not in exclude)
-
-    def lower(text):
-        return text.lower()
-
-    return white_space_fix(remove_articles(remove_punc(lower(s))))
+    return string_comparing.normalize_answer(s)
 
 
 def get_tokens(s):
@@ -723,20 +741,12 @@ def get_tokens(s):
 
 
 def compute_exact(a_gold, a_pred):
-    return int(normalize_answer(a_gold) == normalize_answer(a_pred))
+    return int(string_comparing.exact_match_score(a_pred, a_gold))
 
 
 def compute_f1(a_gold, a_pred):
-    gold_toks = get_tokens(a_gold)
-    pred_toks = get_tokens(a_pred)
-    common = collections.Counter(gold_toks) & collections.Counter(pred_toks)
-    num_same = sum(common.values())
-    if len(gold_toks) == 0 or len(pred_toks) == 0:
-        # If either is no-answer, then F1 is 1 if they agree, 0 otherwise
-        return int(gold_toks == pred_toks)
-    if num_same == 0:
-        return 0
-    precision = 1.0 * num_same / len(pred_toks)
-    recall = 1.0 * num_same / len(gold_toks)
-    f1 = (2 * precision * recall) / (precision + recall)
-    return f1
+    return string_comparing.normalized_f1_score(
+        string_comparing.get_normalized_answer(a_pred),
+        string_comparing.get_normalized_answer(a_gold),
+        empty_match=True,
+    )
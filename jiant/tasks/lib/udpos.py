@@ -17,7 +17,7 @@ from jiant.tasks.lib.templates.shared import (
     construct_single_input_tokens_and_segment_ids,
     pad_single_with_feat_spec,
 )
-from jiant.utils.python.datastructures import zip_equal
+from jiant.utils.python.datastructures import zip_equal, add_slots
 from jiant.utils.python.io import read_file_lines
 
 ARBITRARY_OVERLY_LONG_WORD_CONSTRAINT = 100
@@ -26,6 +26,7 @@ ARBITRARY_OVERLY_LONG_WORD_CONSTRAINT = 100
 # In these cases, we simply replace it with an UNK token.
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -52,6 +53,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -105,6 +107,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
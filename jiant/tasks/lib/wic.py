@@ -21,9 +21,11 @@ from jiant.tasks.lib.templates.shared import (
 from jiant.tasks.utils import truncate_sequences, ExclusiveSpan
 from jiant.utils.python.io import read_json_lines
 from jiant.utils import retokenize
-from jiant.utils.tokenization_normalization import normalize_tokenizations
+from jiant.utils.tokenization_normalization import normalize_tokenizations_cached
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -61,12 +63,12 @@ class Example(BaseExample):
             (
                 sentence_normed_space_tokenization,
                 sentence_normed_target_tokenization,
-            ) = normalize_tokenizations(
+            ) = normalize_tokenizations_cached(
                 sentence_space_tokenization, sentence_target_tokenization, tokenizer
             )
             span_start_char = len(" ".join(sentence_normed_space_tokenization[:span_start_idx]))
             span_text_char = len(span_text)
-            aligner = retokenize.TokenAligner(
+            aligner = retokenize.get_token_aligner(
                 sentence_normed_space_tokenization, sentence_normed_target_tokenization
             )
             target_span = ExclusiveSpan(
@@ -94,6 +96,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -193,6 +196,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
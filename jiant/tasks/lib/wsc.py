@@ -18,11 +18,12 @@ from jiant.tasks.lib.templates.shared import (
     create_input_set_from_tokens_and_segments,
 )
 from jiant.tasks.utils import truncate_sequences, ExclusiveSpan
-from jiant.utils import retokenize
 from jiant.utils.python.io import read_json_lines
-from jiant.utils.tokenization_normalization import normalize_tokenizations
+from jiant.utils.tokenization_normalization import get_normalized_token_aligner
+from jiant.utils.python.datastructures import add_slots
 
 
+@add_slots
 @dataclass
 class Example(BaseExample):
     guid: str
@@ -36,10 +37,7 @@ class Example(BaseExample):
     def tokenize(self, tokenizer):
         space_tokenization = self.text.split()
         target_tokenization = tokenizer.tokenize(self.text)
-        normed_space_tokenization, normed_target_tokenization = normalize_tokenizations(
-            space_tokenization, target_tokenization, tokenizer
-        )
-        aligner = retokenize.TokenAligner(normed_space_tokenization, normed_target_tokenization)
+        aligner = get_normalized_token_aligner(space_tokenization, target_tokenization, tokenizer)
         span1_token_count = len(self.span1_text.split())
         span2_token_count = len(self.span2_text.split())
         target_span1 = ExclusiveSpan(
@@ -59,6 +57,7 @@ class Example(BaseExample):
         )
 
 
+@add_slots
 @dataclass
 class TokenizedExample(BaseTokenizedExample):
     guid: str
@@ -114,6 +113,7 @@ class TokenizedExample(BaseTokenizedExample):
         )
 
 
+@add_slots
 @dataclass
 class DataRow(BaseDataRow):
     guid: str
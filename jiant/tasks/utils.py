@@ -1,6 +1,9 @@
 import numpy as np
 
-from typing import NamedTuple, Sequence
+from typing import Callable, NamedTuple, Sequence
+
+import jiant.utils.python.parallel_io as parallel_io
+from jiant.utils.python.datastructures import ReusableGenerator
 
 
 class InclusiveSpan(NamedTuple):
@@ -91,3 +94,33 @@ def pad_to_max_seq_length(ls, max_seq_length, pad_idx=0, pad_right=True, check=T
     if check:
         assert len(result) == max_seq_length
     return result
+
+
+def read_examples_lazily(
+    create_examples_fn: Callable, path: str, set_type: str, file_format: str = "jsonl"
+) -> ReusableGenerator:
+    """Lazily create Examples from a file, whose lines are parsed in parallel.
+
+    Args:
+        create_examples_fn: function taking (lines, set_type) and yielding Examples, e.g. a
+            Task's _create_examples written as a generator.
+        path: path to data file.
+        set_type: phase, passed to create_examples_fn.
+        file_format: "jsonl", "tsv" or "text" (see: parallel_io.iter_parsed_lines).
+
+    Returns:
+        ReusableGenerator of Examples, in file order (the file is re-read for each iteration).
+
+    """
+    return ReusableGenerator(
+        _create_examples_from_path,
+        create_examples_fn=create_examples_fn,
+        path=path,
+        set_type=set_type,
+        file_format=file_format,
+    )
+
+
+def _create_examples_from_path(create_examples_fn, path, set_type, file_format):
+    lines = parallel_io.iter_parsed_lines(path=path, file_format=file_format)
+    yield from create_examples_fn(lines=lines, set_type=set_type)
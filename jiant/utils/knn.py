@@ -0,0 +1,367 @@
+"""Exact k-nearest-neighbour search over embedding matrices.
+
+Used by the retrieval tasks (Tatoeba, BUCC2018). The "blocked" backend only needs numpy:
+queries and database are processed in tiles, so that peak memory is bounded by the tile size
+rather than by the size of the full (queries x database) score matrix, and the database may be
+stored in float16 (tiles are upcast to float32 before the matrix multiplication).
+faiss (IndexFlat) can be used instead with backend="faiss", or backend="auto" to use faiss only if
+it is installed.
+
+For corpora where exact O(N*M) search is too slow, set KNNConfig.ann_type to search an
+approximate faiss index (IVF or HNSW) instead, see ANNIndex.
+"""
+import concurrent.futures
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+METRICS = ("ip", "cosine", "l2")
+
+
+@dataclass
+class KNNConfig:
+    # "blocked", "faiss", or "auto" (faiss if installed, otherwise "blocked")
+    backend: str = "blocked"
+    # Number of queries per tile
+    query_block_size: int = 4096
+    # Max size of the (query tile x database tile) float32 score matrix, per thread
+    max_block_bytes: int = 2 ** 28
+    # Number of query tiles searched concurrently
+    num_threads: int = 1
+    # If set (e.g. "float16"), embeddings are converted to this dtype before searching
+    storage_dtype: Optional[str] = None
+
+    # Approximate search (requires faiss): None for exact search, "ivf" or "hnsw"
+    ann_type: Optional[str] = None
+    # IVF: number of clusters, and number of clusters visited per query
+    ivf_nlist: int = 1024
+    ivf_nprobe: int = 16
+    # IVF: max number of database rows used to train the clustering
+    ivf_max_train_size: int = 256 * 1024
+    # HNSW: neighbours per node, and beam sizes for construction and search
+    hnsw_m: int = 32
+    hnsw_ef_construction: int = 80
+    hnsw_ef_search: int = 64
+    # Number of rows added to, or searched in, the faiss index at once
+    ann_batch_size: int = 65536
+    # Number of queries used to measure the recall of approximate search against exact search
+    ann_recall_sample_size: int = 1000
+
+    def __post_init__(self):
+        if self.ann_type not in (None, "ivf", "hnsw"):
+            raise KeyError(self.ann_type)
+
+
+def is_faiss_available():
+    try:
+        import faiss  # noqa F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_backend(backend):
+    if backend == "auto":
+        return "faiss" if is_faiss_available() else "blocked"
+    elif backend in ("blocked", "faiss"):
+        return backend
+    else:
+        raise KeyError(backend)
+
+
+def l2_normalize_(x):
+    """L2-normalize rows of a float array in place (same as faiss.normalize_L2)"""
+    # Norms are computed in at least float32 (e.g. for float16 storage), or in float64
+    norms_dtype = np.promote_types(x.dtype, np.float32)
+    norms = np.sqrt(np.einsum("ij,ij->i", x, x, dtype=norms_dtype))[:, None]
+    np.divide(x, norms, out=x, where=norms > 0, casting="unsafe")
+    return x
+
+
+def as_storage_dtype(x, knn_config: Optional[KNNConfig] = None):
+    if knn_config is None or knn_config.storage_dtype is None:
+        return x
+    return x.astype(knn_config.storage_dtype, copy=False)
+
+
+def exact_knn(queries, database, k, metric="ip", knn_config: Optional[KNNConfig] = None):
+    """Exact k-nearest-neighbour search.
+
+    Args:
+        queries: (num_queries, dim) array
+        database: (num_database, dim) array
+        k: number of neighbours to return per query
+        metric: "ip" (inner product, descending), "cosine" (cosine similarity, descending;
+            inputs are not modified) or "l2" (squared L2 distance, ascending)
+        knn_config: KNNConfig
+
+    Returns:
+        (scores, indices), both (num_queries, min(k, num_database)) arrays, best neighbours first
+    """
+    if knn_config is None:
+        knn_config = KNNConfig()
+    if metric not in METRICS:
+        raise KeyError(metric)
+    assert queries.shape[1] == database.shape[1]
+    k = min(k, database.shape[0])
+    if k == 0:
+        # e.g. an empty database
+        return (
+            np.empty((queries.shape[0], 0), dtype=np.float32),
+            np.empty((queries.shape[0], 0), dtype=np.int64),
+        )
+    if resolve_backend(knn_config.backend) == "faiss":
+        return _faiss_knn(queries=queries, database=database, k=k, metric=metric)
+    else:
+        return _blocked_knn(
+            queries=queries, database=database, k=k, metric=metric, knn_config=knn_config,
+        )
+
+
+def _faiss_knn(queries, database, k, metric):
+    import faiss
+
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    database = np.ascontiguousarray(database, dtype=np.float32)
+    dim = queries.shape[1]
+    if metric == "cosine":
+        queries = l2_normalize_(queries.copy())
+        database = l2_normalize_(database.copy())
+    idx = faiss.IndexFlatL2(dim) if metric == "l2" else faiss.IndexFlatIP(dim)
+    idx.add(database)
+    return idx.search(queries, k)
+
+
+def _blocked_knn(queries, database, k, metric, knn_config: KNNConfig):
+    num_queries = queries.shape[0]
+    query_block_size = max(1, min(knn_config.query_block_size, num_queries))
+    database_block_size = max(1, knn_config.max_block_bytes // (4 * query_block_size))
+    database_block_size = min(database_block_size, database.shape[0])
+
+    # Per-row statistics of the database are needed for every query tile, so compute them once
+    if metric == "cosine":
+        database_stats = _get_blocked_norms(database, database_block_size)
+    elif metric == "l2":
+        database_stats = _get_blocked_norms(database, database_block_size) ** 2
+    else:
+        database_stats = None
+
+    scores = np.empty((num_queries, k), dtype=np.float32)
+    indices = np.empty((num_queries, k), dtype=np.int64)
+
+    def search_query_block(start):
+        end = min(start + query_block_size, num_queries)
+        block_scores, block_indices = _search_query_block(
+            query_block=queries[start:end].astype(np.float32),
+            database=database,
+            database_stats=database_stats,
+            database_block_size=database_block_size,
+            k=k,
+            metric=metric,
+        )
+        scores[start:end] = block_scores
+        indices[start:end] = block_indices
+
+    starts = range(0, num_queries, query_block_size)
+    if knn_config.num_threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(knn_config.num_threads) as executor:
+            # Consume the results to surface exceptions
+            list(executor.map(search_query_block, starts))
+    else:
+        for start in starts:
+            search_query_block(start)
+    return scores, indices
+
+
+def _get_blocked_norms(x, block_size):
+    return np.concatenate(
+        [
+            np.linalg.norm(x[start : start + block_size].astype(np.float32), axis=1)
+            for start in range(0, x.shape[0], block_size)
+        ]
+    )
+
+
+def _search_query_block(query_block, database, database_stats, database_block_size, k, metric):
+    # Within the search, higher is always better: l2 distances are negated
+    if metric == "cosine":
+        query_norms = np.linalg.norm(query_block, axis=1)
+        query_norms[query_norms == 0] = 1
+        query_block = query_block / query_norms[:, None]
+    elif metric == "l2":
+        query_sq_norms = (query_block ** 2).sum(axis=1)
+
+    best_scores = np.empty((query_block.shape[0], 0), dtype=np.float32)
+    best_indices = np.empty((query_block.shape[0], 0), dtype=np.int64)
+    for start in range(0, database.shape[0], database_block_size):
+        end = min(start + database_block_size, database.shape[0])
+        scores = query_block @ database[start:end].astype(np.float32).T
+        if metric == "cosine":
+            norms = database_stats[start:end]
+            scores /= np.where(norms > 0, norms, 1)[None, :]
+        elif metric == "l2":
+            scores *= 2
+            scores -= query_sq_norms[:, None]
+            scores -= database_stats[None, start:end]
+            np.minimum(scores, 0, out=scores)
+        block_scores, block_indices = _top_k(scores, k)
+        best_scores, best_indices = _top_k_of(
+            scores=np.concatenate([best_scores, block_scores], axis=1),
+            indices=np.concatenate([best_indices, block_indices + start], axis=1),
+            k=k,
+        )
+
+    # Sort by score, then by index
+    order = np.lexsort((best_indices, -best_scores), axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_indices = np.take_along_axis(best_indices, order, axis=1)
+    if metric == "l2":
+        best_scores = -best_scores
+    return best_scores, best_indices
+
+
+def _top_k(scores, k):
+    if scores.shape[1] <= k:
+        indices = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        return scores, indices
+    indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, indices, axis=1), indices
+
+
+def _top_k_of(scores, indices, k):
+    if scores.shape[1] <= k:
+        return scores, indices
+    selected = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(scores, selected, axis=1), np.take_along_axis(indices, selected, 1)
+
+
+def knn_search(queries, database, k, metric="ip", knn_config: Optional[KNNConfig] = None):
+    """k-nearest-neighbour search, approximate if knn_config.ann_type is set, otherwise exact.
+
+    See exact_knn for arguments and outputs.
+    """
+    if knn_config is not None and knn_config.ann_type is not None:
+        return ANNIndex(database=database, metric=metric, knn_config=knn_config).search(
+            queries=queries, k=k
+        )
+    else:
+        return exact_knn(
+            queries=queries, database=database, k=k, metric=metric, knn_config=knn_config
+        )
+
+
+class ANNIndex:
+    def __init__(self, database, metric="ip", knn_config: Optional[KNNConfig] = None):
+        """Approximate nearest-neighbour index (faiss IVF or HNSW) over a database of embeddings.
+
+        The index is built once on construction, and can then be searched with any number of
+        query sets. Scores follow the conventions of exact_knn.
+
+        Args:
+            database: (num_database, dim) array. Kept by reference, for recall_report.
+            metric: "ip", "cosine" or "l2"
+            knn_config: KNNConfig, with ann_type set to "ivf" or "hnsw"
+        """
+        import faiss
+
+        if metric not in METRICS:
+            raise KeyError(metric)
+        self.database = database
+        self.metric = metric
+        self.knn_config = knn_config if knn_config is not None else KNNConfig(ann_type="hnsw")
+
+        dim = database.shape[1]
+        faiss_metric = faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT
+        ann_type = self.knn_config.ann_type
+        if ann_type == "ivf":
+            nlist = max(1, min(self.knn_config.ivf_nlist, database.shape[0]))
+            quantizer = faiss.IndexFlatL2(dim) if metric == "l2" else faiss.IndexFlatIP(dim)
+            self.index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss_metric)
+            # Keep a reference to the quantizer, which the index does not own
+            self.quantizer = quantizer
+            train_size = min(database.shape[0], self.knn_config.ivf_max_train_size)
+            train_inds = np.sort(
+                np.random.RandomState(0).choice(database.shape[0], train_size, replace=False)
+            )
+            self.index.train(self._prepare(database[train_inds]))
+            self.index.nprobe = min(self.knn_config.ivf_nprobe, nlist)
+        elif ann_type == "hnsw":
+            self.index = faiss.IndexHNSWFlat(dim, self.knn_config.hnsw_m, faiss_metric)
+            self.index.hnsw.efConstruction = self.knn_config.hnsw_ef_construction
+            self.index.hnsw.efSearch = self.knn_config.hnsw_ef_search
+        else:
+            raise KeyError(ann_type)
+
+        batch_size = self.knn_config.ann_batch_size
+        for start in range(0, database.shape[0], batch_size):
+            self.index.add(self._prepare(database[start : start + batch_size]))
+
+    def _prepare(self, x):
+        x = np.array(x, dtype=np.float32, order="C")
+        if self.metric == "cosine":
+            l2_normalize_(x)
+        return x
+
+    def search(self, queries, k):
+        k = min(k, self.database.shape[0])
+        scores = np.empty((queries.shape[0], k), dtype=np.float32)
+        indices = np.empty((queries.shape[0], k), dtype=np.int64)
+        batch_size = self.knn_config.ann_batch_size
+        for start in range(0, queries.shape[0], batch_size):
+            end = start + batch_size
+            scores[start:end], indices[start:end] = self.index.search(
+                self._prepare(queries[start:end]), k
+            )
+        return scores, indices
+
+    def recall_report(self, queries, k, sample_size=None):
+        """Compare approximate against exact search, on a random sample of queries.
+
+        Args:
+            queries: (num_queries, dim) array
+            k: number of neighbours
+            sample_size: number of queries to sample (default: knn_config.ann_recall_sample_size)
+
+        Returns:
+            dict with the recall@k of approximate search, and the time per query of both searches
+        """
+        if sample_size is None:
+            sample_size = self.knn_config.ann_recall_sample_size
+        sample_size = min(sample_size, queries.shape[0])
+        sample_inds = np.sort(
+            np.random.RandomState(0).choice(queries.shape[0], sample_size, replace=False)
+        )
+        sample = queries[sample_inds]
+
+        start_time = time.time()
+        _, ann_indices = self.search(queries=sample, k=k)
+        ann_time = time.time() - start_time
+        start_time = time.time()
+        _, exact_indices = exact_knn(
+            queries=sample,
+            database=self.database,
+            k=k,
+            metric=self.metric,
+            knn_config=KNNConfig(
+                backend="blocked",
+                query_block_size=self.knn_config.query_block_size,
+                max_block_bytes=self.knn_config.max_block_bytes,
+                num_threads=self.knn_config.num_threads,
+            ),
+        )
+        exact_time = time.time() - start_time
+
+        num_found = sum(
+            len(np.intersect1d(ann_row, exact_row))
+            for ann_row, exact_row in zip(ann_indices, exact_indices)
+        )
+        return {
+            "ann_type": self.knn_config.ann_type,
+            "sample_size": sample_size,
+            "k": ann_indices.shape[1],
+            "recall": num_found / max(1, exact_indices.size),
+            "ann_seconds_per_query": ann_time / max(1, sample_size),
+            "exact_seconds_per_query": exact_time / max(1, sample_size),
+        }
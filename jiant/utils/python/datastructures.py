@@ -1,6 +1,6 @@
 import math
 import itertools
-from dataclasses import replace
+from dataclasses import fields, replace
 from typing import Mapping, Any, Sequence, Iterable, Iterator, Union, Tuple, Dict, Set
 
 
@@ -232,17 +232,32 @@ def zip_equal(*iterables):
 
 
 class ExtendedDataClassMixin:
+    # Allows subclasses to be slotted (see: add_slots)
+    __slots__ = ()
+
+    @classmethod
+    def get_field_names(cls) -> Tuple[str, ...]:
+        # Cached per class (in the class's own __dict__, so that it is not inherited)
+        field_names = cls.__dict__.get("_cached_field_names")
+        if field_names is None:
+            # noinspection PyDataclass
+            field_names = tuple(field.name for field in fields(cls))
+            setattr(cls, "_cached_field_names", field_names)
+        return field_names
+
     @classmethod
     def get_fields(cls):
-        # noinspection PyUnresolvedReferences
-        return list(cls.__dataclass_fields__)
+        return list(cls.get_field_names())
 
     @classmethod
     def get_annotations(cls):
-        return cls.__annotations__
+        # Includes fields inherited from parent dataclasses, which cls.__annotations__ does
+        # not on Python>=3.10
+        # noinspection PyDataclass
+        return {field.name: field.type for field in fields(cls)}
 
     def to_dict(self):
-        return {k: getattr(self, k) for k in self.get_fields()}
+        return {k: getattr(self, k) for k in self.get_field_names()}
 
     @classmethod
     def from_dict(cls, kwargs):
@@ -254,6 +269,56 @@ class ExtendedDataClassMixin:
         return replace(self, **new_kwargs)
 
 
+def add_slots(cls):
+    """Recreate a dataclass with __slots__ for its fields (cf. dataclass(slots=True), Python 3.10+)
+
+    Instances of a slotted class do not have a per-instance __dict__, provided that all of its
+    base classes define __slots__ too (e.g. ExtendedDataClassMixin, or other slotted dataclasses).
+    Objects are pickled as a dict of their fields, the same state as an unslotted dataclass, so
+    data cached before and after slotting can be loaded by either.
+
+    Usage:
+        @add_slots
+        @dataclass
+        class DataRow(BaseDataRow):
+            ...
+    """
+    cls_dict = dict(cls.__dict__)
+    inherited_slots = set()
+    for base in cls.__mro__[1:]:
+        inherited_slots.update(base.__dict__.get("__slots__", ()))
+    # noinspection PyDataclass
+    field_names = tuple(field.name for field in fields(cls))
+    slots = tuple(name for name in field_names if name not in inherited_slots)
+    cls_dict["__slots__"] = slots
+    for name in slots:
+        # Remove class-level defaults, which would conflict with the slots (defaults are kept by
+        # the dataclass fields and __init__)
+        cls_dict.pop(name, None)
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    cls_dict.pop("_cached_field_names", None)
+    cls_dict.setdefault("__getstate__", _get_slotted_dataclass_state)
+    cls_dict.setdefault("__setstate__", _set_slotted_dataclass_state)
+    slotted_cls = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted_cls.__qualname__ = cls.__qualname__
+    return slotted_cls
+
+
+def _get_slotted_dataclass_state(self):
+    # noinspection PyDataclass
+    return {field.name: getattr(self, field.name) for field in fields(self)}
+
+
+def _set_slotted_dataclass_state(self, state):
+    if isinstance(state, tuple):
+        # (__dict__ state, slots state), as pickled by default for partially slotted objects
+        dict_state, slots_state = state
+        state = {**(dict_state or {}), **(slots_state or {})}
+    for k, v in state.items():
+        object.__setattr__(self, k, v)
+
+
 class BiMap:
     """Maintains (bijective) mappings between two sets.
 
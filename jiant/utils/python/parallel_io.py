@@ -0,0 +1,147 @@
+"""Parallel, streaming readers for large line-based (JSONL/TSV/plain text) files.
+
+A file is split into byte ranges aligned to line boundaries, ranges are parsed in a process pool,
+and parsed lines are yielded in file order. Only a bounded number of ranges are in flight at any
+time, so the raw lines of a file are never all held in memory (and neither are all of the parsed
+lines, if the consumer does not keep them).
+
+JSON lines are parsed with orjson if it is installed (falling back to json for anything orjson
+rejects, e.g. NaN), and with json otherwise. Files smaller than min_parallel_size are parsed
+in-process, where starting a pool would cost more than it saves.
+"""
+import collections
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+DEFAULT_CHUNK_SIZE = 16 * 2 ** 20
+DEFAULT_MIN_PARALLEL_SIZE = 64 * 2 ** 20
+FILE_FORMATS = ("jsonl", "tsv", "text")
+
+
+def _get_fast_json_loads():
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson.loads
+
+
+_fast_json_loads = _get_fast_json_loads()
+
+
+def _parse_jsonl_line(line: bytes):
+    if _fast_json_loads is not None:
+        try:
+            return _fast_json_loads(line)
+        except ValueError:
+            pass
+    return json.loads(line)
+
+
+def _parse_tsv_line(line: bytes) -> List[str]:
+    return line.decode("utf-8").split("\t")
+
+
+def _parse_text_line(line: bytes) -> str:
+    return line.decode("utf-8")
+
+
+def read_byte_range(path: str, start: int, end: int, file_format: str = "jsonl") -> list:
+    """Read and parse the lines in [start, end) of a file
+
+    Lines are stripped of their line endings. Blank lines are skipped for JSONL, and kept
+    otherwise.
+
+    Args:
+        path: path to file
+        start: byte offset of the start of a line
+        end: byte offset of the start of a line (or the end of the file)
+        file_format: one of FILE_FORMATS
+
+    Returns:
+        list of parsed lines
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    lines = data.split(b"\n")
+    if not lines[-1]:
+        lines.pop()
+    lines = [line[:-1] if line.endswith(b"\r") else line for line in lines]
+    if file_format == "jsonl":
+        return [_parse_jsonl_line(line) for line in lines if line.strip()]
+    elif file_format == "tsv":
+        return [_parse_tsv_line(line) for line in lines]
+    elif file_format == "text":
+        return [_parse_text_line(line) for line in lines]
+    else:
+        raise KeyError(file_format)
+
+
+def get_line_aligned_byte_ranges(path: str, chunk_size: int) -> List[Tuple[int, int]]:
+    """Split a file into byte ranges of about chunk_size bytes, each starting at a line start"""
+    file_size = os.path.getsize(path)
+    boundaries = [0]
+    with open(path, "rb") as f:
+        while boundaries[-1] < file_size:
+            # Seek to the byte before the target offset, so that a line starting exactly at the
+            # target offset is not skipped
+            f.seek(boundaries[-1] + max(chunk_size, 1) - 1)
+            f.readline()
+            boundaries.append(min(f.tell(), file_size))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def iter_parsed_lines(
+    path: str,
+    file_format: str = "jsonl",
+    num_workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    min_parallel_size: int = DEFAULT_MIN_PARALLEL_SIZE,
+) -> Iterator:
+    """Lazily yield the parsed lines of a file, in file order, parsing byte ranges in parallel
+
+    Args:
+        path: path to file
+        file_format: one of FILE_FORMATS
+            - jsonl: lines are parsed as JSON, blank lines are skipped
+            - tsv: lines are split on tabs
+            - text: lines are returned as strings
+        num_workers: number of worker processes (default: number of CPUs)
+        chunk_size: approximate number of bytes per range
+        min_parallel_size: files smaller than this are parsed in-process
+
+    Yields:
+        parsed lines
+    """
+    if file_format not in FILE_FORMATS:
+        raise KeyError(file_format)
+    byte_ranges = get_line_aligned_byte_ranges(path=path, chunk_size=chunk_size)
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, len(byte_ranges))
+    if num_workers <= 1 or os.path.getsize(path) < min_parallel_size:
+        for start, end in byte_ranges:
+            yield from read_byte_range(path=path, start=start, end=end, file_format=file_format)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=num_workers)
+    byte_ranges_iter = iter(byte_ranges)
+    pending = collections.deque()
+    try:
+        # Keep two ranges per worker in flight: enough to keep workers busy while the consumer
+        # processes the current range, without reading far ahead of it
+        for start, end in itertools.islice(byte_ranges_iter, 2 * num_workers):
+            pending.append(executor.submit(read_byte_range, path, start, end, file_format))
+        while pending:
+            parsed_lines = pending.popleft().result()
+            for start, end in itertools.islice(byte_ranges_iter, 1):
+                pending.append(executor.submit(read_byte_range, path, start, end, file_format))
+            yield from parsed_lines
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -7,15 +7,20 @@ Notes:
     * Please keep this code as a standalone utility; don't make this module depend on jiant modules.
 
 """
-from typing import Iterable, Sequence, Tuple, Union
+import functools
+from typing import Iterable, List, Sequence, Tuple, Union
 
 from Levenshtein.StringMatcher import StringMatcher
 from nltk.tokenize.util import string_span_tokenize
 import numpy as np
+from scipy import sparse
 
 
 _DTYPE = np.int32
 
+# Maximum number of (source, target) pairs for which TokenAligners are memoized
+TOKEN_ALIGNER_CACHE_SIZE = 4096
+
 
 def _mat_from_blocks_dense(mb, n_chars_src, n_chars_tgt):
     M = np.zeros((n_chars_src, n_chars_tgt), dtype=_DTYPE)
@@ -34,6 +39,64 @@ def _mat_from_blocks_dense(mb, n_chars_src, n_chars_tgt):
     return M
 
 
+def _mat_from_blocks_sparse(mb, n_chars_src, n_chars_tgt):
+    """Sparse (CSR) equivalent of _mat_from_blocks_dense.
+
+    Only the matching blocks (on the diagonal) and the unmatched regions between consecutive
+    blocks are stored, rather than the full (n_chars_src x n_chars_tgt) matrix.
+    """
+    ridxs = []
+    cidxs = []
+    data = []
+    for i in range(len(mb)):
+        b = mb[i]  # current block
+        # Fill in-between this block and last block
+        if i > 0:
+            lb = mb[i - 1]  # last block
+            s0 = lb[0] + lb[2]  # top
+            e0 = b[0]  # bottom
+            s1 = lb[1] + lb[2]  # left
+            e1 = b[1]  # right
+            if e0 > s0 and e1 > s1:
+                rows, cols = np.meshgrid(np.arange(s0, e0), np.arange(s1, e1), indexing="ij")
+                ridxs.append(rows.ravel())
+                cidxs.append(cols.ravel())
+                data.append(np.ones(rows.size, dtype=_DTYPE))
+        # Fill matching region on diagonal
+        ridxs.append(np.arange(b[0], b[0] + b[2]))
+        cidxs.append(np.arange(b[1], b[1] + b[2]))
+        data.append(np.full(b[2], 2, dtype=_DTYPE))
+    return sparse.csr_matrix(
+        (
+            np.concatenate(data) if data else np.zeros(0, dtype=_DTYPE),
+            (
+                np.concatenate(ridxs) if ridxs else np.zeros(0, dtype=int),
+                np.concatenate(cidxs) if cidxs else np.zeros(0, dtype=int),
+            ),
+        ),
+        shape=(n_chars_src, n_chars_tgt),
+        dtype=_DTYPE,
+    )
+
+
+def _mat_from_spans_sparse(spans: Sequence[Tuple[int, int]], n_chars: int) -> sparse.csr_matrix:
+    """Sparse (CSR) equivalent of _mat_from_spans_dense.
+
+    Each token is stored as the interval of chars that it covers, so only n_chars entries (at
+    most) are stored, rather than the full (n_tokens x n_chars) matrix.
+    """
+    lengths = np.array([s[1] - s[0] for s in spans], dtype=int)
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    indices = (
+        np.concatenate([np.arange(s[0], s[1]) for s in spans]) if spans else np.zeros(0, dtype=int)
+    )
+    return sparse.csr_matrix(
+        (np.ones(len(indices), dtype=_DTYPE), indices, indptr),
+        shape=(len(spans), n_chars),
+        dtype=_DTYPE,
+    )
+
+
 def _mat_from_spans_dense(spans: Sequence[Tuple[int, int]], n_chars: int) -> np.ndarray:
     """Construct a token-to-char matrix from a list of char spans."""
     M = np.zeros((len(spans), n_chars), dtype=_DTYPE)
@@ -68,7 +131,7 @@ def token_to_char(text: str, sep=" ") -> np.ndarray:
 
 def _mat_from_blocks(
     mb: Sequence[Tuple[int, int, int]], n_chars_src: int, n_chars_tgt: int
-) -> np.ndarray:
+) -> sparse.csr_matrix:
     """Construct a char-to-char matrix from a list of matching blocks.
 
     mb is a sequence of (s1, s2, n_char) tuples, where s1 and s2 are the start indices in the
@@ -80,13 +143,19 @@ def _mat_from_blocks(
         n_chars_tgt (int): number of chars in the target string.
 
     Returns:
-        np.ndarray adjacency matrix mapping chars in the source str to chars in the target str.
+        sparse adjacency matrix mapping chars in the source str to chars in the target str.
 
     """
-    return _mat_from_blocks_dense(mb, n_chars_src, n_chars_tgt)
+    return _mat_from_blocks_sparse(mb, n_chars_src, n_chars_tgt)
 
 
-def char_to_char(source: str, target: str) -> np.ndarray:
+def token_to_char_sparse(text: str, sep=" ") -> sparse.csr_matrix:
+    """Sparse (CSR) equivalent of token_to_char"""
+    spans = string_span_tokenize(text, sep=sep)
+    return _mat_from_spans_sparse(tuple(spans), len(text))
+
+
+def char_to_char(source: str, target: str) -> sparse.csr_matrix:
     """Find the character adjacency matrix mapping source string chars to target string chars.
 
     Uses StringMatcher from Levenshtein package to find non-overlapping matching subsequences in
@@ -98,7 +167,7 @@ def char_to_char(source: str, target: str) -> np.ndarray:
         target (str): string of target chars.
 
     Returns:
-        np.ndarray adjacency matrix mapping chars in the source str to chars in the target str.
+        sparse adjacency matrix mapping chars in the source str to chars in the target str.
 
     """
     sm = StringMatcher(seq1=source, seq2=target)
@@ -128,7 +197,13 @@ class TokenAligner(object):
     obtain a (M x N) character adjacency matrix C. We then construct token-to-character matricies
     U (m x M) and V (n x N) and construct T as:
         T = (U C V')
-    where V' denotes the transpose.
+    where V' denotes the transpose. All of these are stored as sparse (CSR) matrices: U and V hold
+    one char interval per token, and C holds only the matched and in-between regions, so memory is
+    roughly linear in the text length rather than O(M x N).
+
+    Aligners are read-only once constructed, so get_token_aligner can be used to share (memoize)
+    aligners between examples with the same source and target, e.g. span queries over the
+    same sentence.
 
     Spans of non-aligned bytes are assumed to contain a many-to-many alignment of all chars in that
     range. This can lead to unwanted alignments if, for example, two consecutive tokens are mapped
@@ -150,14 +225,17 @@ class TokenAligner(object):
             source = " ".join(source)
         if not isinstance(target, str):
             target = " ".join(target)
-        self.U = token_to_char(source)  # (m X M) source token idx to source char idx
-        self.V = token_to_char(target)  # (n x N) target token idx to target char idx
+        self.U = token_to_char_sparse(source)  # (m X M) source token idx to source char idx
+        self.V = token_to_char_sparse(target)  # (n x N) target token idx to target char idx
         self.C = char_to_char(source, target)  # (M x N) source char idx to target char idx
         # Token transfer matrix from (m) tokens in source to (n) tokens in the target. Mat value at
         # index i, j measures the character overlap btwn the ith source token and jth target token.
-        self.source_token_idx_to_target_token_idx = self.U.dot(self.C).dot(self.V.T)
-        self.source_token_idx_to_target_char_idx = self.U.dot(self.C)
-        self.source_char_idx_to_target_token_idx = self.C.dot(self.V.T)
+        self.source_token_idx_to_target_char_idx = _canonicalize(self.U.dot(self.C))
+        self.source_token_idx_to_target_token_idx = _canonicalize(
+            self.source_token_idx_to_target_char_idx.dot(self.V.T)
+        )
+        self.source_char_idx_to_target_token_idx = _canonicalize(self.C.dot(self.V.T))
+        self._row_extents_cache = {}
 
     def project_token_idxs(self, idxs: Union[int, Sequence[int]]) -> Sequence[int]:
         """Project source token index(s) to target token indices.
@@ -183,17 +261,51 @@ class TokenAligner(object):
             idxs = [idxs]
         return self.source_token_idx_to_target_token_idx[idxs].nonzero()[1]  # column indices
 
-    @staticmethod
-    def _project_span(mat, start, end, inclusive):
+    def _get_row_extents(self, mat_name) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the first and last nonzero column in each row of a transfer matrix.
+
+        Empty rows have a first column of mat.shape[1] and a last column of -1. An extra empty row
+        is appended, so that exclusive span ends can be used as indices (see: _project_spans).
+        """
+        if mat_name not in self._row_extents_cache:
+            mat = getattr(self, mat_name)
+            num_rows, num_cols = mat.shape
+            row_min = np.full(num_rows + 1, num_cols, dtype=int)
+            row_max = np.full(num_rows + 1, -1, dtype=int)
+            nonempty = np.diff(mat.indptr) > 0
+            if nonempty.any():
+                starts = mat.indptr[:-1][nonempty]
+                row_min[:-1][nonempty] = np.minimum.reduceat(mat.indices, starts)
+                row_max[:-1][nonempty] = np.maximum.reduceat(mat.indices, starts)
+            self._row_extents_cache[mat_name] = row_min, row_max
+        return self._row_extents_cache[mat_name]
+
+    def _project_spans(self, mat_name, spans, inclusive) -> List[Tuple[int, int]]:
+        spans = np.array(spans, dtype=int).reshape(-1, 2)
+        starts, ends = spans[:, 0], spans[:, 1]
         if inclusive:
-            end = end + 1
-        target_matches = mat[start:end].nonzero()[1].tolist()
-        if len(target_matches) == 0:
+            ends = ends + 1
+        if len(spans) == 0:
+            return []
+        row_min, row_max = self._get_row_extents(mat_name)
+        # Clip to the source length, as slicing the transfer matrix would
+        starts = np.minimum(starts, len(row_min) - 1)
+        ends = np.minimum(ends, len(row_min) - 1)
+        empty = ends <= starts
+        # reduceat over interleaved (start, end) indices reduces over each [start, end), and
+        # the (end, next start) reductions in between are dropped. Empty spans (which fail) are
+        # given one row, within the bounds of the row extents
+        span_ends = np.minimum(np.maximum(ends, starts + 1), len(row_min) - 1)
+        idxs = np.stack([starts, span_ends], axis=1).ravel()
+        output_starts = np.minimum.reduceat(row_min, idxs)[::2]
+        output_ends = np.maximum.reduceat(row_max, idxs)[::2]
+        failed = empty | (output_ends < 0)
+        if failed.any():
+            start, end = spans[failed.argmax()].tolist()
             raise ValueError(f"Project {(start, end)} into empty span in target sequence")
-        output_start, output_end = min(target_matches), max(target_matches)
         if not inclusive:
-            output_end = output_end + 1
-        return (output_start, output_end)
+            output_ends = output_ends + 1
+        return list(zip(output_starts.tolist(), output_ends.tolist()))
 
     def project_token_span(self, start, end, inclusive=False) -> Tuple[int, int]:
         """Project a span from source to target token sequence.
@@ -218,8 +330,34 @@ class TokenAligner(object):
         Returns:
             Tuple[int, int] representing the target span corresponding to the source span.
         """
-        return self._project_span(
-            mat=self.source_token_idx_to_target_token_idx, start=start, end=end, inclusive=inclusive
+        return self._project_spans(
+            mat_name="source_token_idx_to_target_token_idx",
+            spans=[(start, end)],
+            inclusive=inclusive,
+        )[0]
+
+    def project_token_spans(
+        self, spans: Sequence[Tuple[int, int]], inclusive=False
+    ) -> List[Tuple[int, int]]:
+        """Project many spans from source to target token sequence at once.
+
+        Batched equivalent of project_token_span, e.g. for all span queries over one sentence.
+
+        Examples:
+            >>> source_tokens = ['abc', 'def', 'ghi', 'jkl']
+            >>> target_tokens = ['abc', 'd', 'ef', 'ghi', 'jkl']
+            >>> ta = TokenAligner(source_tokens, target_tokens)
+            >>> print(ta.project_token_spans([(0, 2), (3, 4)]))
+            [(0, 3), (4, 5)]
+
+        Raise:
+            When any target span is empty
+
+        Returns:
+            List[Tuple[int, int]] representing the target spans corresponding to the source spans.
+        """
+        return self._project_spans(
+            mat_name="source_token_idx_to_target_token_idx", spans=spans, inclusive=inclusive
         )
 
     def project_token_to_char_span(self, start, end, inclusive=False) -> Tuple[int, int]:
@@ -245,9 +383,11 @@ class TokenAligner(object):
         Returns:
             Tuple[int, int] representing the target span corresponding to the source span.
         """
-        return self._project_span(
-            mat=self.source_token_idx_to_target_char_idx, start=start, end=end, inclusive=inclusive
-        )
+        return self._project_spans(
+            mat_name="source_token_idx_to_target_char_idx",
+            spans=[(start, end)],
+            inclusive=inclusive,
+        )[0]
 
     def project_char_to_token_span(self, start, end, inclusive=False) -> Tuple[int, int]:
         """Project a span from source to target token sequence.
@@ -272,6 +412,52 @@ class TokenAligner(object):
         Returns:
             Tuple[int, int] representing the target span corresponding to the source span.
         """
-        return self._project_span(
-            mat=self.source_char_idx_to_target_token_idx, start=start, end=end, inclusive=inclusive
-        )
+        return self._project_spans(
+            mat_name="source_char_idx_to_target_token_idx",
+            spans=[(start, end)],
+            inclusive=inclusive,
+        )[0]
+
+
+def _canonicalize(mat) -> sparse.csr_matrix:
+    """Convert to CSR, with sorted indices and no explicitly stored zeros"""
+    mat = sparse.csr_matrix(mat)
+    mat.eliminate_zeros()
+    mat.sort_indices()
+    return mat
+
+
+@functools.lru_cache(maxsize=TOKEN_ALIGNER_CACHE_SIZE)
+def _get_token_aligner(source: Union[Tuple[str, ...], str], target: Union[Tuple[str, ...], str]):
+    return TokenAligner(source=source, target=target)
+
+
+def get_token_aligner(
+    source: Union[Iterable[str], str], target: Union[Iterable[str], str]
+) -> TokenAligner:
+    """Get a TokenAligner for source and target, memoized per (source, target) pair.
+
+    TokenAligners are read-only, so the same aligner can be shared e.g. by all span queries over
+    the same sentence. The memo holds the TOKEN_ALIGNER_CACHE_SIZE most recently used aligners,
+    and can be inspected/reset with get_token_aligner_cache_info/clear_token_aligner_cache.
+
+    Args:
+        source (Union[Iterable[str], str]): Source text tokens or string.
+        target (Union[Iterable[str], str]): Target text tokens or string.
+
+    Returns:
+        TokenAligner
+    """
+    if not isinstance(source, str):
+        source = tuple(source)
+    if not isinstance(target, str):
+        target = tuple(target)
+    return _get_token_aligner(source=source, target=target)
+
+
+def get_token_aligner_cache_info():
+    return _get_token_aligner.cache_info()
+
+
+def clear_token_aligner_cache():
+    _get_token_aligner.cache_clear()
@@ -1,47 +1,156 @@
+import collections
+import functools
+import multiprocessing
 import re
 import string
-import collections
+from typing import Iterable, List, Sequence, Tuple
+
+# Normalized answers are memoized by string, so that gold answers (and repeated predictions)
+# are only normalized and tokenized once per process.
+NORMALIZATION_CACHE_SIZE = 2 ** 18
+
+_ARTICLES_REGEX = re.compile(r"\b(a|an|the)\b")
+_PUNCTUATION_TABLE = str.maketrans("", "", string.punctuation)
+
+NormalizedAnswer = collections.namedtuple(
+    "NormalizedAnswer", ["text", "token_counts", "num_tokens"]
+)
 
 
 def normalize_answer(s):
     """Lower text and remove punctuation, articles and extra whitespace.
     From official ReCoRD eval script
     """
+    return get_normalized_answer(s).text
 
-    def remove_articles(text):
-        return re.sub(r"\b(a|an|the)\b", " ", text)
 
-    def white_space_fix(text):
-        return " ".join(text.split())
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def get_normalized_answer(s) -> NormalizedAnswer:
+    """Normalize and tokenize an answer string (memoized).
 
-    def remove_punc(text):
-        exclude = set(string.punctuation)
-        return "".join(ch for ch in text if ch not in exclude)
+    The returned token counts are shared between calls, and must not be modified.
 
-    def lower(text):
-        return text.lower()
+    Args:
+        s: answer string
 
-    return white_space_fix(remove_articles(remove_punc(lower(s))))
+    Returns:
+        NormalizedAnswer with the normalized text, token counts and number of tokens
+    """
+    text = " ".join(_ARTICLES_REGEX.sub(" ", s.lower().translate(_PUNCTUATION_TABLE)).split())
+    tokens = text.split()
+    return NormalizedAnswer(
+        text=text, token_counts=collections.Counter(tokens), num_tokens=len(tokens),
+    )
 
 
-def string_f1_score(prediction, ground_truth):
-    """Compute normalized token level F1
-    From official ReCoRD eval script
+def normalized_f1_score(prediction: NormalizedAnswer, ground_truth: NormalizedAnswer, empty_match):
+    """Compute token level F1 between two normalized answers
+
+    Args:
+        prediction: normalized predicted answer
+        ground_truth: normalized gold answer
+        empty_match: if True, F1 is 1 if both answers are empty and 0 if only one is
+            (SQuAD 2.0 no-answer convention). Otherwise, empty answers always score 0 (ReCoRD).
+
+    Returns:
+        F1 score
     """
-    prediction_tokens = normalize_answer(prediction).split()
-    ground_truth_tokens = normalize_answer(ground_truth).split()
-    common = collections.Counter(prediction_tokens) & collections.Counter(ground_truth_tokens)
-    num_same = sum(common.values())
+    if empty_match and (prediction.num_tokens == 0 or ground_truth.num_tokens == 0):
+        return int(prediction.num_tokens == ground_truth.num_tokens)
+    gold_counts = ground_truth.token_counts
+    num_same = 0
+    for token, count in prediction.token_counts.items():
+        if token in gold_counts:
+            num_same += min(count, gold_counts[token])
     if num_same == 0:
         return 0
-    precision = 1.0 * num_same / len(prediction_tokens)
-    recall = 1.0 * num_same / len(ground_truth_tokens)
+    precision = 1.0 * num_same / prediction.num_tokens
+    recall = 1.0 * num_same / ground_truth.num_tokens
     f1 = (2 * precision * recall) / (precision + recall)
     return f1
 
 
+def string_f1_score(prediction, ground_truth):
+    """Compute normalized token level F1
+    From official ReCoRD eval script
+    """
+    return normalized_f1_score(
+        get_normalized_answer(prediction), get_normalized_answer(ground_truth), empty_match=False,
+    )
+
+
 def exact_match_score(prediction, ground_truth):
     """Compute normalized exact match
     From official ReCoRD eval script
     """
-    return normalize_answer(prediction) == normalize_answer(ground_truth)
+    return get_normalized_answer(prediction).text == get_normalized_answer(ground_truth).text
+
+
+def max_em_and_f1_over_ground_truths(
+    prediction, ground_truths: Iterable[str], empty_match=False
+) -> Tuple[int, float]:
+    """Compute max EM and max F1 between a prediction and each ground truth"""
+    normalized_prediction = get_normalized_answer(prediction)
+    em, f1 = 0, 0
+    for ground_truth in ground_truths:
+        normalized_ground_truth = get_normalized_answer(ground_truth)
+        em = max(em, int(normalized_prediction.text == normalized_ground_truth.text))
+        f1 = max(
+            f1,
+            normalized_f1_score(
+                normalized_prediction, normalized_ground_truth, empty_match=empty_match
+            ),
+        )
+    return em, f1
+
+
+def _compute_em_and_f1_chunk(predictions, ground_truths_list, empty_match):
+    return [
+        max_em_and_f1_over_ground_truths(
+            prediction=prediction, ground_truths=ground_truths, empty_match=empty_match,
+        )
+        for prediction, ground_truths in zip(predictions, ground_truths_list)
+    ]
+
+
+def compute_em_and_f1(
+    predictions: Sequence[str],
+    ground_truths_list: Sequence[Iterable[str]],
+    empty_match=False,
+    num_workers=0,
+    chunk_size=4096,
+) -> Tuple[List[int], List[float]]:
+    """Compute EM and F1 for a batch of predictions, each against its own set of ground truths.
+
+    Args:
+        predictions: list of predicted answer strings
+        ground_truths_list: list of ground truths (an iterable of answer strings) per prediction
+        empty_match: see normalized_f1_score
+        num_workers: if > 0, score chunks of predictions in a pool of this many processes.
+            Only worthwhile for very large evaluation sets.
+        chunk_size: number of predictions per chunk, when using a process pool
+
+    Returns:
+        (list of max-over-ground-truths EM, list of max-over-ground-truths F1)
+    """
+    assert len(predictions) == len(ground_truths_list)
+    if num_workers > 0 and len(predictions) > chunk_size:
+        chunk_args = [
+            (
+                predictions[i : i + chunk_size],
+                [list(ground_truths) for ground_truths in ground_truths_list[i : i + chunk_size]],
+                empty_match,
+            )
+            for i in range(0, len(predictions), chunk_size)
+        ]
+        with multiprocessing.Pool(num_workers) as pool:
+            chunk_results = pool.starmap(_compute_em_and_f1_chunk, chunk_args)
+        results = [result for chunk_result in chunk_results for result in chunk_result]
+    else:
+        results = _compute_em_and_f1_chunk(
+            predictions=predictions, ground_truths_list=ground_truths_list, empty_match=empty_match,
+        )
+    if not results:
+        return [], []
+    em_list, f1_list = zip(*results)
+    return list(em_list), list(f1_list)
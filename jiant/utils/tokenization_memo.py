@@ -0,0 +1,86 @@
+"""Memo of tokenizations, shared across examples.
+
+Many tasks tokenize the same long text for many examples, e.g. ReCoRD (the passage, for every
+candidate entity), MultiRC (the paragraph, for every question/answer pair), multiple-choice tasks
+(the context, for every choice) and SQuAD-style tasks (the context, for every question).
+Tokenizing through the memo means that each such text is only tokenized once (for as long as it
+stays among the max_size most recently used entries).
+
+Entries are keyed by the text and the tokenizer object (tokenizers hash by identity), so
+different tokenizers never share entries.
+"""
+import collections
+from typing import Callable, Hashable, List
+
+DEFAULT_MAX_SIZE = 1024
+
+
+class TokenizationMemo:
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE):
+        """Bounded (least-recently-used) memo, which keeps track of its hit rate.
+
+        Args:
+            max_size: maximum number of entries to keep (0 to disable memoization)
+        """
+        self.max_size = max_size
+        self.memo = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute_fn: Callable):
+        """Get the memoized value for key, or compute (and memoize) it with compute_fn()"""
+        if key in self.memo:
+            self.hits += 1
+            self.memo.move_to_end(key)
+            return self.memo[key]
+        self.misses += 1
+        value = compute_fn()
+        if self.max_size > 0:
+            self.memo[key] = value
+            if len(self.memo) > self.max_size:
+                self.memo.popitem(last=False)
+        return value
+
+    def tokenize(self, tokenizer, text: str) -> List[str]:
+        """Memoized tokenizer.tokenize(text)"""
+        # Stored as a tuple, and copied on the way out, so that callers cannot modify the entry
+        return list(
+            self.get_or_compute(
+                key=("tokenize", tokenizer, text),
+                compute_fn=lambda: tuple(tokenizer.tokenize(text)),
+            )
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get_stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "size": len(self.memo),
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.memo.clear()
+        self.reset_stats()
+
+
+_TOKENIZATION_MEMO = TokenizationMemo()
+
+
+def get_tokenization_memo() -> TokenizationMemo:
+    """Get the tokenization memo shared by task tokenize methods"""
+    return _TOKENIZATION_MEMO
+
+
+def memoized_tokenize(tokenizer, text: str) -> List[str]:
+    """tokenizer.tokenize(text), through the shared tokenization memo"""
+    return _TOKENIZATION_MEMO.tokenize(tokenizer=tokenizer, text=text)
@@ -8,12 +8,17 @@ Notes:
 
 """
 
+import functools
 import re
 import transformers
-from typing import Sequence
+from typing import Sequence, Tuple
 
+from jiant.utils import retokenize
 from jiant.utils.testing import utils as test_utils
 
+# Maximum number of (space tokenization, target tokenization, tokenizer) normalizations memoized
+NORMALIZATION_CACHE_SIZE = 4096
+
 
 def normalize_tokenizations(
     space_tokenization: Sequence[str],
@@ -82,6 +87,55 @@ def normalize_tokenizations(
     return modifed_space_tokenization, modifed_target_tokenization
 
 
+@functools.lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def _normalize_tokenizations_cached(
+    space_tokenization: Tuple[str, ...],
+    target_tokenization: Tuple[str, ...],
+    tokenizer: transformers.PreTrainedTokenizer,
+):
+    normed_space_tokenization, normed_target_tokenization = normalize_tokenizations(
+        list(space_tokenization), list(target_tokenization), tokenizer
+    )
+    return tuple(normed_space_tokenization), tuple(normed_target_tokenization)
+
+
+def normalize_tokenizations_cached(
+    space_tokenization: Sequence[str],
+    target_tokenization: Sequence[str],
+    tokenizer: transformers.PreTrainedTokenizer,
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Memoized normalize_tokenizations, returning tuples (so that results can be shared)"""
+    return _normalize_tokenizations_cached(
+        tuple(space_tokenization), tuple(target_tokenization), tokenizer
+    )
+
+
+def get_normalized_token_aligner(
+    space_tokenization: Sequence[str],
+    target_tokenization: Sequence[str],
+    tokenizer: transformers.PreTrainedTokenizer,
+) -> retokenize.TokenAligner:
+    """Normalize a space tokenization and a target tokenization, and get an aligner between them.
+
+    Both the normalization (see: normalize_tokenizations) and the TokenAligner (see:
+    retokenize.get_token_aligner) are memoized, so examples which share the same text (e.g. span
+    queries over the same sentence) only normalize and align it once.
+
+    Args:
+        space_tokenization (Seqence[str]): space-tokenized token sequence.
+        target_tokenization (Seqence[str]): target tokenizer tokenized sequence.
+        tokenizer (PreTrainedTokenizer): tokenizer carrying info needed for target normalization.
+
+    Returns:
+        TokenAligner from the normalized space tokenization to the normalized target tokenization.
+
+    """
+    normed_space_tokenization, normed_target_tokenization = normalize_tokenizations_cached(
+        space_tokenization, target_tokenization, tokenizer
+    )
+    return retokenize.get_token_aligner(normed_space_tokenization, normed_target_tokenization)
+
+
 def bow_tag_tokens(tokens: Sequence[str], bow_tag: str = "<w>"):
     """Applies a beginning of word (BoW) marker to every token in the tokens sequence."""
     return [bow_tag + t for t in tokens]
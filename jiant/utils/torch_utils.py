@@ -1,10 +1,13 @@
 import copy
+import inspect
 import math
 import os
+import sys
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F  # noqa PyPep8Naming
+import torch.utils.checkpoint
 
 from torch.utils.data import Dataset, DataLoader
 
@@ -127,7 +130,7 @@ class DataLoaderWithLength(DataLoader):
 
 
 def is_data_parallel(torch_module):
-    return isinstance(torch_module, nn.DataParallel)
+    return isinstance(torch_module, (nn.DataParallel, nn.parallel.DistributedDataParallel))
 
 
 def safe_save(obj, path, temp_path=None):
@@ -140,7 +143,111 @@ def safe_save(obj, path, temp_path=None):
 
 
 def get_model_for_saving(model: nn.Module) -> nn.Module:
-    if isinstance(model, nn.DataParallel):
+    if is_data_parallel(model):
         return model.module
     else:
         return model
+
+
+def get_trainable_state_dict(model: nn.Module) -> dict:
+    trainable_names = [name for name, param in model.named_parameters() if param.requires_grad]
+    state_dict = model.state_dict()
+    return {name: state_dict[name] for name in trainable_names}
+
+
+def get_state_dict_for_saving(model: nn.Module) -> dict:
+    """Get the state_dict of a (possibly DataParallel) model, for saving.
+
+    For models with a frozen base (marked with save_trainable_only, e.g. for parameter-efficient
+    fine-tuning), only the trainable parameters are included.
+    """
+    model = get_model_for_saving(model)
+    if getattr(model, "save_trainable_only", False):
+        return get_trainable_state_dict(model)
+    return model.state_dict()
+
+
+def load_state_dict_for_saving(model: nn.Module, state_dict: dict):
+    """Load a state_dict from get_state_dict_for_saving into a (possibly DataParallel) model"""
+    model = get_model_for_saving(model)
+    if not getattr(model, "save_trainable_only", False):
+        model.load_state_dict(state_dict)
+        return
+    missing_keys, unexpected_keys = model.load_state_dict(state_dict, strict=False)
+    missing_trainable_keys = set(get_trainable_state_dict(model)) & set(missing_keys)
+    if unexpected_keys or missing_trainable_keys:
+        raise RuntimeError(
+            f"Mismatched weights. Unexpected: {sorted(unexpected_keys)}."
+            f" Missing: {sorted(missing_trainable_keys)}"
+        )
+
+
+def _supports_non_reentrant_checkpoint():
+    return "use_reentrant" in inspect.signature(torch.utils.checkpoint.checkpoint).parameters
+
+
+class CheckpointedForwardMixin:
+    """Recomputes a module's activations in the backward pass, instead of storing them.
+
+    Mixed into the class of a module by checkpoint_module, which keeps the module's parameter
+    names (and so its state_dict) unchanged. Checkpointing is only applied when training, with
+    gradients enabled.
+    """
+
+    def forward(self, *args, **kwargs):
+        forward = super().forward
+        if not (self.training and torch.is_grad_enabled()):
+            return forward(*args, **kwargs)
+        if _supports_non_reentrant_checkpoint():
+            return torch.utils.checkpoint.checkpoint(forward, *args, use_reentrant=False, **kwargs)
+        # Older versions of torch only support reentrant checkpointing (without keyword arguments),
+        # which computes no parameter gradients unless an input requires gradients
+        args = list(args)
+        if not any(isinstance(arg, torch.Tensor) and arg.requires_grad for arg in args):
+            for i, arg in enumerate(args):
+                if isinstance(arg, torch.Tensor) and arg.is_floating_point():
+                    args[i] = arg.detach().requires_grad_()
+                    break
+        return torch.utils.checkpoint.checkpoint(lambda *args_: forward(*args_, **kwargs), *args)
+
+
+_checkpointed_classes = {}
+
+
+def checkpoint_module(module: nn.Module):
+    """Enable activation checkpointing for a module (in-place)"""
+    cls = type(module)
+    if issubclass(cls, CheckpointedForwardMixin):
+        return
+    if cls not in _checkpointed_classes:
+        _checkpointed_classes[cls] = type(
+            f"Checkpointed{cls.__name__}", (CheckpointedForwardMixin, cls), {}
+        )
+    module.__class__ = _checkpointed_classes[cls]
+
+
+def reset_peak_memory(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        if hasattr(torch.cuda, "reset_peak_memory_stats"):
+            torch.cuda.reset_peak_memory_stats(device)
+        else:
+            torch.cuda.reset_max_memory_allocated(device)
+
+
+def get_peak_memory_mb(device) -> float:
+    """Get peak memory use in MB.
+
+    On GPU, this is the peak memory allocated by tensors since the last reset_peak_memory. On CPU,
+    this is the peak resident set size of the process (which is never reset).
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    try:
+        import resource
+    except ImportError:
+        return float("nan")
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux
+    return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
@@ -1,5 +1,7 @@
 import contextlib
 
+import torch.nn as nn
+
 from jiant.shared.model_resolution import ModelArchitectures
 
 
@@ -26,7 +28,101 @@ def output_hidden_states_context(encoder):
         yield
         modified_obj.output_hidden_states = old_value
     elif model_arch in (ModelArchitectures.BART, ModelArchitectures.MBART):
+        old_value = encoder.config.output_hidden_states
+        encoder.config.output_hidden_states = True
         yield
-        return
+        encoder.config.output_hidden_states = old_value
+    else:
+        raise KeyError(model_arch)
+
+
+def get_num_hidden_states(encoder):
+    """Get the number of hidden states output by the encoder (layers + embeddings)"""
+    model_arch = ModelArchitectures.from_encoder(encoder)
+    if model_arch in (
+        ModelArchitectures.BERT,
+        ModelArchitectures.ROBERTA,
+        ModelArchitectures.XLM_ROBERTA,
+        ModelArchitectures.ELECTRA,
+    ):
+        return len(encoder.encoder.layer) + 1
+    elif model_arch == ModelArchitectures.ALBERT:
+        return encoder.config.num_hidden_layers + 1
+    elif model_arch in (ModelArchitectures.BART, ModelArchitectures.MBART):
+        # Encoder hidden states, followed by the decoder hidden states (which, in Transformers,
+        # are the inputs to each decoder layer, and do not include the final decoder output)
+        return len(encoder.encoder.layers) + 1 + len(encoder.decoder.layers)
+    else:
+        raise KeyError(model_arch)
+
+
+def supports_truncated_layers(encoder, num_layers):
+    """Whether the hidden states after num_layers layers can be computed with
+    truncated_layers_context (i.e. without running the layers above)
+    """
+    model_arch = ModelArchitectures.from_encoder(encoder)
+    if num_layers < 0:
+        return False
+    elif model_arch in (
+        ModelArchitectures.BERT,
+        ModelArchitectures.ROBERTA,
+        ModelArchitectures.XLM_ROBERTA,
+        ModelArchitectures.ELECTRA,
+    ):
+        return num_layers <= len(encoder.encoder.layer)
+    elif model_arch == ModelArchitectures.ALBERT:
+        # Layers are assigned to groups based on the total number of layers
+        return (
+            num_layers <= encoder.config.num_hidden_layers and encoder.config.num_hidden_groups == 1
+        )
+    elif model_arch in (ModelArchitectures.BART, ModelArchitectures.MBART):
+        # Only the encoder stack can be truncated
+        return num_layers <= len(encoder.encoder.layers)
+    else:
+        return False
+
+
+@contextlib.contextmanager
+def truncated_layers_context(encoder, num_layers):
+    """Temporarily truncate the encoder to its first num_layers layers.
+
+    Within the context, the (unpooled) output of the encoder is the hidden state after
+    num_layers layers, i.e. hidden_states[num_layers] in the full model's output.
+    For BART/mBART, only the encoder stack (encoder.encoder) is truncated, and should then be
+    called directly.
+    """
+    assert supports_truncated_layers(encoder, num_layers)
+    model_arch = ModelArchitectures.from_encoder(encoder)
+    if model_arch in (
+        ModelArchitectures.BERT,
+        ModelArchitectures.ROBERTA,
+        ModelArchitectures.XLM_ROBERTA,
+        ModelArchitectures.ELECTRA,
+    ):
+        old_layers = encoder.encoder.layer
+        encoder.encoder.layer = nn.ModuleList(list(old_layers)[:num_layers])
+        try:
+            yield
+        finally:
+            encoder.encoder.layer = old_layers
+    elif model_arch == ModelArchitectures.ALBERT:
+        old_num_hidden_layers = encoder.config.num_hidden_layers
+        encoder.config.num_hidden_layers = num_layers
+        try:
+            yield
+        finally:
+            encoder.config.num_hidden_layers = old_num_hidden_layers
+    elif model_arch in (ModelArchitectures.BART, ModelArchitectures.MBART):
+        bart_encoder = encoder.encoder
+        old_layers, old_layer_norm = bart_encoder.layers, bart_encoder.layer_norm
+        bart_encoder.layers = nn.ModuleList(list(old_layers)[:num_layers])
+        if num_layers < len(old_layers):
+            # The final layer norm (mBART) only applies to the output of the last layer
+            bart_encoder.layer_norm = None
+        try:
+            yield
+        finally:
+            bart_encoder.layers = old_layers
+            bart_encoder.layer_norm = old_layer_norm
     else:
         raise KeyError(model_arch)
@@ -151,6 +151,7 @@ class ZBufferedLogger(ZLogger):
 
 
 class _VoidZLogger(BaseZLogger):
+    @contextmanager
     def log_context(self):
         yield
 
@@ -165,6 +166,7 @@ class _VoidZLogger(BaseZLogger):
 
 
 class _PrintZLogger(BaseZLogger):
+    @contextmanager
     def log_context(self):
         yield
 
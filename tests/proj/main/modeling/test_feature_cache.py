@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+import torch
+import transformers
+
+import jiant.proj.main.modeling.feature_cache as feature_cache
+import jiant.proj.main.modeling.heads as heads
+import jiant.proj.main.modeling.taskmodels as taskmodels
+import jiant.tasks.lib.rte as rte
+import jiant.utils.torch_utils as torch_utils
+from jiant.proj.main.modeling.primary import JiantModel, wrap_jiant_forward
+
+
+def _build_jiant_model():
+    torch.manual_seed(0)
+    encoder = transformers.BertModel(
+        transformers.BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+            max_position_embeddings=32,
+        )
+    )
+    task = rte.RteTask(name="rte", path_dict={})
+    taskmodel = taskmodels.ClassificationModel(
+        encoder=encoder,
+        classification_head=heads.ClassificationHead(
+            hidden_size=16, hidden_dropout_prob=0.1, num_labels=2
+        ),
+    )
+    jiant_model = JiantModel(
+        task_dict={"rte": task},
+        encoder=encoder,
+        taskmodels_dict={"rte": taskmodel},
+        task_to_taskmodel_map={"rte": "rte"},
+        tokenizer=None,
+    )
+    torch_utils.set_requires_grad(encoder.named_parameters(), requires_grad=False)
+    return jiant_model, task
+
+
+def _get_batch(example_ids):
+    rng = np.random.RandomState(0)
+    all_input_ids = torch.tensor(rng.randint(3, 50, size=(10, 7)))
+    input_ids = all_input_ids[example_ids]
+    return rte.Batch(
+        input_ids=input_ids,
+        input_mask=torch.ones_like(input_ids),
+        segment_ids=torch.zeros_like(input_ids),
+        label_id=torch.tensor(example_ids) % 2,
+        tokens=[None] * len(example_ids),
+    )
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_encoder_feature_cache(tmpdir, monkeypatch, dtype):
+    jiant_model, task = _build_jiant_model()
+    jiant_model.eval()
+    cache = feature_cache.EncoderFeatureCache(
+        jiant_model=jiant_model,
+        cache_dir=str(tmpdir),
+        num_examples_dict={"rte": {"train": 10}},
+        dtype=dtype,
+    )
+    atol = 1e-6 if dtype == "float32" else 1e-2
+    for example_ids in [[0, 3, 5], [5, 3, 0], [9, 1, 3]]:
+        batch = _get_batch(example_ids)
+        expected = wrap_jiant_forward(jiant_model=jiant_model, batch=batch, task=task)
+        cached = feature_cache.wrap_jiant_forward_with_feature_cache(
+            jiant_model=jiant_model,
+            batch=batch,
+            batch_metadata={"example_id": example_ids},
+            task=task,
+            phase="train",
+            encoder_feature_cache=cache,
+        )
+        assert torch.allclose(cached.logits, expected.logits, atol=atol)
+    store = cache.stores["rte", "train"]
+    assert list(np.nonzero(store.is_computed)[0]) == [0, 1, 3, 5, 9]
+
+    # Cached features are used instead of running the encoder
+    monkeypatch.setattr(cache.encoder, "forward", None)
+    encoder_output = cache.get_encoder_output(
+        batch=_get_batch([0, 1]), example_ids=[0, 1], task_name="rte", phase="train"
+    )
+    assert encoder_output.unpooled.shape == (2, 7, 16)
+
+
+def test_encoder_feature_cache_budget(tmpdir):
+    jiant_model, task = _build_jiant_model()
+    bytes_per_example = feature_cache.EncoderFeatureStore.get_bytes_per_example(
+        seq_len=7, hidden_size=16, dtype="float16"
+    )
+    cache = feature_cache.EncoderFeatureCache(
+        jiant_model=jiant_model,
+        cache_dir=str(tmpdir),
+        num_examples_dict={"rte": {"train": 10, "val": 10}},
+        dtype="float16",
+        max_bytes=13 * bytes_per_example,
+    )
+    cache.get_encoder_output(_get_batch([0, 1]), example_ids=[0, 1], task_name="rte", phase="train")
+    cache.get_encoder_output(_get_batch([0, 1]), example_ids=[0, 1], task_name="rte", phase="val")
+    assert cache.stores["rte", "train"].max_rows == 10
+    assert cache.stores["rte", "val"].max_rows == 3
+    cache.flush()
+
+    # Features persist across runs
+    store = feature_cache.EncoderFeatureStore(
+        path=str(tmpdir.join("rte", "val")),
+        num_examples=10,
+        dtype="float16",
+        fingerprint=cache.stores["rte", "val"].fingerprint,
+    )
+    assert store.max_rows == 3
+    assert store.lookup(np.array([1, 0])) is not None
+    assert store.lookup(np.array([1, 2])) is None
+
+
+def test_encoder_feature_cache_fingerprint(tmpdir):
+    def get_cache(jiant_model, data_fingerprint):
+        cache = feature_cache.EncoderFeatureCache(
+            jiant_model=jiant_model,
+            cache_dir=str(tmpdir),
+            num_examples_dict={"rte": {"train": 10}},
+            data_fingerprint_dict={"rte": {"train": data_fingerprint}},
+        )
+        cache.get_encoder_output(
+            _get_batch([0, 1]), example_ids=[0, 1], task_name="rte", phase="train"
+        )
+        cache.flush()
+        return cache
+
+    jiant_model, _ = _build_jiant_model()
+    data_fingerprint = feature_cache.get_fingerprint({"max_seq_length": 7})
+    get_cache(jiant_model, data_fingerprint)
+    # Reused with the same encoder and data
+    cache = get_cache(jiant_model, data_fingerprint)
+    assert cache.stores["rte", "train"].lookup(np.array([1, 0])) is not None
+
+    with pytest.raises(RuntimeError, match="different data"):
+        get_cache(jiant_model, feature_cache.get_fingerprint({"max_seq_length": 8}))
+    other_jiant_model, _ = _build_jiant_model()
+    with torch.no_grad():
+        other_jiant_model.encoder.embeddings.word_embeddings.weight[0] += 1
+    with pytest.raises(RuntimeError, match="different encoder"):
+        get_cache(other_jiant_model, data_fingerprint)
+
+
+def test_encoder_feature_cache_requires_frozen_encoder(tmpdir):
+    jiant_model, _ = _build_jiant_model()
+    torch_utils.set_requires_grad(jiant_model.encoder.named_parameters(), requires_grad=True)
+    with pytest.raises(RuntimeError):
+        feature_cache.EncoderFeatureCache(
+            jiant_model=jiant_model, cache_dir=str(tmpdir), num_examples_dict={},
+        )
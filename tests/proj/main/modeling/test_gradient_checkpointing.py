@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+import torch
+import torch.nn as nn
+import transformers
+
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.utils.torch_utils as torch_utils
+
+
+class _Layer(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.linear = nn.Linear(4, 4)
+        self.dropout = nn.Dropout(0.5)
+
+    def forward(self, x, scale=1.0):
+        return self.dropout(torch.tanh(self.linear(x))) * scale
+
+
+class _Encoder(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.layers = nn.ModuleList([_Layer() for _ in range(3)])
+
+    def forward(self, x):
+        for layer in self.layers:
+            x = layer(x, scale=2.0)
+        return x
+
+
+def _get_bert_encoder():
+    config = transformers.BertConfig(
+        vocab_size=20,
+        hidden_size=8,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=16,
+    )
+    return transformers.BertModel(config)
+
+
+def _forward_backward(encoder, inputs, seed=0):
+    torch.manual_seed(seed)
+    encoder.zero_grad()
+    output = encoder(inputs)
+    if isinstance(output, tuple):
+        output = output[0]
+    output.sum().backward()
+    return output.detach(), [param.grad for param in encoder.parameters() if param.grad is not None]
+
+
+@pytest.mark.parametrize(
+    "get_encoder, get_inputs, num_layers",
+    [
+        (_Encoder, lambda: torch.randn(2, 4), 3),
+        (_get_bert_encoder, lambda: torch.randint(20, (2, 5)), 2),
+    ],
+)
+def test_gradient_checkpointing_matches(get_encoder, get_inputs, num_layers):
+    torch.manual_seed(0)
+    encoder = get_encoder()
+    inputs = get_inputs()
+    checkpointed_encoder = copy.deepcopy(encoder)
+    assert jiant_model_setup.enable_gradient_checkpointing(checkpointed_encoder) == num_layers
+    assert list(checkpointed_encoder.state_dict()) == list(encoder.state_dict())
+
+    output, grads = _forward_backward(encoder.train(), inputs)
+    checkpointed_output, checkpointed_grads = _forward_backward(
+        checkpointed_encoder.train(), inputs
+    )
+    assert len(grads) == len(checkpointed_grads)
+    # Dropout masks are the same in the recomputed forward pass
+    assert torch.allclose(output, checkpointed_output)
+    for grad, checkpointed_grad in zip(grads, checkpointed_grads):
+        assert torch.allclose(grad, checkpointed_grad, atol=1e-6)
+
+
+@pytest.mark.parametrize("non_reentrant", [True, False])
+def test_gradient_checkpointing_frozen_embeddings(monkeypatch, non_reentrant):
+    monkeypatch.setattr(
+        torch_utils, "_supports_non_reentrant_checkpoint", lambda: non_reentrant,
+    )
+    torch.manual_seed(0)
+    encoder = _get_bert_encoder()
+    inputs = torch.randint(20, (2, 5))
+    jiant_model_setup.freeze_encoder_parameters(encoder, freeze_embeddings=True)
+    checkpointed_encoder = copy.deepcopy(encoder)
+    jiant_model_setup.enable_gradient_checkpointing(checkpointed_encoder)
+
+    _, grads = _forward_backward(encoder.train(), inputs)
+    _, checkpointed_grads = _forward_backward(checkpointed_encoder.train(), inputs)
+    # Inputs to the first layer do not require gradients, but its parameters still get them
+    trainable_params = [
+        param for param in checkpointed_encoder.encoder.parameters() if param.requires_grad
+    ]
+    assert trainable_params
+    for param in trainable_params:
+        assert param.grad is not None and param.grad.abs().sum() > 0
+    assert len(grads) == len(checkpointed_grads)
+    for grad, checkpointed_grad in zip(grads, checkpointed_grads):
+        assert torch.allclose(grad, checkpointed_grad, atol=1e-6)
+
+
+def test_gradient_checkpointing_unsupported():
+    with pytest.raises(RuntimeError):
+        jiant_model_setup.enable_gradient_checkpointing(nn.Sequential(nn.Linear(2, 2)))
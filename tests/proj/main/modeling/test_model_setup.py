@@ -0,0 +1,89 @@
+import pytest
+import torch
+import transformers
+
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.shared.model_setup as model_setup
+
+
+def _get_bert_encoder():
+    config = transformers.BertConfig(
+        vocab_size=20,
+        hidden_size=8,
+        num_hidden_layers=3,
+        num_attention_heads=2,
+        intermediate_size=16,
+    )
+    return transformers.BertModel(config)
+
+
+def test_parse_layer_indices():
+    assert jiant_model_setup.parse_layer_indices("0-3,6") == [0, 1, 2, 3, 6]
+    assert jiant_model_setup.parse_layer_indices("2, 1,1") == [1, 2]
+    assert jiant_model_setup.parse_layer_indices("") == []
+
+
+def test_freeze_encoder_parameters():
+    encoder = _get_bert_encoder()
+    freeze_summary = jiant_model_setup.freeze_encoder_parameters(
+        encoder=encoder, freeze_embeddings=True, freeze_layers=[0]
+    )
+    assert freeze_summary["num_frozen_layers"] == 1
+    assert freeze_summary["num_layers"] == 3
+    assert freeze_summary["lowest_trainable_layer"] == 1
+    assert not freeze_summary["all_layers_frozen"]
+    frozen_names = [name for name, param in encoder.named_parameters() if not param.requires_grad]
+    assert frozen_names and all(
+        name.startswith(("embeddings.", "encoder.layer.0.")) for name in frozen_names
+    )
+    assert freeze_summary["num_frozen_params"] == sum(
+        param.numel() for param in encoder.parameters() if not param.requires_grad
+    )
+
+    # Frozen parameters are left out of the optimizer
+    optimizer_scheduler = model_setup.create_optimizer(
+        model=encoder, learning_rate=1e-3, t_total=10, warmup_steps=0, warmup_proportion=None,
+    )
+    optimizer_params = {
+        id(param)
+        for group in optimizer_scheduler.optimizer.param_groups
+        for param in group["params"]
+    }
+    assert optimizer_params == {id(param) for param in encoder.parameters() if param.requires_grad}
+
+    # The backward pass does not reach the frozen layer
+    layer_outputs = []
+    encoder.encoder.layer[0].register_forward_hook(
+        lambda module, inputs, output: layer_outputs.append(output[0])
+    )
+    encoder(torch.arange(10).view(2, 5))[0].sum().backward()
+    assert not layer_outputs[0].requires_grad
+    assert all(param.grad is None for param in encoder.parameters() if not param.requires_grad)
+
+
+def test_freeze_encoder_parameters_all_layers():
+    freeze_summary = jiant_model_setup.freeze_encoder_parameters(
+        encoder=_get_bert_encoder(), freeze_embeddings=True, freeze_layers=[0, 1, 2]
+    )
+    assert freeze_summary["num_frozen_layers"] == 3
+    assert freeze_summary["all_layers_frozen"]
+    assert freeze_summary["lowest_trainable_layer"] is None
+
+
+def test_freeze_encoder_parameters_invalid_layer():
+    with pytest.raises(RuntimeError):
+        jiant_model_setup.freeze_encoder_parameters(encoder=_get_bert_encoder(), freeze_layers=[3])
+
+
+def test_freeze_encoder_parameters_gradient_checkpointing():
+    encoder = _get_bert_encoder().train()
+    freeze_summary = jiant_model_setup.freeze_encoder_parameters(
+        encoder=encoder, freeze_embeddings=True, freeze_layers=[0]
+    )
+    jiant_model_setup.enable_gradient_checkpointing(encoder)
+    encoder(torch.arange(10).view(2, 5))[0].sum().backward()
+    # Layers from the lowest trainable layer up get gradients, as without checkpointing
+    for i, layer in enumerate(encoder.encoder.layer):
+        has_grads = [param.grad is not None for param in layer.parameters()]
+        assert all(has_grads) == (i >= freeze_summary["lowest_trainable_layer"])
+        assert any(has_grads) == all(has_grads)
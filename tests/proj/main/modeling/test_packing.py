@@ -0,0 +1,94 @@
+import types
+
+import torch
+import transformers
+
+import jiant.proj.main.modeling.heads as heads
+import jiant.proj.main.modeling.packing as packing
+import jiant.proj.main.modeling.taskmodels as taskmodels
+import jiant.tasks.lib.mnli as mnli
+import jiant.tasks.lib.rte as rte
+from jiant.proj.main.modeling.primary import JiantModel, wrap_jiant_forward
+
+
+def _build_jiant_model():
+    torch.manual_seed(0)
+    encoder = transformers.BertModel(
+        transformers.BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=32,
+            max_position_embeddings=32,
+            hidden_dropout_prob=0.0,
+            attention_probs_dropout_prob=0.0,
+        )
+    )
+    task_dict = {
+        "rte": rte.RteTask(name="rte", path_dict={}),
+        "mnli": mnli.MnliTask(name="mnli", path_dict={}),
+    }
+    taskmodels_dict = {
+        task_name: taskmodels.ClassificationModel(
+            encoder=encoder,
+            classification_head=heads.ClassificationHead(
+                hidden_size=16, hidden_dropout_prob=0.0, num_labels=len(task.LABELS)
+            ),
+        )
+        for task_name, task in task_dict.items()
+    }
+    return JiantModel(
+        task_dict=task_dict,
+        encoder=encoder,
+        taskmodels_dict=taskmodels_dict,
+        task_to_taskmodel_map={"rte": "rte", "mnli": "mnli"},
+        tokenizer=types.SimpleNamespace(pad_token_id=0),
+    )
+
+
+def _get_batch(task, batch_size, seq_length):
+    input_mask = torch.ones(batch_size, seq_length, dtype=torch.long)
+    input_mask[0, seq_length // 2 :] = 0
+    return task.Batch(
+        input_ids=torch.randint(1, 50, (batch_size, seq_length)) * input_mask,
+        input_mask=input_mask,
+        segment_ids=torch.zeros(batch_size, seq_length, dtype=torch.long),
+        label_id=torch.randint(len(task.LABELS), (batch_size,)),
+        tokens=[[]] * batch_size,
+    )
+
+
+def _get_grads(jiant_model):
+    return [param.grad.clone() for param in jiant_model.parameters() if param.grad is not None]
+
+
+def test_packed_forward_matches_separate_forward():
+    jiant_model = _build_jiant_model()
+    rte_task, mnli_task = jiant_model.task_dict["rte"], jiant_model.task_dict["mnli"]
+    task_batch_list = [
+        (rte_task, _get_batch(rte_task, batch_size=3, seq_length=8)),
+        (mnli_task, _get_batch(mnli_task, batch_size=2, seq_length=12)),
+        (rte_task, _get_batch(rte_task, batch_size=2, seq_length=5)),
+    ]
+
+    model_outputs = [
+        wrap_jiant_forward(jiant_model=jiant_model, batch=batch, task=task, compute_loss=True)
+        for task, batch in task_batch_list
+    ]
+    sum(model_output.loss for model_output in model_outputs).backward()
+    grads = _get_grads(jiant_model)
+    jiant_model.zero_grad()
+
+    packed_model_outputs = packing.packed_forward(
+        jiant_model=jiant_model, task_batch_list=task_batch_list, compute_loss=True
+    )
+    sum(model_output.loss for model_output in packed_model_outputs).backward()
+    packed_grads = _get_grads(jiant_model)
+
+    for model_output, packed_model_output in zip(model_outputs, packed_model_outputs):
+        assert torch.allclose(model_output.logits, packed_model_output.logits, atol=1e-5)
+        assert torch.allclose(model_output.loss, packed_model_output.loss, atol=1e-5)
+    assert len(grads) == len(packed_grads)
+    for grad, packed_grad in zip(grads, packed_grads):
+        assert torch.allclose(grad, packed_grad, atol=1e-5)
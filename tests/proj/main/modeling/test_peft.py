@@ -0,0 +1,127 @@
+import copy
+
+import pytest
+import torch
+import torch.nn as nn
+import transformers
+
+import jiant.proj.main.modeling.model_setup as jiant_model_setup
+import jiant.proj.main.modeling.peft as peft
+import jiant.shared.model_setup as model_setup
+import jiant.utils.torch_utils as torch_utils
+
+INPUT_IDS = torch.arange(10).view(2, 5)
+
+
+class _Model(nn.Module):
+    # Stands in for JiantModel: an encoder, shared by taskmodels with their own heads
+    def __init__(self):
+        super().__init__()
+        config = transformers.BertConfig(
+            vocab_size=20,
+            hidden_size=8,
+            num_hidden_layers=2,
+            num_attention_heads=2,
+            intermediate_size=16,
+        )
+        self.encoder = transformers.BertModel(config)
+        self.head = nn.Linear(8, 2)
+        self.task_to_taskmodel_map = {"task_a": "taskmodel_a", "task_b": "taskmodel_b"}
+
+    def forward(self, input_ids):
+        return self.head(self.encoder(input_ids)[0])
+
+
+def _get_model(peft_config):
+    torch.manual_seed(0)
+    model = _Model().eval()
+    initial_output = model(INPUT_IDS)
+    peft.inject_peft(jiant_model=model, peft_config=peft_config)
+    return model, initial_output
+
+
+@pytest.mark.parametrize(
+    "peft_config",
+    [
+        peft.PeftConfig(adapter_size=2),
+        peft.PeftConfig(lora_rank=2),
+        peft.PeftConfig(adapter_size=2, lora_rank=2, per_taskmodel=True),
+    ],
+)
+def test_inject_peft(peft_config):
+    model, initial_output = _get_model(peft_config)
+    # Adapters and LoRA are initialized to leave outputs unchanged
+    assert torch.allclose(model(INPUT_IDS), initial_output, atol=1e-6)
+
+    trainable_names = [name for name, param in model.named_parameters() if param.requires_grad]
+    assert all(".peft." in name or name.startswith("head.") for name in trainable_names)
+    assert all(name in trainable_names for name in torch_utils.get_state_dict_for_saving(model))
+    optimizer_scheduler = model_setup.create_optimizer(
+        model=model, learning_rate=1e-3, t_total=10, warmup_steps=0, warmup_proportion=None,
+    )
+    num_optimizer_params = sum(
+        len(group["params"]) for group in optimizer_scheduler.optimizer.param_groups
+    )
+    assert num_optimizer_params == len(trainable_names)
+
+
+def test_save_and_load_trainable_only():
+    peft_config = peft.PeftConfig(lora_rank=2, adapter_size=2)
+    model, _ = _get_model(peft_config)
+    model.train()
+    model(INPUT_IDS).sum().backward()
+    torch.optim.SGD([p for p in model.parameters() if p.requires_grad], lr=1.0).step()
+    model.eval()
+    state_dict = torch_utils.get_state_dict_for_saving(model)
+    assert len(state_dict) < len(model.state_dict())
+
+    new_model, _ = _get_model(peft_config)
+    assert not torch.allclose(new_model(INPUT_IDS), model(INPUT_IDS))
+    torch_utils.load_state_dict_for_saving(new_model, state_dict)
+    assert torch.allclose(new_model(INPUT_IDS), model(INPUT_IDS))
+
+    with pytest.raises(RuntimeError):
+        torch_utils.load_state_dict_for_saving(new_model, {"unexpected.weight": torch.ones(1)})
+
+
+def test_per_taskmodel():
+    model, initial_output = _get_model(peft.PeftConfig(lora_rank=2, per_taskmodel=True))
+    for module in peft.get_peft_modules(model.encoder):
+        nn.init.ones_(module.peft["taskmodel_b"].lora.lora_b)
+    peft.set_active_taskmodel(model.encoder, "taskmodel_a")
+    assert torch.allclose(model(INPUT_IDS), initial_output, atol=1e-6)
+    peft.set_active_taskmodel(model.encoder, "taskmodel_b")
+    assert not torch.allclose(model(INPUT_IDS), initial_output, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "peft_config", [peft.PeftConfig(adapter_size=2), peft.PeftConfig(lora_rank=2)],
+)
+def test_gradient_checkpointing(peft_config):
+    model, _ = _get_model(peft_config)
+    # Non-zero initializations, so that all PEFT parameters get non-zero gradients
+    for module in peft.get_peft_modules(model.encoder):
+        for param in module.peft.parameters():
+            nn.init.normal_(param)
+    checkpointed_model = copy.deepcopy(model)
+    jiant_model_setup.enable_gradient_checkpointing(checkpointed_model.encoder)
+    for model_ in (model, checkpointed_model):
+        model_.train()
+        torch.manual_seed(0)
+        model_(INPUT_IDS).sum().backward()
+
+    peft_names = [name for name, _ in model.named_parameters() if ".peft." in name]
+    assert peft_names
+    params = dict(model.named_parameters())
+    for name, checkpointed_param in checkpointed_model.named_parameters():
+        if not checkpointed_param.requires_grad:
+            continue
+        assert checkpointed_param.grad is not None and checkpointed_param.grad.abs().sum() > 0
+        assert torch.allclose(checkpointed_param.grad, params[name].grad, atol=1e-5)
+
+
+def test_has_reentrant_gradient_checkpointing():
+    model, _ = _get_model(peft.PeftConfig(lora_rank=2))
+    assert not jiant_model_setup.has_reentrant_gradient_checkpointing(model.encoder)
+    model.encoder.config.gradient_checkpointing = True
+    assert jiant_model_setup.has_reentrant_gradient_checkpointing(model.encoder)
@@ -0,0 +1,103 @@
+import pytest
+import torch
+import transformers
+
+import jiant.proj.main.modeling.taskmodels as taskmodels
+import jiant.utils.transformer_utils as transformer_utils
+from jiant.utils.python.datastructures import take_one
+
+SMALL_CONFIG_KWARGS = dict(
+    vocab_size=50,
+    hidden_size=16,
+    num_hidden_layers=3,
+    num_attention_heads=2,
+    intermediate_size=32,
+    max_position_embeddings=32,
+)
+
+
+def _build_encoder(model_type):
+    if model_type == "bert":
+        return transformers.BertModel(transformers.BertConfig(**SMALL_CONFIG_KWARGS))
+    elif model_type == "roberta":
+        return transformers.RobertaModel(transformers.RobertaConfig(**SMALL_CONFIG_KWARGS))
+    elif model_type == "albert":
+        return transformers.AlbertModel(
+            transformers.AlbertConfig(embedding_size=8, **SMALL_CONFIG_KWARGS)
+        )
+    elif model_type == "electra":
+        return transformers.ElectraModel(
+            transformers.ElectraConfig(embedding_size=8, **SMALL_CONFIG_KWARGS)
+        )
+    elif model_type in ("bart", "mbart"):
+        return transformers.BartModel(
+            transformers.BartConfig(
+                vocab_size=50,
+                d_model=16,
+                encoder_layers=3,
+                decoder_layers=2,
+                encoder_attention_heads=2,
+                decoder_attention_heads=2,
+                encoder_ffn_dim=32,
+                decoder_ffn_dim=32,
+                max_position_embeddings=32,
+                # mBART has additional final layer norms
+                normalize_before=model_type == "mbart",
+                add_final_layer_norm=model_type == "mbart",
+            )
+        )
+    else:
+        raise KeyError(model_type)
+
+
+class _Batch:
+    def __init__(self):
+        torch.manual_seed(0)
+        self.input_ids = torch.randint(3, 50, (2, 7))
+        self.input_ids[1, 5:] = 1
+        self.input_mask = (self.input_ids != 1).long()
+        self.segment_ids = torch.zeros_like(self.input_ids)
+
+
+@pytest.mark.parametrize("model_type", ["bert", "roberta", "albert", "electra", "bart", "mbart"])
+def test_get_layer_output_matches_hidden_states(model_type):
+    encoder = _build_encoder(model_type).eval()
+    batch = _Batch()
+    with torch.no_grad():
+        with transformer_utils.output_hidden_states_context(encoder):
+            encoder_output = taskmodels.get_output_from_encoder_and_batch(encoder, batch)
+        hidden_states = take_one(encoder_output.other)
+        assert len(hidden_states) == transformer_utils.get_num_hidden_states(encoder)
+        for layer in range(-len(hidden_states), len(hidden_states)):
+            layer_output = taskmodels.get_layer_output_from_encoder_and_batch(
+                encoder=encoder, batch=batch, layer=layer
+            )
+            assert torch.allclose(layer_output, hidden_states[layer], atol=1e-5)
+        # Hidden states are only returned when requested
+        assert not taskmodels.get_output_from_encoder_and_batch(encoder, batch).other
+
+
+@pytest.mark.parametrize("model_type", ["bert", "albert", "bart"])
+def test_get_layer_outputs_matches_hidden_states(model_type):
+    encoder = _build_encoder(model_type).eval()
+    batch = _Batch()
+    with torch.no_grad():
+        full_output = taskmodels.get_output_from_encoder_and_batch(encoder, batch)
+        with transformer_utils.output_hidden_states_context(encoder):
+            hidden_states = take_one(
+                taskmodels.get_output_from_encoder_and_batch(encoder, batch).other
+            )
+        for layers in [[1, 2], [None, 0, -1], [-2]]:
+            layer_outputs = taskmodels.get_layer_outputs_from_encoder_and_batch(
+                encoder=encoder, batch=batch, layers=layers
+            )
+            assert set(layer_outputs) == set(layers)
+            for layer, layer_output in layer_outputs.items():
+                if layer is None:
+                    assert torch.allclose(layer_output.pooled, full_output.pooled, atol=1e-5)
+                    assert torch.allclose(layer_output.unpooled, full_output.unpooled, atol=1e-5)
+                else:
+                    assert torch.allclose(layer_output.unpooled, hidden_states[layer], atol=1e-5)
+                    assert torch.allclose(
+                        layer_output.pooled, hidden_states[layer][:, 0], atol=1e-5
+                    )
@@ -0,0 +1,166 @@
+import os
+import socket
+
+import numpy as np
+import torch
+
+import jiant.proj.main.launch as launch
+import jiant.shared.caching as caching
+
+REPO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+
+WORKER_SCRIPT = """
+import os
+import sys
+
+import torch
+
+import jiant.shared.distributed as distributed
+import jiant.shared.initialization as initialization
+import jiant.shared.model_setup as model_setup
+
+local_rank = int(os.environ["LOCAL_RANK"])
+initialization.init_cuda_from_args(no_cuda=True, local_rank=local_rank, fp16=False, verbose=False)
+# Different initializations are replaced by those of the first process
+torch.manual_seed(local_rank)
+model, _ = model_setup.raw_special_model_setup(
+    model=torch.nn.Linear(4, 1),
+    optimizer=None,
+    fp16=False,
+    fp16_opt_level=None,
+    n_gpu=0,
+    local_rank=local_rank,
+)
+torch.manual_seed(100)
+inputs = torch.randn(4, 4)
+rank, world_size = distributed.get_rank(), distributed.get_world_size()
+model(inputs[rank::world_size]).pow(2).mean().backward()
+torch.save(
+    {
+        "weight": model.module.weight.detach(),
+        "grad": model.module.weight.grad,
+        "world_size": world_size,
+        "seed": distributed.broadcast_int(rank + 10),
+    },
+    os.path.join(sys.argv[1], f"rank_{rank}.p"),
+)
+"""
+
+EVAL_WORKER_SCRIPT = """
+import os
+import sys
+import types
+
+import numpy as np
+import torch
+
+import jiant.proj.main.runner as jiant_runner
+import jiant.shared.caching as caching
+import jiant.shared.distributed as distributed
+import jiant.shared.initialization as initialization
+import jiant.tasks.evaluate.core as evaluate_core
+
+local_rank = int(os.environ["LOCAL_RANK"])
+initialization.init_cuda_from_args(no_cuda=True, local_rank=local_rank, fp16=False, verbose=False)
+rank, world_size = distributed.get_rank(), distributed.get_world_size()
+shard_slice = caching.get_shard_slice(7, num_shards=world_size, shard_index=rank)
+logits = np.arange(14, dtype=np.float32).reshape(7, 2)[shard_slice]
+guids = np.array([f"guid{i}" for i in range(7)])[shard_slice]
+
+logits_accumulator = evaluate_core.ConcatenateLogitsAccumulator()
+logits_accumulator.update(
+    batch_logits=logits, batch_loss=0, batch=None, batch_metadata={"guid": guids}
+)
+bucc_accumulator = evaluate_core.Bucc2018Accumulator()
+bucc_accumulator.update(
+    batch_logits=logits,
+    batch_loss=0,
+    batch=types.SimpleNamespace(
+        is_english=torch.ones(len(logits)), text_hash=list(guids), guid=list(guids)
+    ),
+    batch_metadata={},
+)
+gathered = jiant_runner.gather_eval_results(
+    eval_accumulator=logits_accumulator, total_eval_loss=float(rank), nb_eval_steps=1
+)
+gathered_bucc = jiant_runner.gather_eval_results(eval_accumulator=bucc_accumulator)
+if rank == 0:
+    bucc_accumulated = gathered_bucc[0].get_accumulated()
+    torch.save(
+        {
+            "logits": gathered[0].get_accumulated(),
+            "guids": gathered[0].get_guids(),
+            "total_eval_loss": gathered[1],
+            "nb_eval_steps": gathered[2],
+            "bucc_embeddings": np.array(bucc_accumulated["all_embeddings"]),
+            "bucc_guids": bucc_accumulated["guid_list"],
+        },
+        os.path.join(sys.argv[1], "gathered.p"),
+    )
+else:
+    assert gathered is None and gathered_bucc is None
+"""
+
+
+def _get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_sharded_iterable_dataset(tmpdir):
+    caching.chunk_and_save(
+        data=list(range(10)), chunk_size=3, data_args={"chunk_size": 3}, output_dir=str(tmpdir)
+    )
+    cache = caching.ChunkedFilesDataCache(str(tmpdir))
+    shards = [
+        list(cache.get_iterable_dataset(shuffle=True, num_shards=3, shard_index=shard_index))
+        for shard_index in range(3)
+    ]
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    assert len(cache.get_iterable_dataset(num_shards=3, shard_index=0)) == 4
+    assert sorted(sum(shards, [])) == list(range(10))
+
+
+def _launch_worker(tmpdir, worker_script, nproc_per_node):
+    script_path = os.path.join(str(tmpdir), "worker.py")
+    with open(script_path, "w") as f:
+        f.write(worker_script)
+    launch.launch(
+        args=launch.RunConfiguration(nproc_per_node=nproc_per_node, master_port=_get_free_port()),
+        python_args=[script_path, str(tmpdir)],
+        poll_interval=0.1,
+    )
+
+
+def test_launch_gloo_ddp(tmpdir, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", REPO_PATH)
+    _launch_worker(tmpdir, worker_script=WORKER_SCRIPT, nproc_per_node=2)
+    outputs = [torch.load(os.path.join(str(tmpdir), f"rank_{rank}.p")) for rank in range(2)]
+    assert [output["world_size"] for output in outputs] == [2, 2]
+    assert [output["seed"] for output in outputs] == [10, 10]
+
+    # Gradients are averaged over processes, as for the full batch on one process
+    torch.manual_seed(0)
+    model = torch.nn.Linear(4, 1)
+    torch.manual_seed(100)
+    model(torch.randn(4, 4)).pow(2).mean().backward()
+    for output in outputs:
+        assert torch.allclose(output["weight"], model.weight.detach())
+        assert torch.allclose(output["grad"], model.weight.grad, atol=1e-6)
+
+
+def test_gather_eval_results(tmpdir, monkeypatch):
+    monkeypatch.setenv("PYTHONPATH", REPO_PATH)
+    # Gathered results hold numpy arrays, which newer versions of torch.load reject by default
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    # Uneven shards of 3, 2 and 2 examples
+    _launch_worker(tmpdir, worker_script=EVAL_WORKER_SCRIPT, nproc_per_node=3)
+    gathered = torch.load(os.path.join(str(tmpdir), "gathered.p"))
+    guids = [f"guid{i}" for i in range(7)]
+    expected_logits = np.arange(14, dtype=np.float32).reshape(7, 2)
+    assert np.array_equal(gathered["logits"], expected_logits)
+    assert list(gathered["guids"]) == guids
+    assert (gathered["total_eval_loss"], gathered["nb_eval_steps"]) == (0.0 + 1.0 + 2.0, 3)
+    assert np.array_equal(gathered["bucc_embeddings"], expected_logits)
+    assert list(gathered["bucc_guids"]) == guids
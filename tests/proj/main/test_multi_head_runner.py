@@ -0,0 +1,134 @@
+import functools
+
+import numpy as np
+import torch
+import transformers
+
+import jiant.proj.main.components.container_setup as container_setup
+import jiant.proj.main.components.task_sampler as jiant_task_sampler
+import jiant.proj.main.multi_head_runner as multi_head_runner
+import jiant.shared.caching as caching
+import jiant.tasks.lib.rte as rte
+from jiant.shared.model_setup import ModelArchitectures
+from jiant.utils.zlog import VOID_LOGGER
+
+
+def _create_task_container(tmpdir):
+    task = rte.RteTask(name="rte", path_dict={})
+    rng = np.random.RandomState(0)
+    data_rows = [
+        rte.DataRow(
+            guid=f"rte-{i}",
+            input_ids=rng.randint(3, 50, size=7),
+            input_mask=np.ones(7, dtype=int),
+            segment_ids=np.zeros(7, dtype=int),
+            label_id=i % 2,
+            tokens=[],
+        )
+        for i in range(12)
+    ]
+    data = [{"data_row": row, "metadata": {"example_id": i}} for i, row in enumerate(data_rows)]
+    for phase in ["train", "val"]:
+        caching.chunk_and_save(
+            data=data, chunk_size=5, data_args={"chunk_size": 5}, output_dir=str(tmpdir.join(phase))
+        )
+    caching.chunk_and_save(
+        data=[{"label_id": row.label_id} for row in data_rows],
+        chunk_size=5,
+        data_args={"chunk_size": 5},
+        output_dir=str(tmpdir.join("val_labels")),
+    )
+    return container_setup.JiantTaskContainer(
+        task_dict={"rte": task},
+        task_sampler=jiant_task_sampler.UniformMultiTaskSampler(task_dict={"rte": task}, rng=0),
+        task_cache_dict=container_setup.create_task_cache_dict(
+            {"rte": {phase: str(tmpdir.join(phase)) for phase in ["train", "val", "val_labels"]}}
+        ),
+        global_train_config=container_setup.GlobalTrainConfig(max_steps=3, warmup_steps=0),
+        task_specific_configs={
+            "rte": container_setup.TaskSpecificConfig(
+                train_batch_size=4,
+                eval_batch_size=4,
+                gradient_accumulation_steps=1,
+                eval_subset_num=8,
+            )
+        },
+        taskmodels_config=container_setup.TaskmodelsConfig(task_to_taskmodel_map={"rte": "rte"}),
+        task_run_config=container_setup.TaskRunConfig(
+            train_task_list=["rte"],
+            train_val_task_list=["rte"],
+            val_task_list=["rte"],
+            test_task_list=[],
+        ),
+        metrics_aggregator=jiant_task_sampler.EqualMetricAggregator(),
+    )
+
+
+def test_multi_head_runner(tmpdir, monkeypatch):
+    # Cache chunks contain DataRows, which torch>=2.6 does not load by default
+    monkeypatch.setattr(torch, "load", functools.partial(torch.load, weights_only=False))
+    jiant_task_container = _create_task_container(tmpdir)
+    encoder = transformers.BertModel(
+        transformers.BertConfig(
+            vocab_size=50,
+            hidden_size=16,
+            num_hidden_layers=3,
+            num_attention_heads=2,
+            intermediate_size=32,
+            max_position_embeddings=32,
+        )
+    )
+    head_states = multi_head_runner.create_head_states(
+        head_config_list=[
+            multi_head_runner.HeadConfig(name="last", task_name="rte"),
+            multi_head_runner.HeadConfig(name="layer1_seed0", task_name="rte", layer=1),
+            multi_head_runner.HeadConfig(name="layer1_seed1", task_name="rte", layer=1, seed=1),
+        ],
+        jiant_task_container=jiant_task_container,
+        encoder=encoder,
+        model_arch=ModelArchitectures.BERT,
+        learning_rate=1e-3,
+        adam_epsilon=1e-8,
+        optimizer_type="adam",
+        device=torch.device("cpu"),
+        verbose=False,
+    )
+    runner = multi_head_runner.MultiHeadRunner(
+        jiant_task_container=jiant_task_container,
+        encoder=encoder,
+        tokenizer=None,
+        head_states=head_states,
+        device=torch.device("cpu"),
+        max_grad_norm=1.0,
+        log_writer=VOID_LOGGER,
+    )
+    # Heads are initialized from their own seeds
+    head_weights = {
+        name: head_state.get_head_state_dict()["classification_head.dense.weight"].clone()
+        for name, head_state in head_states.items()
+    }
+    assert torch.equal(head_weights["last"], head_weights["layer1_seed0"])
+    assert not torch.equal(head_weights["layer1_seed0"], head_weights["layer1_seed1"])
+    encoder_state_dict = {k: v.clone() for k, v in encoder.state_dict().items()}
+
+    num_encoder_calls = []
+    encoder.embeddings.register_forward_hook(lambda *args: num_encoder_calls.append(1))
+    for _ in runner.run_train_context(verbose=False):
+        pass
+    # One encoder pass per batch, shared by all heads
+    assert len(num_encoder_calls) == 3
+    for name, head_state in head_states.items():
+        assert head_state.train_state.global_steps == 3
+        assert not torch.equal(
+            head_state.get_head_state_dict()["classification_head.dense.weight"],
+            head_weights[name],
+        )
+    for k, v in encoder.state_dict().items():
+        assert torch.equal(v, encoder_state_dict[k])
+
+    val_results_dict = runner.run_val(task_name_list=["rte"], use_subset=True, verbose=False)
+    assert set(val_results_dict) == set(head_states)
+    assert len(num_encoder_calls) == 3 + 2
+    for head_results_dict in val_results_dict.values():
+        assert len(head_results_dict["rte"]["accumulator"].get_guids()) == 8
+    assert set(runner.update_best_heads(val_results_dict)) == set(head_states)
@@ -0,0 +1,116 @@
+import os
+
+import jiant.proj.main.components.container_setup as container_setup
+import jiant.proj.main.components.task_sampler as jiant_task_sampler
+import jiant.proj.main.runner as jiant_runner
+import jiant.proj.main.tokenize_and_cache as tokenize_and_cache
+import jiant.shared.caching as shared_caching
+import jiant.tasks.evaluate as evaluate
+import jiant.utils.python.io as py_io
+from jiant.shared import model_resolution
+from jiant.shared.constants import PHASE
+from jiant.tasks import create_task_from_config_path
+from jiant.utils.testing.tokenizer import SimpleSpaceTokenizer
+from jiant.utils.zlog import VOID_LOGGER
+
+SPR1_DATA_PATH = os.path.join(os.path.dirname(__file__), "../../tasks/lib/resources/data/spr1")
+
+
+def _create_grouped_spr1_task_container(tmpdir, eval_subset_num):
+    task_config_path = os.path.join(str(tmpdir), "spr1.json")
+    py_io.write_json(
+        {
+            "task": "spr1",
+            "name": "spr1",
+            "paths": {"val": os.path.join(SPR1_DATA_PATH, "test.jsonl")},
+            "kwargs": {"group_spans": True},
+        },
+        task_config_path,
+    )
+    task = create_task_from_config_path(task_config_path)
+    vocabulary = set()
+    for example in task.get_val_examples():
+        vocabulary.update(example.text.split())
+    tokenizer = SimpleSpaceTokenizer(vocabulary=sorted(vocabulary))
+    args = tokenize_and_cache.RunConfiguration(
+        task_config_path=task_config_path,
+        model_type="bert-",
+        model_tokenizer_path="",
+        output_dir=str(tmpdir),
+        max_seq_length=40,
+        chunk_size=1,
+    )
+    tokenize_and_cache.chunk_and_save(
+        task=task,
+        phase=PHASE.VAL,
+        examples=task.get_val_examples(),
+        feat_spec=model_resolution.build_featurization_spec(model_type="bert-", max_seq_length=40),
+        tokenizer=tokenizer,
+        args=args,
+    )
+    val_cache = shared_caching.ChunkedFilesDataCache(os.path.join(str(tmpdir), PHASE.VAL))
+    shared_caching.chunk_and_save(
+        data=evaluate.get_evaluation_scheme_for_task(task).get_labels_from_cache_and_examples(
+            task=task, cache=val_cache, examples=None
+        ),
+        chunk_size=args.chunk_size,
+        data_args=args.to_dict(),
+        output_dir=os.path.join(str(tmpdir), "val_labels"),
+    )
+    return container_setup.JiantTaskContainer(
+        task_dict={"spr1": task},
+        task_sampler=jiant_task_sampler.UniformMultiTaskSampler(task_dict={"spr1": task}, rng=0),
+        task_cache_dict=container_setup.create_task_cache_dict(
+            {"spr1": {phase: os.path.join(str(tmpdir), phase) for phase in ["val", "val_labels"]}}
+        ),
+        global_train_config=container_setup.GlobalTrainConfig(max_steps=1, warmup_steps=0),
+        task_specific_configs={
+            "spr1": container_setup.TaskSpecificConfig(
+                train_batch_size=1,
+                eval_batch_size=1,
+                gradient_accumulation_steps=1,
+                eval_subset_num=eval_subset_num,
+            )
+        },
+        taskmodels_config=container_setup.TaskmodelsConfig(task_to_taskmodel_map={"spr1": "spr1"}),
+        task_run_config=container_setup.TaskRunConfig(
+            train_task_list=[], train_val_task_list=[], val_task_list=["spr1"], test_task_list=[],
+        ),
+        metrics_aggregator=jiant_task_sampler.EqualMetricAggregator(),
+    )
+
+
+def test_val_labels_subset_grouped_spans(tmpdir, monkeypatch):
+    # Cached chunks hold DataRows, which newer versions of torch.load reject by default
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    jiant_task_container = _create_grouped_spr1_task_container(tmpdir, eval_subset_num=1)
+    task = jiant_task_container.task_dict["spr1"]
+    assert task.group_spans
+    runner = jiant_runner.JiantRunner(
+        jiant_task_container=jiant_task_container,
+        jiant_model=None,
+        optimizer_scheduler=None,
+        device="cpu",
+        rparams=jiant_runner.RunnerParameters(local_rank=-1, n_gpu=0, fp16=False, max_grad_norm=1),
+        log_writer=VOID_LOGGER,
+    )
+    all_labels = runner.get_val_labels_dict(["spr1"])["spr1"]
+    val_labels = runner.get_val_labels_dict(["spr1"], use_subset=True)["spr1"]
+
+    # Logits of the first (grouped) row, predicting its labels, one row per span query
+    evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task)
+    accumulator = evaluation_scheme.get_accumulator()
+    for batch, batch_metadata in runner.get_val_dataloader_dict(["spr1"], use_subset=True)["spr1"]:
+        accumulator.update(
+            batch_logits=batch.label_ids.float().numpy(),
+            batch_loss=0,
+            batch=batch,
+            batch_metadata=batch_metadata,
+        )
+    num_span_queries = len(accumulator.get_accumulated())
+    assert 1 < num_span_queries < len(all_labels)
+    assert len(val_labels) == num_span_queries
+    metrics = evaluation_scheme.compute_metrics_from_accumulator(
+        task=task, accumulator=accumulator, tokenizer=None, labels=val_labels
+    )
+    assert metrics.minor["acc"] == 1.0
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+import jiant.proj.main.preprocessing as preprocessing
+import jiant.proj.main.tokenize_and_cache as tokenize_and_cache
+import jiant.shared.caching as shared_caching
+import jiant.tasks.evaluate as evaluate
+from jiant.shared import model_resolution
+from jiant.shared.constants import PHASE
+from jiant.tasks import create_task_from_config_path
+from jiant.utils.testing.tokenizer import SimpleSpaceTokenizer
+
+
+def test_streaming_val_labels_match_labels_from_cache(tmpdir, monkeypatch):
+    # Cached chunks hold DataRows, which newer versions of torch.load reject by default
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    task = create_task_from_config_path(
+        os.path.join(os.path.dirname(__file__), "../../tasks/lib/resources/mnli.json"),
+        verbose=False,
+    )
+    vocabulary = set()
+    for example in task.iter_examples(PHASE.VAL):
+        vocabulary.update(example.premise.split() + example.hypothesis.split())
+    tokenizer = SimpleSpaceTokenizer(vocabulary=sorted(vocabulary))
+    feat_spec = model_resolution.build_featurization_spec(model_type="bert-", max_seq_length=64)
+    evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task)
+    args = tokenize_and_cache.RunConfiguration(
+        task_config_path="",
+        model_type="bert-",
+        model_tokenizer_path="",
+        output_dir=str(tmpdir),
+        max_seq_length=64,
+        chunk_size=2,
+        do_iter=True,
+    )
+
+    val_labels_writer = shared_caching.ChunkedFilesWriter(
+        chunk_size=args.chunk_size,
+        data_args=args.to_dict(),
+        output_dir=os.path.join(str(tmpdir), "val_labels"),
+    )
+    tokenize_and_cache.chunk_and_save(
+        task=task,
+        phase=PHASE.VAL,
+        examples=task.iter_examples(PHASE.VAL),
+        feat_spec=feat_spec,
+        tokenizer=tokenizer,
+        args=args,
+        labels_recorder=preprocessing.StreamingLabelsRecorder(
+            task=task,
+            evaluation_scheme=evaluation_scheme,
+            write_fn=val_labels_writer.write,
+            group_size=3,
+        ),
+    )
+    val_labels_writer.close()
+
+    val_cache = shared_caching.ChunkedFilesDataCache(os.path.join(str(tmpdir), PHASE.VAL))
+    streamed_labels = shared_caching.ChunkedFilesDataCache(
+        os.path.join(str(tmpdir), "val_labels")
+    ).get_all()
+    labels = evaluation_scheme.get_labels_from_cache_and_examples(
+        task=task, cache=val_cache, examples=task.get_examples(PHASE.VAL)
+    )
+    assert len(val_cache) == len(labels) > args.chunk_size
+    assert np.array_equal(np.array(streamed_labels), labels)
+    assert [datum["metadata"]["example_id"] for datum in val_cache.iter_all()] == list(
+        range(len(labels))
+    )
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+import torch
+import transformers
+
+import jiant.proj.main.tokenize_and_cache as tokenize_and_cache
+import jiant.proj.main.trim_vocab as trim_vocab
+import jiant.shared.caching as shared_caching
+import jiant.shared.model_setup as model_setup
+import jiant.utils.python.io as py_io
+from jiant.shared.constants import PHASE
+from jiant.tasks import create_task_from_config_path
+
+TASK_CONFIG_PATH = os.path.join(os.path.dirname(__file__), "../../tasks/lib/resources/mnli.json")
+
+
+def _setup_model_and_cache(base_path):
+    task = create_task_from_config_path(TASK_CONFIG_PATH, verbose=False)
+    words = set()
+    for example in task.iter_examples(PHASE.VAL):
+        words.update((example.premise + " " + example.hypothesis).lower().split())
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [f"unused{i}" for i in range(100)]
+    vocab += sorted(words)
+    tokenizer_path = os.path.join(base_path, "tokenizer")
+    os.makedirs(tokenizer_path)
+    py_io.write_file("\n".join(vocab) + "\n", os.path.join(tokenizer_path, "vocab.txt"))
+
+    config = transformers.BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=8,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=16,
+    )
+    model = transformers.BertForPreTraining(config).eval()
+    model_path = os.path.join(base_path, "model.p")
+    model_config_path = os.path.join(base_path, "model.json")
+    torch.save(model.state_dict(), model_path)
+    py_io.write_json(config.to_dict(), model_config_path)
+
+    tokenize_and_cache.main(
+        tokenize_and_cache.RunConfiguration(
+            task_config_path=TASK_CONFIG_PATH,
+            model_type="bert-base-uncased",
+            model_tokenizer_path=tokenizer_path,
+            output_dir=os.path.join(base_path, "cache", "mnli"),
+            phases="val",
+            max_seq_length=64,
+            chunk_size=3,
+        )
+    )
+    return model, model_path, model_config_path, tokenizer_path
+
+
+def test_trim_vocab(tmpdir, monkeypatch):
+    # Cached chunks hold DataRows, which newer versions of torch.load reject by default
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    base_path = str(tmpdir)
+    model, model_path, model_config_path, tokenizer_path = _setup_model_and_cache(base_path)
+    result = trim_vocab.trim_vocab(
+        trim_vocab.RunConfiguration(
+            model_type="bert-base-uncased",
+            model_path=model_path,
+            model_config_path=model_config_path,
+            model_tokenizer_path=tokenizer_path,
+            task_cache_base_path=os.path.join(base_path, "cache"),
+            output_base_path=os.path.join(base_path, "trimmed"),
+        )
+    )
+    assert result["trimmed_vocab_size"] < result["vocab_size"] - 100
+    output_config = py_io.read_json(os.path.join(base_path, "trimmed", "config.json"))
+
+    # Remapped caches match the output of the trimmed tokenizer
+    tokenizer = model_setup.get_tokenizer("bert-base-uncased", tokenizer_path)
+    trimmed_tokenizer = model_setup.get_tokenizer(
+        "bert-base-uncased", output_config["model_tokenizer_path"]
+    )
+    assert len(trimmed_tokenizer) == result["trimmed_vocab_size"]
+    assert trimmed_tokenizer.convert_tokens_to_ids(["unused0"]) == [trimmed_tokenizer.unk_token_id]
+    cache = shared_caching.ChunkedFilesDataCache(os.path.join(base_path, "cache", "mnli", "val"))
+    trimmed_cache = shared_caching.ChunkedFilesDataCache(
+        os.path.join(output_config["task_cache_base_path"], "mnli", "val")
+    )
+    data_rows = [datum["data_row"] for datum in cache.iter_all()]
+    trimmed_data_rows = [datum["data_row"] for datum in trimmed_cache.iter_all()]
+    assert len(data_rows) == len(trimmed_data_rows)
+    for data_row, trimmed_data_row in zip(data_rows, trimmed_data_rows):
+        tokens = tokenizer.convert_ids_to_tokens(data_row.input_ids.tolist())
+        assert (
+            trimmed_tokenizer.convert_ids_to_tokens(trimmed_data_row.input_ids.tolist()) == tokens
+        )
+        assert (
+            trimmed_tokenizer.convert_tokens_to_ids(tokens) == trimmed_data_row.input_ids.tolist()
+        )
+        assert np.array_equal(trimmed_data_row.label_id, data_row.label_id)
+
+    # The trimmed model gives the same outputs, over the kept vocabulary
+    trimmed_model = transformers.BertForPreTraining(
+        transformers.BertConfig.from_json_file(output_config["model_config_path"])
+    ).eval()
+    trimmed_model.load_state_dict(torch.load(output_config["model_path"]))
+    kept_token_ids = trimmed_tokenizer.kept_token_ids
+    input_ids = torch.tensor(data_rows[0].input_ids).view(1, -1)
+    trimmed_input_ids = torch.tensor(trimmed_data_rows[0].input_ids).view(1, -1)
+    with torch.no_grad():
+        mlm_logits = model(input_ids)[0]
+        trimmed_mlm_logits = trimmed_model(trimmed_input_ids)[0]
+    assert torch.allclose(mlm_logits[..., kept_token_ids], trimmed_mlm_logits, atol=1e-5)
@@ -0,0 +1,56 @@
+import gc
+import os
+
+import numpy as np
+
+import jiant.shared.embedding_store as embedding_store
+
+
+def test_embedding_store(tmpdir):
+    rng = np.random.RandomState(0)
+    batches = [rng.randn(n, 4).astype(np.float32) for n in [3, 5, 1, 7]]
+    store = embedding_store.EmbeddingStore(output_dir=str(tmpdir), initial_capacity=4)
+    for i, batch in enumerate(batches):
+        store.add(
+            batch, guid=[f"{i}-{j}" for j in range(len(batch))], is_english=[i % 2] * len(batch)
+        )
+    embeddings, side_data = store.get_data()
+    assert len(store) == 16
+    assert isinstance(embeddings, np.memmap)
+    assert np.array_equal(embeddings, np.concatenate(batches))
+    assert list(side_data["guid"][:4]) == ["0-0", "0-1", "0-2", "1-0"]
+
+    loaded_embeddings, loaded_side_data = embedding_store.load_embedding_store(str(tmpdir))
+    assert np.array_equal(loaded_embeddings, embeddings)
+    assert np.array_equal(loaded_side_data["is_english"], side_data["is_english"])
+
+
+def test_embedding_store_float16():
+    embeddings = np.arange(12, dtype=np.float32).reshape(6, 2)
+    store = embedding_store.EmbeddingStore(dtype="float16")
+    store.add(embeddings[:2])
+    store.add(embeddings[2:])
+    stored_embeddings, _ = store.get_data()
+    assert stored_embeddings.dtype == np.float16
+    assert np.array_equal(stored_embeddings, embeddings)
+
+
+def test_embedding_store_temp_dir(tmpdir):
+    temp_dir = os.path.join(str(tmpdir), "embeddings")
+    store = embedding_store.EmbeddingStore(temp_dir=temp_dir)
+    store.add(np.ones((2, 3), dtype=np.float32))
+    assert os.listdir(temp_dir) == [os.path.basename(store.output_dir)]
+    # Temporary stores are deleted when garbage-collected
+    del store
+    gc.collect()
+    assert os.listdir(temp_dir) == []
+
+
+def test_select_rows():
+    x = np.arange(10).reshape(5, 2)
+    contiguous = embedding_store.select_rows(x, np.array([False, True, True, True, False]))
+    assert np.shares_memory(contiguous, x)
+    assert np.array_equal(contiguous, x[1:4])
+    assert np.array_equal(
+        embedding_store.select_rows(x, np.array([True, False, True, False, False])), x[[0, 2]]
+    )
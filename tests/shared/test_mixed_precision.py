@@ -0,0 +1,61 @@
+import pytest
+import torch
+
+from jiant.shared.mixed_precision import MixedPrecision, logits_to_numpy
+from jiant.shared.model_setup import OptimizerScheduler
+from jiant.shared.runner import complex_backpropagate
+
+
+def _train_step(mixed_precision, model, optimizer_scheduler):
+    with mixed_precision.autocast():
+        logits = model(torch.ones(4, 3))
+        loss = torch.nn.functional.cross_entropy(logits, torch.tensor([0, 1, 0, 1]))
+    complex_backpropagate(
+        loss=loss,
+        optimizer=optimizer_scheduler.optimizer,
+        model=model,
+        fp16=False,
+        n_gpu=1,
+        gradient_accumulation_steps=1,
+        max_grad_norm=1.0,
+        mixed_precision=mixed_precision,
+    )
+    mixed_precision.step(
+        optimizer_scheduler=optimizer_scheduler, parameters=model.parameters(), max_grad_norm=1.0,
+    )
+    optimizer_scheduler.optimizer.zero_grad()
+    return logits
+
+
+@pytest.mark.parametrize("precision", ["fp32", "bf16"])
+def test_cpu_train_step(precision):
+    torch.manual_seed(0)
+    model = torch.nn.Linear(3, 2)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    optimizer_scheduler = OptimizerScheduler(
+        optimizer=optimizer, scheduler=torch.optim.lr_scheduler.LambdaLR(optimizer, lambda _: 1.0)
+    )
+    mixed_precision = MixedPrecision(precision=precision, device_type="cpu")
+    initial_weight = model.weight.detach().clone()
+    logits = _train_step(mixed_precision, model, optimizer_scheduler)
+
+    assert logits.dtype == (torch.bfloat16 if precision == "bf16" else torch.float32)
+    assert logits_to_numpy(logits).dtype == "float32"
+    # Parameters stay in float32, and are updated
+    assert model.weight.dtype == torch.float32
+    assert not torch.equal(model.weight, initial_weight)
+    assert mixed_precision.grad_scaler is None
+
+
+def test_state_dict():
+    mixed_precision = MixedPrecision(precision="bf16")
+    MixedPrecision(precision="bf16").load_state_dict(mixed_precision.state_dict())
+    with pytest.raises(RuntimeError):
+        MixedPrecision(precision="fp32").load_state_dict(mixed_precision.state_dict())
+
+
+def test_fp16_requires_gpu():
+    with pytest.raises(RuntimeError):
+        MixedPrecision(precision="fp16", device_type="cpu")
+    with pytest.raises(KeyError):
+        MixedPrecision(precision="fp8")
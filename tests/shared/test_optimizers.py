@@ -0,0 +1,110 @@
+import copy
+
+import pytest
+import torch
+import transformers
+
+import jiant.shared.model_setup as model_setup
+from jiant.ext.radam import ForeachAdamW, ForeachRAdam, RAdam
+
+
+def _build_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.Tanh(), torch.nn.Linear(16, 3))
+
+
+def _get_param_groups(model):
+    return [
+        {"params": [model[0].weight, model[2].weight], "weight_decay": 0.01},
+        {"params": [model[0].bias, model[2].bias], "weight_decay": 0.0, "lr": 0.01},
+    ]
+
+
+def _train(model, optimizer, num_steps=12):
+    torch.manual_seed(1)
+    for _ in range(num_steps):
+        loss = model(torch.randn(4, 8)).pow(2).sum()
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+
+
+@pytest.mark.parametrize(
+    "optimizer_class, foreach_optimizer_class",
+    [(RAdam, ForeachRAdam), (transformers.AdamW, ForeachAdamW)],
+)
+def test_foreach_optimizer_matches_reference(optimizer_class, foreach_optimizer_class):
+    model = _build_model()
+    foreach_model = copy.deepcopy(model)
+    _train(model, optimizer_class(_get_param_groups(model), lr=1e-3))
+    _train(foreach_model, foreach_optimizer_class(_get_param_groups(foreach_model), lr=1e-3))
+    for param, foreach_param in zip(model.parameters(), foreach_model.parameters()):
+        assert torch.allclose(param, foreach_param, atol=1e-6)
+
+
+def test_foreach_optimizer_state_dtype():
+    model = _build_model()
+    bf16_model = copy.deepcopy(model)
+    _train(model, ForeachAdamW(_get_param_groups(model), lr=1e-3))
+    bf16_optimizer = ForeachAdamW(
+        _get_param_groups(bf16_model), lr=1e-3, state_dtype=torch.bfloat16
+    )
+    _train(bf16_model, bf16_optimizer)
+    for param, bf16_param in zip(model.parameters(), bf16_model.parameters()):
+        assert param.dtype == bf16_param.dtype == torch.float32
+        assert torch.allclose(param, bf16_param, atol=1e-3)
+    assert all(
+        state["exp_avg"].dtype == state["exp_avg_sq"].dtype == torch.bfloat16
+        for state in bf16_optimizer.state.values()
+    )
+
+
+@pytest.mark.parametrize("foreach_optimizer_class", [ForeachRAdam, ForeachAdamW])
+def test_foreach_optimizer_state_dtype_load_state_dict(foreach_optimizer_class):
+    model = _build_model()
+    resumed_model = copy.deepcopy(model)
+    optimizer = foreach_optimizer_class(
+        _get_param_groups(model), lr=1e-3, state_dtype=torch.bfloat16
+    )
+    _train(model, optimizer, num_steps=1)
+    resumed_optimizer = foreach_optimizer_class(
+        _get_param_groups(resumed_model), lr=1e-3, state_dtype=torch.bfloat16
+    )
+    resumed_optimizer.load_state_dict(copy.deepcopy(optimizer.state_dict()))
+    for param, resumed_param in zip(model.parameters(), resumed_model.parameters()):
+        state, resumed_state = optimizer.state[param], resumed_optimizer.state[resumed_param]
+        assert resumed_state["step"] == state["step"]
+        for key in ["exp_avg", "exp_avg_sq"]:
+            assert resumed_state[key].dtype == torch.bfloat16
+            assert torch.equal(resumed_state[key], state[key])
+
+
+def test_get_optimizer_state_memory():
+    model = _build_model()
+    optimizer = ForeachRAdam(_get_param_groups(model), lr=1e-3, state_dtype=torch.bfloat16)
+    assert [
+        group_memory["num_state_tensors"]
+        for group_memory in model_setup.get_optimizer_state_memory(optimizer)
+    ] == [0, 0]
+    _train(model, optimizer, num_steps=1)
+    group_memory_list = model_setup.get_optimizer_state_memory(optimizer)
+    assert [group_memory["num_params"] for group_memory in group_memory_list] == [
+        8 * 16 + 16 * 3,
+        16 + 3,
+    ]
+    assert [group_memory["num_state_tensors"] for group_memory in group_memory_list] == [4, 4]
+    # Two bfloat16 moments per parameter
+    assert group_memory_list[0]["state_memory_mb"] == (8 * 16 + 16 * 3) * 2 * 2 / 1024 ** 2
+
+
+def test_create_optimizer_state_dtype_requires_foreach():
+    with pytest.raises(RuntimeError):
+        model_setup.create_optimizer(
+            model=_build_model(),
+            learning_rate=1e-3,
+            t_total=10,
+            warmup_steps=0,
+            warmup_proportion=None,
+            optimizer_type="adam",
+            optimizer_state_dtype="bfloat16",
+        )
@@ -0,0 +1,258 @@
+import os
+
+import numpy as np
+import pytest
+import tokenizers
+import transformers
+
+import jiant.tasks.lib.templates.squad_style.core as squad_style
+import jiant.tasks.lib.templates.squad_style.utils as squad_utils
+import jiant.utils.python.io as py_io
+from jiant.shared.constants import PHASE
+
+
+class SpaceJoinTokenizer:
+    # noinspection PyMethodMayBeStatic
+    def convert_tokens_to_string(self, tokens):
+        return " ".join(tokens)
+
+
+def _reference_prelim_predictions(features, results, n_best_size, max_answer_length):
+    # Straightforward nested-loop implementation, used as a reference
+    prelim_predictions = []
+    for feature_index, (feature, result) in enumerate(zip(features, results)):
+        start_indexes = sorted(
+            range(len(result.start_logits)), key=lambda i: result.start_logits[i], reverse=True
+        )[:n_best_size]
+        end_indexes = sorted(
+            range(len(result.end_logits)), key=lambda i: result.end_logits[i], reverse=True
+        )[:n_best_size]
+        for start_index in start_indexes:
+            for end_index in end_indexes:
+                if start_index >= len(feature.tokens) or end_index >= len(feature.tokens):
+                    continue
+                if start_index not in feature.token_to_orig_map:
+                    continue
+                if end_index not in feature.token_to_orig_map:
+                    continue
+                if not feature.token_is_max_context.get(start_index, False):
+                    continue
+                if end_index < start_index or end_index - start_index + 1 > max_answer_length:
+                    continue
+                prelim_predictions.append(
+                    (
+                        feature_index,
+                        start_index,
+                        end_index,
+                        result.start_logits[start_index] + result.end_logits[end_index],
+                    )
+                )
+    return [x[:3] for x in sorted(prelim_predictions, key=lambda x: x[3], reverse=True)]
+
+
+def _create_random_features(rng, num_features, seq_length):
+    features, results = [], []
+    for i in range(num_features):
+        num_tokens = rng.randint(5, seq_length)
+        features.append(
+            squad_utils.PartialFeatures(
+                unique_id=i,
+                tokens=[f"t{j}" for j in range(num_tokens)],
+                token_to_orig_map={j: j for j in range(3, num_tokens) if rng.rand() < 0.9},
+                token_is_max_context={j: bool(rng.rand() < 0.8) for j in range(3, num_tokens)},
+            )
+        )
+        # Rounded logits, so that there are many ties
+        results.append(
+            squad_utils.SquadResult(
+                unique_id=i,
+                start_logits=np.round(rng.randn(seq_length) * 2).astype(np.float32),
+                end_logits=np.round(rng.randn(seq_length) * 2).astype(np.float32),
+            )
+        )
+    return features, results
+
+
+def test_get_best_indexes_breaks_ties_by_index():
+    logits = np.array([1.0, 3.0, 2.0, 3.0, 2.0, 0.0])
+    assert list(squad_utils._get_best_indexes(logits, 1)) == [1]
+    assert list(squad_utils._get_best_indexes(logits, 3)) == [1, 3, 2]
+    assert list(squad_utils._get_best_indexes(logits, 4)) == [1, 3, 2, 4]
+    assert list(squad_utils._get_best_indexes(logits, 10)) == [1, 3, 2, 4, 0, 5]
+
+
+def test_sorted_prelim_predictions_match_nested_loop():
+    rng = np.random.RandomState(0)
+    for _ in range(20):
+        features, results = _create_random_features(rng, num_features=3, seq_length=32)
+        prelim_predictions, _, _, _ = squad_utils.get_sorted_prelim_predictions(
+            features=features,
+            unique_id_to_result={result.unique_id: result for result in results},
+            n_best_size=8,
+            max_answer_length=5,
+            version_2_with_negative=False,
+        )
+        assert [
+            (pred.feature_index, pred.start_index, pred.end_index) for pred in prelim_predictions
+        ] == _reference_prelim_predictions(
+            features=features, results=results, n_best_size=8, max_answer_length=5,
+        )
+
+
+def test_compute_predictions_logits_v2():
+    seq_length = 8
+    start_logits = np.full(seq_length, -10, dtype=np.float32)
+    end_logits = np.full(seq_length, -10, dtype=np.float32)
+    start_logits[[0, 3, 5]] = [1, 5, 6]
+    end_logits[[0, 4, 6]] = [1, 5, 2]
+    feature = squad_utils.PartialFeatures(
+        unique_id=0,
+        tokens=["<cls>", "q", "<sep>", "the", "quick", "brown", "fox", "<sep>"],
+        token_to_orig_map={3: 0, 4: 1, 5: 2, 6: 3},
+        # Token 5 is better covered by another window
+        token_is_max_context={3: True, 4: True, 5: False, 6: True},
+    )
+    example = squad_utils.PartialExample(
+        doc_tokens=["the", "quick", "brown", "fox"],
+        qas_id="q0",
+        partial_features=[feature],
+        answers=[],
+    )
+    result = squad_utils.SquadResult(unique_id=0, start_logits=start_logits, end_logits=end_logits)
+    kwargs = dict(
+        partial_examples=[example],
+        all_results=[result],
+        n_best_size=3,
+        max_answer_length=4,
+        do_lower_case=False,
+        null_score_diff_threshold=0.0,
+        tokenizer=SpaceJoinTokenizer(),
+        skip_get_final_text=True,
+        verbose=False,
+    )
+    predictions = squad_utils.compute_predictions_logits_v2(version_2_with_negative=False, **kwargs)
+    assert predictions == {"q0": "the quick"}
+    predictions = squad_utils.compute_predictions_logits_v2(version_2_with_negative=True, **kwargs)
+    assert predictions == {"q0": "the quick"}
+
+
+def _reference_whitespace_split(context_text):
+    # Original char-by-char implementation of Example.__post_init__
+    doc_tokens = []
+    char_to_word_offset = []
+    prev_is_whitespace = True
+    for c in context_text:
+        if squad_style.is_whitespace(c):
+            prev_is_whitespace = True
+        else:
+            if prev_is_whitespace:
+                doc_tokens.append(c)
+            else:
+                doc_tokens[-1] += c
+            prev_is_whitespace = False
+        char_to_word_offset.append(len(doc_tokens) - 1)
+    return doc_tokens, char_to_word_offset
+
+
+def _create_tokenizers(tmpdir):
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "##s", "##ing", ".", ",", "?"]
+    words = ["the", "cat", "dog", "sat", "on", "mat", "run", "jump", "what", "who", "did"]
+    vocab += words
+    vocab_path = os.path.join(tmpdir, "vocab.txt")
+    py_io.write_file("\n".join(vocab) + "\n", vocab_path)
+    slow_tokenizer = transformers.BertTokenizer(vocab_path, do_lower_case=True)
+
+    return slow_tokenizer, _create_fast_tokenizer(vocab_path), words
+
+
+def _create_fast_tokenizer(vocab_path, tokenizer_cls=transformers.BertTokenizerFast):
+    class TokenizerFast(tokenizer_cls):
+        # The installed tokenizers package may not match the BertTokenizerFast constructor,
+        # so the backend tokenizer is built directly
+        # noinspection PyMissingConstructor
+        def __init__(self):
+            transformers.PreTrainedTokenizerFast.__init__(
+                self,
+                tokenizers.BertWordPieceTokenizer(vocab_path, lowercase=True),
+                unk_token="[UNK]",
+                sep_token="[SEP]",
+                pad_token="[PAD]",
+                cls_token="[CLS]",
+                mask_token="[MASK]",
+            )
+
+    return TokenizerFast()
+
+
+def _create_random_example(rng, words):
+    context_words = []
+    for _ in range(rng.randint(1, 40)):
+        word = words[rng.randint(len(words))]
+        word += ["", "s", "ing", ".", ",", "xyz"][rng.randint(6)]
+        context_words.append(word.capitalize() if rng.rand() < 0.2 else word)
+    separators = [" ", " ", " ", "  ", "\n", " \t"]
+    context_text = ""
+    word_char_spans = []
+    for word in context_words:
+        context_text += separators[rng.randint(len(separators))]
+        word_char_spans.append((len(context_text), len(context_text) + len(word)))
+        context_text += word
+    answer_start = rng.randint(len(context_words))
+    answer_end = min(answer_start + rng.randint(3), len(context_words) - 1)
+    start_position_character = word_char_spans[answer_start][0]
+    answer_text = context_text[start_position_character : word_char_spans[answer_end][1]]
+    question_text = " ".join(words[i] for i in rng.randint(len(words), size=rng.randint(1, 8)))
+    return squad_style.Example(
+        qas_id="q",
+        question_text=question_text + "?",
+        context_text=context_text,
+        answer_text=answer_text,
+        start_position_character=start_position_character,
+        title="-",
+        answers=[{"text": answer_text}],
+        is_impossible=False,
+    )
+
+
+def test_fast_featurization_matches_slow_featurization(tmpdir):
+    slow_tokenizer, fast_tokenizer, words = _create_tokenizers(str(tmpdir))
+    assert fast_tokenizer.is_fast
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        example = _create_random_example(rng, words)
+        assert (example.doc_tokens, example.char_to_word_offset) == _reference_whitespace_split(
+            example.context_text
+        )
+        for set_type in [PHASE.TRAIN, PHASE.VAL]:
+            kwargs = dict(max_seq_length=24, doc_stride=5, max_query_length=6, set_type=set_type)
+            slow_data_rows = example.to_feature_list(tokenizer=slow_tokenizer, **kwargs)
+            fast_data_rows = example.to_feature_list(tokenizer=fast_tokenizer, **kwargs)
+            assert len(slow_data_rows) == len(fast_data_rows)
+            for slow_data_row, fast_data_row in zip(slow_data_rows, fast_data_rows):
+                for key, slow_value in slow_data_row.to_dict().items():
+                    fast_value = getattr(fast_data_row, key)
+                    if isinstance(slow_value, np.ndarray):
+                        assert (slow_value == fast_value).all(), key
+                    else:
+                        assert slow_value == fast_value, key
+
+
+def test_fast_featurization_only_for_wordpiece(tmpdir):
+    slow_tokenizer, fast_tokenizer, words = _create_tokenizers(str(tmpdir))
+    # Stands in for fast non-WordPiece tokenizers (e.g. byte-level BPE), for which the fast
+    #   path may tokenize contexts differently
+    other_fast_tokenizer = _create_fast_tokenizer(
+        os.path.join(str(tmpdir), "vocab.txt"), tokenizer_cls=transformers.PreTrainedTokenizerFast
+    )
+    assert squad_style.supports_fast_featurization(fast_tokenizer)
+    assert not squad_style.supports_fast_featurization(other_fast_tokenizer)
+    assert not squad_style.supports_fast_featurization(slow_tokenizer)
+    example = _create_random_example(np.random.RandomState(0), words)
+    with pytest.raises(RuntimeError):
+        example.to_feature_list(
+            tokenizer=other_fast_tokenizer,
+            max_seq_length=24,
+            doc_stride=5,
+            max_query_length=6,
+            set_type=PHASE.VAL,
+        )
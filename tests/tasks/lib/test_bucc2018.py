@@ -0,0 +1,190 @@
+import os
+
+import numpy as np
+import pytest
+
+import jiant.tasks.evaluate as evaluate
+import jiant.tasks.lib.bucc2018 as bucc2018
+import jiant.utils.python.io as py_io
+from jiant.shared import model_resolution
+from jiant.tasks import create_task_from_config_path
+from jiant.utils.knn import KNNConfig
+from jiant.utils.testing.tokenizer import SimpleSpaceTokenizer
+
+
+def _reference_greedy_unique_pairs(src, trg):
+    seen_src, seen_trg = set(), set()
+    selected = []
+    for i, (src_ind, trg_ind) in enumerate(zip(src, trg)):
+        if src_ind not in seen_src and trg_ind not in seen_trg:
+            seen_src.add(src_ind)
+            seen_trg.add(trg_ind)
+            selected.append(i)
+    return selected
+
+
+def _reference_bucc_optimize(candidate2score, gold):
+    items = sorted(candidate2score.items(), key=lambda x: -x[1])
+    nextract = ncorrect = 0
+    threshold = 0
+    best_f1 = 0
+    for i in range(len(items)):
+        nextract += 1
+        if items[i][0] in gold:
+            ncorrect += 1
+        if ncorrect > 0:
+            precision = ncorrect / nextract
+            recall = ncorrect / len(gold)
+            f1 = 2 * precision * recall / (precision + recall)
+            if f1 > best_f1:
+                best_f1 = f1
+                threshold = (items[i][1] + items[i + 1][1]) / 2
+    return threshold
+
+
+def test_greedy_unique_pairs():
+    rng = np.random.RandomState(0)
+    for _ in range(50):
+        src = rng.randint(0, 10, size=30)
+        trg = rng.randint(0, 10, size=30)
+        assert list(
+            bucc2018.greedy_unique_pairs(src=src, trg=trg, num_src=10, num_trg=10)
+        ) == _reference_greedy_unique_pairs(src, trg)
+    # Each pair conflicts with the next one
+    src, trg = np.arange(1000) // 2, (np.arange(1000) + 1) // 2
+    assert list(
+        bucc2018.greedy_unique_pairs(src=src, trg=trg, num_src=500, num_trg=501)
+    ) == _reference_greedy_unique_pairs(src, trg)
+
+
+def test_score_candidates():
+    rng = np.random.RandomState(0)
+    x = rng.randn(7, 5).astype(np.float32)
+    y = rng.randn(9, 5).astype(np.float32)
+    candidate_inds = rng.randint(0, 9, size=(7, 3))
+    fwd_mean, bwd_mean = rng.rand(7), rng.rand(9)
+    for dist in ["cosine", "l2"]:
+        scores = bucc2018.score_candidates(
+            x, y, candidate_inds, fwd_mean, bwd_mean, lambda a, b: a / b, dist=dist, batch_size=2,
+        )
+        for i in range(7):
+            for j in range(3):
+                k = candidate_inds[i, j]
+                expected = bucc2018.score(
+                    x[i], y[k], fwd_mean[i], bwd_mean[k], lambda a, b: a / b, dist=dist
+                )
+                assert np.isclose(scores[i, j], expected)
+
+
+def test_bucc_optimize_and_extract():
+    candidate2score = {("s%d" % i, "t%d" % (i % 7)): (i * 37 % 11) / 10 for i in range(40)}
+    gold = [candidate for i, candidate in enumerate(candidate2score) if i % 3 == 0]
+    gold.append(("s-unk", "t-unk"))
+    # Make sure the lowest-scored candidate is not the best cut-off
+    candidate2score["s-low", "t-low"] = -1.0
+    threshold = bucc2018.bucc_optimize(candidate2score, gold)
+    assert threshold == _reference_bucc_optimize(candidate2score, gold)
+    assert bucc2018.bucc_extract(candidate2score, threshold) == [
+        candidate for candidate, score in candidate2score.items() if score >= threshold
+    ]
+
+
+@pytest.mark.parametrize("task_name", ["bucc2018", "tatoeba"])
+def test_knn_config_from_task_config(tmpdir, task_name):
+    task_config_path = os.path.join(str(tmpdir), "task_config.json")
+    knn_config = {"backend": "blocked", "query_block_size": 2, "storage_dtype": "float16"}
+    py_io.write_json(
+        {
+            "task": task_name,
+            "name": f"{task_name}_de",
+            "paths": {},
+            "kwargs": {
+                "language": "de",
+                "knn_config": knn_config,
+                "embedding_store_dir": os.path.join(str(tmpdir), "embeddings"),
+            },
+        },
+        task_config_path,
+    )
+    evaluation_scheme = evaluate.get_evaluation_scheme_for_task(
+        create_task_from_config_path(task_config_path)
+    )
+    assert evaluation_scheme.knn_config == KNNConfig(**knn_config)
+    embedding_store = evaluation_scheme.get_accumulator().embedding_store
+    assert embedding_store.dtype == np.float16
+    assert os.path.dirname(embedding_store.output_dir) == os.path.join(str(tmpdir), "embeddings")
+
+
+def test_ann_mining_from_task_config(tmpdir):
+    pytest.importorskip("faiss")
+    num_sentences = 30
+    # The last sentences are not translations (but are similar)
+    for lang in ["en", "de"]:
+        py_io.write_file(
+            "".join(f"{lang}-{i}\tsentence {lang} {i}\n" for i in range(num_sentences + 1)),
+            os.path.join(str(tmpdir), f"{lang}.txt"),
+        )
+    py_io.write_file(
+        "".join(f"de-{i}\ten-{i}\n" for i in range(num_sentences)),
+        os.path.join(str(tmpdir), "labels.txt"),
+    )
+    task_config_path = os.path.join(str(tmpdir), "task_config.json")
+    py_io.write_json(
+        {
+            "task": "bucc2018",
+            "name": "bucc2018_de",
+            "paths": {
+                "val": {
+                    "eng": os.path.join(str(tmpdir), "en.txt"),
+                    "other": os.path.join(str(tmpdir), "de.txt"),
+                    "labels": os.path.join(str(tmpdir), "labels.txt"),
+                }
+            },
+            "kwargs": {
+                "language": "de",
+                "knn_config": {"ann_type": "hnsw", "hnsw_m": 8, "ann_recall_sample_size": 10},
+            },
+        },
+        task_config_path,
+    )
+    task = create_task_from_config_path(task_config_path)
+    val_examples = task.get_val_examples()
+    vocabulary = set()
+    for example in val_examples:
+        vocabulary.update(example.text.split())
+    tokenizer = SimpleSpaceTokenizer(vocabulary=sorted(vocabulary))
+    feat_spec = model_resolution.build_featurization_spec(model_type="bert-", max_seq_length=8)
+    data_rows = [
+        example.tokenize(tokenizer).featurize(tokenizer=tokenizer, feat_spec=feat_spec)
+        for example in val_examples
+    ]
+
+    # Each English sentence has a noisy translation, with the same index
+    rng = np.random.RandomState(0)
+    eng_embeddings = rng.randn(num_sentences + 1, 16).astype(np.float32)
+    other_embeddings = eng_embeddings + 0.01 * rng.randn(num_sentences + 1, 16).astype(np.float32)
+    other_embeddings[-1] = eng_embeddings[-1] + rng.randn(16)
+    embeddings = np.concatenate([eng_embeddings, other_embeddings])
+    evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task)
+    accumulator = evaluation_scheme.get_accumulator()
+    for start in range(0, len(data_rows), 8):
+        batch, batch_metadata = task.collate_fn(
+            [{"data_row": data_row, "metadata": {}} for data_row in data_rows[start : start + 8]]
+        )
+        accumulator.update(
+            batch_logits=embeddings[start : start + 8],
+            batch_loss=0,
+            batch=batch,
+            batch_metadata=batch_metadata,
+        )
+    metrics = evaluation_scheme.compute_metrics_from_accumulator(
+        task=task, accumulator=accumulator, tokenizer=tokenizer, labels=task.get_val_labels(),
+    )
+    # Approximate search was used, and the recall of each search direction is reported
+    assert metrics.minor["ann_recall_fwd"] == metrics.minor["ann_recall_bwd"] == 1.0
+    assert metrics.major == 1.0
+
+
+def test_knn_config_invalid_ann_type():
+    with pytest.raises(KeyError):
+        KNNConfig(ann_type="lsh")
@@ -2,9 +2,12 @@ import os
 from collections import Counter
 
 import numpy as np
+import torch
 import transformers
 from unittest.mock import Mock
 
+import jiant.proj.main.modeling.heads as heads
+import jiant.tasks.evaluate as evaluate
 from jiant.shared import model_resolution
 from jiant.tasks import create_task_from_config_path
 from jiant.utils.testing.tokenizer import SimpleSpaceTokenizer
@@ -337,3 +340,78 @@ def test_featurization_of_task_data():
     assert featurized_example_0_dict["span1_text"] == FEATURIZED_TRAIN_EXAMPLE_0["span1_text"]
     assert featurized_example_0_dict["span2_text"] == FEATURIZED_TRAIN_EXAMPLE_0["span2_text"]
     assert (featurized_example_0_dict["spans"] == FEATURIZED_TRAIN_EXAMPLE_0["spans"]).all()
+
+
+def test_grouped_span_queries():
+    # Grouped span queries should give the same spans, labels and logits as ungrouped ones
+    config_path = os.path.join(os.path.dirname(__file__), "resources/spr1.json")
+    task = create_task_from_config_path(config_path)
+    grouped_task = create_task_from_config_path(config_path)
+    grouped_task.group_spans = True
+    train_examples = task.get_train_examples()
+    grouped_train_examples = grouped_task.get_train_examples()
+    assert [len(example.examples) for example in grouped_train_examples] == [2, 2]
+
+    token_counter = Counter()
+    for example in train_examples:
+        token_counter.update(example.text.split())
+    tokenizer = SimpleSpaceTokenizer(vocabulary=list(token_counter.keys()))
+    feat_spec = model_resolution.build_featurization_spec(model_type="bert-", max_seq_length=40)
+    data_rows = [
+        example.tokenize(tokenizer).featurize(tokenizer=tokenizer, feat_spec=feat_spec)
+        for example in train_examples
+    ]
+    grouped_data_rows = [
+        example.tokenize(tokenizer).featurize(tokenizer=tokenizer, feat_spec=feat_spec)
+        for example in grouped_train_examples
+    ]
+    assert (
+        np.concatenate([data_row.spans for data_row in grouped_data_rows])
+        == np.stack([data_row.spans for data_row in data_rows])
+    ).all()
+    assert (
+        np.concatenate([data_row.label_ids for data_row in grouped_data_rows])
+        == np.stack([data_row.label_ids for data_row in data_rows])
+    ).all()
+
+    # Give the second sentence a third query, so that the first is padded when batched
+    grouped_data_rows[1].spans = np.concatenate([grouped_data_rows[1].spans] * 2)[:3]
+    grouped_data_rows[1].label_ids = np.concatenate([grouped_data_rows[1].label_ids] * 2)[:3]
+    grouped_data_rows[1].span_guids = grouped_data_rows[1].span_guids + ["extra"]
+    grouped_data_rows[1].span1_texts = grouped_data_rows[1].span1_texts + ["extra"]
+    grouped_data_rows[1].span2_texts = grouped_data_rows[1].span2_texts + ["extra"]
+    data_rows.append(data_rows[2])
+    batch, batch_metadata = grouped_task.collate_fn(
+        [{"data_row": data_row, "metadata": {}} for data_row in grouped_data_rows]
+    )
+    assert batch.spans.shape == (2, 3, 2, 2)
+    assert batch.span_mask.tolist() == [[1, 1, 0], [1, 1, 1]]
+    flat_batch, _ = task.collate_fn(
+        [{"data_row": data_row, "metadata": {}} for data_row in data_rows]
+    )
+
+    torch.manual_seed(0)
+    head = heads.SpanComparisonHead(
+        hidden_size=8, hidden_dropout_prob=0.0, num_spans=2, num_labels=len(task.LABELS)
+    )
+    unpooled = torch.randn(2, batch.input_ids.shape[1], 8)
+    grouped_logits = head(unpooled=unpooled, spans=batch.spans)
+    flat_logits = head(unpooled=unpooled[[0, 0, 1, 1, 1]], spans=flat_batch.spans)
+    assert grouped_logits.shape == (2, 3, len(task.LABELS))
+
+    evaluation_scheme = evaluate.get_evaluation_scheme_for_task(task)
+    accumulator = evaluation_scheme.get_accumulator()
+    accumulator.update(
+        batch_logits=grouped_logits.detach().numpy(),
+        batch_loss=0,
+        batch=batch,
+        batch_metadata=batch_metadata,
+    )
+    assert np.allclose(accumulator.get_accumulated(), flat_logits.detach().numpy(), atol=1e-6)
+    assert list(accumulator.get_guids()) == [
+        "train-0-0",
+        "train-0-1",
+        "train-1-0",
+        "train-1-1",
+        "extra",
+    ]
@@ -1,8 +1,15 @@
+import dataclasses
 import json
+import pickle
 import pytest
+import tracemalloc
 from dataclasses import dataclass
 
+import numpy as np
+
+import jiant.tasks.lib.mnli as mnli
 import jiant.utils.python.datastructures as py_datastructures
+from jiant.tasks.core import BaseDataRow
 
 
 def test_take_one():
@@ -165,3 +172,78 @@ def test_set_dict_keys():
     assert list(py_datastructures.set_dict_keys(d, ["a", "c", "b"])) == ["a", "c", "b"]
     with pytest.raises(AssertionError):
         py_datastructures.set_dict_keys(d, ["a", "b"])
+
+
+@dataclass
+class UnslottedRow(py_datastructures.ExtendedDataClassMixin):
+    guid: str
+    input_ids: list
+    label_id: int = 0
+
+
+@py_datastructures.add_slots
+@dataclass
+class SlottedRow(py_datastructures.ExtendedDataClassMixin):
+    guid: str
+    input_ids: list
+    label_id: int = 0
+
+
+@py_datastructures.add_slots
+@dataclass
+class SlottedSubRow(SlottedRow):
+    tokens: list = None
+
+
+def test_add_slots():
+    row = SlottedSubRow(guid="a", input_ids=[1, 2])
+    assert not hasattr(row, "__dict__")
+    assert row.to_dict() == {"guid": "a", "input_ids": [1, 2], "label_id": 0, "tokens": None}
+    assert SlottedRow.get_field_names() == ("guid", "input_ids", "label_id")
+    assert SlottedSubRow.get_fields() == ["guid", "input_ids", "label_id", "tokens"]
+    assert row.new(label_id=1) == SlottedSubRow(guid="a", input_ids=[1, 2], label_id=1)
+    with pytest.raises(AttributeError):
+        row.not_a_field = 1
+
+
+def test_add_slots_pickle_compatibility():
+    unslotted_row = UnslottedRow(guid="a", input_ids=[1, 2], label_id=3)
+    slotted_row = SlottedRow(guid="a", input_ids=[1, 2], label_id=3)
+    assert pickle.loads(pickle.dumps(slotted_row)) == slotted_row
+    # Data pickled before and after slotting can be loaded by either class
+    assert unslotted_row.__reduce_ex__(2)[2] == slotted_row.__reduce_ex__(2)[2]
+    loaded_row = SlottedRow.__new__(SlottedRow)
+    loaded_row.__setstate__(unslotted_row.__reduce_ex__(2)[2])
+    assert loaded_row == slotted_row
+
+
+def test_add_slots_memory_per_instance():
+    # Benchmark of the memory used by MNLI DataRows themselves (field values are shared), against
+    # the same DataRow without slots
+    num_instances = 10000
+    unslotted_data_row_class = dataclasses.make_dataclass(
+        "UnslottedDataRow",
+        [(field.name, field.type) for field in dataclasses.fields(mnli.DataRow)],
+        bases=(BaseDataRow,),
+    )
+    input_ids = np.arange(8)
+    tokens = ["[CLS]", "a", "[SEP]", "b", "[SEP]"]
+    bytes_per_instance = {}
+    for cls in [unslotted_data_row_class, mnli.DataRow]:
+        tracemalloc.start()
+        instances = [
+            cls(
+                guid="a",
+                input_ids=input_ids,
+                input_mask=input_ids,
+                segment_ids=input_ids,
+                label_id=i,
+                tokens=tokens,
+            )
+            for i in range(num_instances)
+        ]
+        bytes_per_instance[cls] = tracemalloc.get_traced_memory()[0] / num_instances
+        tracemalloc.stop()
+        del instances
+    assert not hasattr(mnli.DataRow(*([None] * 6)), "__dict__")
+    assert bytes_per_instance[mnli.DataRow] < bytes_per_instance[unslotted_data_row_class]
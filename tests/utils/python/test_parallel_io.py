@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+import jiant.utils.python.io as py_io
+import jiant.utils.python.parallel_io as parallel_io
+
+
+def _write_lines(tmpdir, name, text):
+    path = os.path.join(tmpdir, name)
+    py_io.write_file(text, path)
+    return path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 10 ** 6])
+def test_byte_ranges_are_line_aligned(tmpdir, chunk_size):
+    path = _write_lines(str(tmpdir), "data.txt", "a\nbb\n\nccc\ndddd\ne")
+    byte_ranges = parallel_io.get_line_aligned_byte_ranges(path, chunk_size=chunk_size)
+    assert byte_ranges[0][0] == 0
+    assert byte_ranges[-1][1] == os.path.getsize(path)
+    data = py_io.read_file(path, mode="rb")
+    for (start, end), (next_start, _) in zip(byte_ranges, byte_ranges[1:]):
+        assert end == next_start
+        assert data[end - 1 : end] == b"\n"
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_iter_parsed_lines_jsonl(tmpdir, num_workers):
+    records = [
+        {"idx": i, "text": "é" * (i % 5), "value": float("nan") if i == 3 else i} for i in range(50)
+    ]
+    path = _write_lines(str(tmpdir), "data.jsonl", "\n".join(map(json.dumps, records)) + "\n\n")
+    parsed_lines = list(
+        parallel_io.iter_parsed_lines(
+            path, file_format="jsonl", num_workers=num_workers, chunk_size=100, min_parallel_size=0,
+        )
+    )
+    # Blank lines are skipped, and NaN (which orjson rejects) falls back to json
+    assert json.dumps(parsed_lines) == json.dumps(records)
+
+
+def test_iter_parsed_lines_tsv_and_text(tmpdir):
+    path = _write_lines(str(tmpdir), "data.tsv", "a\tb\r\n\tc\n\nd")
+    assert list(parallel_io.iter_parsed_lines(path, file_format="tsv", chunk_size=3)) == [
+        ["a", "b"],
+        ["", "c"],
+        [""],
+        ["d"],
+    ]
+    assert list(parallel_io.iter_parsed_lines(path, file_format="text", chunk_size=3)) == [
+        "a\tb",
+        "\tc",
+        "",
+        "d",
+    ]
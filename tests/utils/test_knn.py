@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from jiant.utils import knn
+
+
+def _brute_force_knn(queries, database, k, metric):
+    if metric == "ip":
+        scores = queries @ database.T
+    elif metric == "cosine":
+        scores = (queries @ database.T) / np.outer(
+            np.linalg.norm(queries, axis=1), np.linalg.norm(database, axis=1)
+        )
+    else:
+        scores = -(((queries[:, None, :] - database[None, :, :]) ** 2).sum(axis=-1))
+    indices = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+    scores = np.take_along_axis(scores, indices, axis=1)
+    return (-scores if metric == "l2" else scores), indices
+
+
+@pytest.mark.parametrize("metric", ["ip", "cosine", "l2"])
+@pytest.mark.parametrize("num_threads", [1, 3])
+def test_blocked_knn_matches_brute_force(metric, num_threads):
+    rng = np.random.RandomState(0)
+    queries = rng.randn(23, 8).astype(np.float32)
+    database = rng.randn(41, 8).astype(np.float32)
+    # Tiles of 5 queries x 6 database rows
+    knn_config = knn.KNNConfig(
+        backend="blocked", query_block_size=5, max_block_bytes=4 * 5 * 6, num_threads=num_threads,
+    )
+    scores, indices = knn.exact_knn(
+        queries=queries, database=database, k=4, metric=metric, knn_config=knn_config
+    )
+    expected_scores, expected_indices = _brute_force_knn(queries, database, k=4, metric=metric)
+    assert (indices == expected_indices).all()
+    assert np.allclose(scores, expected_scores, atol=1e-4)
+
+
+def test_blocked_knn_float16_storage():
+    rng = np.random.RandomState(0)
+    database = rng.randn(50, 16).astype(np.float32)
+    knn_config = knn.KNNConfig(backend="blocked", storage_dtype="float16")
+    _, indices = knn.exact_knn(
+        queries=knn.as_storage_dtype(database[:10] + 0.01, knn_config=knn_config),
+        database=knn.as_storage_dtype(database, knn_config=knn_config),
+        k=1,
+        metric="cosine",
+        knn_config=knn_config,
+    )
+    assert list(indices[:, 0]) == list(range(10))
+
+
+def test_blocked_knn_k_larger_than_database():
+    queries = np.eye(3, dtype=np.float32)
+    scores, indices = knn.exact_knn(
+        queries=queries, database=queries[:2], k=5, knn_config=knn.KNNConfig(backend="blocked")
+    )
+    assert indices.shape == (3, 2)
+    assert list(indices[0]) == [0, 1]
+
+
+@pytest.mark.parametrize("backend", ["blocked", "auto"])
+def test_exact_knn_empty_database(backend):
+    scores, indices = knn.exact_knn(
+        queries=np.eye(3, dtype=np.float32),
+        database=np.zeros((0, 3), dtype=np.float32),
+        k=5,
+        knn_config=knn.KNNConfig(backend=backend),
+    )
+    assert scores.shape == indices.shape == (3, 0)
+
+
+@pytest.mark.parametrize("dtype", [np.float16, np.float32, np.float64])
+def test_l2_normalize_(dtype):
+    x = np.array([[3.0, 4.0], [0.0, 0.0]], dtype=dtype)
+    knn.l2_normalize_(x)
+    assert x.dtype == dtype
+    assert np.allclose(x, [[0.6, 0.8], [0.0, 0.0]], rtol=1e-3 if dtype == np.float16 else 1e-5)
+
+
+@pytest.mark.parametrize("ann_type", ["ivf", "hnsw"])
+def test_ann_index(ann_type):
+    pytest.importorskip("faiss")
+    rng = np.random.RandomState(0)
+    database = rng.randn(200, 8).astype(np.float32)
+    knn_config = knn.KNNConfig(ann_type=ann_type, ivf_nlist=4, ivf_nprobe=4)
+    index = knn.ANNIndex(database=database, metric="cosine", knn_config=knn_config)
+    scores, indices = index.search(queries=database[:20], k=3)
+    assert indices.shape == (20, 3)
+    assert list(indices[:, 0]) == list(range(20))
+    assert np.allclose(scores[:, 0], 1, atol=1e-5)
+    # With nprobe == nlist, IVF search is exhaustive
+    report = index.recall_report(queries=database, k=3, sample_size=50)
+    assert report["sample_size"] == 50
+    assert report["recall"] > 0.9
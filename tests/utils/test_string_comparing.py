@@ -0,0 +1,50 @@
+import pytest
+
+import jiant.utils.string_comparing as string_comparing
+
+
+def test_normalize_answer():
+    assert string_comparing.normalize_answer("The  Cat's hat!") == "cats hat"
+    assert string_comparing.normalize_answer("an apple, a pear") == "apple pear"
+    assert string_comparing.normalize_answer("") == ""
+
+
+def test_string_f1_score():
+    assert string_comparing.string_f1_score("the cat sat", "a cat sat down") == pytest.approx(0.8)
+    assert string_comparing.string_f1_score("dog", "cat") == 0
+    # ReCoRD scoring: empty answers never match
+    assert string_comparing.string_f1_score("", "") == 0
+
+
+def test_compute_em_and_f1():
+    predictions = ["the cat", "dog", ""]
+    ground_truths_list = [["cat", "a cat sat"], ["cat"], [""]]
+    em_list, f1_list = string_comparing.compute_em_and_f1(
+        predictions=predictions, ground_truths_list=ground_truths_list,
+    )
+    assert em_list == [1, 0, 1]
+    assert f1_list == [1.0, 0, 0]
+
+    # SQuAD 2.0 scoring: empty answers match each other
+    em_list, f1_list = string_comparing.compute_em_and_f1(
+        predictions=predictions, ground_truths_list=ground_truths_list, empty_match=True,
+    )
+    assert em_list == [1, 0, 1]
+    assert f1_list == [1.0, 0, 1]
+
+
+def test_compute_em_and_f1_process_pool():
+    predictions = ["cat {}".format(i) for i in range(20)]
+    ground_truths_list = [["cat {}".format(i), "dog"] for i in range(0, 40, 2)]
+    expected = string_comparing.compute_em_and_f1(
+        predictions=predictions, ground_truths_list=ground_truths_list,
+    )
+    assert (
+        string_comparing.compute_em_and_f1(
+            predictions=predictions,
+            ground_truths_list=ground_truths_list,
+            num_workers=2,
+            chunk_size=8,
+        )
+        == expected
+    )
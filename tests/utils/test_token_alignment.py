@@ -1,7 +1,14 @@
 import numpy as np
 import pytest
+import scipy.sparse
 
-from jiant.utils.retokenize import TokenAligner, token_to_char
+from jiant.utils.retokenize import (
+    TokenAligner,
+    clear_token_aligner_cache,
+    get_token_aligner,
+    get_token_aligner_cache_info,
+    token_to_char,
+)
 
 
 def test_token_to_char():
@@ -561,13 +568,62 @@ def test_project_invalid_span():
         ta.project_token_span(0, 0)
 
 
+def test_project_span_past_last_source_token():
+    ta = TokenAligner(["a", "b"], "a b")
+    with pytest.raises(ValueError):
+        ta.project_token_span(2, 2)
+    with pytest.raises(ValueError):
+        ta.project_token_span(2, 3)
+    with pytest.raises(ValueError):
+        ta.project_token_span(2, 2, inclusive=True)
+    with pytest.raises(ValueError):
+        ta.project_token_to_char_span(2, 3, inclusive=True)
+    with pytest.raises(ValueError):
+        ta.project_token_spans([(0, 1), (2, 3)])
+
+
 def test_private_project_token_span():
     mat = np.eye(5, dtype=int)
     mat[0][0] = 0
     mat[3][3] = 0
-    assert TokenAligner._project_span(mat, 1, 3, inclusive=True) == (1, 2)
-    assert TokenAligner._project_span(mat, 1, 3, inclusive=False) == (1, 3)
-    assert TokenAligner._project_span(mat, 1, 2, inclusive=True) == (1, 2)
-    assert TokenAligner._project_span(mat, 1, 2, inclusive=False) == (1, 2)
-    assert TokenAligner._project_span(mat, 1, 4, inclusive=True) == (1, 4)
-    assert TokenAligner._project_span(mat, 1, 4, inclusive=False) == (1, 3)
+    ta = TokenAligner("a b c d e", "a b c d e")
+    ta.source_token_idx_to_target_token_idx = scipy.sparse.csr_matrix(mat)
+    mat_name = "source_token_idx_to_target_token_idx"
+    assert ta._project_spans(mat_name, [(1, 3)], inclusive=True) == [(1, 2)]
+    assert ta._project_spans(mat_name, [(1, 3)], inclusive=False) == [(1, 3)]
+    assert ta._project_spans(mat_name, [(1, 2)], inclusive=True) == [(1, 2)]
+    assert ta._project_spans(mat_name, [(1, 2)], inclusive=False) == [(1, 2)]
+    assert ta._project_spans(mat_name, [(1, 4)], inclusive=True) == [(1, 4)]
+    assert ta._project_spans(mat_name, [(1, 4)], inclusive=False) == [(1, 3)]
+
+
+def test_project_token_spans_matches_project_token_span():
+    src_tokens = ["Members", "of", "the", "House", "clapped", "their", "hands"]
+    tgt_tokens = ["Members", "Ġof", "Ġthe", "ĠHouse", "Ġcl", "apped", "Ġtheir", "Ġhands"]
+    ta = TokenAligner(src_tokens, tgt_tokens)
+    spans = [(0, 7), (4, 5), (3, 6), (6, 7)]
+    assert ta.project_token_spans(spans) == [ta.project_token_span(*span) for span in spans]
+    inclusive_spans = [(0, 6), (4, 4), (3, 5), (6, 6)]
+    assert ta.project_token_spans(inclusive_spans, inclusive=True) == [
+        ta.project_token_span(*span, inclusive=True) for span in inclusive_spans
+    ]
+    assert ta.project_token_spans([]) == []
+    with pytest.raises(ValueError):
+        ta.project_token_spans([(0, 1), (2, 2)])
+
+
+def test_token_aligner_is_sparse():
+    # The char-to-char matrix of a long text should not be stored densely
+    tokens = ["token%d" % i for i in range(2000)]
+    ta = TokenAligner(tokens, tokens)
+    assert ta.C.nnz == len(" ".join(tokens))
+    assert ta.project_token_span(1500, 1502) == (1500, 1502)
+
+
+def test_get_token_aligner_is_memoized():
+    clear_token_aligner_cache()
+    ta = get_token_aligner(["abc", "def"], ["abc", "d", "ef"])
+    assert get_token_aligner(("abc", "def"), ("abc", "d", "ef")) is ta
+    assert get_token_aligner(["abc", "def"], ["abc", "def"]) is not ta
+    cache_info = get_token_aligner_cache_info()
+    assert (cache_info.hits, cache_info.misses) == (1, 2)
@@ -0,0 +1,38 @@
+from unittest.mock import Mock
+
+from jiant.utils.tokenization_memo import TokenizationMemo
+
+
+def test_tokenization_memo():
+    tokenizer = Mock()
+    tokenizer.tokenize.side_effect = lambda text: text.split()
+    memo = TokenizationMemo(max_size=2)
+    assert memo.tokenize(tokenizer, "a b") == ["a", "b"]
+    assert memo.tokenize(tokenizer, "a b") == ["a", "b"]
+    assert memo.tokenize(tokenizer, "c d") == ["c", "d"]
+    assert tokenizer.tokenize.call_count == 2
+    assert memo.get_stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3, "size": 2}
+
+    # Results are copies, so modifying them does not modify the memo
+    memo.tokenize(tokenizer, "a b").append("x")
+    assert memo.tokenize(tokenizer, "a b") == ["a", "b"]
+
+    # Least-recently-used entries ("c d") are evicted
+    memo.tokenize(tokenizer, "e f")
+    memo.tokenize(tokenizer, "c d")
+    assert tokenizer.tokenize.call_count == 4
+
+    # Different tokenizers do not share entries
+    other_tokenizer = Mock()
+    other_tokenizer.tokenize.side_effect = lambda text: list(text)
+    assert memo.tokenize(other_tokenizer, "c d") == ["c", " ", "d"]
+
+
+def test_tokenization_memo_disabled():
+    tokenizer = Mock()
+    tokenizer.tokenize.side_effect = lambda text: text.split()
+    memo = TokenizationMemo(max_size=0)
+    memo.tokenize(tokenizer, "a b")
+    memo.tokenize(tokenizer, "a b")
+    assert tokenizer.tokenize.call_count == 2
+    assert memo.get_stats()["size"] == 0